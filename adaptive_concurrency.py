@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Adaptive Concurrency - Vegas/AIMD in-flight limit for bulk offline jobs
+Grows the number of requests in flight while time-to-first-token stays near
+its floor, backs off when requests start queueing on the server and halves
+on timeouts/5xx/429; the benchmark compares it to fixed concurrencies
+while the server's spare capacity changes mid-run
+"""
+
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from collections import deque
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+from load_engine import LoadEngine
+from outcome_stats import summarize_outcomes, format_outcomes
+from mock_openai_server import start_mock_servers, stop_mock_servers
+
+
+class AdaptiveConcurrencyLimiter:
+    """In-flight limit driven by queueing latency (Vegas) and errors (AIMD).
+
+    Every completed request yields a latency sample: its TTFT when streamed,
+    which is where waiting for a batch slot or KV space shows up, otherwise
+    ``total_ms / completion_tokens``.  Per-token decode time is deliberately
+    not used for streams, since it grows with batch size even while
+    throughput still rises.  Once per round (``limit`` completions) the
+    average sample is compared to the floor seen over the last
+    ``floor_rounds`` rounds:
+
+        queued = limit * (1 - floor / average)
+
+    estimates how many requests are waiting instead of being served.  Below
+    ``alpha`` the limit grows by one (doubling during the initial slow
+    start, until the first sign of queueing), above ``beta`` it shrinks by
+    half the excess (at least one), so an overshoot is undone in a round or two.
+    Timeouts, 5xx and 429 cut the limit by ``backoff`` (at most once per
+    round), as does an error rate above ``max_error_rate``.  The floor is a
+    windowed minimum so it follows the server when its load changes.
+    Latency samples of requests started before the last limit change are
+    ignored, so a round measures the limit it is judging.
+    """
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 256, alpha: float = 2.0,
+                 beta: float = 4.0, backoff: float = 0.5, max_error_rate: float = 0.05, floor_rounds: int = 20):
+        self.limit = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.alpha = alpha
+        self.beta = beta
+        self.backoff = backoff
+        self.max_error_rate = max_error_rate
+        self.in_flight = 0
+        self.history: List[Dict[str, Any]] = []
+        self._round_floors: deque = deque(maxlen=floor_rounds)
+        self._samples: List[float] = []
+        self._round_errors = 0
+        self._round_size = 0
+        self._backed_off = False
+        self._slow_start = True
+        self._changed_at = 0.0
+        self._start = time.perf_counter()
+        self._condition = asyncio.Condition()
+        # The loop only keeps weak references to tasks, so pending notifications are held here
+        self._notify_tasks = set()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    def release(self, record: Optional[Dict[str, Any]]):
+        """Feed back one finished request (None when it was cancelled) and wake waiters"""
+        self.in_flight -= 1
+        if record is not None:
+            self.update(record)
+        task = asyncio.get_running_loop().create_task(self._notify())
+        self._notify_tasks.add(task)
+        task.add_done_callback(self._notify_tasks.discard)
+
+    async def _notify(self):
+        async with self._condition:
+            self._condition.notify_all()
+
+    @staticmethod
+    def is_overload(record: Dict[str, Any]) -> bool:
+        """Failures that mean "too much load": timeouts, transport errors, 5xx and 429"""
+        if record["success"]:
+            return False
+        status = record.get("status")
+        return status is None or status >= 500 or status == 429
+
+    @staticmethod
+    def latency_sample(record: Dict[str, Any]) -> Optional[float]:
+        if record.get("first_token_ms") is not None:
+            return record["first_token_ms"]
+        if record.get("completion_tokens"):
+            return record["total_ms"] / record["completion_tokens"]
+        return None
+
+    def update(self, record: Dict[str, Any]):
+        if self.is_overload(record):
+            self._round_errors += 1
+            if not self._backed_off:
+                # Multiplicative decrease, once per round so a burst of errors is one signal
+                self._set_limit(self.limit * self.backoff)
+                self._backed_off = True
+                self._slow_start = False
+        elif record.get("start_time", 0.0) < self._changed_at:
+            return
+        elif record["success"]:
+            sample = self.latency_sample(record)
+            if sample is not None:
+                self._samples.append(sample)
+        self._round_size += 1
+
+        if self._round_size >= self.limit:
+            self._end_round()
+
+    def _end_round(self):
+        error_rate = self._round_errors / self._round_size
+        if self._samples:
+            average = statistics.mean(self._samples)
+            self._round_floors.append(min(self._samples))
+            floor = min(self._round_floors)
+            queued = self.limit * (1 - floor / average) if average > 0 else 0.0
+            if error_rate > self.max_error_rate:
+                if not self._backed_off:
+                    self._set_limit(self.limit * self.backoff)
+                self._slow_start = False
+            elif queued < self.alpha:
+                self._set_limit(self.limit * 2 if self._slow_start else self.limit + 1)
+            else:
+                self._slow_start = False
+                if queued > self.beta:
+                    self._set_limit(self.limit - max(1, (queued - self.beta) / 2))
+            self.history.append({"t": time.perf_counter() - self._start, "limit": self.limit,
+                                 "avg_latency_ms": average, "floor_latency_ms": floor,
+                                 "queued_estimate": queued, "error_rate": error_rate})
+        self._samples = []
+        self._round_errors = 0
+        self._round_size = 0
+        self._backed_off = False
+
+    def _set_limit(self, value: float):
+        limit = int(min(max(value, self.min_limit), self.max_limit))
+        if limit != self.limit:
+            self.limit = limit
+            self._changed_at = time.time()
+
+
+class BackgroundLoad:
+    """Closed loop of ``concurrency`` requests from another tenant, toggled mid-run"""
+
+    def __init__(self, engine: LoadEngine, concurrency: int, max_tokens: int):
+        self.engine = engine
+        self.concurrency = concurrency
+        self.max_tokens = max_tokens
+        self._tasks: List[asyncio.Task] = []
+
+    async def _loop(self, worker: int):
+        while True:
+            await self.engine.send(self.engine.build_payload(f"Background tenant {worker}: summarize the news",
+                                                             self.max_tokens))
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._loop(i)) for i in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+def phase_throughput(records: List[Dict[str, Any]], start: float, end: float) -> float:
+    """Completion tokens/s of requests that finished inside [start, end) (wall clock)"""
+    tokens = sum(r["completion_tokens"] for r in records
+                 if r["success"] and start <= r["start_time"] + r["total_ms"] / 1000 < end)
+    return tokens / (end - start) if end > start else 0.0
+
+
+async def run_config(base_url: str, label: str, concurrency: Optional[int], args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    payloads = []
+    async with LoadEngine(base_url, args.model, timeout=args.timeout, max_connections=0) as engine, \
+            LoadEngine(base_url, args.model, timeout=args.timeout) as background_engine:
+        for i in range(args.requests):
+            max_tokens = rng.randint(args.max_tokens // 2, args.max_tokens)
+            payloads.append(engine.build_payload(f"Job {i}: write a product description for item {i}", max_tokens))
+
+        background = BackgroundLoad(background_engine, args.background_concurrency, args.max_tokens)
+        limiter = AdaptiveConcurrencyLimiter(initial=args.initial, max_limit=args.max_limit) if concurrency is None \
+            else None
+
+        async def change_load():
+            await asyncio.sleep(args.change_after)
+            background.start()
+
+        start = time.time()
+        changer = asyncio.create_task(change_load())
+        if limiter is not None:
+            records = await engine.run_adaptive(payloads, limiter)
+        else:
+            records = await engine.run_closed_loop(payloads, concurrency)
+        end = time.time()
+        changer.cancel()
+        await background.stop()
+
+    ok = [r for r in records if r["success"]]
+    change_at = start + args.change_after
+    latencies = [r["total_ms"] for r in ok]
+    outcomes = summarize_outcomes(records)
+    result = {
+        "config": label,
+        "requests": len(records),
+        "successful": len(ok),
+        "errors": len(records) - len(ok),
+        "outcomes": outcomes["outcomes"],
+        "censored_latency_percentiles": outcomes["censored_percentiles"],
+        "elapsed_s": end - start,
+        "throughput_tps": sum(r["completion_tokens"] for r in ok) / (end - start),
+        "throughput_before_change_tps": phase_throughput(records, start, min(change_at, end)),
+        "throughput_after_change_tps": phase_throughput(records, change_at, end),
+        "p50_latency_ms": statistics.median(latencies) if latencies else None,
+        "p95_latency_ms": statistics.quantiles(latencies, n=20)[18] if len(latencies) >= 20 else None,
+    }
+    if limiter is not None:
+        before = [h["limit"] for h in limiter.history if h["t"] < args.change_after]
+        after = [h["limit"] for h in limiter.history if h["t"] >= args.change_after]
+        result["limit_before_change"] = statistics.median(before[len(before) // 2:]) if before else None
+        result["limit_after_change"] = statistics.median(after[len(after) // 2:]) if after else None
+        result["limit_history"] = limiter.history
+    return result
+
+
+async def run_benchmark(args) -> List[Dict[str, Any]]:
+    servers = []
+    base_url = args.backend
+    if not base_url:
+        servers = await start_mock_servers(1, args.mock_port, ttft_ms=30.0, itl_ms=args.mock_itl_ms,
+                                           max_running=args.mock_max_running, batch_penalty=0.03)
+        base_url = servers[0].base_url
+
+    results = []
+    try:
+        configs = [(f"fixed_{c}", c) for c in args.fixed] + [("adaptive", None)]
+        for label, concurrency in configs:
+            result = await run_config(base_url, label, concurrency, args)
+            results.append(result)
+            extra = ""
+            if concurrency is None:
+                extra = f"  limit {result['limit_before_change']} → {result['limit_after_change']}"
+            print(f"  {label:<10} {result['throughput_tps']:8.1f} tok/s  "
+                  f"(before {result['throughput_before_change_tps']:.0f}, after {result['throughput_after_change_tps']:.0f})  "
+                  f"p95 {result['p95_latency_ms'] or 0:7.0f}ms  [{format_outcomes(result['outcomes'])}]{extra}")
+    finally:
+        await stop_mock_servers(servers)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Adaptive (Vegas/AIMD) concurrency benchmark for bulk jobs")
+    parser.add_argument("--backend", help="Server base URL (default: local mock server)")
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--requests", type=int, default=400, help="Bulk jobs per configuration")
+    parser.add_argument("--max-tokens", type=int, default=64, help="Upper bound of max_tokens per job")
+    parser.add_argument("--fixed", type=int, nargs="+", default=[4, 8, 16, 32], help="Fixed concurrencies to compare")
+    parser.add_argument("--initial", type=int, default=4, help="Adaptive starting limit")
+    parser.add_argument("--max-limit", type=int, default=256)
+    parser.add_argument("--change-after", type=float, default=10.0,
+                        help="Seconds before a competing tenant starts loading the server")
+    parser.add_argument("--background-concurrency", type=int, default=8, help="Competing tenant's concurrency")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--mock-port", type=int, default=9190)
+    parser.add_argument("--mock-itl-ms", type=float, default=10.0)
+    parser.add_argument("--mock-max-running", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("🚀 Adaptive Concurrency Benchmark")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    results = asyncio.run(run_benchmark(args))
+
+    best_fixed = max((r for r in results if r["config"] != "adaptive"), key=lambda r: r["throughput_tps"], default=None)
+    adaptive = results[-1]
+    if best_fixed and best_fixed["throughput_tps"]:
+        print(f"\n🏆 adaptive reaches {adaptive['throughput_tps'] / best_fixed['throughput_tps']:.0%} of the best "
+              f"fixed setting ({best_fixed['config']}) with p95 {adaptive['p95_latency_ms'] or 0:.0f}ms "
+              f"vs {best_fixed['p95_latency_ms'] or 0:.0f}ms")
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"adaptive_concurrency_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "config": vars(args), "results": results}, f, indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
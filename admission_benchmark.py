@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Admission Benchmark - interactive tail latency with and without the admission proxy
+Open-loop mix of bulk (low priority, two tenants) and interactive (high
+priority) requests against a server with a FIFO token budget, sent directly
+and then through AdmissionProxy
+"""
+
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+import aiohttp
+from aiohttp import web
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+from load_engine import LoadEngine
+from outcome_stats import summarize_outcomes, format_outcomes
+from admission_proxy import AdmissionController, AdmissionProxy, TokenEstimator
+from mock_openai_server import start_mock_servers, stop_mock_servers
+from energy_telemetry import PowerSampler, start_power_sampler, energy_fields, add_power_arguments, format_energy
+
+WORDS = "the model serves many users and every request competes for the same key value cache".split()
+
+
+def build_stream(args) -> List[Dict[str, Any]]:
+    """Poisson arrivals per traffic class, merged and sorted by send time"""
+    rng = random.Random(args.seed)
+    classes = [
+        ("interactive", "high", args.interactive_rate, args.interactive_prompt_words, args.interactive_max_tokens),
+        ("bulk-a", "low", args.bulk_rate * 0.8, args.bulk_prompt_words, args.bulk_max_tokens),
+        ("bulk-b", "low", args.bulk_rate * 0.2, args.bulk_prompt_words, args.bulk_max_tokens),
+    ]
+    stream = []
+    for tenant, priority, rate, words, max_tokens in classes:
+        t = 0.0
+        while rate > 0:
+            t += rng.expovariate(rate)
+            if t >= args.duration:
+                break
+            prompt = " ".join(rng.choice(WORDS) for _ in range(words))
+            stream.append({"at": t, "tenant": tenant, "priority": priority,
+                           "payload": {"model": args.model, "prompt": prompt, "max_tokens": max_tokens,
+                                       "temperature": 0.7, "stream": True,
+                                       "stream_options": {"include_usage": True}}})
+    return sorted(stream, key=lambda item: item["at"])
+
+
+async def replay(base_url: str, stream: List[Dict[str, Any]], model: str) -> List[Dict[str, Any]]:
+    records = []
+    async with LoadEngine(base_url, model, timeout=300, max_connections=0) as engine:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        async def fire(item):
+            await asyncio.sleep(max(item["at"] - (loop.time() - start), 0))
+            record = await engine.send(item["payload"],
+                                       headers={"X-Priority": item["priority"], "X-Tenant": item["tenant"]})
+            record["tenant"] = item["tenant"]
+            record["priority"] = item["priority"]
+            records.append(record)
+
+        await asyncio.gather(*(fire(item) for item in stream))
+    return records
+
+
+def percentile(values: List[float], q: int) -> Optional[float]:
+    if len(values) < 2:
+        return values[0] if values else None
+    return statistics.quantiles(values, n=100)[q - 1]
+
+
+def class_summary(records: List[Dict[str, Any]], key: str, value: str) -> Dict[str, Any]:
+    selected = [r for r in records if r[key] == value]
+    ok = [r for r in selected if r["success"]]
+    latencies = [r["total_ms"] for r in ok]
+    ttfts = [r["first_token_ms"] for r in ok if r.get("first_token_ms") is not None]
+    ttft_outcomes = summarize_outcomes(selected, key="first_token_ms")
+    return {
+        "requests": len(selected),
+        "successful": len(ok),
+        "outcomes": ttft_outcomes["outcomes"],
+        "censored_ttft_percentiles": ttft_outcomes["censored_percentiles"],
+        "rejected_429": sum(1 for r in selected if r["status"] == 429),
+        "completion_tokens": sum(r["completion_tokens"] for r in ok),
+        "p50_latency_ms": percentile(latencies, 50),
+        "p95_latency_ms": percentile(latencies, 95),
+        "p99_latency_ms": percentile(latencies, 99),
+        "p50_ttft_ms": percentile(ttfts, 50),
+        "p95_ttft_ms": percentile(ttfts, 95),
+        "p99_ttft_ms": percentile(ttfts, 99),
+    }
+
+
+async def run_mode(mode: str, upstream: str, stream: List[Dict[str, Any]], args,
+                   power: Optional[PowerSampler] = None) -> Dict[str, Any]:
+    runner = None
+    target = upstream
+    proxy = None
+    if mode == "admission_proxy":
+        controller = AdmissionController(args.token_budget, deadlines_ms={"high": args.high_deadline_ms,
+                                                                          "low": args.low_deadline_ms})
+        proxy = AdmissionProxy(upstream, controller, TokenEstimator(args.tokenizer or args.model))
+        runner = web.AppRunner(proxy.build_app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, "127.0.0.1", args.proxy_port).start()
+        target = f"http://127.0.0.1:{args.proxy_port}"
+
+    try:
+        start = time.perf_counter()
+        records = await replay(target, stream, args.model)
+        end = time.perf_counter()
+        proxy_stats = None
+        if runner is not None:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"{target}/admission/stats") as response:
+                    proxy_stats = await response.json()
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+
+    return {
+        "mode": mode,
+        "high": class_summary(records, "priority", "high"),
+        "low": class_summary(records, "priority", "low"),
+        "tenants": {t: class_summary(records, "tenant", t) for t in ("bulk-a", "bulk-b")},
+        "proxy_stats": proxy_stats,
+        "energy": energy_fields(power, start, end, sum(r["completion_tokens"] for r in records if r["success"]),
+                                sum(1 for r in records if r["success"])),
+    }
+
+
+async def run_benchmark(args) -> List[Dict[str, Any]]:
+    power = start_power_sampler(args.power, args.power_interval_s)
+    servers = []
+    upstream = args.backend
+    if not upstream:
+        servers = await start_mock_servers(1, args.mock_port, ttft_ms=30.0, itl_ms=args.mock_itl_ms,
+                                           prefill_ms_per_token=0.1, max_running=64,
+                                           max_total_tokens=args.token_budget)
+        upstream = servers[0].base_url
+
+    stream = build_stream(args)
+    print(f"📨 {len(stream)} requests over {args.duration:.0f}s "
+          f"({sum(1 for s in stream if s['priority'] == 'high')} interactive)")
+    results = []
+    try:
+        for mode in ("direct", "admission_proxy"):
+            print(f"\n📊 Mode: {mode}")
+            result = await run_mode(mode, upstream, stream, args, power)
+            results.append(result)
+            high, low = result["high"], result["low"]
+            print(f"  high: p50 {high['p50_latency_ms'] or 0:.0f}ms  p99 {high['p99_latency_ms'] or 0:.0f}ms  "
+                  f"TTFT p99 {high['p99_ttft_ms'] or 0:.0f}ms  [{format_outcomes(high['outcomes'])}]")
+            print(f"  low:  p50 {low['p50_latency_ms'] or 0:.0f}ms  p99 {low['p99_latency_ms'] or 0:.0f}ms  "
+                  f"[{format_outcomes(low['outcomes'])}]")
+            if power:
+                print(f"  energy: {format_energy(result['energy'])}")
+    finally:
+        await stop_mock_servers(servers)
+        if power:
+            power.close()
+    return results
+
+
+def print_summary(results: List[Dict[str, Any]]):
+    direct, proxied = results
+    print("\n" + "=" * 70)
+    print("🏁 ADMISSION CONTROL SUMMARY")
+    print("=" * 70)
+    for metric in ("p50_latency_ms", "p95_latency_ms", "p99_latency_ms", "p99_ttft_ms"):
+        before, after = direct["high"][metric], proxied["high"][metric]
+        if before and after:
+            print(f"  high {metric:<16} {before:8.0f}ms → {after:8.0f}ms  ({(before - after) / before:+.1%} reduction)")
+    classes = (proxied["proxy_stats"] or {}).get("classes", {})
+    for name in ("high", "low"):
+        stats = classes.get(name)
+        if stats:
+            print(f"  proxy queue wait {name:<5} avg {stats['avg_queue_wait_ms']:.1f}ms  "
+                  f"p95 {stats['p95_queue_wait_ms'] or 0:.1f}ms  "
+                  f"rejected {stats['rejected_full'] + stats['rejected_deadline'] + stats['timed_out']}")
+    tenants = proxied["tenants"]
+    print(f"  bulk tenants served (tokens): bulk-a {tenants['bulk-a']['completion_tokens']}, "
+          f"bulk-b {tenants['bulk-b']['completion_tokens']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Admission control proxy benchmark")
+    parser.add_argument("--backend", help="Server base URL (default: local mock with a FIFO token budget)")
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--tokenizer", help="Bundled tokenizer for the proxy (default: --model)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of arrivals per mode")
+    parser.add_argument("--token-budget", type=int, default=3072, help="Server --max-total-tokens")
+    parser.add_argument("--interactive-rate", type=float, default=2.0, help="Interactive requests/s")
+    parser.add_argument("--interactive-prompt-words", type=int, default=40)
+    parser.add_argument("--interactive-max-tokens", type=int, default=32)
+    parser.add_argument("--bulk-rate", type=float, default=4.0, help="Bulk requests/s (split 80/20 over 2 tenants)")
+    parser.add_argument("--bulk-prompt-words", type=int, default=300)
+    parser.add_argument("--bulk-max-tokens", type=int, default=256)
+    parser.add_argument("--high-deadline-ms", type=float, default=2000.0)
+    parser.add_argument("--low-deadline-ms", type=float, default=30000.0)
+    parser.add_argument("--mock-itl-ms", type=float, default=10.0)
+    parser.add_argument("--mock-port", type=int, default=9180)
+    parser.add_argument("--proxy-port", type=int, default=9189)
+    parser.add_argument("--seed", type=int, default=0)
+    add_power_arguments(parser)
+    args = parser.parse_args()
+
+    print("🚀 Admission Control Benchmark")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    results = asyncio.run(run_benchmark(args))
+    print_summary(results)
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"admission_benchmark_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "config": vars(args), "results": results}, f, indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
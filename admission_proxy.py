@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Admission Control Proxy - priority classes and token-budget backpressure
+Holds requests in front of the server until their estimated KV footprint
+(prompt tokens + max_tokens) fits the budget, serves higher priority classes
+first, shares each class fairly between tenants and answers 429 fast when
+the queue cannot meet its deadline
+"""
+
+import time
+import heapq
+import asyncio
+import argparse
+import statistics
+import aiohttp
+from aiohttp import web
+from collections import deque
+from typing import List, Dict, Any, Optional
+
+import qwen_tokenizer
+from replica_router import request_text, proxy_stream
+
+# Highest priority first; queue deadlines in ms
+PRIORITY_CLASSES = ["high", "normal", "low"]
+DEFAULT_DEADLINES_MS = {"high": 2000.0, "normal": 10000.0, "low": 30000.0}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is refused instead of queued"""
+
+    def __init__(self, reason: str, retry_after_s: float = 1.0):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after_s = retry_after_s
+
+
+class TokenEstimator:
+    """prompt tokens (bundled tokenizer) + max_tokens, i.e. the KV slots a request can reach"""
+
+    def __init__(self, tokenizer_model: str = "Qwen/Qwen3-32B-AWQ", default_max_tokens: int = 256):
+        self.tokenizer_model = tokenizer_model
+        self.default_max_tokens = default_max_tokens
+        self._use_tokenizer = True
+
+    def prompt_tokens(self, body: Dict[str, Any]) -> int:
+        prompt = body.get("prompt")
+        if isinstance(prompt, list) and prompt and isinstance(prompt[0], int):
+            return len(prompt)
+        text = request_text(body)
+        if self._use_tokenizer:
+            try:
+                return qwen_tokenizer.count_tokens(self.tokenizer_model, text)
+            except (RuntimeError, FileNotFoundError):
+                # No tokenizer available: fall back to the ~4 chars/token rule for good
+                self._use_tokenizer = False
+        return max(len(text) // 4, 1)
+
+    def estimate(self, body: Dict[str, Any]) -> int:
+        max_tokens = body.get("max_tokens") or body.get("max_completion_tokens") or self.default_max_tokens
+        return self.prompt_tokens(body) + int(max_tokens) * int(body.get("n") or 1)
+
+
+class _Waiter:
+    __slots__ = ("priority", "tenant", "cost", "future", "enqueued")
+
+    def __init__(self, priority: str, tenant: str, cost: int, future: asyncio.Future):
+        self.priority = priority
+        self.tenant = tenant
+        self.cost = cost
+        self.future = future
+        self.enqueued = time.perf_counter()
+
+
+class AdmissionController:
+    """Token-budget concurrency limit with strict priority and per-tenant fair queuing.
+
+    Within a priority class tenants are served by fair queuing: each request
+    gets the virtual finish tag ``max(class_clock, tenant_finish) + cost``
+    and the smallest tag goes next, so a tenant flooding the queue only
+    delays its own requests.  Classes are strict: ``low`` only runs when nothing of a
+    higher class is waiting.
+
+    A request is refused immediately (``AdmissionRejected``) when its class
+    queue is full or when the queued tokens ahead of it, drained at the
+    recently observed rate, would exceed the class deadline; requests that
+    are still queued at their deadline are refused too.
+    """
+
+    DRAIN_WINDOW_S = 5.0
+
+    def __init__(self, token_budget: int = 3072, max_concurrency: int = 64,
+                 deadlines_ms: Optional[Dict[str, float]] = None, max_queue: int = 256):
+        self.token_budget = token_budget
+        self.max_concurrency = max_concurrency
+        self.deadlines_ms = {**DEFAULT_DEADLINES_MS, **(deadlines_ms or {})}
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self.in_flight_tokens = 0
+        self._queues: Dict[str, List] = {p: [] for p in PRIORITY_CLASSES}
+        self._queued_tokens = {p: 0 for p in PRIORITY_CLASSES}
+        self._queued_count = {p: 0 for p in PRIORITY_CLASSES}
+        self._class_clock = {p: 0.0 for p in PRIORITY_CLASSES}
+        self._tenant_finish: Dict[str, Dict[str, float]] = {p: {} for p in PRIORITY_CLASSES}
+        self._seq = 0
+        self._releases: deque = deque()
+        self.stats = {p: {"admitted": 0, "rejected_full": 0, "rejected_deadline": 0, "timed_out": 0,
+                          "queue_wait_ms": deque(maxlen=10000)} for p in PRIORITY_CLASSES}
+
+    def _tokens_ahead(self, priority: str) -> int:
+        ahead = 0
+        for p in PRIORITY_CLASSES:
+            ahead += self._queued_tokens[p]
+            if p == priority:
+                break
+        return ahead
+
+    def drain_tokens_per_s(self) -> Optional[float]:
+        """Tokens released over the last DRAIN_WINDOW_S seconds"""
+        cutoff = time.perf_counter() - self.DRAIN_WINDOW_S
+        while self._releases and self._releases[0][0] < cutoff:
+            self._releases.popleft()
+        if len(self._releases) < 2:
+            return None
+        return sum(cost for _, cost in self._releases) / self.DRAIN_WINDOW_S
+
+    def estimated_wait_ms(self, priority: str, cost: int) -> Optional[float]:
+        """Queued tokens ahead (same or higher class) over the observed drain rate"""
+        rate = self.drain_tokens_per_s()
+        if not rate:
+            return None
+        excess = self.in_flight_tokens + self._tokens_ahead(priority) + cost - self.token_budget
+        return max(excess, 0) / rate * 1000
+
+    def _fits(self, cost: int) -> bool:
+        if self.in_flight >= self.max_concurrency:
+            return False
+        # An oversized request runs alone rather than waiting forever
+        return self.in_flight == 0 or self.in_flight_tokens + cost <= self.token_budget
+
+    async def acquire(self, priority: str, tenant: str, cost: int) -> float:
+        """Wait for admission; returns the queue wait in ms or raises AdmissionRejected"""
+        if priority not in self._queues:
+            raise ValueError(f"Unknown priority class {priority!r} (expected one of {PRIORITY_CLASSES})")
+        stats = self.stats[priority]
+        cost = min(cost, self.token_budget)
+        if self._queued_count[priority] == 0 and self._higher_waiting(priority) == 0 and self._fits(cost):
+            self._grant(priority, cost, 0.0)
+            return 0.0
+
+        deadline_ms = self.deadlines_ms[priority]
+        if self._queued_count[priority] >= self.max_queue:
+            stats["rejected_full"] += 1
+            raise AdmissionRejected(f"{priority} queue full ({self.max_queue})", deadline_ms / 1000)
+        estimate = self.estimated_wait_ms(priority, cost)
+        if estimate is not None and estimate > deadline_ms:
+            stats["rejected_deadline"] += 1
+            raise AdmissionRejected(f"Estimated queue wait {estimate:.0f}ms exceeds {priority} deadline "
+                                    f"{deadline_ms:.0f}ms", estimate / 1000)
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = _Waiter(priority, tenant, cost, future)
+        finish = self._tenant_finish[priority]
+        tag = max(self._class_clock[priority], finish.get(tenant, 0.0)) + cost
+        finish[tenant] = tag
+        self._seq += 1
+        heapq.heappush(self._queues[priority], (tag, self._seq, waiter))
+        self._queued_tokens[priority] += cost
+        self._queued_count[priority] += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), deadline_ms / 1000)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # Granted in the same tick as the timeout fired
+                return future.result()
+            self._abandon(waiter)
+            stats["timed_out"] += 1
+            raise AdmissionRejected(f"Queued longer than {priority} deadline {deadline_ms:.0f}ms", 1.0)
+        except asyncio.CancelledError:
+            # Client went away while queued (or a grant raced the cancel: give it back)
+            if future.done() and not future.cancelled():
+                self.release(cost)
+            else:
+                self._abandon(waiter)
+            raise
+
+    def _abandon(self, waiter: _Waiter):
+        """Take a timed-out or cancelled waiter out of the accounting; its heap entry is dropped lazily"""
+        waiter.future.cancel()
+        self._dequeued(waiter)
+        # It may have been the head blocking everything behind it
+        self._dispatch()
+
+    def _higher_waiting(self, priority: str) -> int:
+        waiting = 0
+        for p in PRIORITY_CLASSES:
+            if p == priority:
+                break
+            waiting += self._queued_count[p]
+        return waiting
+
+    def _grant(self, priority: str, cost: int, wait_ms: float):
+        self.in_flight += 1
+        self.in_flight_tokens += cost
+        self.stats[priority]["admitted"] += 1
+        self.stats[priority]["queue_wait_ms"].append(wait_ms)
+
+    def release(self, cost: int):
+        """Return a request's tokens to the budget and admit whatever now fits"""
+        cost = min(cost, self.token_budget)
+        self.in_flight -= 1
+        self.in_flight_tokens -= cost
+        self._releases.append((time.perf_counter(), cost))
+        self._dispatch()
+
+    def _dispatch(self):
+        for priority in PRIORITY_CLASSES:
+            queue = self._queues[priority]
+            while queue:
+                tag, _, waiter = queue[0]
+                if waiter.future.done():
+                    # Abandoned, already taken out of the accounting
+                    heapq.heappop(queue)
+                    continue
+                if not self._fits(waiter.cost):
+                    # Head-of-line blocks lower classes too, otherwise big high-priority requests starve
+                    return
+                heapq.heappop(queue)
+                self._dequeued(waiter)
+                self._class_clock[priority] = tag
+                wait_ms = (time.perf_counter() - waiter.enqueued) * 1000
+                self._grant(priority, waiter.cost, wait_ms)
+                waiter.future.set_result(wait_ms)
+            if not queue:
+                self._tenant_finish[priority].clear()
+
+    def _dequeued(self, waiter: _Waiter):
+        self._queued_tokens[waiter.priority] -= waiter.cost
+        self._queued_count[waiter.priority] -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        classes = {}
+        for priority in PRIORITY_CLASSES:
+            stats = self.stats[priority]
+            waits = list(stats["queue_wait_ms"])
+            classes[priority] = {
+                "admitted": stats["admitted"],
+                "rejected_full": stats["rejected_full"],
+                "rejected_deadline": stats["rejected_deadline"],
+                "timed_out": stats["timed_out"],
+                "queued": self._queued_count[priority],
+                "queued_tokens": self._queued_tokens[priority],
+                "avg_queue_wait_ms": statistics.mean(waits) if waits else 0.0,
+                "p95_queue_wait_ms": statistics.quantiles(waits, n=20)[18] if len(waits) >= 20 else None,
+            }
+        return {
+            "token_budget": self.token_budget,
+            "in_flight": self.in_flight,
+            "in_flight_tokens": self.in_flight_tokens,
+            "drain_tokens_per_s": self.drain_tokens_per_s(),
+            "classes": classes,
+        }
+
+
+class AdmissionProxy:
+    """aiohttp proxy applying an AdmissionController in front of one upstream.
+
+    Priority comes from the ``X-Priority`` header (high/normal/low), the
+    tenant from ``X-Tenant``, then the body's ``user`` field, then the peer
+    address.  Admitted responses carry ``X-Queue-Wait-Ms``.
+    """
+
+    def __init__(self, upstream: str, controller: AdmissionController, estimator: TokenEstimator,
+                 default_priority: str = "normal", timeout: float = 300):
+        self.upstream = upstream.rstrip("/")
+        self.controller = controller
+        self.estimator = estimator
+        self.default_priority = default_priority
+        self.timeout = timeout
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/health", self.handle_health)
+        app.router.add_get("/admission/stats", self.handle_stats)
+        app.router.add_post("/v1/{tail:.*}", self.handle_proxy)
+        app.on_startup.append(self._start)
+        app.on_cleanup.append(self._close)
+        return app
+
+    async def _start(self, app):
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout),
+                                             connector=aiohttp.TCPConnector(limit=0))
+
+    async def _close(self, app):
+        await self.session.close()
+
+    async def handle_health(self, request):
+        async with self.session.get(f"{self.upstream}/health") as upstream:
+            return web.Response(status=upstream.status, text=await upstream.text())
+
+    async def handle_stats(self, request):
+        return web.json_response(self.controller.snapshot())
+
+    async def handle_proxy(self, request):
+        body = await request.json()
+        priority = request.headers.get("X-Priority", self.default_priority).lower()
+        if priority not in PRIORITY_CLASSES:
+            return web.json_response({"error": f"Unknown priority {priority!r}"}, status=400)
+        tenant = request.headers.get("X-Tenant") or body.get("user") or request.remote or "anonymous"
+        cost = self.estimator.estimate(body)
+
+        try:
+            wait_ms = await self.controller.acquire(priority, tenant, cost)
+        except AdmissionRejected as e:
+            return web.json_response({"error": {"message": e.reason, "type": "rate_limit_exceeded"}}, status=429,
+                                     headers={"Retry-After": str(max(1, round(e.retry_after_s)))})
+        try:
+            response, _ = await proxy_stream(request, self.session, self.upstream, body,
+                                             response_headers={"X-Queue-Wait-Ms": f"{wait_ms:.1f}"})
+            return response
+        finally:
+            self.controller.release(cost)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Priority-aware admission control proxy")
+    parser.add_argument("--upstream", default="http://localhost:8003", help="OpenAI-compatible server URL")
+    parser.add_argument("--host", default="0.0.0.0", help="Proxy bind host")
+    parser.add_argument("--port", type=int, default=8070, help="Proxy port")
+    parser.add_argument("--token-budget", type=int, default=3072,
+                        help="Tokens (prompt + max_tokens) allowed in flight; match --max-total-tokens")
+    parser.add_argument("--max-concurrency", type=int, default=64, help="Requests allowed in flight")
+    parser.add_argument("--max-queue", type=int, default=256, help="Queued requests per class before 429")
+    parser.add_argument("--deadline-ms", action="append", default=[], metavar="CLASS=MS",
+                        help="Queue deadline per class, repeatable (default high=2000 normal=10000 low=30000)")
+    parser.add_argument("--default-priority", default="normal", choices=PRIORITY_CLASSES)
+    parser.add_argument("--tokenizer", default="Qwen/Qwen3-32B-AWQ", help="Bundled tokenizer for prompt counts")
+    args = parser.parse_args()
+
+    deadlines = {}
+    for item in args.deadline_ms:
+        name, _, value = item.partition("=")
+        deadlines[name] = float(value)
+    controller = AdmissionController(args.token_budget, args.max_concurrency, deadlines, args.max_queue)
+    proxy = AdmissionProxy(args.upstream, controller, TokenEstimator(args.tokenizer), args.default_priority)
+    print(f"🚦 Admission control for {args.upstream} on port {args.port} "
+          f"(budget {args.token_budget} tokens, deadlines {controller.deadlines_ms})")
+    web.run_app(proxy.build_app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Backend Launcher - start, stop, crash and relaunch a server the same way for every backend
+One interface over an in-process mock, a local subprocess and a Docker
+container, so recovery and rolling-restart scenarios can run on a laptop
+against mocks and unchanged against the real SGLang containers
+"""
+
+import os
+import time
+import shlex
+import signal
+import asyncio
+import aiohttp
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional
+
+from mock_openai_server import MockOpenAIServer
+
+
+async def probe_health(base_url: str, timeout: float = 2.0) -> bool:
+    """True if GET /health answers 200 within ``timeout``"""
+    try:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+            async with session.get(f"{base_url.rstrip('/')}/health") as response:
+                return response.status == 200
+    except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+        return False
+
+
+async def wait_healthy(base_url: str, timeout: float = 600.0, interval: float = 0.5) -> Optional[float]:
+    """Seconds until /health answers, or None if it never did within ``timeout``"""
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if await probe_health(base_url):
+            return time.perf_counter() - start
+        await asyncio.sleep(interval)
+    return None
+
+
+class Launcher(ABC):
+    """Base interface; ``crash`` kills abruptly and, when ``supervised``, the backend comes back by itself.
+
+    ``supervised`` mirrors Docker's ``restart: unless-stopped``: the Docker
+    launcher gets it from the daemon, the others emulate it by relaunching
+    ``restart_delay_s`` after a crash.
+    """
+
+    kind = "base"
+
+    def __init__(self, base_url: str, restart_delay_s: float = 0.0, supervised: bool = True):
+        self.base_url = base_url.rstrip("/")
+        self.restart_delay_s = restart_delay_s
+        self.supervised = supervised
+        self.events: List[Dict[str, Any]] = []
+        self._relaunch: Optional[asyncio.Task] = None
+
+    def _event(self, name: str, **details):
+        self.events.append({"t": time.perf_counter(), "event": name, **details})
+
+    @abstractmethod
+    async def start(self):
+        """Launch the backend; returns once the process or container is running"""
+
+    @abstractmethod
+    async def stop(self):
+        """Graceful shutdown"""
+
+    @abstractmethod
+    async def _kill(self):
+        """Abrupt death without cleanup (SIGKILL or equivalent)"""
+
+    async def crash(self):
+        """Abrupt death (SIGKILL or equivalent), followed by a supervised relaunch"""
+        await self._kill()
+        self._event("crashed")
+        if self.supervised:
+            self._relaunch = asyncio.create_task(self._relaunch_after_delay())
+
+    async def _relaunch_after_delay(self):
+        await asyncio.sleep(self.restart_delay_s)
+        await self.start()
+        self._event("relaunched")
+
+    async def restart(self):
+        """Graceful stop followed by a start"""
+        await self.stop()
+        await self.start()
+
+    async def close(self):
+        """Stop supervising; leaves external backends as they are"""
+        if self._relaunch is not None:
+            self._relaunch.cancel()
+            await asyncio.gather(self._relaunch, return_exceptions=True)
+            self._relaunch = None
+
+    def describe(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "base_url": self.base_url, "restart_delay_s": self.restart_delay_s,
+                "supervised": self.supervised}
+
+
+class MockLauncher(Launcher):
+    """In-process MockOpenAIServer; after every (re)start the first ``cold_s`` seconds add ``cold_ttft_ms``.
+
+    The cold period stands in for torch.compile / CUDA graph capture after
+    a real restart, so latency takes a while to return to baseline.
+    """
+
+    kind = "mock"
+
+    def __init__(self, port: int = 9260, restart_delay_s: float = 3.0, cold_s: float = 5.0,
+                 cold_ttft_ms: float = 400.0, supervised: bool = True, **mock_kwargs):
+        self._mock_kwargs = {"port": port, **mock_kwargs}
+        self.server = MockOpenAIServer(**self._mock_kwargs)
+        super().__init__(self.server.base_url, restart_delay_s, supervised)
+        self.cold_s = cold_s
+        self.cold_ttft_ms = cold_ttft_ms
+        self._warm_ttft_ms = self.server.ttft_ms
+        self._cooldown: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.server._runner is not None:
+            return
+        # A fresh server per start, like a new process: empty queues, counters and caches
+        self.server = MockOpenAIServer(**self._mock_kwargs)
+        if self._cooldown is not None:
+            self._cooldown.cancel()
+        if self.cold_s > 0:
+            self.server.ttft_ms = self._warm_ttft_ms + self.cold_ttft_ms
+            self._cooldown = asyncio.create_task(self._warm_up(self.server))
+        await self.server.start()
+        self._event("started")
+
+    async def _warm_up(self, server: MockOpenAIServer):
+        await asyncio.sleep(self.cold_s)
+        server.ttft_ms = self._warm_ttft_ms
+
+    async def stop(self):
+        await self.server.stop()
+        self._event("stopped")
+
+    async def restart(self):
+        """Graceful stop, ``restart_delay_s`` of downtime (model load), then a cold start"""
+        await self.stop()
+        await asyncio.sleep(self.restart_delay_s)
+        await self.start()
+
+    async def _kill(self):
+        await self.server.kill()
+
+    async def close(self):
+        await super().close()
+        if self._cooldown is not None:
+            self._cooldown.cancel()
+        await self.server.stop()
+
+    def describe(self) -> Dict[str, Any]:
+        return {**super().describe(), "cold_s": self.cold_s, "cold_ttft_ms": self.cold_ttft_ms}
+
+
+class SubprocessLauncher(Launcher):
+    """A local server process started from ``command``; crash is SIGKILL, stop is SIGTERM"""
+
+    kind = "subprocess"
+
+    def __init__(self, command: str, base_url: str, restart_delay_s: float = 3.0, supervised: bool = True,
+                 stop_timeout_s: float = 30.0):
+        super().__init__(base_url, restart_delay_s, supervised)
+        self.command = command
+        self.stop_timeout_s = stop_timeout_s
+        self.process: Optional[asyncio.subprocess.Process] = None
+
+    async def start(self):
+        if self.process is not None and self.process.returncode is None:
+            return
+        self.process = await asyncio.create_subprocess_exec(
+            *shlex.split(self.command), stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+            start_new_session=True)
+        self._event("started", pid=self.process.pid)
+
+    async def _signal(self, sig: int):
+        if self.process is None or self.process.returncode is not None:
+            return
+        try:
+            # The whole session, so wrapper scripts take their server with them
+            os.killpg(self.process.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    async def stop(self):
+        await self._signal(signal.SIGTERM)
+        if self.process is not None:
+            try:
+                await asyncio.wait_for(self.process.wait(), self.stop_timeout_s)
+            except asyncio.TimeoutError:
+                await self._signal(signal.SIGKILL)
+                await self.process.wait()
+        self._event("stopped")
+
+    async def _kill(self):
+        await self._signal(signal.SIGKILL)
+        if self.process is not None:
+            await self.process.wait()
+
+    async def close(self):
+        await super().close()
+        await self.stop()
+
+    def describe(self) -> Dict[str, Any]:
+        return {**super().describe(), "command": self.command}
+
+
+class DockerLauncher(Launcher):
+    """An existing container (e.g. from a deploy-*.sh script).
+
+    ``crash`` SIGKILLs the container's main process from the host, which
+    Docker treats as a crash, so the restart policy decides when it comes
+    back (``docker kill`` would count as a manual stop and disable it).
+    The container's process usually belongs to root, so without permission
+    to signal it the kill goes through non-interactive ``sudo`` instead.
+    ``start`` runs ``deploy_command`` when given, so a relaunch can switch to
+    a new flag set; otherwise it is ``docker start``.
+    """
+
+    kind = "docker"
+
+    def __init__(self, container: str, base_url: str, deploy_command: Optional[str] = None,
+                 stop_timeout_s: int = 30):
+        super().__init__(base_url, restart_delay_s=0.0, supervised=True)
+        self.container = container
+        self.deploy_command = deploy_command
+        self.stop_timeout_s = stop_timeout_s
+
+    async def _docker(self, *args: str) -> str:
+        process = await asyncio.create_subprocess_exec("docker", *args, stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.PIPE)
+        stdout, stderr = await process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"docker {' '.join(args)} failed: {stderr.decode().strip()}")
+        return stdout.decode().strip()
+
+    async def start(self):
+        if self.deploy_command:
+            process = await asyncio.create_subprocess_exec(*shlex.split(self.deploy_command),
+                                                           stdout=asyncio.subprocess.DEVNULL)
+            if await process.wait() != 0:
+                raise RuntimeError(f"{self.deploy_command} exited with {process.returncode}")
+        elif await self._docker("inspect", "-f", "{{.State.Running}}", self.container) != "true":
+            await self._docker("start", self.container)
+        self._event("started")
+
+    async def stop(self):
+        await self._docker("stop", "-t", str(self.stop_timeout_s), self.container)
+        self._event("stopped")
+
+    async def _kill(self):
+        pid = int(await self._docker("inspect", "-f", "{{.State.Pid}}", self.container))
+        if pid <= 0:
+            raise RuntimeError(f"container {self.container} is not running")
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except PermissionError:
+            try:
+                process = await asyncio.create_subprocess_exec("sudo", "-n", "kill", "-KILL", str(pid),
+                                                               stderr=asyncio.subprocess.PIPE)
+            except FileNotFoundError:
+                raise RuntimeError(f"cannot SIGKILL container pid {pid}: not permitted and sudo is not installed")
+            _, stderr = await process.communicate()
+            if process.returncode != 0:
+                raise RuntimeError(f"cannot SIGKILL container pid {pid} (run as root or allow "
+                                   f"passwordless sudo kill): {stderr.decode().strip()}")
+
+    async def crash(self):
+        # No emulated relaunch: the daemon's restart policy is the supervisor
+        await self._kill()
+        self._event("crashed")
+
+    def describe(self) -> Dict[str, Any]:
+        return {**super().describe(), "container": self.container, "deploy_command": self.deploy_command}
+
+
+def build_launcher(kind: str, url: Optional[str] = None, command: Optional[str] = None,
+                   container: Optional[str] = None, port: int = 9260, restart_delay_s: float = 3.0,
+                   deploy_command: Optional[str] = None, **mock_kwargs) -> Launcher:
+    """Launcher from CLI-style options"""
+    if kind == "mock":
+        return MockLauncher(port=port, restart_delay_s=restart_delay_s, **mock_kwargs)
+    if not url:
+        raise ValueError(f"--url is required for the {kind} launcher")
+    if kind == "subprocess":
+        if not command:
+            raise ValueError("--command is required for the subprocess launcher")
+        return SubprocessLauncher(command, url, restart_delay_s)
+    if kind == "docker":
+        if not container:
+            raise ValueError("--container is required for the docker launcher")
+        return DockerLauncher(container, url, deploy_command)
+    raise ValueError(f"Unknown launcher {kind!r}, choose from mock, subprocess, docker")
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Offline Batch Runner - push a JSONL file of prompts through the server
+Reads prompts lazily, keeps the server saturated (fixed or adaptive
+concurrency), writes results incrementally (in input order or index-tagged)
+and resumes a killed run from what is already in the output file
+"""
+
+import os
+import json
+import time
+import asyncio
+import argparse
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Optional, Iterator, Tuple, Set, Union
+
+from load_engine import LoadEngine
+from adaptive_concurrency import AdaptiveConcurrencyLimiter
+
+
+def read_jsonl(path: str, skip: Set[int],
+               start: int = 0) -> Iterator[Tuple[int, Union[Dict[str, Any], ValueError, None]]]:
+    """Yield (index, item) for every line not already done, one line at a time.
+
+    Blank lines come as None and malformed ones as the ValueError that
+    rejected them, so one bad line fails its item instead of the run.
+    """
+    with open(path, encoding="utf-8") as f:
+        for index, line in enumerate(f):
+            if index < start or index in skip:
+                continue
+            line = line.strip()
+            if not line:
+                yield index, None
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                yield index, e
+                continue
+            if not isinstance(item, dict):
+                item = ValueError(f"expected a JSON object, got {type(item).__name__}")
+            yield index, item
+
+
+def count_lines(path: str) -> int:
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def scan_output(path: str) -> Tuple[Set[int], int, int]:
+    """Indices already written successfully, the first index not covered by a contiguous prefix,
+    and how many failed items were dropped for a retry.
+
+    A torn last line from a killed run is truncated away, and ``success: false``
+    lines are removed so the resumed run sends those items again.
+    """
+    done: Set[int] = set()
+    if not os.path.exists(path):
+        return done, 0, 0
+    good_bytes = 0
+    failed = 0
+    with open(path, "rb") as f:
+        for raw in f:
+            try:
+                line = json.loads(raw)
+                index = line["index"]
+            except (ValueError, KeyError, TypeError):
+                break
+            if line.get("success", True):
+                done.add(index)
+            else:
+                failed += 1
+            good_bytes += len(raw)
+    if failed:
+        # Rewrite without the failed lines (and without any torn tail)
+        with open(path, "rb") as src, open(path + ".tmp", "wb") as dst:
+            remaining = good_bytes
+            for raw in src:
+                if remaining <= 0:
+                    break
+                remaining -= len(raw)
+                if json.loads(raw).get("success", True):
+                    dst.write(raw)
+        os.replace(path + ".tmp", path)
+    elif good_bytes < os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(good_bytes)
+    watermark = 0
+    while watermark in done:
+        watermark += 1
+    return {i for i in done if i >= watermark}, watermark, failed
+
+
+class _FixedLimiter:
+    """Same interface as AdaptiveConcurrencyLimiter with a constant limit"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def acquire(self):
+        await self._semaphore.acquire()
+
+    def release(self, record: Optional[Dict[str, Any]]):
+        self._semaphore.release()
+
+
+class ProgressMeter:
+    """Sustained tokens/s over a sliding window plus overall rate and ETA"""
+
+    def __init__(self, total: int, done: int, window_s: float = 30.0):
+        self.total = total
+        self.done = done
+        self.tokens = 0
+        self.errors = 0
+        self.window_s = window_s
+        self.start = time.perf_counter()
+        self._events: deque = deque()
+
+    def add(self, tokens: int, success: bool):
+        now = time.perf_counter()
+        self.done += 1
+        self.tokens += tokens
+        self.errors += 0 if success else 1
+        self._events.append((now, tokens))
+        while self._events and self._events[0][0] < now - self.window_s:
+            self._events.popleft()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.perf_counter()
+        elapsed = now - self.start
+        span = min(self.window_s, elapsed)
+        recent_requests = len(self._events)
+        sustained_tps = sum(t for _, t in self._events) / span if span > 0 else 0.0
+        request_rate = recent_requests / span if span > 0 else 0.0
+        remaining = max(self.total - self.done, 0)
+        return {
+            "done": self.done,
+            "total": self.total,
+            "errors": self.errors,
+            "elapsed_s": elapsed,
+            "completion_tokens": self.tokens,
+            "sustained_tps": sustained_tps,
+            "overall_tps": self.tokens / elapsed if elapsed > 0 else 0.0,
+            "eta_s": remaining / request_rate if request_rate > 0 else None,
+        }
+
+
+def format_eta(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "--:--"
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes:02d}:{secs:02d}"
+
+
+class BatchRunner:
+    """Streams items from the input file through LoadEngine and appends results to the output file.
+
+    Each input line is ``{"prompt": ...}`` or ``{"messages": [...]}`` plus
+    optional ``id``, ``max_tokens``, ``temperature`` and other sampling
+    fields.  Output lines carry the input ``index`` so the output file is
+    also the checkpoint.  With ``ordered`` a reorder buffer holds results
+    until all earlier lines are written; at most ``window`` items are read
+    ahead of the oldest unwritten one either way, which bounds memory.
+    """
+
+    def __init__(self, engine: LoadEngine, limiter: Any, defaults: Dict[str, Any], ordered: bool = False,
+                 window: int = 256, retries: int = 2):
+        self.engine = engine
+        self.limiter = limiter
+        self.defaults = defaults
+        self.ordered = ordered
+        self.window = window
+        self.retries = retries
+
+    def build_request(self, item: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+        payload = {"model": self.engine.model, **self.defaults}
+        payload.update({k: v for k, v in item.items() if k not in ("id", "index")})
+        payload["stream"] = False
+        endpoint = "/v1/chat/completions" if "messages" in payload else "/v1/completions"
+        return payload, endpoint
+
+    @staticmethod
+    def invalid_line(index: int, error: ValueError) -> Dict[str, Any]:
+        return {"index": index, "id": None, "success": False, "latency_ms": 0.0,
+                "error": f"invalid input line: {error}"}
+
+    @staticmethod
+    def output_line(index: int, item: Dict[str, Any], record: Dict[str, Any]) -> Dict[str, Any]:
+        line = {"index": index, "id": item.get("id"), "success": record["success"],
+                "latency_ms": round(record["total_ms"], 1)}
+        if record["success"]:
+            choice = (record["response"].get("choices") or [{}])[0]
+            line["output"] = choice.get("text") if "text" in choice else (choice.get("message") or {}).get("content")
+            line["finish_reason"] = choice.get("finish_reason")
+            line["usage"] = record["response"].get("usage")
+        else:
+            line["error"] = record["error"]
+        return line
+
+    async def process(self, index: int, item: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+        payload, endpoint = self.build_request(item)
+        for attempt in range(self.retries + 1):
+            await self.limiter.acquire()
+            record = None
+            try:
+                record = await self.engine.send(payload, endpoint, keep_response=True)
+            finally:
+                self.limiter.release(record)
+            retryable = not record["success"] and (record["status"] is None or record["status"] >= 500
+                                                   or record["status"] == 429)
+            if not retryable or attempt == self.retries:
+                break
+            await asyncio.sleep(min(2 ** attempt, 30))
+        return self.output_line(index, item, record), record["completion_tokens"]
+
+    async def run(self, items: Iterator[Tuple[int, Union[Dict[str, Any], ValueError, None]]], output_path: str,
+                  meter: ProgressMeter, watermark: int, done: Set[int], progress_interval: float = 5.0):
+        """Process ``items`` (blank lines come as None, malformed ones as a ValueError that is written
+        as a failed line); ``done`` holds indices written by an earlier run"""
+        read_ahead = asyncio.Semaphore(self.window)
+        pending: Dict[int, Dict[str, Any]] = {}
+        skip = set(done)
+        next_index = watermark
+        tasks = set()
+
+        with open(output_path, "a", encoding="utf-8") as out:
+            def write(line):
+                out.write(json.dumps(line, ensure_ascii=False) + "\n")
+                out.flush()
+                read_ahead.release()
+
+            def drain():
+                nonlocal next_index
+                while next_index in pending or next_index in skip:
+                    if next_index in pending:
+                        write(pending.pop(next_index))
+                    else:
+                        skip.discard(next_index)
+                    next_index += 1
+
+            async def handle(index, item):
+                if isinstance(item, ValueError):
+                    line, tokens = self.invalid_line(index, item), 0
+                else:
+                    line, tokens = await self.process(index, item)
+                meter.add(tokens, line["success"])
+                if self.ordered:
+                    pending[index] = line
+                    drain()
+                else:
+                    write(line)
+
+            async def report():
+                while True:
+                    await asyncio.sleep(progress_interval)
+                    s = meter.snapshot()
+                    print(f"  ⏳ {s['done']}/{s['total']}  {s['sustained_tps']:.1f} tok/s sustained "
+                          f"({s['overall_tps']:.1f} overall)  limit {self.limiter.limit}  "
+                          f"errors {s['errors']}  ETA {format_eta(s['eta_s'])}", flush=True)
+
+            reporter = asyncio.create_task(report())
+            try:
+                for index, item in items:
+                    if item is None:
+                        skip.add(index)
+                        drain()
+                        continue
+                    await read_ahead.acquire()
+                    task = asyncio.create_task(handle(index, item))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                if tasks:
+                    await asyncio.gather(*list(tasks))
+            finally:
+                reporter.cancel()
+                for task in list(tasks):
+                    task.cancel()
+
+
+async def run_batch(args) -> Dict[str, Any]:
+    done, watermark, failed = scan_output(args.output)
+    total = count_lines(args.input)
+    resumed = len(done) + watermark
+    if resumed:
+        print(f"🔁 Resuming: {resumed} of {total} lines already in {args.output}")
+    if failed:
+        print(f"🔁 Retrying {failed} failed item(s) from the previous run")
+
+    defaults = {"max_tokens": args.max_tokens, "temperature": args.temperature}
+    limiter = AdaptiveConcurrencyLimiter(initial=args.concurrency, max_limit=args.max_concurrency) \
+        if args.adaptive else _FixedLimiter(args.concurrency)
+    meter = ProgressMeter(total, resumed)
+    async with LoadEngine(args.url, args.model, timeout=args.timeout, max_connections=0) as engine:
+        runner = BatchRunner(engine, limiter, defaults, ordered=args.ordered, window=args.window,
+                             retries=args.retries)
+        await runner.run(read_jsonl(args.input, done, watermark), args.output, meter, watermark, done,
+                         args.progress_interval)
+    summary = meter.snapshot()
+    summary["resumed_from"] = resumed
+    summary["processed_this_run"] = summary["done"] - resumed
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline JSONL batch generation with checkpoint/resume")
+    parser.add_argument("input", help="JSONL with one {\"prompt\"|\"messages\", ...} object per line")
+    parser.add_argument("output", help="JSONL results; also the checkpoint for --resume runs")
+    parser.add_argument("--url", default="http://localhost:8003", help="Server base URL")
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--max-tokens", type=int, default=256, help="Default max_tokens per item")
+    parser.add_argument("--temperature", type=float, default=0.7, help="Default temperature per item")
+    parser.add_argument("--concurrency", type=int, default=16, help="In-flight requests (initial if --adaptive)")
+    parser.add_argument("--adaptive", action="store_true", help="Adapt concurrency with the Vegas/AIMD limiter")
+    parser.add_argument("--max-concurrency", type=int, default=128, help="Upper bound for --adaptive")
+    parser.add_argument("--ordered", action="store_true", help="Write results in input order")
+    parser.add_argument("--window", type=int, default=256, help="Max items read ahead of the oldest unwritten one")
+    parser.add_argument("--retries", type=int, default=2, help="Retries for timeouts, 5xx and 429")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--progress-interval", type=float, default=5.0, help="Seconds between progress lines")
+    args = parser.parse_args()
+
+    print("🚀 Offline Batch Runner")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"📥 {args.input} → 📤 {args.output} ({'ordered' if args.ordered else 'index-tagged'}, "
+          f"{'adaptive' if args.adaptive else 'fixed'} concurrency {args.concurrency})")
+    try:
+        summary = asyncio.run(run_batch(args))
+    except KeyboardInterrupt:
+        print("\n⏹️ Interrupted - rerun the same command to resume")
+        return
+
+    print(f"\n✅ {summary['done']}/{summary['total']} done ({summary['processed_this_run']} this run), "
+          f"{summary['errors']} errors")
+    print(f"📊 {summary['completion_tokens']} tokens in {summary['elapsed_s']:.1f}s → "
+          f"{summary['overall_tps']:.1f} tok/s overall, {summary['sustained_tps']:.1f} tok/s sustained")
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"batch_run_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "config": vars(args), "summary": summary}, f, indent=2)
+    print(f"💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
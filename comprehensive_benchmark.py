@@ -13,13 +13,22 @@ from datetime import datetime
 import subprocess
 import sys
 
+from energy_telemetry import start_power_sampler, energy_fields
+from outcome_stats import classify_status, classify_exception, outcome_counts, format_outcomes
+
 class SGLangBenchmark:
-    def __init__(self, port, name, config_desc):
+    def __init__(self, port, name, config_desc, power=None):
         self.port = port
         self.name = name
         self.config_desc = config_desc
         self.base_url = f"http://localhost:{port}"
         self.results = []
+        # Running PowerSampler (or None) and what the suite generated, for tokens/joule
+        self.power = power
+        self.generated_tokens = 0
+        self.completed_requests = 0
+        # Outcome of every measured request (warmup excluded), failures included
+        self.attempts = []
 
     def warmup(self):
         """Warm up the model with a few requests"""
@@ -44,6 +53,7 @@ class SGLangBenchmark:
         """Test response latency"""
         latencies = []
         tokens_generated = []
+        window_start = time.perf_counter()
 
         for i in range(num_runs):
             start = time.perf_counter()
@@ -66,8 +76,16 @@ class SGLangBenchmark:
                     latencies.append(latency)
                     tokens = data.get('usage', {}).get('completion_tokens', max_tokens)
                     tokens_generated.append(tokens)
+                    self.attempts.append({'outcome': 'ok'})
+                else:
+                    self.attempts.append({'outcome': classify_status(response.status_code)})
+                    print(f"  ❌ Error in run {i+1}: Status {response.status_code}")
             except Exception as e:
+                self.attempts.append({'outcome': classify_exception(e)})
                 print(f"  ❌ Error in run {i+1}: {e}")
+        window_end = time.perf_counter()
+        self.generated_tokens += sum(tokens_generated)
+        self.completed_requests += len(latencies)
 
         if latencies:
             return {
@@ -78,7 +96,8 @@ class SGLangBenchmark:
                 'p50_latency': statistics.median(latencies),
                 'p95_latency': statistics.quantiles(latencies, n=20)[18] if len(latencies) >= 20 else max(latencies),
                 'avg_tokens': statistics.mean(tokens_generated),
-                'throughput': statistics.mean([t / (l / 1000) for t, l in zip(tokens_generated, latencies)])
+                'throughput': statistics.mean([t / (l / 1000) for t, l in zip(tokens_generated, latencies)]),
+                **energy_fields(self.power, window_start, window_end, sum(tokens_generated), len(latencies))
             }
         return None
 
@@ -98,13 +117,20 @@ class SGLangBenchmark:
                 stream=True,
                 timeout=10
             )
+            if response.status_code != 200:
+                self.attempts.append({'outcome': classify_status(response.status_code)})
+                print(f"  ❌ TTFT error: Status {response.status_code}")
+                return None
 
             # Get first chunk
             for line in response.iter_lines():
                 if line:
                     ttft = (time.perf_counter() - start) * 1000
+                    self.attempts.append({'outcome': 'ok'})
                     return ttft
+            self.attempts.append({'outcome': 'reset'})
         except Exception as e:
+            self.attempts.append({'outcome': classify_exception(e)})
             print(f"  ❌ TTFT error: {e}")
         return None
 
@@ -128,29 +154,35 @@ class SGLangBenchmark:
                 end = time.perf_counter()
                 if response.status_code == 200:
                     data = response.json()
+                    self.attempts.append({'outcome': 'ok'})
                     return {
                         'latency': (end - start) * 1000,
                         'tokens': data.get('usage', {}).get('completion_tokens', 0)
                     }
-            except:
-                pass
+                self.attempts.append({'outcome': classify_status(response.status_code)})
+            except Exception as e:
+                self.attempts.append({'outcome': classify_exception(e)})
             return None
 
         with concurrent.futures.ThreadPoolExecutor(max_workers=num_requests) as executor:
             start_time = time.perf_counter()
             results = list(executor.map(make_request, range(num_requests)))
-            total_time = (time.perf_counter() - start_time) * 1000
+            end_time = time.perf_counter()
+            total_time = (end_time - start_time) * 1000
 
         successful = [r for r in results if r]
         if successful:
             total_tokens = sum(r['tokens'] for r in successful)
+            self.generated_tokens += total_tokens
+            self.completed_requests += len(successful)
             avg_latency = statistics.mean([r['latency'] for r in successful])
             return {
                 'total_time': total_time,
                 'avg_latency': avg_latency,
                 'total_tokens': total_tokens,
                 'throughput': total_tokens / (total_time / 1000) if total_time > 0 else 0,
-                'success_rate': len(successful) / num_requests * 100
+                'success_rate': len(successful) / num_requests * 100,
+                **energy_fields(self.power, start_time, end_time, total_tokens, len(successful))
             }
         return None
 
@@ -183,6 +215,7 @@ class SGLangBenchmark:
         print(f"{'='*70}")
 
         self.warmup()
+        suite_start = time.perf_counter()
 
         # Test 1: Short response (10 tokens)
         print("\n📊 Test 1: Short Response (10 tokens)")
@@ -217,6 +250,10 @@ class SGLangBenchmark:
         print("📊 Test 7: Korean Language (30 tokens)")
         korean_result = self.test_latency("인공지능의 장점과 단점을 설명해주세요:", 30, num_runs=5)
 
+        # Energy over the whole suite (warmup excluded), then per test below
+        suite_energy = energy_fields(self.power, suite_start, time.perf_counter(), self.generated_tokens,
+                                     self.completed_requests)
+
         # Get GPU metrics
         gpu_metrics = self.get_gpu_metrics()
 
@@ -260,6 +297,17 @@ class SGLangBenchmark:
             'korean_avg_latency_ms': korean_result['avg_latency'] if korean_result else None,
             'korean_throughput_tps': korean_result['throughput'] if korean_result else None,
 
+            # Outcome breakdown over every measured request
+            'outcomes': format_outcomes(outcome_counts(self.attempts)),
+
+            # Energy (only with a GPU power source)
+            'suite_energy_j': suite_energy.get('energy_j'),
+            'suite_tokens_per_joule': suite_energy.get('tokens_per_joule'),
+            'suite_joules_per_request': suite_energy.get('joules_per_request'),
+            'medium_tokens_per_joule': medium_result.get('tokens_per_joule') if medium_result else None,
+            'concurrent_tokens_per_joule': concurrent_result.get('tokens_per_joule') if concurrent_result else None,
+            'concurrent_joules_per_request': concurrent_result.get('joules_per_request') if concurrent_result else None,
+
             # GPU metrics
             **gpu_metrics
         }
@@ -271,8 +319,12 @@ class SGLangBenchmark:
             print(f"   Short Response: {short_result['avg_latency']:.0f}ms")
         if medium_result:
             print(f"   Throughput (50 tok): {medium_result['throughput']:.2f} tok/s")
+        print(f"   Outcomes: {result['outcomes']}")
         if avg_ttft:
             print(f"   TTFT: {avg_ttft:.0f}ms")
+        if suite_energy.get('tokens_per_joule'):
+            print(f"   Energy: {suite_energy['tokens_per_joule']:.2f} tok/J, "
+                  f"{suite_energy['joules_per_request']:.1f} J/request")
         print(f"{'='*70}\n")
 
         return result
@@ -315,13 +367,16 @@ def main():
     print("🚀 SGLang Comprehensive Performance Benchmark")
     print(f"📅 Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"🖥️ Testing {len(configurations)} configurations")
+    power = start_power_sampler()
+    if power:
+        print(f"⚡ Sampling GPU power via {power.provider.name}")
 
     for config in configurations:
         # Check if port is accessible
         try:
             response = requests.get(f"http://localhost:{config['port']}/health", timeout=2)
             if response.status_code == 200:
-                benchmark = SGLangBenchmark(config['port'], config['name'], config['desc'])
+                benchmark = SGLangBenchmark(config['port'], config['name'], config['desc'], power)
                 result = benchmark.run_benchmark()
                 if result:
                     all_results.append(result)
@@ -329,6 +384,8 @@ def main():
                 print(f"⚠️ {config['name']} on port {config['port']} not healthy")
         except:
             print(f"❌ {config['name']} on port {config['port']} not accessible")
+    if power:
+        power.close()
 
     # Save results
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -340,14 +397,17 @@ def main():
         print("\n" + "="*80)
         print("📊 PERFORMANCE COMPARISON SUMMARY")
         print("="*80)
-        print(f"{'Configuration':<20} {'Latency(ms)':<15} {'Throughput':<15} {'TTFT(ms)':<10}")
+        print(f"{'Configuration':<20} {'Latency(ms)':<15} {'Throughput':<15} {'TTFT(ms)':<10} {'tok/J':<8} Outcomes")
         print("-"*80)
 
         for r in all_results:
+            tpj = r.get('suite_tokens_per_joule')
             print(f"{r['configuration']:<20} "
                   f"{r.get('short_avg_latency_ms', 0):<15.0f} "
                   f"{r.get('medium_throughput_tps', 0):<15.2f} "
-                  f"{r.get('avg_ttft_ms', 0):<10.0f}")
+                  f"{r.get('avg_ttft_ms', 0):<10.0f} "
+                  f"{f'{tpj:.2f}' if tpj else 'n/a':<8} "
+                  f"{r['outcomes']}")
         print("="*80)
 
 if __name__ == '__main__':
@@ -3,62 +3,43 @@
 Concurrent Stress Test - Multiple simultaneous requests for token generation
 """
 
+import io
 import asyncio
-import aiohttp
+import argparse
+import contextlib
 import time
 import json
 from datetime import datetime
 import statistics
 
-async def make_concurrent_request(session, request_id, prompt, max_tokens, url):
-    """Make a single async request"""
-    start_time = time.perf_counter()
-
-    payload = {
-        "model": "Qwen/Qwen2.5-7B-Instruct",
-        "prompt": prompt,
-        "max_tokens": max_tokens,
-        "temperature": 0.7,
-        "top_p": 0.9,
-    }
-
-    try:
-        async with session.post(url, json=payload) as response:
-            if response.status == 200:
-                data = await response.json()
-                end_time = time.perf_counter()
-
-                usage = data.get("usage", {})
-                completion_tokens = usage.get("completion_tokens", 0)
-                total_time = end_time - start_time
-                tokens_per_second = completion_tokens / total_time if total_time > 0 else 0
-
-                return {
-                    "request_id": request_id,
-                    "success": True,
-                    "tokens": completion_tokens,
-                    "time": total_time,
-                    "speed": tokens_per_second,
-                    "start": start_time,
-                    "end": end_time
-                }
-            else:
-                return {
-                    "request_id": request_id,
-                    "success": False,
-                    "error": f"Status {response.status}"
-                }
-    except Exception as e:
-        return {
-            "request_id": request_id,
-            "success": False,
-            "error": str(e)
-        }
+from outcome_stats import summarize_outcomes, format_outcomes, format_percentile
+from harness_calibration import NullServer, client_bound_reasons
+from load_engine import LoadEngine
+from steady_state import analyze_throughput
+from energy_telemetry import start_power_sampler, add_power_arguments, format_energy
 
-async def run_concurrent_test(num_concurrent, tokens_per_request):
-    """Run concurrent test with specified number of simultaneous requests"""
-
-    url = "http://localhost:8000/v1/completions"
+async def make_concurrent_request(engine, request_id, prompt, max_tokens):
+    """Make a single streamed request; every chunk is timestamped for the steady-state analysis"""
+    payload = engine.build_payload(prompt, max_tokens, temperature=0.7, top_p=0.9)
+    start_time = time.perf_counter()
+    record = await engine.send(payload)
+    end_time = time.perf_counter()
+
+    record["request_id"] = request_id
+    if record["success"]:
+        total_time = record["total_ms"] / 1000
+        record.update({
+            "tokens": record["completion_tokens"],
+            "time": total_time,
+            "speed": record["completion_tokens"] / total_time if total_time > 0 else 0,
+            "start": start_time,
+            "end": end_time
+        })
+    return record
+
+async def run_concurrent_test(num_concurrent, tokens_per_request, base_url="http://localhost:8000", bin_s=0.25,
+                              power=None):
+    """Run concurrent test with specified number of simultaneous requests; ``power`` is a running PowerSampler"""
 
     # Different prompts for variety
     prompts = [
@@ -81,15 +62,14 @@ async def run_concurrent_test(num_concurrent, tokens_per_request):
 
     # Prepare requests
     tasks = []
-    async with aiohttp.ClientSession() as session:
+    async with LoadEngine(base_url, "Qwen/Qwen2.5-7B-Instruct", timeout=300, max_connections=0) as engine:
         for i in range(num_concurrent):
             prompt = prompts[i % len(prompts)]
             task = make_concurrent_request(
-                session,
+                engine,
                 i+1,
                 prompt,
-                tokens_per_request,
-                url
+                tokens_per_request
             )
             tasks.append(task)
 
@@ -103,6 +83,10 @@ async def run_concurrent_test(num_concurrent, tokens_per_request):
     # Analyze results
     successful = [r for r in results if r.get("success")]
     failed = [r for r in results if not r.get("success")]
+    # Timeouts stay in the latency percentiles as censored samples
+    outcomes = summarize_outcomes(results)
+    # Throughput over the window where the decode batch is full, not the ramp-up and tail
+    steady = analyze_throughput(results, bin_s=bin_s)
 
     if successful:
         total_tokens = sum(r["tokens"] for r in successful)
@@ -117,23 +101,36 @@ async def run_concurrent_test(num_concurrent, tokens_per_request):
 
         # Overall throughput
         overall_throughput = total_tokens / overall_time if overall_time > 0 else 0
+        energy = power.energy_report(overall_start, overall_end, total_tokens, len(successful)) if power else None
 
         print(f"\n📊 Results:")
         print(f"  ✅ Successful: {len(successful)}/{num_concurrent}")
         print(f"  ❌ Failed: {len(failed)}/{num_concurrent}")
+        print(f"  🧾 Outcomes: {format_outcomes(outcomes['outcomes'])}")
 
         print(f"\n⏱️  Timing:")
         print(f"  Overall time: {overall_time:.2f} seconds")
         print(f"  Avg response time: {avg_response_time:.2f} seconds")
         print(f"  Min response time: {min(individual_times):.2f} seconds")
         print(f"  Max response time: {max(individual_times):.2f} seconds")
+        print(f"  Latency p50/p95/p99 (timeouts censored): {format_percentile(outcomes, 50)}/"
+              f"{format_percentile(outcomes, 95)}/{format_percentile(outcomes, 99)} ms")
 
         print(f"\n🚀 Token Generation Speed:")
         print(f"  Total tokens generated: {total_tokens}")
-        print(f"  Overall throughput: {overall_throughput:.2f} tok/s")
+        print(f"  Overall throughput: {overall_throughput:.2f} tok/s ({format_outcomes(outcomes['outcomes'])})")
+        if steady["steady_throughput"] is not None:
+            window_start, window_end = steady["steady_window_s"]
+            print(f"  Steady-state throughput: {steady['steady_throughput']:.2f} tok/s "
+                  f"({window_start:.2f}-{window_end:.2f}s, {steady['steady_fraction']:.0%} of the run, "
+                  f"{steady['peak_decoding']} decoding)")
+        else:
+            print(f"  Steady-state throughput: n/a ({steady.get('error')})")
         print(f"  Average individual speed: {avg_individual_speed:.2f} tok/s")
         print(f"  Min individual speed: {min_speed:.2f} tok/s")
         print(f"  Max individual speed: {max_speed:.2f} tok/s")
+        if energy:
+            print(f"  ⚡ Energy: {format_energy(energy)}")
 
         print(f"\n📈 Performance Metrics:")
         print(f"  Tokens per minute: {overall_throughput * 60:.0f}")
@@ -152,13 +149,48 @@ async def run_concurrent_test(num_concurrent, tokens_per_request):
             "total_tokens": total_tokens,
             "overall_time": overall_time,
             "throughput": overall_throughput,
-            "success_rate": len(successful) / num_concurrent
+            "steady_throughput": steady["steady_throughput"],
+            "steady_window_s": steady.get("steady_window_s"),
+            "steady_fraction": steady.get("steady_fraction"),
+            "steady_cv": steady.get("steady_cv"),
+            "throughput_series": steady.get("throughput_series"),
+            "throughput_bin_s": bin_s,
+            "requests_per_s": len(successful) / overall_time,
+            "p50_total_ms": statistics.median(individual_times) * 1000,
+            "energy": energy,
+            "tokens_per_joule": energy.get("tokens_per_joule") if energy else None,
+            "success_rate": len(successful) / num_concurrent,
+            "outcomes": outcomes["outcomes"],
+            "censored_latency_percentiles": outcomes["censored_percentiles"]
         }
     else:
-        print(f"\n❌ All requests failed!")
+        print(f"\n❌ All requests failed! ({format_outcomes(outcomes['outcomes'])})")
         return None
 
-async def main():
+def ranking_metric(results):
+    """Steady-state throughput when every scenario found a plateau, else overall throughput for all of them"""
+    if all(r.get('steady_throughput') is not None for r in results):
+        return 'steady_throughput'
+    return 'throughput'
+
+def _steady_text(result):
+    steady = result.get('steady_throughput')
+    return f"{steady:7.2f} tok/s" if steady is not None else "    n/a"
+
+def _energy_text(result):
+    tpj = result.get('tokens_per_joule')
+    return f"  {tpj:.2f} tok/J" if tpj is not None else ""
+
+async def calibrate_scenarios(test_scenarios, null_port=9230):
+    """Run every scenario against a zero-latency in-process server to get the client's own ceilings"""
+    ceilings = {}
+    with NullServer(null_port) as null:
+        for concurrent, tokens in test_scenarios:
+            with contextlib.redirect_stdout(io.StringIO()):
+                ceilings[(concurrent, tokens)] = await run_concurrent_test(concurrent, tokens, null.base_url)
+    return ceilings
+
+async def main(calibrate=False, margin=0.8, power_kind="auto", power_interval_s=0.1):
     """Run multiple concurrent test scenarios"""
 
     print("🚀 Concurrent Token Generation Stress Test")
@@ -178,16 +210,36 @@ async def main():
         (5, 1000),   # 5 concurrent with heavy load
     ]
 
+    ceilings = {}
+    if calibrate:
+        print("📏 Calibrating the client against a zero-latency server...")
+        ceilings = await calibrate_scenarios(test_scenarios)
+        for (concurrent, tokens), ceiling in ceilings.items():
+            if ceiling:
+                print(f"  {concurrent:2d} users × {tokens:4d} tokens: ceiling {ceiling['requests_per_s']:.1f} req/s, "
+                      f"added latency {ceiling['p50_total_ms']:.1f}ms")
+
     results = []
+    power = start_power_sampler(power_kind, power_interval_s)
+    if power:
+        print(f"⚡ Sampling GPU power via {power.provider.name} every {power.interval_s}s")
 
     for concurrent, tokens in test_scenarios:
-        result = await run_concurrent_test(concurrent, tokens)
+        result = await run_concurrent_test(concurrent, tokens, power=power)
         if result:
+            ceiling = ceilings.get((concurrent, tokens))
+            if ceiling:
+                result["harness_ceiling_requests_per_s"] = ceiling["requests_per_s"]
+                result["harness_added_latency_ms"] = ceiling["p50_total_ms"]
+                result["client_bound"] = client_bound_reasons(result, ceiling, margin)
             results.append(result)
 
         # Brief pause between tests
         await asyncio.sleep(2)
 
+    if power:
+        power.close()
+
     # Final summary
     print("\n" + "="*60)
     print("🏁 FINAL SUMMARY")
@@ -197,18 +249,27 @@ async def main():
         print("\n📊 Throughput by Concurrent Users:")
         for r in results:
             print(f"  {r['concurrent']:2d} users × {r['tokens_per_request']:4d} tokens: "
-                  f"{r['throughput']:7.2f} tok/s "
-                  f"({r['success_rate']:.0%} success)")
-
-        # Find best configuration
-        best = max(results, key=lambda x: x['throughput'])
-        print(f"\n🏆 Best Performance:")
+                  f"{r['throughput']:7.2f} tok/s overall, "
+                  f"{_steady_text(r)} steady "
+                  f"({r['success_rate']:.0%} success: {format_outcomes(r['outcomes'])})"
+                  f"{_energy_text(r)}"
+                  f"{'  ⚠️ client-bound' if r.get('client_bound') else ''}")
+
+        # Find best configuration, every scenario ranked by the same metric
+        metric = ranking_metric(results)
+        best = max(results, key=lambda r: r[metric])
+        print(f"\n🏆 Best Performance (by {metric.replace('_', ' ')}):")
         print(f"  Configuration: {best['concurrent']} concurrent requests")
-        print(f"  Throughput: {best['throughput']:.2f} tok/s")
+        print(f"  Throughput: {best['throughput']:.2f} tok/s overall, {_steady_text(best)} steady")
         print(f"  Total tokens: {best['total_tokens']} in {best['overall_time']:.2f}s")
+        efficient = [r for r in results if r.get('tokens_per_joule') is not None]
+        if efficient:
+            greenest = max(efficient, key=lambda r: r['tokens_per_joule'])
+            print(f"  Most energy-efficient: {greenest['concurrent']} × {greenest['tokens_per_request']} tokens "
+                  f"({format_energy(greenest['energy'])})")
 
         # Performance rating
-        max_throughput = max(r['throughput'] for r in results)
+        max_throughput = best[metric]
         print(f"\n🎯 Server Capacity Rating:")
         if max_throughput > 500:
             print("  ⭐⭐⭐⭐⭐ ENTERPRISE GRADE (>500 tok/s)")
@@ -233,14 +294,21 @@ async def main():
     print(f"\n💾 Report saved to: {report_file}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent token generation stress test")
+    parser.add_argument("--calibrate", action="store_true",
+                        help="Measure the client's own ceilings first and flag client-bound scenarios")
+    parser.add_argument("--margin", type=float, default=0.8, help="Fraction of a ceiling that counts as client-bound")
+    add_power_arguments(parser)
+    args = parser.parse_args()
+
     # Check server first
     import requests
     try:
         response = requests.get("http://localhost:8000/health", timeout=5)
-        print("✅ Server is ready\n")
-
-        # Run async tests
-        asyncio.run(main())
-    except:
+    except requests.RequestException:
         print("❌ Server is not responding. Please check if SGLang is running on port 8000")
-        exit(1)
\ No newline at end of file
+        exit(1)
+    print("✅ Server is ready\n")
+
+    # Run async tests
+    asyncio.run(main(args.calibrate, args.margin, args.power, args.power_interval_s))
\ No newline at end of file
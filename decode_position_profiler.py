@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Decode Position Profiler - inter-token latency as a function of output position
+Streams long generations, buckets ITL every N output tokens and fits a slope
+so attention cost growth can be compared across attention backends
+"""
+
+import json
+import asyncio
+import argparse
+import statistics
+from datetime import datetime
+from typing import List, Dict, Any, Tuple
+
+from load_engine import LoadEngine
+
+
+def position_itls(record: Dict[str, Any]) -> List[Tuple[float, float]]:
+    """(output position, inter-token latency ms) pairs for one streamed request.
+
+    With --stream-interval 1 every SSE chunk is one token.  When the server
+    batches tokens per chunk, positions are rescaled with the usage count.
+    """
+    times = record.get("token_times_ms") or []
+    if len(times) < 2:
+        return []
+    tokens = max(record.get("completion_tokens") or len(times), len(times))
+    tokens_per_chunk = tokens / len(times)
+    pairs = []
+    for i in range(1, len(times)):
+        itl = (times[i] - times[i - 1]) / tokens_per_chunk
+        pairs.append((i * tokens_per_chunk, itl))
+    return pairs
+
+
+def bucket_itls(pairs: List[Tuple[float, float]], bucket_size: int) -> List[Dict[str, Any]]:
+    """Median/mean ITL per output-position bucket"""
+    buckets: Dict[int, List[float]] = {}
+    for position, itl in pairs:
+        buckets.setdefault(int(position // bucket_size), []).append(itl)
+    rows = []
+    for index in sorted(buckets):
+        values = buckets[index]
+        rows.append({
+            "position_start": index * bucket_size,
+            "position_end": (index + 1) * bucket_size,
+            "samples": len(values),
+            "mean_itl_ms": statistics.mean(values),
+            "median_itl_ms": statistics.median(values),
+            "p95_itl_ms": statistics.quantiles(values, n=20)[18] if len(values) >= 20 else max(values),
+            "tokens_per_second": 1000 / statistics.mean(values) if statistics.mean(values) > 0 else 0,
+        })
+    return rows
+
+
+def fit_slope(buckets: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Least-squares line through bucket medians: ITL(ms) = intercept + slope * position"""
+    if len(buckets) < 2:
+        return {}
+    x = [(b["position_start"] + b["position_end"]) / 2 for b in buckets]
+    y = [b["median_itl_ms"] for b in buckets]
+    slope, intercept = statistics.linear_regression(x, y)
+    first, last = y[0], y[-1]
+    return {
+        "intercept_ms": intercept,
+        "slope_ms_per_token": slope,
+        "slope_ms_per_1k_tokens": slope * 1000,
+        "growth_first_to_last": (last - first) / first if first > 0 else 0,
+        "r_squared": statistics.correlation(x, y) ** 2 if len(set(y)) > 1 else 0.0,
+    }
+
+
+async def profile_backend(name: str, base_url: str, args) -> Dict[str, Any]:
+    """Run the long generations against one server and profile them"""
+    print(f"\n{'='*60}")
+    print(f"📋 Backend: {name} ({base_url})")
+    print(f"🎯 {args.runs} × {args.max_tokens} tokens, bucket {args.bucket_size}")
+    print(f"{'='*60}")
+
+    params = {"temperature": 0.7, "top_p": 0.9}
+    if not args.no_force_length:
+        params.update({"ignore_eos": True, "min_tokens": args.max_tokens})
+
+    pairs: List[Tuple[float, float]] = []
+    records = []
+    async with LoadEngine(base_url, args.model, timeout=args.timeout) as engine:
+        await engine.send(engine.build_payload("Hello", 5))
+        for run in range(args.runs):
+            payload = engine.build_payload(args.prompt, args.max_tokens, **params)
+            record = await engine.send(payload)
+            if not record["success"]:
+                print(f"  Run {run+1}/{args.runs}: ❌ {record['error']}")
+                continue
+            records.append(record)
+            pairs.extend(position_itls(record))
+            generated = record["completion_tokens"]
+            seconds = record["total_ms"] / 1000
+            print(f"  Run {run+1}/{args.runs}: {generated} tokens in {seconds:.1f}s "
+                  f"({generated / seconds:.2f} tok/s, TTFT {record['first_token_ms'] or 0:.0f}ms)")
+            if generated < args.max_tokens * 0.95:
+                print(f"    ⚠️ Stopped early at {generated} tokens; ignore_eos/min_tokens may be unsupported")
+
+    buckets = bucket_itls(pairs, args.bucket_size)
+    fit = fit_slope(buckets)
+    return {
+        "backend": name,
+        "base_url": base_url,
+        "runs": len(records),
+        "avg_tokens_per_second": statistics.mean(
+            [r["completion_tokens"] / (r["total_ms"] / 1000) for r in records]) if records else 0,
+        "buckets": buckets,
+        "fit": fit,
+    }
+
+
+def print_summary(profiles: List[Dict[str, Any]]):
+    print("\n" + "=" * 70)
+    print("🏁 DECODE POSITION PROFILE")
+    print("=" * 70)
+    for p in profiles:
+        print(f"\n📌 {p['backend']}: average {p['avg_tokens_per_second']:.2f} tok/s over {p['runs']} runs")
+        for b in p["buckets"]:
+            print(f"  {b['position_start']:>6}-{b['position_end']:<6} "
+                  f"ITL median {b['median_itl_ms']:7.2f}ms  p95 {b['p95_itl_ms']:7.2f}ms  "
+                  f"({b['tokens_per_second']:.1f} tok/s)")
+        fit = p["fit"]
+        if fit:
+            print(f"  📈 Slope: {fit['slope_ms_per_1k_tokens']:+.3f}ms per 1k tokens "
+                  f"(intercept {fit['intercept_ms']:.2f}ms, R²={fit['r_squared']:.2f}, "
+                  f"first→last bucket {fit['growth_first_to_last']:+.1%})")
+
+    fitted = [p for p in profiles if p["fit"]]
+    if len(fitted) > 1:
+        print("\n⚖️ Attention cost growth by backend:")
+        for p in sorted(fitted, key=lambda p: p["fit"]["slope_ms_per_1k_tokens"]):
+            print(f"  {p['backend']:<15} {p['fit']['slope_ms_per_1k_tokens']:+.3f}ms / 1k tokens")
+
+
+def parse_target(value: str) -> Tuple[str, str]:
+    """'triton=http://localhost:8000' -> ('triton', 'http://localhost:8000')"""
+    if "=" in value:
+        name, url = value.split("=", 1)
+    else:
+        name, url = value, value
+    return name, url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode-position throughput decay profiler")
+    parser.add_argument("--target", action="append", type=parse_target,
+                        help="name=base_url, repeatable (e.g. triton=http://localhost:8000)")
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--prompt", default="Create a complete novel chapter with multiple characters, "
+                                            "detailed descriptions, dialogues, and plot development:")
+    parser.add_argument("--max-tokens", type=int, default=4000, help="Tokens to generate per run")
+    parser.add_argument("--runs", type=int, default=2, help="Generations per backend")
+    parser.add_argument("--bucket-size", type=int, default=256, help="Output positions per bucket")
+    parser.add_argument("--no-force-length", action="store_true", help="Do not send ignore_eos/min_tokens")
+    parser.add_argument("--timeout", type=float, default=900, help="Per-request timeout in seconds")
+    args = parser.parse_args()
+    targets = args.target or [("default", "http://localhost:8000")]
+
+    print("🚀 Decode Position Profiler")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    profiles = [asyncio.run(profile_backend(name, url, args)) for name, url in targets]
+    print_summary(profiles)
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"decode_position_profile_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "max_tokens": args.max_tokens,
+                   "bucket_size": args.bucket_size, "profiles": profiles}, f, indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
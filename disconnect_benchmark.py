@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Disconnect Benchmark - does the server stop generating for clients that left?
+Runs a closed loop of streaming clients where a fraction hang up after K
+tokens, reads the server's own counters (SGLang or vLLM /metrics, or the
+scheduler log) and compares generated vs delivered tokens and running
+requests with a run without abandonment; a probe then abandons a batch of
+streams at once and times how fast the running count falls back
+"""
+
+import re
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+import aiohttp
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+from load_engine import LoadEngine
+from mock_openai_server import MockOpenAIServer
+from decode_position_profiler import parse_target
+from outcome_stats import outcome_counts, format_outcomes
+from sglang_log_monitor import SchedulerLogIngester
+
+# Prometheus names per server (SGLang needs --enable-metrics)
+METRIC_NAMES = {
+    "sglang": {"running": "sglang:num_running_reqs", "queued": "sglang:num_queue_reqs",
+               "generated": "sglang:generation_tokens_total"},
+    "vllm": {"running": "vllm:num_requests_running", "queued": "vllm:num_requests_waiting",
+             "generated": "vllm:generation_tokens_total"},
+}
+SAMPLE_LINE = re.compile(r"^([A-Za-z_:][\w:]*)(?:\{[^}]*\})?\s+([-+\d.eE]+|NaN)")
+
+
+class StreamAbandoned(Exception):
+    """Raised from the token callback to drop the connection mid-stream"""
+
+
+def parse_prometheus(text: str) -> Dict[str, float]:
+    """Metric name -> value, summed over label sets"""
+    values: Dict[str, float] = {}
+    for line in text.splitlines():
+        match = SAMPLE_LINE.match(line)
+        if match and match.group(2) != "NaN":
+            values[match.group(1)] = values.get(match.group(1), 0.0) + float(match.group(2))
+    return values
+
+
+class ServerCounters:
+    """Running requests and generated tokens from /metrics, or running requests from the scheduler log"""
+
+    def __init__(self, base_url: str, container: Optional[str] = None):
+        self.base_url = base_url.rstrip("/")
+        self.container = container
+        self.flavor: Optional[str] = None
+        self.ingester: Optional[SchedulerLogIngester] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._log_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5))
+        try:
+            metrics = await self._fetch()
+            self.flavor = next((name for name, names in METRIC_NAMES.items() if names["running"] in metrics), None)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.flavor = None
+        if self.flavor is None and self.container:
+            self.ingester = SchedulerLogIngester()
+            self._log_task = asyncio.create_task(
+                self.ingester.ingest(self.ingester.tail_docker(self.container, since="1s"), live=True))
+
+    async def stop(self):
+        if self._log_task is not None:
+            self._log_task.cancel()
+            await asyncio.gather(self._log_task, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+
+    @property
+    def source(self) -> str:
+        if self.flavor:
+            return f"{self.flavor} /metrics"
+        return f"docker logs {self.container}" if self.ingester else "none"
+
+    async def _fetch(self) -> Dict[str, float]:
+        async with self._session.get(f"{self.base_url}/metrics") as response:
+            response.raise_for_status()
+            return parse_prometheus(await response.text())
+
+    async def read(self) -> Dict[str, Optional[float]]:
+        """Current running/queued requests and generated-token counter (None where unknown)"""
+        if self.flavor:
+            names = METRIC_NAMES[self.flavor]
+            metrics = await self._fetch()
+            return {key: metrics.get(name) for key, name in names.items()}
+        if self.ingester and self.ingester.samples:
+            last = self.ingester.samples[-1]
+            return {"running": last.get("running_req"), "queued": last.get("queue_req"), "generated": None}
+        return {"running": None, "queued": None, "generated": None}
+
+
+async def run_load(engine: LoadEngine, counters: ServerCounters, fraction: float, args) -> Dict[str, Any]:
+    """Closed loop of ``args.clients`` streams for ``args.duration`` seconds, abandoning ``fraction`` of them"""
+    rng = random.Random(args.seed)
+    records: List[Dict[str, Any]] = []
+    samples: List[Dict[str, Any]] = []
+    in_flight = 0
+    deadline = time.perf_counter() + args.duration
+
+    async def client(worker: int):
+        nonlocal in_flight
+        n = 0
+        while time.perf_counter() < deadline:
+            abandon = rng.random() < fraction
+
+            def on_token(record, now_ms):
+                if abandon and len(record["token_times_ms"]) >= args.abandon_after:
+                    raise StreamAbandoned(f"Abandoned after {args.abandon_after} tokens")
+
+            payload = engine.build_payload(f"Client {worker} request {n}: tell me a long story", args.max_tokens,
+                                           ignore_eos=True, min_tokens=args.max_tokens)
+            in_flight += 1
+            try:
+                record = await engine.send(payload, on_token=on_token)
+            finally:
+                in_flight -= 1
+            record["abandoned"] = abandon and len(record["token_times_ms"]) >= args.abandon_after
+            records.append(record)
+            n += 1
+
+    async def sample():
+        while True:
+            reading = await counters.read()
+            samples.append({"t": time.perf_counter(), "client_in_flight": in_flight, **reading})
+            await asyncio.sleep(args.poll_s)
+
+    before = await counters.read()
+    start = time.perf_counter()
+    sampler = asyncio.create_task(sample())
+    try:
+        await asyncio.gather(*(client(i) for i in range(args.clients)))
+    finally:
+        sampler.cancel()
+        await asyncio.gather(sampler, return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    # Give a server that ignores disconnects time to finish its zombie sequences before reading the counter
+    await asyncio.sleep(args.settle_s)
+    after = await counters.read()
+
+    completed = [r for r in records if not r["abandoned"]]
+    abandoned = [r for r in records if r["abandoned"]]
+    delivered = sum(len(r["token_times_ms"]) for r in abandoned) + \
+        sum(r["completion_tokens"] for r in completed if r["success"])
+    generated = after["generated"] - before["generated"] \
+        if after["generated"] is not None and before["generated"] is not None else None
+    running = [s["running"] for s in samples if s["running"] is not None]
+    clients = [s["client_in_flight"] for s in samples if s["running"] is not None]
+    return {
+        "abandon_fraction": fraction,
+        "requests": len(records),
+        "abandoned": len(abandoned),
+        "outcomes": outcome_counts(completed),
+        "elapsed_s": elapsed,
+        "delivered_tokens": delivered,
+        "useful_tokens_per_s": sum(r["completion_tokens"] for r in completed if r["success"]) / elapsed,
+        "server_generated_tokens": generated,
+        "wasted_tokens": generated - delivered if generated is not None else None,
+        "wasted_fraction": (generated - delivered) / generated if generated else None,
+        "mean_server_running": statistics.mean(running) if running else None,
+        "mean_client_in_flight": statistics.mean(clients) if clients else None,
+        # Requests the server still runs for nobody
+        "zombie_requests": statistics.mean(running) - statistics.mean(clients) if running else None,
+    }
+
+
+async def reclaim_probe(engine: LoadEngine, counters: ServerCounters, args) -> Dict[str, Any]:
+    """Abandon ``args.probe_streams`` streams at the same moment and time the drop of the server's running count"""
+    idle = await counters.read()
+    if idle["running"] is None:
+        return {"error": "no server-side running count (enable /metrics or pass --container)"}
+    reached = asyncio.Event()
+    started = [0]
+    failed = [0]
+
+    def settle():
+        # A probe that fails before its first token will never start; don't wait for it
+        if started[0] + failed[0] >= args.probe_streams:
+            reached.set()
+
+    def on_token(record, now_ms):
+        if len(record["token_times_ms"]) == 1:
+            started[0] += 1
+            settle()
+        if reached.is_set() or len(record["token_times_ms"]) >= args.max_tokens:
+            raise StreamAbandoned("Probe disconnect")
+
+    def on_done(task):
+        if not task.cancelled() and task.exception() is None and not task.result()["token_times_ms"]:
+            failed[0] += 1
+            settle()
+
+    payloads = [engine.build_payload(f"Probe stream {i}: tell me a long story", args.max_tokens,
+                                     ignore_eos=True, min_tokens=args.max_tokens) for i in range(args.probe_streams)]
+    tasks = [asyncio.create_task(engine.send(p, on_token=on_token)) for p in payloads]
+    for task in tasks:
+        task.add_done_callback(on_done)
+    try:
+        await asyncio.wait_for(reached.wait(), timeout=args.timeout)
+    except asyncio.TimeoutError:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return {"error": f"only {started[0]} of {args.probe_streams} probe streams started "
+                         f"within {args.timeout:.0f}s"}
+    if not started[0]:
+        await asyncio.gather(*tasks)
+        return {"error": f"all {args.probe_streams} probe streams failed before their first token"}
+    peak = (await counters.read())["running"]
+    await asyncio.gather(*tasks)
+    disconnected = time.perf_counter()
+
+    trace = []
+    while time.perf_counter() - disconnected < args.probe_timeout_s:
+        running = (await counters.read())["running"]
+        elapsed_ms = (time.perf_counter() - disconnected) * 1000
+        trace.append((elapsed_ms, running))
+        if running is not None and running <= idle["running"]:
+            return {"idle_running": idle["running"], "peak_running": peak, "reclaim_ms": elapsed_ms,
+                    "trace": trace}
+        await asyncio.sleep(args.poll_s)
+    return {"idle_running": idle["running"], "peak_running": peak, "reclaim_ms": None, "trace": trace}
+
+
+async def run_target(name: str, base_url: str, args) -> Dict[str, Any]:
+    counters = ServerCounters(base_url, args.container)
+    await counters.start()
+    print(f"\n📋 {name} ({base_url}), server counters from {counters.source}")
+    result: Dict[str, Any] = {"target": name, "base_url": base_url, "counter_source": counters.source}
+    try:
+        async with LoadEngine(base_url, args.model, timeout=args.timeout) as engine:
+            for label, fraction in (("no_abandon", 0.0), ("abandon", args.abandon_fraction)):
+                run = await run_load(engine, counters, fraction, args)
+                result[label] = run
+                wasted = f"{run['wasted_fraction']:.1%}" if run["wasted_fraction"] is not None else "n/a"
+                zombies = f"{run['zombie_requests']:+.1f}" if run["zombie_requests"] is not None else "n/a"
+                print(f"  {label:<11} useful {run['useful_tokens_per_s']:8.1f} tok/s  wasted {wasted:>6}  "
+                      f"zombies {zombies:>5}  abandoned {run['abandoned']}/{run['requests']}  "
+                      f"[{format_outcomes(run['outcomes'])}]")
+            probe = await reclaim_probe(engine, counters, args)
+            result["probe"] = probe
+            if probe.get("reclaim_ms") is not None:
+                print(f"  🔌 {args.probe_streams} streams dropped: running {probe['peak_running']:.0f} → "
+                      f"{probe['idle_running']:.0f} in {probe['reclaim_ms']:.0f}ms")
+            else:
+                print(f"  🔌 capacity not reclaimed within {args.probe_timeout_s:.0f}s "
+                      f"{probe.get('error', '')}")
+    finally:
+        await counters.stop()
+
+    before, after = result["no_abandon"], result["abandon"]
+    if before["useful_tokens_per_s"]:
+        result["useful_throughput_change"] = after["useful_tokens_per_s"] / before["useful_tokens_per_s"] - 1
+    result["reclaims_capacity"] = result["probe"].get("reclaim_ms") is not None and \
+        (after["wasted_fraction"] is None or after["wasted_fraction"] < args.waste_tolerance)
+    return result
+
+
+async def run_benchmark(args) -> List[Dict[str, Any]]:
+    targets = args.target
+    servers = []
+    if not targets:
+        # A server that stops on disconnect and one that keeps generating for nobody
+        for offset, (name, ignore) in enumerate([("mock_reclaims", False), ("mock_ignores_disconnect", True)]):
+            server = MockOpenAIServer(port=args.mock_port + offset, ttft_ms=30.0, itl_ms=10.0,
+                                      max_running=args.clients * 2, batch_penalty=0.02, ignore_disconnect=ignore,
+                                      name=name)
+            await server.start()
+            servers.append(server)
+        targets = [(s.name, s.base_url) for s in servers]
+
+    results = []
+    try:
+        for name, url in targets:
+            results.append(await run_target(name, url, args))
+    finally:
+        for server in servers:
+            await server.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Client disconnect / cancellation capacity benchmark")
+    parser.add_argument("--target", action="append", type=parse_target,
+                        help="name=base_url, repeatable, e.g. sglang=http://localhost:8000 (default: mocks)")
+    parser.add_argument("--container", help="Read running requests from this container's scheduler log "
+                                            "when /metrics is not available")
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent streaming clients")
+    parser.add_argument("--max-tokens", type=int, default=512)
+    parser.add_argument("--abandon-fraction", type=float, default=0.5, help="Share of streams the client drops")
+    parser.add_argument("--abandon-after", type=int, default=32, help="Tokens received before dropping")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per run")
+    parser.add_argument("--settle-s", type=float, default=3.0, help="Wait before the final counter read")
+    parser.add_argument("--probe-streams", type=int, default=16, help="Streams dropped at once by the probe")
+    parser.add_argument("--probe-timeout-s", type=float, default=30.0)
+    parser.add_argument("--poll-s", type=float, default=0.05, help="Counter polling interval")
+    parser.add_argument("--waste-tolerance", type=float, default=0.05,
+                        help="Wasted-token share still counted as reclaiming capacity")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--mock-port", type=int, default=9260)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("🚀 Disconnect Benchmark")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"👥 {args.clients} clients, {args.abandon_fraction:.0%} drop after {args.abandon_after} of "
+          f"{args.max_tokens} tokens")
+    results = asyncio.run(run_benchmark(args))
+
+    print("\n" + "=" * 70)
+    print("🏁 DISCONNECT SUMMARY")
+    print("=" * 70)
+    for r in results:
+        verdict = "✅ reclaims capacity" if r["reclaims_capacity"] else "⚠️ keeps generating for departed clients"
+        change = r.get("useful_throughput_change")
+        print(f"  {r['target']:<24} {verdict}"
+              f"{f'  (useful throughput {change:+.1%} with abandonment)' if change is not None else ''}")
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"disconnect_benchmark_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "config": vars(args), "results": results}, f, indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
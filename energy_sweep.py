@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Energy Sweep - rank deployment flag sets by tokens per joule at a latency SLO
+Runs the same closed-loop concurrency ladder against every target (one
+deployment each, e.g. different --max-running-requests or quantization)
+while a background sampler records GPU power, integrates energy per level
+and reports tokens/joule and joules/request next to throughput. The
+ranking takes each target's most efficient level that still meets the
+TTFT/TPOT/latency SLO
+"""
+
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+from load_engine import LoadEngine
+from mock_openai_server import MockOpenAIServer
+from decode_position_profiler import parse_target
+from outcome_stats import outcome_counts, format_outcomes
+from energy_telemetry import FakePowerProvider, PowerSampler, build_power_provider, format_energy
+
+PROMPTS = [
+    "Explain how a write-ahead log makes a database crash-safe:",
+    "Write a short story about a lighthouse keeper and a storm:",
+    "Compare TCP congestion control algorithms in detail:",
+    "Describe the life cycle of a star from nebula to remnant:",
+]
+
+# Mock deployments standing in for two --max-running-requests settings; the
+# fake power model draws per running request, so batching trades latency for joules
+MOCK_DEPLOYMENTS = [
+    ("mock_mr8", {"max_running": 8, "batch_penalty": 0.03}),
+    ("mock_mr32", {"max_running": 32, "batch_penalty": 0.05}),
+]
+
+
+def percentile(values: List[float], q: int) -> Optional[float]:
+    if not values:
+        return None
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=100)[q - 1]
+
+
+def tpot_ms(record: Dict[str, Any]) -> Optional[float]:
+    """Mean time per output token after the first"""
+    if not record["success"] or record.get("first_token_ms") is None or record["completion_tokens"] < 2:
+        return None
+    return (record["total_ms"] - record["first_token_ms"]) / (record["completion_tokens"] - 1)
+
+
+def slo_violations(point: Dict[str, Any], args) -> List[str]:
+    """Which SLO bounds a level misses; empty means it qualifies for the ranking"""
+    violations = []
+    for key, bound, label in (("ttft_p99_ms", args.slo_ttft_p99_ms, "TTFT p99"),
+                              ("tpot_p99_ms", args.slo_tpot_p99_ms, "TPOT p99"),
+                              ("total_p99_ms", args.slo_total_p99_ms, "latency p99")):
+        if bound is not None and (point[key] is None or point[key] > bound):
+            violations.append(f"{label} {point[key] or 0:.0f}ms > {bound:.0f}ms")
+    if point["success_rate"] < args.slo_success_rate:
+        violations.append(f"success {point['success_rate']:.1%} < {args.slo_success_rate:.1%}")
+    return violations
+
+
+async def run_level(engine: LoadEngine, power: Optional[PowerSampler], concurrency: int, args) -> Dict[str, Any]:
+    payloads = [engine.build_payload(f"{PROMPTS[i % len(PROMPTS)]} (request {i})", args.max_tokens,
+                                     temperature=0.7, ignore_eos=True)
+                for i in range(concurrency * args.requests_per_slot)]
+    start = time.perf_counter()
+    records = await engine.run_closed_loop(payloads, concurrency)
+    end = time.perf_counter()
+
+    ok = [r for r in records if r["success"]]
+    tokens = sum(r["completion_tokens"] for r in ok)
+    duration = end - start
+    point = {
+        "concurrency": concurrency,
+        "requests": len(records),
+        "duration_s": duration,
+        "total_tokens": tokens,
+        "throughput": tokens / duration if duration > 0 else 0.0,
+        "requests_per_s": len(ok) / duration if duration > 0 else 0.0,
+        "success_rate": len(ok) / len(records) if records else 0.0,
+        "ttft_p50_ms": percentile([r["first_token_ms"] for r in ok if r.get("first_token_ms") is not None], 50),
+        "ttft_p99_ms": percentile([r["first_token_ms"] for r in ok if r.get("first_token_ms") is not None], 99),
+        "tpot_p99_ms": percentile([t for t in map(tpot_ms, ok) if t is not None], 99),
+        "total_p99_ms": percentile([r["total_ms"] for r in ok], 99),
+        "outcomes": outcome_counts(records),
+    }
+    energy = power.energy_report(start, end, tokens, len(ok)) if power else {"energy_j": None}
+    point.update({"energy": energy, "tokens_per_joule": energy.get("tokens_per_joule"),
+                  "joules_per_request": energy.get("joules_per_request"),
+                  "mean_power_w": energy.get("mean_power_w")})
+    point["slo_violations"] = slo_violations(point, args)
+    return point
+
+
+async def run_target(name: str, base_url: str, provider: Optional[Any], args) -> Dict[str, Any]:
+    print(f"\n🔌 {name} ({base_url}), power via {provider.name if provider else 'none'}")
+    power = PowerSampler(provider, args.power_interval_s) if provider else None
+    points = []
+    async with LoadEngine(base_url, args.model, timeout=args.timeout, max_connections=0) as engine:
+        if args.warmup_requests:
+            warmup = [engine.build_payload(PROMPTS[0], 16) for _ in range(args.warmup_requests)]
+            await engine.run_closed_loop(warmup, args.warmup_requests)
+        if power:
+            power.start()
+        try:
+            for concurrency in args.concurrency:
+                point = await run_level(engine, power, concurrency, args)
+                points.append(point)
+                verdict = "✅" if not point["slo_violations"] else f"❌ {'; '.join(point['slo_violations'])}"
+                print(f"  {concurrency:4d} in flight: {point['throughput']:8.1f} tok/s  "
+                      f"TTFT p99 {point['ttft_p99_ms'] or 0:6.0f}ms  TPOT p99 {point['tpot_p99_ms'] or 0:5.1f}ms  "
+                      f"{format_energy(point['energy'])}  {verdict}")
+                # Let power fall back to idle so levels do not bleed into each other
+                await asyncio.sleep(args.cooldown_s)
+        finally:
+            if power:
+                power.stop()
+
+    qualifying = [p for p in points if not p["slo_violations"] and p["tokens_per_joule"] is not None]
+    best = max(qualifying, key=lambda p: p["tokens_per_joule"]) if qualifying else None
+    return {"target": name, "base_url": base_url, "power_provider": provider.name if provider else None,
+            "points": points, "best_at_slo": best,
+            "max_throughput_at_slo": max((p["throughput"] for p in points if not p["slo_violations"]),
+                                         default=None)}
+
+
+def rank_targets(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Targets by tokens/joule at their most efficient SLO-meeting level; targets with none go last"""
+    return sorted(results, key=lambda r: -(r["best_at_slo"]["tokens_per_joule"] if r["best_at_slo"] else -1.0))
+
+
+async def run_sweep(args) -> List[Dict[str, Any]]:
+    targets = args.target
+    servers = []
+    providers = {}
+    if not targets:
+        for offset, (name, flags) in enumerate(MOCK_DEPLOYMENTS):
+            server = MockOpenAIServer(port=args.mock_port + offset, ttft_ms=30.0, itl_ms=10.0, name=name, **flags)
+            await server.start()
+            servers.append(server)
+            if args.power in ("auto", "fake"):
+                providers[name] = FakePowerProvider(lambda server=server: server.stats["running"],
+                                                    idle_w=args.fake_idle_w, watts_per_unit=args.fake_watts_per_request,
+                                                    max_w=args.fake_max_w)
+        targets = [(s.name, s.base_url) for s in servers]
+
+    shared = None
+    if any(name not in providers for name, _ in targets):
+        # Real deployments share the GPU, so one provider serves every target
+        shared = build_power_provider(args.power, args.gpu)
+    results = []
+    try:
+        for name, url in targets:
+            results.append(await run_target(name, url, providers.get(name, shared), args))
+    finally:
+        for server in servers:
+            await server.stop()
+        for provider in [*providers.values(), shared]:
+            if provider is not None:
+                provider.close()
+    return results
+
+
+def print_summary(ranked: List[Dict[str, Any]], args):
+    print("\n" + "=" * 70)
+    print("🏁 ENERGY EFFICIENCY AT SLO")
+    print("=" * 70)
+    bounds = [f"{label} ≤ {bound:.0f}ms" for label, bound in (("TTFT p99", args.slo_ttft_p99_ms),
+                                                                ("TPOT p99", args.slo_tpot_p99_ms),
+                                                                ("latency p99", args.slo_total_p99_ms))
+              if bound is not None]
+    print(f"  SLO: {', '.join(bounds + [f'success ≥ {args.slo_success_rate:.0%}'])}")
+    for rank, r in enumerate(ranked, 1):
+        best = r["best_at_slo"]
+        if best is None:
+            print(f"  {rank}. {r['target']:<20} no level meets the SLO with energy data")
+            continue
+        print(f"  {rank}. {r['target']:<20} {best['tokens_per_joule']:6.2f} tok/J  "
+              f"{best['joules_per_request']:7.1f} J/req  {best['throughput']:8.1f} tok/s @ "
+              f"{best['concurrency']} in flight ({best['mean_power_w']:.0f} W)  "
+              f"[{format_outcomes(best['outcomes'])}]")
+    if ranked and ranked[0]["best_at_slo"]:
+        print(f"\n🏆 Most energy-efficient at SLO: {ranked[0]['target']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank deployments by tokens per joule at a latency SLO")
+    parser.add_argument("--target", action="append", type=parse_target,
+                        help="name=base_url, repeatable, e.g. mr64=http://localhost:8000 (default: mocks)")
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--concurrency", type=lambda s: [int(x) for x in s.split(",")], default=[1, 4, 8, 16, 32],
+                        help="Comma-separated in-flight levels")
+    parser.add_argument("--requests-per-slot", type=int, default=4, help="Requests per level = this × concurrency")
+    parser.add_argument("--max-tokens", type=int, default=128)
+    parser.add_argument("--warmup-requests", type=int, default=4)
+    parser.add_argument("--cooldown-s", type=float, default=1.0, help="Idle time between levels")
+    parser.add_argument("--slo-ttft-p99-ms", type=float, default=1000.0)
+    parser.add_argument("--slo-tpot-p99-ms", type=float, default=50.0)
+    parser.add_argument("--slo-total-p99-ms", type=float, default=None)
+    parser.add_argument("--slo-success-rate", type=float, default=0.99)
+    parser.add_argument("--power", choices=["auto", "nvml", "nvidia-smi", "fake", "none"], default="auto",
+                        help="Power source; auto uses the fake model for mocks and NVML/nvidia-smi otherwise")
+    parser.add_argument("--power-interval-s", type=float, default=0.1)
+    parser.add_argument("--gpu", type=lambda s: [int(x) for x in s.split(",")], default=None,
+                        help="GPU indices to sum, e.g. 0,1 (default: all)")
+    parser.add_argument("--fake-idle-w", type=float, default=60.0)
+    parser.add_argument("--fake-watts-per-request", type=float, default=25.0)
+    parser.add_argument("--fake-max-w", type=float, default=450.0)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--mock-port", type=int, default=9280)
+    args = parser.parse_args()
+
+    print("🚀 Energy Sweep")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    ranked = rank_targets(asyncio.run(run_sweep(args)))
+    print_summary(ranked, args)
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"energy_sweep_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "config": vars(args), "results": ranked}, f, indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Energy Telemetry - GPU power sampled in the background and integrated over a run
+Power comes from NVML (pynvml), nvidia-smi, or a fake provider driven by a
+callable for mock runs; a sampler thread keeps a (time, watts) series and
+energy over any interval is its trapezoidal integral, giving tokens per
+joule and joules per request next to throughput
+"""
+
+import time
+import threading
+import subprocess
+from collections import deque
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+try:
+    import pynvml
+except ImportError:
+    pynvml = None
+
+
+class NvmlPowerProvider:
+    """Board power of the selected GPUs from NVML, summed"""
+
+    name = "nvml"
+    min_interval_s = 0.0
+
+    def __init__(self, gpu_indices: Optional[List[int]] = None):
+        if pynvml is None:
+            raise RuntimeError("pynvml is not installed (pip install nvidia-ml-py)")
+        pynvml.nvmlInit()
+        count = pynvml.nvmlDeviceGetCount()
+        self.handles = [pynvml.nvmlDeviceGetHandleByIndex(i) for i in (gpu_indices or range(count))]
+
+    def read_watts(self) -> float:
+        return sum(pynvml.nvmlDeviceGetPowerUsage(h) for h in self.handles) / 1000.0
+
+    def close(self):
+        pynvml.nvmlShutdown()
+
+
+class NvidiaSmiPowerProvider:
+    """power.draw from nvidia-smi; a process per sample, so samplers never go below ``min_interval_s``"""
+
+    name = "nvidia-smi"
+    min_interval_s = 0.5
+
+    def __init__(self, gpu_indices: Optional[List[int]] = None):
+        self.command = ["nvidia-smi", "--query-gpu=power.draw", "--format=csv,noheader,nounits"]
+        if gpu_indices:
+            self.command.append(f"--id={','.join(str(i) for i in gpu_indices)}")
+        self.read_watts()
+
+    def read_watts(self) -> float:
+        output = subprocess.run(self.command, capture_output=True, text=True, timeout=5, check=True).stdout
+        return sum(float(line) for line in output.split() if line.strip() and line.strip() != "[N/A]")
+
+    def close(self):
+        pass
+
+
+class FakePowerProvider:
+    """Synthetic power for mocks: ``idle_w`` plus ``watts_per_unit`` × ``load()`` (e.g. running requests)"""
+
+    name = "fake"
+    min_interval_s = 0.0
+
+    def __init__(self, load: Callable[[], float] = lambda: 0.0, idle_w: float = 60.0, watts_per_unit: float = 40.0,
+                 max_w: float = 575.0):
+        self.load = load
+        self.idle_w = idle_w
+        self.watts_per_unit = watts_per_unit
+        self.max_w = max_w
+
+    def read_watts(self) -> float:
+        return min(self.max_w, self.idle_w + self.watts_per_unit * self.load())
+
+    def close(self):
+        pass
+
+
+def build_power_provider(kind: str = "auto", gpu_indices: Optional[List[int]] = None, **fake_kwargs) -> Optional[Any]:
+    """Provider by name; ``auto`` tries NVML then nvidia-smi and returns None when neither works"""
+    if kind == "none":
+        return None
+    if kind == "fake":
+        return FakePowerProvider(**fake_kwargs)
+    if kind in ("auto", "nvml"):
+        try:
+            return NvmlPowerProvider(gpu_indices)
+        except Exception:
+            if kind == "nvml":
+                raise
+    if kind in ("auto", "nvidia-smi"):
+        try:
+            return NvidiaSmiPowerProvider(gpu_indices)
+        except Exception:
+            if kind == "nvidia-smi":
+                raise
+    return None
+
+
+class PowerSampler:
+    """Background thread sampling ``provider`` every ``interval_s``; usable as a context manager.
+
+    The interval is raised to the provider's ``min_interval_s``.
+    ``max_samples`` bounds the series for long runs that only integrate
+    recent intervals (the soak test).
+    """
+
+    def __init__(self, provider: Any, interval_s: float = 0.1, max_samples: Optional[int] = None):
+        self.provider = provider
+        self.interval_s = max(interval_s, getattr(provider, "min_interval_s", 0.0))
+        self.samples: deque = deque(maxlen=max_samples)
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                watts = self.provider.read_watts()
+            except Exception:
+                self.errors += 1
+            else:
+                with self._lock:
+                    self.samples.append((time.perf_counter(), watts))
+            self._stop.wait(self.interval_s)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="power-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        """Stop sampling and release the provider"""
+        self.stop()
+        self.provider.close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def window(self, start: float, end: float) -> List[Tuple[float, float]]:
+        """Samples in [start, end] plus the neighbours just outside, so the integral covers the whole span"""
+        with self._lock:
+            samples = list(self.samples)
+        inside = [s for s in samples if start <= s[0] <= end]
+        before = [s for s in samples if s[0] < start][-1:]
+        after = [s for s in samples if s[0] > end][:1]
+        return before + inside + after
+
+    def energy_j(self, start: float, end: float) -> Optional[float]:
+        """Trapezoidal integral of power over [start, end] (perf_counter seconds)"""
+        samples = self.window(start, end)
+        if not samples:
+            return None
+        if len(samples) == 1:
+            return samples[0][1] * (end - start)
+        joules = 0.0
+        for (t0, w0), (t1, w1) in zip(samples, samples[1:]):
+            lo, hi = max(t0, start), min(t1, end)
+            if hi <= lo:
+                continue
+            # Linear interpolation of the power at the clipped ends
+            slope = (w1 - w0) / (t1 - t0) if t1 > t0 else 0.0
+            joules += (w0 + slope * (lo - t0) + w0 + slope * (hi - t0)) / 2 * (hi - lo)
+        # Flat extension when the samples do not reach the ends of the span
+        if samples[0][0] > start:
+            joules += samples[0][1] * (samples[0][0] - start)
+        if samples[-1][0] < end:
+            joules += samples[-1][1] * (end - samples[-1][0])
+        return joules
+
+    def energy_report(self, start: float, end: float, tokens: int, requests: int) -> Dict[str, Any]:
+        """Energy, mean/peak power and the efficiency ratios for one run"""
+        joules = self.energy_j(start, end)
+        watts = [w for t, w in self.window(start, end) if start <= t <= end]
+        if joules is None:
+            return {"energy_j": None, "provider": self.provider.name}
+        return {
+            "provider": self.provider.name,
+            "energy_j": joules,
+            "mean_power_w": joules / (end - start) if end > start else None,
+            "peak_power_w": max(watts) if watts else None,
+            "power_samples": len(watts),
+            "tokens_per_joule": tokens / joules if joules > 0 else None,
+            "joules_per_request": joules / requests if requests else None,
+            "joules_per_token": joules / tokens if tokens else None,
+        }
+
+
+def format_energy(report: Optional[Dict[str, Any]]) -> str:
+    """'1234 J, 2.31 tok/J, 45.6 J/req @ 310 W' or 'n/a'"""
+    if not report or report.get("energy_j") is None:
+        return "n/a"
+    parts = [f"{report['energy_j']:.0f} J"]
+    if report.get("tokens_per_joule") is not None:
+        parts.append(f"{report['tokens_per_joule']:.2f} tok/J")
+    if report.get("joules_per_request") is not None:
+        parts.append(f"{report['joules_per_request']:.1f} J/req")
+    if report.get("mean_power_w") is not None:
+        parts[-1] += f" @ {report['mean_power_w']:.0f} W"
+    return ", ".join(parts)
+
+
+def start_power_sampler(kind: str = "auto", interval_s: float = 0.1, gpu_indices: Optional[List[int]] = None,
+                        max_samples: Optional[int] = None) -> Optional[PowerSampler]:
+    """A running sampler for ``kind``, or None when no power source is available (``auto`` without a GPU)"""
+    provider = build_power_provider(kind, gpu_indices)
+    if provider is None:
+        return None
+    sampler = PowerSampler(provider, interval_s, max_samples)
+    sampler.start()
+    return sampler
+
+
+def energy_fields(power: Optional[PowerSampler], start: float, end: float, tokens: int,
+                  requests: int) -> Dict[str, Any]:
+    """Flat energy columns for one result row; empty without a sampler"""
+    if power is None:
+        return {}
+    report = power.energy_report(start, end, tokens, requests)
+    return {key: report.get(key) for key in ("energy_j", "mean_power_w", "tokens_per_joule", "joules_per_request")}
+
+
+def add_power_arguments(parser):
+    """--power/--power-interval-s, shared by every benchmark entry point"""
+    parser.add_argument("--power", choices=["auto", "nvml", "nvidia-smi", "none"], default="auto",
+                        help="GPU power source for tokens/joule (auto skips it when there is no GPU)")
+    parser.add_argument("--power-interval-s", type=float, default=0.1,
+                        help="Power sampling interval (nvidia-smi never samples faster than 0.5s)")
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Fault Injection Check - how the load harness accounts for each injected fault
+Forces every fault kind of the mock server in turn and reports whether
+LoadEngine records it as a failure, its latency and its token counts, so
+harness blind spots (e.g. a reset stream counted as a success) show up
+"""
+
+import json
+import asyncio
+import argparse
+import statistics
+import aiohttp
+from datetime import datetime
+from typing import List, Dict, Any
+
+from load_engine import LoadEngine
+from outcome_stats import outcome_counts, format_outcomes
+from mock_openai_server import FAULT_KINDS, MockOpenAIServer
+
+# Faults after which a request must not count as a complete success
+MUST_FAIL = {"error_5xx", "reset", "stall"}
+
+
+async def set_faults(base_url: str, schedule: Dict[str, Any]):
+    async with aiohttp.ClientSession() as session:
+        async with session.post(f"{base_url}/faults", json=schedule) as response:
+            response.raise_for_status()
+
+
+def check_records(kind: str, stream: bool, records: List[Dict[str, Any]], max_tokens: int) -> Dict[str, Any]:
+    ok = [r for r in records if r["success"]]
+    latencies = [r["total_ms"] for r in records]
+    # A success without usage is accounted for when it is flagged as such
+    wrong_tokens = [r for r in ok if r["completion_tokens"] != max_tokens and not r.get("usage_missing")]
+    misaccounted = len(ok) if kind in MUST_FAIL else len(wrong_tokens)
+    return {
+        "fault": kind,
+        "stream": stream,
+        "requests": len(records),
+        "recorded_success": len(ok),
+        "outcomes": outcome_counts(records),
+        "usage_missing": sum(1 for r in ok if r.get("usage_missing")),
+        "errors": sorted({r["error"] for r in records if r["error"]}),
+        "median_total_ms": statistics.median(latencies) if latencies else None,
+        "max_total_ms": max(latencies) if latencies else None,
+        "success_with_wrong_token_count": len(wrong_tokens),
+        "misaccounted": misaccounted,
+    }
+
+
+async def run_check(args) -> List[Dict[str, Any]]:
+    server = MockOpenAIServer(port=args.mock_port, ttft_ms=20.0, itl_ms=5.0, max_running=64)
+    await server.start()
+    results = []
+    try:
+        async with LoadEngine(server.base_url, args.model, timeout=args.timeout) as engine:
+            for kind in ["none", *FAULT_KINDS]:
+                rates = {} if kind == "none" else {kind: 1.0}
+                await set_faults(server.base_url, {"rates": rates, "seed": args.seed, "stall_ms": args.stall_ms,
+                                                   "first_byte_delay_ms": args.first_byte_delay_ms})
+                for stream in (True, False):
+                    payloads = [engine.build_payload(f"Fault check {kind} {i}", args.max_tokens, stream=stream)
+                                for i in range(args.requests)]
+                    records = await engine.run_closed_loop(payloads, args.requests)
+                    result = check_records(kind, stream, records, args.max_tokens)
+                    results.append(result)
+                    flag = "❌" if result["misaccounted"] else "✅"
+                    print(f"  {flag} {kind:<16} {'stream' if stream else 'json':<6} "
+                          f"success {result['recorded_success']:>3}/{result['requests']}  "
+                          f"median {result['median_total_ms']:7.0f}ms  misaccounted {result['misaccounted']}  "
+                          f"{format_outcomes(result['outcomes'])}")
+    finally:
+        await server.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check harness accounting under injected server faults")
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--requests", type=int, default=20, help="Requests per fault kind and mode")
+    parser.add_argument("--max-tokens", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=5.0, help="Client timeout (stalls longer than this time out)")
+    parser.add_argument("--stall-ms", type=float, default=10000.0)
+    parser.add_argument("--first-byte-delay-ms", type=float, default=500.0)
+    parser.add_argument("--mock-port", type=int, default=9220)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("🚀 Fault Injection Check")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    results = asyncio.run(run_check(args))
+
+    misaccounted = sum(r["misaccounted"] for r in results)
+    print(f"\n{'⚠️' if misaccounted else '🏆'} {misaccounted} misaccounted requests across {len(results)} checks")
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"fault_injection_check_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "config": vars(args), "results": results}, f, indent=2)
+    print(f"💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
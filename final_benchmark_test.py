@@ -11,7 +11,17 @@ import statistics
 from datetime import datetime
 import subprocess
 
-def test_configuration(port, name, num_tests=20):
+from outcome_stats import classify_status, classify_exception, summarize_outcomes, format_outcomes, format_percentile
+from warmup_detector import completion_probe, warmup_until_steady, trim_to_steady_state
+from energy_telemetry import start_power_sampler, energy_fields, format_energy
+
+def record_attempt(results, test, start, outcome, **values):
+    """Keep every attempt with its outcome class, failures included"""
+    attempt = {'test': test, 'outcome': outcome, 'total_ms': (time.perf_counter() - start) * 1000}
+    attempt.update(values)
+    results['attempts'].append(attempt)
+
+def test_configuration(port, name, num_tests=20, power=None):
     """Test a single configuration"""
     base_url = f"http://localhost:{port}"
     results = {
@@ -21,21 +31,18 @@ def test_configuration(port, name, num_tests=20):
         'medium_latencies': [],
         'medium_throughputs': [],
         'ttfts': [],
-        'korean_throughputs': []
+        'korean_throughputs': [],
+        'attempts': [],
+        'generated_tokens': 0,
+        'completed_requests': 0
     }
 
-    # Warmup
+    # Warmup until single-request latency stops moving (torch.compile / CUDA graph capture)
     print(f"🔥 Warming up {name}...")
-    for _ in range(3):
-        try:
-            requests.post(
-                f"{base_url}/v1/completions",
-                json={"model": "Qwen/Qwen3-32B-AWQ", "prompt": "Hi", "max_tokens": 5},
-                timeout=10
-            )
-            time.sleep(0.5)
-        except:
-            pass
+    probe = completion_probe(base_url, "Qwen/Qwen3-32B-AWQ", prompt="Hi", max_tokens=5, timeout=10)
+    results['warmup'] = warmup_until_steady(probe, [1])
+    print(f"  Warmup took {results['warmup']['warmup_s']:.1f}s ({results['warmup']['requests']} requests)")
+    window_start = time.perf_counter()
 
     # Test 1: Short response latency (20 runs)
     print(f"📊 Testing short response latency...")
@@ -55,10 +62,25 @@ def test_configuration(port, name, num_tests=20):
             if response.status_code == 200:
                 latency = (time.perf_counter() - start) * 1000
                 results['short_latencies'].append(latency)
+                results['generated_tokens'] += response.json().get('usage', {}).get('completion_tokens', 0)
+                results['completed_requests'] += 1
+                record_attempt(results, 'short', start, 'ok')
                 print(f"  Run {i+1}/{num_tests}: {latency:.0f}ms")
+            else:
+                record_attempt(results, 'short', start, classify_status(response.status_code))
+                print(f"  Error: Status {response.status_code}")
         except Exception as e:
+            record_attempt(results, 'short', start, classify_exception(e))
             print(f"  Error: {e}")
 
+    # Only trim when the warmup gave up before converging; after a converged warmup the
+    # early samples are ordinary noise and trimming them would bias the mean low
+    results['short_dropped'] = 0
+    if not results['warmup']['converged']:
+        results['short_latencies'], results['short_dropped'] = trim_to_steady_state(results['short_latencies'])
+    if results['short_dropped']:
+        print(f"  Excluded {results['short_dropped']} pre-convergence samples")
+
     # Test 2: Medium response throughput (10 runs)
     print(f"📊 Testing medium response throughput...")
     for i in range(10):
@@ -81,8 +103,15 @@ def test_configuration(port, name, num_tests=20):
                 throughput = tokens / elapsed
                 results['medium_latencies'].append(elapsed * 1000)
                 results['medium_throughputs'].append(throughput)
+                results['generated_tokens'] += tokens
+                results['completed_requests'] += 1
+                record_attempt(results, 'medium', start, 'ok')
                 print(f"  Run {i+1}/10: {throughput:.2f} tok/s")
+            else:
+                record_attempt(results, 'medium', start, classify_status(response.status_code))
+                print(f"  Error: Status {response.status_code}")
         except Exception as e:
+            record_attempt(results, 'medium', start, classify_exception(e))
             print(f"  Error: {e}")
 
     # Test 3: TTFT (10 runs)
@@ -102,13 +131,26 @@ def test_configuration(port, name, num_tests=20):
                 stream=True,
                 timeout=10
             )
+            if response.status_code != 200:
+                record_attempt(results, 'ttft', start, classify_status(response.status_code))
+                print(f"  Error: Status {response.status_code}")
+                continue
             for line in response.iter_lines():
                 if line:
                     ttft = (time.perf_counter() - start) * 1000
                     results['ttfts'].append(ttft)
+                    # The stream is dropped after the first token, so only that token counts
+                    results['generated_tokens'] += 1
+                    results['completed_requests'] += 1
+                    record_attempt(results, 'ttft', start, 'ok', first_token_ms=ttft)
                     print(f"  Run {i+1}/10: {ttft:.0f}ms")
                     break
+            else:
+                record_attempt(results, 'ttft', start, 'reset')
+                print(f"  Error: stream closed before the first token")
         except Exception as e:
+            # A timeout here is a TTFT of at least the elapsed time (censored sample)
+            record_attempt(results, 'ttft', start, classify_exception(e))
             print(f"  Error: {e}")
 
     # Test 4: Korean processing (5 runs)
@@ -132,10 +174,20 @@ def test_configuration(port, name, num_tests=20):
                 tokens = data.get('usage', {}).get('completion_tokens', 30)
                 throughput = tokens / elapsed
                 results['korean_throughputs'].append(throughput)
+                results['generated_tokens'] += tokens
+                results['completed_requests'] += 1
+                record_attempt(results, 'korean', start, 'ok')
                 print(f"  Run {i+1}/5: {throughput:.2f} tok/s")
+            else:
+                record_attempt(results, 'korean', start, classify_status(response.status_code))
+                print(f"  Error: Status {response.status_code}")
         except Exception as e:
+            record_attempt(results, 'korean', start, classify_exception(e))
             print(f"  Error: {e}")
 
+    # Energy over the four measured tests, warmup excluded
+    results['energy'] = energy_fields(power, window_start, time.perf_counter(),
+                                      results['generated_tokens'], results['completed_requests'])
     return results
 
 def calculate_stats(values):
@@ -164,6 +216,9 @@ def main():
     ]
 
     all_results = []
+    power = start_power_sampler()
+    if power:
+        print(f"🔋 Sampling GPU power via {power.provider.name}")
 
     for port, name in configs:
         print(f"\n{'='*60}")
@@ -174,12 +229,14 @@ def main():
             # Check if accessible
             response = requests.get(f"http://localhost:{port}/health", timeout=2)
             if response.status_code == 200:
-                results = test_configuration(port, name)
+                results = test_configuration(port, name, power=power)
                 all_results.append(results)
             else:
                 print(f"❌ {name} not healthy")
         except Exception as e:
             print(f"❌ {name} not accessible: {e}")
+    if power:
+        power.close()
 
     # Generate CSV report
     print("\n" + "="*80)
@@ -193,6 +250,10 @@ def main():
         medium_stats = calculate_stats(r['medium_throughputs'])
         ttft_stats = calculate_stats(r['ttfts'])
         korean_stats = calculate_stats(r['korean_throughputs'])
+        # Timeouts count as censored latencies instead of disappearing from the percentiles
+        short_outcomes = summarize_outcomes([a for a in r['attempts'] if a['test'] == 'short'])
+        ttft_outcomes = summarize_outcomes([a for a in r['attempts'] if a['test'] == 'ttft'], key='first_token_ms')
+        all_outcomes = summarize_outcomes(r['attempts'])
 
         row = {
             'Configuration': r['name'],
@@ -200,26 +261,42 @@ def main():
             'Short_Avg_Latency_ms': round(short_stats.get('mean', 0), 1),
             'Short_Min_Latency_ms': round(short_stats.get('min', 0), 1),
             'Short_P95_Latency_ms': round(short_stats.get('p95', 0), 1),
+            'Short_P95_Censored_ms': format_percentile(short_outcomes, 95),
             'Medium_Avg_Throughput_tps': round(medium_stats.get('mean', 0), 2),
             'Medium_Min_Throughput_tps': round(medium_stats.get('min', 0), 2),
             'Medium_Max_Throughput_tps': round(medium_stats.get('max', 0), 2),
             'TTFT_Avg_ms': round(ttft_stats.get('mean', 0), 1),
             'TTFT_Min_ms': round(ttft_stats.get('min', 0), 1),
             'TTFT_P95_ms': round(ttft_stats.get('p95', 0), 1),
+            'TTFT_P95_Censored_ms': format_percentile(ttft_outcomes, 95),
             'Korean_Avg_Throughput_tps': round(korean_stats.get('mean', 0), 2),
             'Test_Runs_Short': len(r['short_latencies']),
             'Test_Runs_Medium': len(r['medium_throughputs']),
             'Test_Runs_TTFT': len(r['ttfts']),
-            'Test_Runs_Korean': len(r['korean_throughputs'])
+            'Test_Runs_Korean': len(r['korean_throughputs']),
+            'Short_Dropped_Warmup': r['short_dropped'],
+            'Warmup_s': round(r['warmup']['warmup_s'], 1),
+            'Warmup_Requests': r['warmup']['requests'],
+            'Warmup_Converged': r['warmup']['converged'],
+            'Attempts': all_outcomes['requests'],
+            'Error_Rate': round(all_outcomes['error_rate'], 3),
+            'Outcomes': format_outcomes(all_outcomes['outcomes']),
+            'Energy_J': r['energy'].get('energy_j'),
+            'Mean_Power_W': r['energy'].get('mean_power_w'),
+            'Tokens_Per_Joule': r['energy'].get('tokens_per_joule'),
+            'Joules_Per_Request': r['energy'].get('joules_per_request')
         }
         csv_data.append(row)
 
         # Print summary
         print(f"\n{r['name']}:")
         print(f"  📌 Short Response: {row['Short_Avg_Latency_ms']}ms (min: {row['Short_Min_Latency_ms']}ms)")
-        print(f"  📈 Throughput: {row['Medium_Avg_Throughput_tps']} tok/s")
-        print(f"  ⏱️ TTFT: {row['TTFT_Avg_ms']}ms (min: {row['TTFT_Min_ms']}ms)")
+        print(f"  📈 Throughput: {row['Medium_Avg_Throughput_tps']} tok/s ({row['Outcomes']})")
+        print(f"  ⏱️ TTFT: {row['TTFT_Avg_ms']}ms (min: {row['TTFT_Min_ms']}ms, "
+              f"p95 censored: {row['TTFT_P95_Censored_ms']}ms)")
         print(f"  🇰🇷 Korean: {row['Korean_Avg_Throughput_tps']} tok/s")
+        if r['energy']:
+            print(f"  🔋 Energy: {format_energy(r['energy'])}")
 
     # Save CSV
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Harness Calibration - how fast can the client go against a server that costs nothing?
+Runs each load pattern against an in-process zero-latency OpenAI-compatible
+endpoint to measure the harness's own request rate, SSE chunk rate and added
+latency, then flags real results that come within a margin of those ceilings
+as client-bound rather than server-bound
+"""
+
+import json
+import asyncio
+import argparse
+import threading
+import statistics
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+from load_engine import LoadEngine
+from mock_openai_server import MockOpenAIServer
+from outcome_stats import format_outcomes, outcome_counts
+
+# (concurrency, max_tokens) - the concurrent stress test scenarios
+DEFAULT_PATTERNS = [(1, 100), (2, 100), (5, 100), (10, 100), (20, 100), (5, 500), (10, 500), (5, 1000)]
+
+
+class NullServer:
+    """Zero-latency mock server on a background thread with its own event loop.
+
+    Running it off the client's event loop keeps the server's work from
+    being charged to the client's scheduling; it still shares the GIL, so
+    the measured ceilings are slightly conservative.
+    """
+
+    def __init__(self, port: int = 9230, model: str = "Qwen/Qwen3-32B-AWQ"):
+        self.server = MockOpenAIServer(port=port, model=model, ttft_ms=0.0, itl_ms=0.0, prefill_ms_per_token=0.0,
+                                       max_running=100000, batch_penalty=0.0, name="null")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return self.server.base_url
+
+    def start(self):
+        ready = threading.Event()
+        errors: List[BaseException] = []
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            try:
+                self._loop.run_until_complete(self.server.start())
+            except BaseException as e:
+                errors.append(e)
+                ready.set()
+                return
+            ready.set()
+            self._loop.run_forever()
+            self._loop.run_until_complete(self.server.stop())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=serve, name="null-server", daemon=True)
+        self._thread.start()
+        ready.wait()
+        if errors:
+            raise errors[0]
+
+    def stop(self):
+        if self._loop is not None and self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop = None
+            self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+async def measure_pattern(base_url: str, model: str, concurrency: int, max_tokens: int, stream: bool,
+                          requests: int, timeout: float = 120.0) -> Dict[str, Any]:
+    """Closed-loop run of one pattern; rates are per second of wall time"""
+    async with LoadEngine(base_url, model, timeout=timeout, max_connections=0) as engine:
+        payloads = [engine.build_payload(f"Calibration request {i}: write a story", max_tokens, stream=stream)
+                    for i in range(requests)]
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        records = await engine.run_closed_loop(payloads, concurrency)
+        elapsed = loop.time() - start
+
+    ok = [r for r in records if r["success"]]
+    totals = [r["total_ms"] for r in ok]
+    ttfts = [r["first_token_ms"] for r in ok if r.get("first_token_ms") is not None]
+    chunks = sum(len(r["token_times_ms"]) for r in ok)
+    return {
+        "concurrency": concurrency,
+        "max_tokens": max_tokens,
+        "stream": stream,
+        "requests": len(records),
+        "outcomes": outcome_counts(records),
+        "elapsed_s": elapsed,
+        "requests_per_s": len(ok) / elapsed if elapsed > 0 else 0.0,
+        "chunks_per_s": chunks / elapsed if elapsed > 0 and stream else None,
+        "tokens_per_s": sum(r["completion_tokens"] for r in ok) / elapsed if elapsed > 0 else 0.0,
+        "p50_total_ms": statistics.median(totals) if totals else None,
+        "p50_first_token_ms": statistics.median(ttfts) if ttfts else None,
+    }
+
+
+def client_bound_reasons(result: Dict[str, Any], ceiling: Dict[str, Any], margin: float = 0.8) -> List[str]:
+    """Why ``result`` may be limited by the client rather than the server (empty if it is not).
+
+    A run is client-bound when its request or chunk rate reaches ``margin``
+    of the harness ceiling, or when the harness's own latency at that
+    pattern is more than ``1 - margin`` of the measured latency.
+    """
+    reasons = []
+    for key, label in (("requests_per_s", "request rate"), ("chunks_per_s", "SSE chunk rate")):
+        value, limit = result.get(key), ceiling.get(key)
+        if value and limit and value >= margin * limit:
+            reasons.append(f"{label} at {value / limit:.0%} of the harness ceiling")
+    overhead, measured = ceiling.get("p50_total_ms"), result.get("p50_total_ms")
+    if overhead and measured and overhead >= (1 - margin) * measured:
+        reasons.append(f"harness adds {overhead:.1f}ms of the {measured:.1f}ms median latency")
+    return reasons
+
+
+async def calibrate(patterns: List[Tuple[int, int]], modes: List[bool], args) -> Dict[str, Dict[str, Any]]:
+    """Harness ceilings per pattern, keyed like ``pattern_key``"""
+    ceilings = {}
+    with NullServer(args.null_port, args.model) as null:
+        for concurrency, max_tokens in patterns:
+            for stream in modes:
+                requests = max(args.min_requests, concurrency * args.rounds)
+                ceiling = await measure_pattern(null.base_url, args.model, concurrency, max_tokens, stream, requests)
+                ceilings[pattern_key(concurrency, max_tokens, stream)] = ceiling
+                chunk_rate = f"{ceiling['chunks_per_s']:9.0f} chunks/s" if stream else " " * 18
+                print(f"  🧪 c={concurrency:<3} tokens={max_tokens:<5} {'stream' if stream else 'json':<6} "
+                      f"{ceiling['requests_per_s']:8.1f} req/s  {chunk_rate}  "
+                      f"added latency p50 {ceiling['p50_total_ms'] or 0:7.1f}ms")
+    return ceilings
+
+
+def pattern_key(concurrency: int, max_tokens: int, stream: bool) -> str:
+    return f"c{concurrency}_t{max_tokens}_{'stream' if stream else 'json'}"
+
+
+async def compare_backend(patterns: List[Tuple[int, int]], modes: List[bool], ceilings: Dict[str, Dict[str, Any]],
+                          args) -> List[Dict[str, Any]]:
+    results = []
+    for concurrency, max_tokens in patterns:
+        for stream in modes:
+            requests = max(args.min_requests, concurrency * args.rounds)
+            result = await measure_pattern(args.backend, args.model, concurrency, max_tokens, stream, requests,
+                                           args.timeout)
+            ceiling = ceilings[pattern_key(concurrency, max_tokens, stream)]
+            result["client_bound"] = client_bound_reasons(result, ceiling, args.margin)
+            results.append(result)
+            flag = "⚠️ client-bound" if result["client_bound"] else "✅ server-bound"
+            print(f"  c={concurrency:<3} tokens={max_tokens:<5} {'stream' if stream else 'json':<6} "
+                  f"{result['requests_per_s']:7.2f} req/s (ceiling {ceiling['requests_per_s']:.0f})  "
+                  f"{result['tokens_per_s']:8.1f} tok/s  {flag}  [{format_outcomes(result['outcomes'])}]")
+            for reason in result["client_bound"]:
+                print(f"      ↳ {reason}")
+    return results
+
+
+def parse_patterns(specs: List[str]) -> List[Tuple[int, int]]:
+    patterns = []
+    for spec in specs:
+        concurrency, _, max_tokens = spec.partition(":")
+        patterns.append((int(concurrency), int(max_tokens or 100)))
+    return patterns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the load harness's own ceilings against a null server")
+    parser.add_argument("--backend", help="Real server base URL to compare against the ceilings")
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--patterns", nargs="+", help="concurrency:max_tokens pairs (default: stress test scenarios)")
+    parser.add_argument("--modes", nargs="+", default=["stream", "json"], choices=["stream", "json"])
+    parser.add_argument("--rounds", type=int, default=10, help="Requests per pattern = concurrency × rounds")
+    parser.add_argument("--min-requests", type=int, default=50)
+    parser.add_argument("--margin", type=float, default=0.8, help="Fraction of a ceiling that counts as client-bound")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--null-port", type=int, default=9230)
+    args = parser.parse_args()
+
+    patterns = parse_patterns(args.patterns) if args.patterns else DEFAULT_PATTERNS
+    modes = [mode == "stream" for mode in args.modes]
+
+    print("🚀 Harness Calibration")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("\n📏 Harness ceilings (zero-latency server):")
+    ceilings = asyncio.run(calibrate(patterns, modes, args))
+
+    results = []
+    if args.backend:
+        print(f"\n📊 {args.backend} against the ceilings (margin {args.margin:.0%}):")
+        results = asyncio.run(compare_backend(patterns, modes, ceilings, args))
+        bound = sum(1 for r in results if r["client_bound"])
+        print(f"\n{'⚠️' if bound else '🏆'} {bound}/{len(results)} patterns are client-bound")
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"harness_calibration_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "config": vars(args), "ceilings": ceilings, "results": results}, f,
+                  indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,10 @@ import requests
 import json
 from datetime import datetime
 
-def heavy_generation_test(port=8000):
+from energy_telemetry import start_power_sampler
+from outcome_stats import classify_status, classify_exception, outcome_counts, format_outcomes
+
+def heavy_generation_test(port=8000, power=None):
     """Test with multiple requests to generate thousands of tokens"""
 
     url = f"http://localhost:{port}/v1/completions"
@@ -49,7 +52,9 @@ def heavy_generation_test(port=8000):
 
     total_tokens_generated = 0
     total_time_spent = 0
+    total_energy = 0.0
     results = []
+    attempts = []
 
     for scenario in test_scenarios:
         print(f"\n{'='*60}")
@@ -59,7 +64,9 @@ def heavy_generation_test(port=8000):
 
         scenario_tokens = 0
         scenario_time = 0
+        scenario_energy = 0.0
         speeds = []
+        scenario_attempts = []
 
         for run in range(scenario['runs']):
             print(f"\n  Run {run+1}/{scenario['runs']}:")
@@ -85,58 +92,76 @@ def heavy_generation_test(port=8000):
                     data = response.json()
                     usage = data.get("usage", {})
                     completion_tokens = usage.get("completion_tokens", 0)
+                    scenario_attempts.append({"outcome": "ok"})
 
                     speed = completion_tokens / elapsed if elapsed > 0 else 0
                     speeds.append(speed)
 
                     scenario_tokens += completion_tokens
                     scenario_time += elapsed
+                    # Only the request itself; the pause between runs is idle draw
+                    scenario_energy += (power.energy_j(start_time, end_time) or 0.0) if power else 0.0
 
                     print(f"    ✅ Generated: {completion_tokens} tokens")
                     print(f"    ⏱️  Time: {elapsed:.2f}s")
                     print(f"    🚀 Speed: {speed:.2f} tok/s")
                 else:
+                    scenario_attempts.append({"outcome": classify_status(response.status_code)})
                     print(f"    ❌ Failed: {response.status_code}")
 
                 time.sleep(1)  # Brief pause between runs
 
             except Exception as e:
+                scenario_attempts.append({"outcome": classify_exception(e)})
                 print(f"    ❌ Error: {e}")
 
+        attempts.extend(scenario_attempts)
+        scenario_outcomes = outcome_counts(scenario_attempts)
         if speeds:
             avg_speed = sum(speeds) / len(speeds)
             print(f"\n  📊 Scenario Summary:")
             print(f"    Total tokens: {scenario_tokens}")
             print(f"    Total time: {scenario_time:.2f}s")
-            print(f"    Average speed: {avg_speed:.2f} tok/s")
+            print(f"    Average speed: {avg_speed:.2f} tok/s ({format_outcomes(scenario_outcomes)})")
             print(f"    Min speed: {min(speeds):.2f} tok/s")
             print(f"    Max speed: {max(speeds):.2f} tok/s")
+            if scenario_energy:
+                print(f"    Energy: {scenario_energy:.0f} J, {scenario_tokens / scenario_energy:.2f} tok/J")
 
             results.append({
                 "scenario": scenario['name'],
                 "tokens": scenario_tokens,
                 "time": scenario_time,
                 "avg_speed": avg_speed,
-                "runs": len(speeds)
+                "runs": len(speeds),
+                "outcomes": scenario_outcomes,
+                "energy_j": scenario_energy if power else None,
+                "tokens_per_joule": scenario_tokens / scenario_energy if scenario_energy else None
             })
 
             total_tokens_generated += scenario_tokens
             total_time_spent += scenario_time
+            total_energy += scenario_energy
+        else:
+            print(f"\n  ❌ No successful runs ({format_outcomes(scenario_outcomes)})")
 
     # Final summary
     print("\n" + "="*60)
     print("🏁 FINAL RESULTS")
     print("="*60)
     print(f"\n📊 Overall Performance:")
+    print(f"  Outcomes: {format_outcomes(outcome_counts(attempts))}")
     print(f"  Total tokens generated: {total_tokens_generated}")
     print(f"  Total time: {total_time_spent:.2f} seconds")
     print(f"  Overall speed: {total_tokens_generated/total_time_spent:.2f} tok/s")
     print(f"  Throughput: {total_tokens_generated/total_time_spent*60:.0f} tokens/minute")
+    if total_energy:
+        print(f"  Energy: {total_energy:.0f} J, {total_tokens_generated/total_energy:.2f} tok/J")
 
     print(f"\n📈 Per-Scenario Results:")
     for r in results:
         print(f"  {r['scenario']}:")
-        print(f"    Average: {r['avg_speed']:.2f} tok/s over {r['runs']} runs")
+        print(f"    Average: {r['avg_speed']:.2f} tok/s over {r['runs']} runs ({format_outcomes(r['outcomes'])})")
 
     # Performance rating
     overall_speed = total_tokens_generated/total_time_spent if total_time_spent > 0 else 0
@@ -161,6 +186,9 @@ def heavy_generation_test(port=8000):
             "total_tokens": total_tokens_generated,
             "total_time": total_time_spent,
             "overall_speed": overall_speed,
+            "outcomes": outcome_counts(attempts),
+            "energy_j": total_energy if power else None,
+            "tokens_per_joule": total_tokens_generated / total_energy if total_energy else None,
             "scenarios": results
         }, f, indent=2)
 
@@ -177,7 +205,12 @@ def main():
     except:
         print("⚠️  Server may not be ready, but continuing...\n")
 
-    heavy_generation_test()
+    power = start_power_sampler()
+    try:
+        heavy_generation_test(power=power)
+    finally:
+        if power:
+            power.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Latency Breakdown Test - How much of the short-request latency is transport?
+Replays the "The capital of France is" probe with fresh and pooled connections
+"""
+
+import csv
+import json
+import asyncio
+import argparse
+import statistics
+from datetime import datetime
+from typing import List, Dict, Any
+
+from load_engine import LoadEngine
+
+BASELINE_CSV = "comparison_20250916_154056.csv"
+
+# (label, force_close, stream)
+MODES = [
+    ("fresh_connection", True, False),    # what requests.post without a Session does
+    ("reused_connection", False, False),  # keep-alive pool
+    ("reused_streaming", False, True),    # keep-alive pool, exposes the first token
+]
+
+
+def phase_breakdown(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Split each request into transport, server wait and generation phases"""
+    ok = [r for r in records if r.get("success") and r.get("headers_sent_ms") is not None]
+    if not ok:
+        return {}
+
+    def avg(values):
+        return statistics.mean(values) if values else 0.0
+
+    connect = [r["connect_ms"] for r in ok]
+    # Setup is everything before the headers go out: DNS, pool wait and connect
+    setup = [r["headers_sent_ms"] for r in ok]
+    write = [r["request_sent_ms"] - r["headers_sent_ms"] for r in ok]
+    server_wait = [r["first_byte_ms"] - r["request_sent_ms"] for r in ok if r.get("first_byte_ms") is not None]
+    first_token = [r["first_token_ms"] - r["first_byte_ms"] for r in ok
+                   if r.get("first_token_ms") is not None and r.get("first_byte_ms") is not None]
+    generation = [r["total_ms"] - r["first_token_ms"] for r in ok if r.get("first_token_ms") is not None]
+    totals = [r["total_ms"] for r in ok]
+
+    transport = avg(setup) + avg(write)
+    return {
+        "samples": len(ok),
+        "connection_reuse_rate": sum(1 for r in ok if r.get("connection_reused")) / len(ok),
+        "avg_dns_ms": avg([r["dns_ms"] for r in ok]),
+        "avg_connect_ms": avg(connect),
+        "avg_setup_ms": avg(setup),
+        "avg_request_write_ms": avg(write),
+        "avg_server_wait_ms": avg(server_wait),
+        "avg_first_token_after_headers_ms": avg(first_token) if first_token else None,
+        "avg_generation_ms": avg(generation) if generation else None,
+        "avg_total_ms": avg(totals),
+        "p50_total_ms": statistics.median(totals),
+        "transport_ms": transport,
+        "transport_share": transport / avg(totals) if totals else 0.0,
+    }
+
+
+def load_baseline(path: str = BASELINE_CSV) -> List[Dict[str, Any]]:
+    """Read the historical short-latency numbers for comparison"""
+    try:
+        with open(path, newline="") as f:
+            return list(csv.DictReader(f))
+    except OSError:
+        return []
+
+
+async def run_breakdown(base_url: str, model: str, runs: int) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for label, force_close, stream in MODES:
+        print(f"📊 {label}: {runs} runs")
+        async with LoadEngine(base_url, model, timeout=30, force_close=force_close) as engine:
+            # One untimed request so the pooled modes start with a warm connection
+            await engine.send(engine.build_payload("Hi", 5, stream=False))
+            records = []
+            for i in range(runs):
+                payload = engine.build_payload("The capital of France is", 10, stream=stream, temperature=0.1)
+                record = await engine.send(payload)
+                records.append(record)
+                if record["success"]:
+                    print(f"  {i+1:2d}: total {record['total_ms']:6.1f}ms "
+                          f"(connect {record['connect_ms']:.1f}ms, reused={record['connection_reused']})")
+                else:
+                    print(f"  {i+1:2d}: ERROR {record['error']}")
+        results[label] = phase_breakdown(records)
+    return results
+
+
+def print_report(results: Dict[str, Dict[str, Any]], baseline: List[Dict[str, Any]]):
+    print("\n" + "=" * 79)
+    print("📊 LATENCY BREAKDOWN (ms)")
+    print("=" * 79)
+    print(f"{'Mode':<20} {'Connect':>8} {'Setup':>8} {'Write':>8} {'Server':>8} {'Total':>8} {'Transport%':>11}")
+    print("-" * 79)
+    for label, b in results.items():
+        if not b:
+            print(f"{label:<20} no successful samples")
+            continue
+        print(f"{label:<20} {b['avg_connect_ms']:>8.2f} {b['avg_setup_ms']:>8.2f} {b['avg_request_write_ms']:>8.2f} "
+              f"{b['avg_server_wait_ms']:>8.1f} {b['avg_total_ms']:>8.1f} {b['transport_share']:>10.1%}")
+
+    streaming = results.get("reused_streaming") or {}
+    if streaming.get("avg_generation_ms") is not None:
+        print(f"\n🌊 Streaming: first token {streaming['avg_server_wait_ms'] + streaming['avg_first_token_after_headers_ms']:.1f}ms "
+              f"after send, generation {streaming['avg_generation_ms']:.1f}ms")
+
+    fresh = results.get("fresh_connection") or {}
+    reused = results.get("reused_connection") or {}
+    if fresh and reused:
+        overhead = fresh["avg_total_ms"] - reused["avg_total_ms"]
+        print(f"\n🔌 Fresh-connection overhead per call: {overhead:.2f}ms")
+        for row in baseline:
+            historical = float(row["Avg_Latency_ms"])
+            print(f"  {row['Configuration']}: {historical:.1f}ms historical short latency → "
+                  f"transport ≈ {fresh['transport_ms']:.2f}ms ({fresh['transport_ms'] / historical:.2%}), "
+                  f"model ≈ {historical - fresh['transport_ms']:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Connection-level latency breakdown")
+    parser.add_argument("--host", default="localhost", help="Server host")
+    parser.add_argument("--port", type=int, default=8003, help="Server port")
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--runs", type=int, default=20, help="Requests per mode")
+    parser.add_argument("--baseline", default=BASELINE_CSV, help="Historical comparison CSV")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print("🔍 Connection-Level Latency Breakdown")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 70)
+
+    results = asyncio.run(run_breakdown(f"http://{args.host}:{args.port}", args.model, args.runs))
+    print_report(results, load_baseline(args.baseline))
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"latency_breakdown_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "modes": results}, f, indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
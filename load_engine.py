@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Async Load Engine - aiohttp request driver for OpenAI-compatible servers
+Records per-request connection-level timings through aiohttp trace hooks
+"""
+
+import time
+import json
+import asyncio
+import aiohttp
+import statistics
+from typing import List, Dict, Any, Optional, Callable
+
+from outcome_stats import classify_status, classify_exception, summarize_outcomes
+
+
+def _offset_ms(ctx: Dict[str, Any], key: str) -> None:
+    """Store the current time as milliseconds since the request started"""
+    ctx[key] = (time.perf_counter() - ctx["_start"]) * 1000
+
+
+async def _on_request_start(session, trace_config_ctx, params):
+    trace_config_ctx.trace_request_ctx.setdefault("_start", time.perf_counter())
+
+
+async def _on_dns_start(session, trace_config_ctx, params):
+    _offset_ms(trace_config_ctx.trace_request_ctx, "_dns_start_ms")
+
+
+async def _on_dns_end(session, trace_config_ctx, params):
+    ctx = trace_config_ctx.trace_request_ctx
+    _offset_ms(ctx, "_dns_end_ms")
+    ctx["dns_ms"] = ctx["_dns_end_ms"] - ctx.get("_dns_start_ms", ctx["_dns_end_ms"])
+
+
+async def _on_connection_create_start(session, trace_config_ctx, params):
+    _offset_ms(trace_config_ctx.trace_request_ctx, "_connect_start_ms")
+
+
+async def _on_connection_create_end(session, trace_config_ctx, params):
+    ctx = trace_config_ctx.trace_request_ctx
+    _offset_ms(ctx, "_connect_end_ms")
+    ctx["connection_reused"] = False
+    ctx["connect_ms"] = ctx["_connect_end_ms"] - ctx.get("_connect_start_ms", ctx["_connect_end_ms"])
+
+
+async def _on_connection_reuseconn(session, trace_config_ctx, params):
+    ctx = trace_config_ctx.trace_request_ctx
+    ctx["connection_reused"] = True
+    ctx["connect_ms"] = 0.0
+
+
+async def _on_connection_queued_end(session, trace_config_ctx, params):
+    # Time spent waiting for a free slot in the connector pool
+    _offset_ms(trace_config_ctx.trace_request_ctx, "pool_wait_ms")
+
+
+async def _on_request_headers_sent(session, trace_config_ctx, params):
+    # Everything before this (DNS, pool wait, connect) is connection setup
+    ctx = trace_config_ctx.trace_request_ctx
+    _offset_ms(ctx, "headers_sent_ms")
+    ctx["request_sent_ms"] = ctx["headers_sent_ms"]
+
+
+async def _on_request_chunk_sent(session, trace_config_ctx, params):
+    # Moves request_sent_ms on to the last body write
+    _offset_ms(trace_config_ctx.trace_request_ctx, "request_sent_ms")
+
+
+async def _on_request_end(session, trace_config_ctx, params):
+    # Fired once the response status line and headers have arrived
+    _offset_ms(trace_config_ctx.trace_request_ctx, "first_byte_ms")
+
+
+def build_trace_config() -> aiohttp.TraceConfig:
+    """Build the TraceConfig that fills the per-request timing dict"""
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(_on_request_start)
+    trace_config.on_dns_resolvehost_start.append(_on_dns_start)
+    trace_config.on_dns_resolvehost_end.append(_on_dns_end)
+    trace_config.on_connection_create_start.append(_on_connection_create_start)
+    trace_config.on_connection_create_end.append(_on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+    trace_config.on_connection_queued_end.append(_on_connection_queued_end)
+    trace_config.on_request_headers_sent.append(_on_request_headers_sent)
+    trace_config.on_request_chunk_sent.append(_on_request_chunk_sent)
+    trace_config.on_request_end.append(_on_request_end)
+    return trace_config
+
+
+class LoadEngine:
+    """Shared aiohttp session that sends completion requests and records timings.
+
+    Every call to ``send`` returns a flat record dict with the connection
+    timings (``connection_reused``, ``dns_ms``, ``connect_ms``,
+    ``headers_sent_ms``, ``request_sent_ms``, ``first_byte_ms``), the model timings
+    (``first_token_ms``, ``total_ms``) and the token counts.  All ``*_ms``
+    values are offsets from the moment the request was issued.
+    """
+
+    def __init__(self, base_url: str = "http://localhost:8000", model: str = "Qwen/Qwen3-32B-AWQ",
+                 timeout: float = 120, max_connections: int = 100, force_close: bool = False):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.force_close = force_close
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self):
+        """Open the pooled session (keep-alive unless force_close is set)"""
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, force_close=self.force_close)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                trace_configs=[build_trace_config()],
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def build_payload(self, prompt: Any, max_tokens: int, stream: bool = True, **params) -> Dict[str, Any]:
+        """Build a /v1/completions payload with the engine's model"""
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "max_tokens": max_tokens,
+            "stream": stream,
+        }
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+        payload.update(params)
+        return payload
+
+    async def send(self, payload: Dict[str, Any], endpoint: str = "/v1/completions",
+                   on_token: Optional[Callable[[Dict[str, Any], float], None]] = None,
+                   keep_response: bool = False, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Send one request and return its timing record.
+
+        With ``keep_response`` the parsed body of a non-streamed response is
+        kept under ``record["response"]``.  ``headers`` are added to the
+        request (e.g. priority/tenant headers for the admission proxy).
+        ``record["outcome"]`` classifies every attempt (see
+        ``outcome_stats.OUTCOMES``); a stream that ends without ``[DONE]``
+        counts as a reset, and a non-streamed body without usage is flagged
+        with ``usage_missing``.
+        """
+        await self.start()
+        record: Dict[str, Any] = {
+            "endpoint": endpoint,
+            "stream": bool(payload.get("stream")),
+            "max_tokens": payload.get("max_tokens"),
+            "success": False,
+            "outcome": None,
+            "status": None,
+            "error": None,
+            "connection_reused": None,
+            "dns_ms": 0.0,
+            "connect_ms": 0.0,
+            "headers_sent_ms": None,
+            "request_sent_ms": None,
+            "first_byte_ms": None,
+            "first_token_ms": None,
+            "total_ms": None,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "token_times_ms": [],
+        }
+        ctx: Dict[str, Any] = {"_start": time.perf_counter()}
+        record["start_time"] = time.time()
+        try:
+            async with self.session.post(f"{self.base_url}{endpoint}", json=payload, headers=headers,
+                                         trace_request_ctx=ctx) as response:
+                record["status"] = response.status
+                if response.status != 200:
+                    record["error"] = f"Status {response.status}"
+                    record["outcome"] = classify_status(response.status)
+                    await response.read()
+                elif record["stream"]:
+                    if await self._read_stream(response, ctx, record, on_token):
+                        record["success"] = True
+                        record["outcome"] = "ok"
+                    else:
+                        record["error"] = "Stream ended without [DONE]"
+                        record["outcome"] = "reset"
+                else:
+                    data = await response.json()
+                    usage = data.get("usage")
+                    if not usage:
+                        record["usage_missing"] = True
+                    usage = usage or {}
+                    record["prompt_tokens"] = usage.get("prompt_tokens", 0)
+                    record["completion_tokens"] = usage.get("completion_tokens", 0)
+                    record["success"] = True
+                    record["outcome"] = "ok"
+                    if keep_response:
+                        record["response"] = data
+        except asyncio.TimeoutError:
+            record["error"] = "Timeout"
+            record["outcome"] = "timeout"
+        except Exception as e:
+            record["error"] = str(e) or type(e).__name__
+            record["outcome"] = classify_exception(e)
+        record["total_ms"] = (time.perf_counter() - ctx["_start"]) * 1000
+        for key, value in ctx.items():
+            if not key.startswith("_"):
+                record[key] = value
+        return record
+
+    async def _read_stream(self, response, ctx, record, on_token) -> bool:
+        """Consume an SSE stream, timestamping every content chunk; True if it ended with [DONE]"""
+        chunks = 0
+        finished = False
+        async for raw_line in response.content:
+            line = raw_line.strip()
+            if not line.startswith(b"data: "):
+                continue
+            data = line[6:]
+            if data == b"[DONE]":
+                finished = True
+                break
+            try:
+                event = json.loads(data)
+            except ValueError:
+                continue
+            usage = event.get("usage")
+            if usage:
+                record["prompt_tokens"] = usage.get("prompt_tokens", 0)
+                record["completion_tokens"] = usage.get("completion_tokens", 0)
+            choices = event.get("choices") or []
+            if not choices:
+                continue
+            choice = choices[0]
+            text = choice.get("text")
+            if text is None:
+                text = (choice.get("delta") or {}).get("content")
+            if not text:
+                continue
+            now_ms = (time.perf_counter() - ctx["_start"]) * 1000
+            if record["first_token_ms"] is None:
+                record["first_token_ms"] = now_ms
+            record["token_times_ms"].append(now_ms)
+            chunks += 1
+            if on_token is not None:
+                on_token(record, now_ms)
+        if not record["completion_tokens"]:
+            record["completion_tokens"] = chunks
+        return finished
+
+    async def run_closed_loop(self, payloads: List[Dict[str, Any]], concurrency: int = 1,
+                              endpoint: str = "/v1/completions") -> List[Dict[str, Any]]:
+        """Send all payloads keeping at most ``concurrency`` requests in flight"""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def worker(index, payload):
+            async with semaphore:
+                record = await self.send(payload, endpoint)
+                record["request_id"] = index
+                return record
+
+        return await asyncio.gather(*(worker(i, p) for i, p in enumerate(payloads)))
+
+    async def run_adaptive(self, payloads: List[Dict[str, Any]], limiter: Any,
+                           endpoint: str = "/v1/completions") -> List[Dict[str, Any]]:
+        """Send all payloads with the in-flight limit set by ``limiter``.
+
+        ``limiter`` needs ``async acquire()``, ``release(record)`` and a
+        ``limit`` attribute, e.g. ``adaptive_concurrency.AdaptiveConcurrencyLimiter``.
+        """
+
+        async def worker(index, payload):
+            await limiter.acquire()
+            record = None
+            try:
+                record = await self.send(payload, endpoint)
+            finally:
+                limiter.release(record)
+            record["request_id"] = index
+            record["concurrency_limit"] = limiter.limit
+            return record
+
+        return await asyncio.gather(*(worker(i, p) for i, p in enumerate(payloads)))
+
+
+def summarize_timings(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Average the connection and model phases over successful records, plus the outcome breakdown"""
+    ok = [r for r in records if r.get("success")]
+    outcomes = summarize_outcomes(records)
+    if not ok:
+        return {"requests": len(records), "successful": 0, "outcomes": outcomes["outcomes"]}
+
+    def mean_of(key):
+        values = [r[key] for r in ok if r.get(key) is not None]
+        return statistics.mean(values) if values else None
+
+    reused = sum(1 for r in ok if r.get("connection_reused"))
+    return {
+        "requests": len(records),
+        "successful": len(ok),
+        "connection_reuse_rate": reused / len(ok),
+        "avg_dns_ms": mean_of("dns_ms"),
+        "avg_connect_ms": mean_of("connect_ms"),
+        "avg_request_sent_ms": mean_of("request_sent_ms"),
+        "avg_first_byte_ms": mean_of("first_byte_ms"),
+        "avg_first_token_ms": mean_of("first_token_ms"),
+        "avg_total_ms": mean_of("total_ms"),
+        "avg_completion_tokens": mean_of("completion_tokens"),
+        "outcomes": outcomes["outcomes"],
+        "censored_total_percentiles": outcomes["censored_percentiles"],
+    }
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Completion Micro-Batcher - coalesce small concurrent completions into one request
+Collects calls for a short window (or until max_batch), sends them as a
+multi-prompt /v1/completions request and hands each caller its own choice.
+The benchmark drives open-loop Poisson arrivals at several rates, so the
+window decides how large batches get and how much latency it adds
+"""
+
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from datetime import datetime
+from typing import List, Dict, Any, Tuple
+
+from load_engine import LoadEngine
+from mock_openai_server import start_mock_servers, stop_mock_servers
+
+
+class CompletionMicroBatcher:
+    """Batches ``complete()`` calls that share identical sampling parameters.
+
+    Only requests with the same parameters can share an HTTP request, so
+    pending calls are grouped by their canonical parameter set.  A group is
+    flushed ``window_ms`` after its first call or as soon as it holds
+    ``max_batch`` prompts.  Usage is only reported per batch by the server,
+    so callers get ``batch_usage`` rather than per-prompt counts.
+    """
+
+    def __init__(self, engine: LoadEngine, window_ms: float = 5.0, max_batch: int = 16):
+        self.engine = engine
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self._pending: Dict[str, List[Tuple[Any, asyncio.Future, float]]] = {}
+        self._params: Dict[str, Dict[str, Any]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._inflight: set = set()
+        self.batches_sent = 0
+        self.prompts_sent = 0
+
+    async def complete(self, prompt: Any, **params) -> Dict[str, Any]:
+        """Queue one prompt and wait for its choice"""
+        if params.get("stream"):
+            raise ValueError("Streaming requests cannot be micro-batched")
+        key = json.dumps(params, sort_keys=True)
+        future = asyncio.get_running_loop().create_future()
+        group = self._pending.setdefault(key, [])
+        self._params[key] = params
+        group.append((prompt, future, time.perf_counter()))
+        if len(group) >= self.max_batch:
+            self._flush(key)
+        elif len(group) == 1:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.window_ms / 1000, self._flush, key)
+        return await future
+
+    def _flush(self, key: str):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        group = self._pending.pop(key, [])
+        params = self._params.pop(key, None)
+        if group:
+            task = asyncio.create_task(self._send(group, params))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, group: List[Tuple[Any, asyncio.Future, float]], params: Dict[str, Any]):
+        prompts = [prompt for prompt, _, _ in group]
+        n = params.get("n", 1)
+        payload = {"model": self.engine.model, "prompt": prompts if len(prompts) > 1 else prompts[0],
+                   "stream": False, **params}
+        self.batches_sent += 1
+        self.prompts_sent += len(prompts)
+        record = await self.engine.send(payload, keep_response=True)
+        now = time.perf_counter()
+
+        if not record["success"]:
+            error = RuntimeError(record["error"] or "Batch request failed")
+            for _, future, _ in group:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        # Choice index = prompt_index * n + sample_index
+        response = record["response"]
+        per_prompt: Dict[int, List[Dict[str, Any]]] = {}
+        for choice in response.get("choices", []):
+            per_prompt.setdefault(choice.get("index", 0) // n, []).append(choice)
+        for i, (_, future, queued_at) in enumerate(group):
+            if future.done():
+                continue
+            choices = per_prompt.get(i)
+            if not choices:
+                future.set_exception(RuntimeError(f"No choice returned for prompt {i}"))
+                continue
+            future.set_result({
+                "text": choices[0].get("text"),
+                "finish_reason": choices[0].get("finish_reason"),
+                "choices": choices,
+                "batch_size": len(group),
+                "batch_usage": response.get("usage"),
+                "latency_ms": (now - queued_at) * 1000,
+                "server_ms": record["total_ms"],
+            })
+
+    async def drain(self):
+        """Flush everything pending and wait for in-flight batches"""
+        for key in list(self._pending):
+            self._flush(key)
+        if self._inflight:
+            await asyncio.gather(*list(self._inflight), return_exceptions=True)
+
+
+async def open_loop(call, prompts: List[str], rate: float, seed: int) -> List[Any]:
+    """Start ``call(prompt)`` at Poisson arrival times (``rate`` per second) without waiting for answers.
+
+    The same seed gives every mode the same arrival sequence, so only the
+    batching differs between rows.
+    """
+    rng = random.Random(seed)
+    tasks = []
+    next_at = time.perf_counter()
+    for prompt in prompts:
+        next_at += rng.expovariate(rate)
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        tasks.append(asyncio.create_task(call(prompt)))
+    return await asyncio.gather(*tasks)
+
+
+async def run_unbatched(engine: LoadEngine, prompts: List[str], rate: float, max_tokens: int,
+                        seed: int = 0) -> Dict[str, Any]:
+    async def one(prompt):
+        return await engine.send(engine.build_payload(prompt, max_tokens, stream=False, temperature=0.7))
+
+    start = time.perf_counter()
+    records = await open_loop(one, prompts, rate, seed)
+    elapsed = time.perf_counter() - start
+    latencies = [r["total_ms"] for r in records if r["success"]]
+    return summarize("per_request", rate, elapsed, latencies, len(prompts), len(prompts))
+
+
+async def run_batched(engine: LoadEngine, prompts: List[str], rate: float, max_tokens: int,
+                      window_ms: float, max_batch: int, seed: int = 0) -> Dict[str, Any]:
+    batcher = CompletionMicroBatcher(engine, window_ms, max_batch)
+
+    async def one(prompt):
+        try:
+            return await batcher.complete(prompt, max_tokens=max_tokens, temperature=0.7)
+        except RuntimeError:
+            return None
+
+    start = time.perf_counter()
+    results = await open_loop(one, prompts, rate, seed)
+    await batcher.drain()
+    elapsed = time.perf_counter() - start
+    latencies = [r["latency_ms"] for r in results if r]
+    summary = summarize(f"window_{window_ms:g}ms", rate, elapsed, latencies, len(prompts), batcher.batches_sent)
+    summary["avg_batch_size"] = batcher.prompts_sent / batcher.batches_sent if batcher.batches_sent else 0
+    return summary
+
+
+def summarize(label: str, rate: float, elapsed: float, latencies: List[float], total: int,
+              http_requests: int) -> Dict[str, Any]:
+    return {
+        "mode": label,
+        "arrival_rate": rate,
+        "prompts": total,
+        "successful": len(latencies),
+        "http_requests": http_requests,
+        "elapsed_s": elapsed,
+        "prompts_per_second": len(latencies) / elapsed if elapsed > 0 else 0,
+        "p50_latency_ms": statistics.median(latencies) if latencies else None,
+        "p95_latency_ms": statistics.quantiles(latencies, n=20)[18] if len(latencies) >= 20 else None,
+        "avg_batch_size": 1.0,
+    }
+
+
+async def run_benchmark(args) -> List[Dict[str, Any]]:
+    servers = []
+    base_url = args.backend
+    if not base_url:
+        servers = await start_mock_servers(1, args.mock_port, ttft_ms=20.0, itl_ms=5.0, max_running=args.mock_max_running)
+        base_url = servers[0].base_url
+
+    prompts = [f"Q{i}: The capital of country number {i} is" for i in range(args.prompts)]
+    results = []
+    try:
+        async with LoadEngine(base_url, args.model, timeout=120, max_connections=0) as engine:
+            for rate in args.rates:
+                print(f"\n📈 {rate:g} prompts/s (Poisson)")
+                result = await run_unbatched(engine, prompts, rate, args.max_tokens, args.seed)
+                results.append(result)
+                print_row(result)
+                for window in args.windows:
+                    result = await run_batched(engine, prompts, rate, args.max_tokens, window, args.max_batch,
+                                               args.seed)
+                    results.append(result)
+                    print_row(result)
+    finally:
+        await stop_mock_servers(servers)
+    return results
+
+
+def print_row(r: Dict[str, Any]):
+    print(f"  {r['mode']:<16} {r['prompts_per_second']:8.1f} prompts/s  "
+          f"p50 {r['p50_latency_ms'] or 0:7.1f}ms  p95 {r['p95_latency_ms'] or 0:7.1f}ms  "
+          f"{r['http_requests']:4d} HTTP requests (avg batch {r['avg_batch_size']:.1f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching window benchmark")
+    parser.add_argument("--backend", help="Server base URL (default: local mock server)")
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--prompts", type=int, default=200, help="Small completions to send")
+    parser.add_argument("--rates", type=float, nargs="+", default=[100, 400, 1600],
+                        help="Open-loop Poisson arrival rates (prompts/s)")
+    parser.add_argument("--max-tokens", type=int, default=10)
+    parser.add_argument("--windows", type=float, nargs="+", default=[1, 2, 5, 10, 20], help="Batch windows in ms")
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--mock-port", type=int, default=9170)
+    parser.add_argument("--mock-max-running", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0, help="Arrival sequence seed, shared by every mode")
+    args = parser.parse_args()
+
+    print("🚀 Micro-Batcher Benchmark")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    results = asyncio.run(run_benchmark(args))
+
+    print("\n🏆 Lowest p50 latency per arrival rate:")
+    for rate in args.rates:
+        rows = [r for r in results if r["arrival_rate"] == rate and r["p50_latency_ms"] is not None]
+        if not rows:
+            continue
+        baseline = next((r for r in rows if r["mode"] == "per_request"), None)
+        best = min(rows, key=lambda r: r["p50_latency_ms"])
+        versus = f" vs {baseline['p50_latency_ms']:.1f}ms per-request" if baseline and baseline is not best else ""
+        print(f"  {rate:8g}/s: {best['mode']:<16} p50 {best['p50_latency_ms']:.1f}ms{versus} "
+              f"(avg batch {best['avg_batch_size']:.1f})")
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"micro_batch_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "config": vars(args), "results": results}, f, indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""
+Mock OpenAI-Compatible Server - GPU-free stand-in for SGLang/vLLM
+Simulates prefill/decode timing and a bounded number of running requests
+so routers and load tools can be exercised locally
+"""
+
+import time
+import json
+import random
+import asyncio
+import argparse
+from aiohttp import web
+from collections import OrderedDict, deque
+from typing import List, Dict, Any, Optional, Sequence
+
+FAULT_KINDS = ("error_5xx", "reset", "stall", "slow_first_byte", "truncated_usage", "slow")
+
+
+class FaultSchedule:
+    """Seeded per-request fault plan for the mock server.
+
+    Request ``n`` (1-based arrival order) gets at most one fault, drawn from
+    ``random.Random(f"{seed}:{n}")``, so the same seed and request order
+    reproduce the same faults however the requests interleave.  ``explicit``
+    maps request numbers to a kind and overrides the rates.
+
+    - ``error_5xx``: immediate 500/502/503 with an OpenAI-style error body
+    - ``reset``: connection aborted after a random number of tokens
+    - ``stall``: stream stops after a random number of tokens, the
+      connection stays open for ``stall_ms`` and is then closed
+    - ``slow_first_byte``: ``first_byte_delay_ms`` before the request is even queued
+    - ``truncated_usage``: the usage block is missing
+    - ``slow``: the whole request runs ``latency_multiplier`` times slower
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None, seed: int = 0,
+                 explicit: Optional[Dict[int, str]] = None, error_statuses: Sequence[int] = (500, 502, 503),
+                 stall_ms: float = 30000.0, first_byte_delay_ms: float = 2000.0, latency_multiplier: float = 10.0):
+        self.rates = {k: float(v) for k, v in (rates or {}).items() if v}
+        self.explicit = {int(k): v for k, v in (explicit or {}).items()}
+        unknown = (set(self.rates) | set(self.explicit.values())) - set(FAULT_KINDS)
+        if unknown:
+            raise ValueError(f"Unknown fault kinds {sorted(unknown)} (expected {FAULT_KINDS})")
+        if sum(self.rates.values()) > 1:
+            raise ValueError("Fault rates add up to more than 1")
+        self.seed = seed
+        self.error_statuses = list(error_statuses)
+        self.stall_ms = stall_ms
+        self.first_byte_delay_ms = first_byte_delay_ms
+        self.latency_multiplier = latency_multiplier
+
+    @staticmethod
+    def parse_rates(spec: str) -> Dict[str, float]:
+        """``"error_5xx=0.02,reset=0.01"`` as a rates dict"""
+        rates = {}
+        for item in filter(None, (part.strip() for part in spec.split(","))):
+            kind, _, rate = item.partition("=")
+            rates[kind] = float(rate)
+        return rates
+
+    @classmethod
+    def parse(cls, spec: str, **kwargs) -> "FaultSchedule":
+        """Build from ``"error_5xx=0.02,reset=0.01"``"""
+        return cls(cls.parse_rates(spec), **kwargs)
+
+    def plan(self, request_number: int, max_tokens: int) -> Optional[Dict[str, Any]]:
+        rng = random.Random(f"{self.seed}:{request_number}")
+        draw = rng.random()
+        kind = self.explicit.get(request_number)
+        if kind is None:
+            cumulative = 0.0
+            for candidate in FAULT_KINDS:
+                cumulative += self.rates.get(candidate, 0.0)
+                if draw < cumulative:
+                    kind = candidate
+                    break
+        if kind is None:
+            return None
+        return {"kind": kind, "status": rng.choice(self.error_statuses),
+                "at_token": rng.randint(0, max(max_tokens - 1, 0))}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"rates": self.rates, "seed": self.seed, "explicit": self.explicit,
+                "error_statuses": self.error_statuses, "stall_ms": self.stall_ms,
+                "first_byte_delay_ms": self.first_byte_delay_ms, "latency_multiplier": self.latency_multiplier}
+
+
+class MockOpenAIServer:
+    """Serves /v1/completions, /v1/chat/completions, /health, /v1/models and /stats.
+
+    Timing model per request: wait for one of ``max_running`` batch slots,
+    then ``ttft_ms + prefill_ms_per_token * prompt_tokens`` before the first
+    token, then ``itl_ms`` per token, stretched by ``batch_penalty`` for every
+    other running request (a crude stand-in for a shared GPU).
+
+    With ``prefix_cache_blocks`` > 0 an LRU of prompt blocks mimics the radix
+    cache: leading blocks seen before are not charged prefill time.
+
+    With ``max_total_tokens`` > 0 requests are also admitted FIFO only while
+    the sum of ``prompt + max_tokens`` in flight fits, like SGLang's
+    ``--max-total-tokens`` KV pool.
+
+    ``faults`` injects errors, resets, stalls and slowdowns from a seeded
+    FaultSchedule; it can be replaced at runtime with POST /faults.
+    ``straggler_rate``/``straggler_multiplier`` are a shorthand for a
+    schedule with only ``slow`` faults.
+
+    ``prefill_interference`` stretches every decode step by that fraction
+    per request currently in prefill, like a server that runs whole
+    prefills between decode iterations instead of small chunks.
+
+    A stream whose client disconnects stops generating, unless
+    ``ignore_disconnect`` is set to mimic a server that keeps decoding
+    for nobody.  /metrics exposes the counters under SGLang's Prometheus
+    names.
+    """
+
+    def __init__(self, port: int = 8000, host: str = "127.0.0.1", model: str = "Qwen/Qwen3-32B-AWQ",
+                 ttft_ms: float = 50.0, itl_ms: float = 10.0, prefill_ms_per_token: float = 0.05,
+                 max_running: int = 8, batch_penalty: float = 0.05, prefix_cache_blocks: int = 0,
+                 block_words: int = 16, max_total_tokens: int = 0, straggler_rate: float = 0.0,
+                 straggler_multiplier: float = 10.0, seed: int = 0, faults: Optional[FaultSchedule] = None,
+                 name: Optional[str] = None, prefill_interference: float = 0.0, ignore_disconnect: bool = False):
+        self.port = port
+        self.host = host
+        self.model = model
+        self.ttft_ms = ttft_ms
+        self.itl_ms = itl_ms
+        self.prefill_ms_per_token = prefill_ms_per_token
+        self.max_running = max_running
+        self.batch_penalty = batch_penalty
+        self.prefix_cache_blocks = prefix_cache_blocks
+        self.block_words = block_words
+        self.max_total_tokens = max_total_tokens
+        self.prefill_interference = prefill_interference
+        self.ignore_disconnect = ignore_disconnect
+        self.faults = faults or FaultSchedule({"slow": straggler_rate}, seed=seed,
+                                              latency_multiplier=straggler_multiplier)
+        self.name = name or f"mock-{port}"
+        self.stats = {"requests": 0, "completed": 0, "running": 0, "queued": 0, "generated_tokens": 0,
+                      "prompt_tokens": 0, "cached_tokens": 0, "kv_tokens": 0, "aborted": 0, "prefilling": 0,
+                      "faults": {kind: 0 for kind in FAULT_KINDS}}
+        self._prefix_cache: "OrderedDict[int, bool]" = OrderedDict()
+        self._slots = asyncio.Semaphore(max_running)
+        self._kv_waiters: deque = deque()
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/health", self.handle_health)
+        app.router.add_get("/v1/models", self.handle_models)
+        app.router.add_get("/stats", self.handle_stats)
+        app.router.add_get("/metrics", self.handle_metrics)
+        app.router.add_get("/faults", self.handle_get_faults)
+        app.router.add_post("/faults", self.handle_set_faults)
+        app.router.add_post("/v1/completions", self.handle_completions)
+        app.router.add_post("/v1/chat/completions", self.handle_completions)
+        return app
+
+    async def start(self):
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def kill(self):
+        """Drop every open connection at once and stop, like a crashed process"""
+        if self._runner is not None:
+            server = self._runner.server
+            for handler in list(server.connections if server else []):
+                if handler.transport is not None:
+                    handler.transport.abort()
+            await self.stop()
+
+    async def handle_health(self, request):
+        return web.Response(text="OK")
+
+    async def handle_models(self, request):
+        return web.json_response({"object": "list", "data": [{"id": self.model, "object": "model"}]})
+
+    async def handle_stats(self, request):
+        return web.json_response({"name": self.name, **self.stats})
+
+    async def handle_metrics(self, request):
+        """Prometheus text format with the metric names SGLang uses under --enable-metrics"""
+        labels = f'{{model_name="{self.model}"}}'
+        metrics = [
+            ("sglang:num_running_reqs", "gauge", self.stats["running"]),
+            ("sglang:num_queue_reqs", "gauge", self.stats["queued"]),
+            ("sglang:token_usage", "gauge",
+             self.stats["kv_tokens"] / self.max_total_tokens if self.max_total_tokens else 0.0),
+            ("sglang:prompt_tokens_total", "counter", self.stats["prompt_tokens"]),
+            ("sglang:generation_tokens_total", "counter", self.stats["generated_tokens"]),
+        ]
+        lines = []
+        for name, kind, value in metrics:
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name}{labels} {value}")
+        return web.Response(text="\n".join(lines) + "\n", content_type="text/plain")
+
+    async def handle_get_faults(self, request):
+        return web.json_response(self.faults.to_dict())
+
+    async def handle_set_faults(self, request):
+        try:
+            self.faults = FaultSchedule(**await request.json())
+        except (TypeError, ValueError) as e:
+            return web.json_response({"error": str(e)}, status=400)
+        return web.json_response(self.faults.to_dict())
+
+    @staticmethod
+    def prompt_units(body: Dict[str, Any]) -> List[Any]:
+        """Prompt as a list of pseudo-tokens: token ids as-is, text split on whitespace
+
+        A list of prompts counts as their concatenation.
+        """
+        if "messages" in body:
+            return " ".join(f"{m.get('role')}: {m.get('content', '')}" for m in body["messages"]).split()
+        prompt = body.get("prompt", "")
+        if isinstance(prompt, list) and prompt and isinstance(prompt[0], int):
+            return prompt
+        if isinstance(prompt, list):
+            return [unit for p in prompt for unit in (p if isinstance(p, list) else str(p).split())]
+        return str(prompt).split()
+
+    @staticmethod
+    def batch_size(body: Dict[str, Any]) -> int:
+        """Number of prompts in a /v1/completions request (list of strings or of token lists)"""
+        prompt = body.get("prompt")
+        if isinstance(prompt, list) and prompt and isinstance(prompt[0], (str, list)):
+            return len(prompt)
+        return 1
+
+    @classmethod
+    def prompt_tokens(cls, body: Dict[str, Any]) -> int:
+        return max(len(cls.prompt_units(body)), 1)
+
+    def cached_prefix_tokens(self, units: List[Any]) -> int:
+        """Count leading tokens already in the prefix cache, then insert the prompt"""
+        if not self.prefix_cache_blocks:
+            return 0
+        cached = 0
+        missed = False
+        chain = 0
+        for start in range(0, len(units) - self.block_words + 1, self.block_words):
+            chain = hash((chain, tuple(units[start:start + self.block_words])))
+            if not missed and chain in self._prefix_cache:
+                cached += self.block_words
+                self._prefix_cache.move_to_end(chain)
+            else:
+                missed = True
+                self._prefix_cache[chain] = True
+        while len(self._prefix_cache) > self.prefix_cache_blocks:
+            self._prefix_cache.popitem(last=False)
+        return cached
+
+    async def _reserve_kv(self, tokens: int):
+        """Wait FIFO until ``tokens`` fit the simulated KV pool"""
+        if not self._kv_waiters and self.stats["kv_tokens"] + tokens <= self.max_total_tokens:
+            self.stats["kv_tokens"] += tokens
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._kv_waiters.append((tokens, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release_kv(tokens)
+            else:
+                self._kv_waiters.remove((tokens, future))
+            raise
+
+    def _release_kv(self, tokens: int):
+        self.stats["kv_tokens"] -= tokens
+        while self._kv_waiters:
+            need, future = self._kv_waiters[0]
+            if self.stats["kv_tokens"] and self.stats["kv_tokens"] + need > self.max_total_tokens:
+                break
+            self._kv_waiters.popleft()
+            self.stats["kv_tokens"] += need
+            future.set_result(None)
+
+    def token_delay(self, multiplier: float = 1.0) -> float:
+        running = self.stats["running"]
+        stretch = self.batch_penalty * max(running - 1, 0) + self.prefill_interference * self.stats["prefilling"]
+        return multiplier * self.itl_ms * (1 + stretch) / 1000
+
+    def chunk(self, body: Dict[str, Any], request_id: str, text: str,
+              finish_reason: Optional[str] = None) -> Dict[str, Any]:
+        if "messages" in body:
+            return {"id": request_id, "object": "chat.completion.chunk", "model": self.model,
+                    "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": finish_reason}]}
+        return {"id": request_id, "object": "text_completion", "model": self.model,
+                "choices": [{"index": 0, "text": text, "finish_reason": finish_reason}]}
+
+    async def handle_completions(self, request):
+        body = await request.json()
+        self.stats["requests"] += 1
+        request_id = f"cmpl-{self.name}-{self.stats['requests']}"
+        units = self.prompt_units(body)
+        prompt_tokens = max(len(units), 1)
+        max_tokens = int(body.get("max_tokens") or 16)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": max_tokens,
+                 "total_tokens": prompt_tokens + max_tokens}
+
+        fault = self.faults.plan(self.stats["requests"], max_tokens)
+        kind = fault["kind"] if fault else None
+        if kind:
+            self.stats["faults"][kind] += 1
+        if kind == "error_5xx":
+            return web.json_response({"error": {"message": "Injected fault", "type": "server_error"}},
+                                     status=fault["status"])
+        if kind == "slow_first_byte":
+            await asyncio.sleep(self.faults.first_byte_delay_ms / 1000)
+        multiplier = self.faults.latency_multiplier if kind == "slow" else 1.0
+
+        kv_tokens = min(prompt_tokens + max_tokens * self.batch_size(body), self.max_total_tokens)
+        self.stats["queued"] += 1
+        try:
+            if self.max_total_tokens:
+                await self._reserve_kv(kv_tokens)
+        except asyncio.CancelledError:
+            self.stats["queued"] -= 1
+            raise
+        try:
+            async with self._slots:
+                self.stats["queued"] -= 1
+                self.stats["running"] += 1
+                try:
+                    cached = self.cached_prefix_tokens(units)
+                    self.stats["prompt_tokens"] += prompt_tokens
+                    self.stats["cached_tokens"] += cached
+                    prefill_ms = self.ttft_ms + self.prefill_ms_per_token * (prompt_tokens - cached)
+                    self.stats["prefilling"] += 1
+                    try:
+                        await asyncio.sleep(multiplier * prefill_ms / 1000)
+                    finally:
+                        self.stats["prefilling"] -= 1
+                    if body.get("stream"):
+                        return await self._stream(request, body, request_id, max_tokens, usage, multiplier, fault)
+                    # A list of prompts decodes as one batch of sequences
+                    batch = self.batch_size(body)
+                    self.stats["running"] += batch - 1
+                    try:
+                        for i in range(max_tokens):
+                            if i:
+                                await asyncio.sleep(self.token_delay(multiplier))
+                            if kind in ("reset", "stall") and i == fault["at_token"]:
+                                if kind == "stall":
+                                    await asyncio.sleep(self.faults.stall_ms / 1000)
+                                self._abort(request)
+                                return web.Response()
+                    finally:
+                        self.stats["running"] -= batch - 1
+                    self.stats["generated_tokens"] += max_tokens * batch
+                    self.stats["completed"] += 1
+                    text = " tok" * max_tokens
+                    if "messages" in body:
+                        choices = [{"index": 0, "message": {"role": "assistant", "content": text},
+                                    "finish_reason": "length"}]
+                    else:
+                        choices = [{"index": i, "text": f"{text} #{i}", "finish_reason": "length"} for i in range(batch)]
+                    if batch > 1:
+                        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": max_tokens * batch,
+                                 "total_tokens": prompt_tokens + max_tokens * batch}
+                    data = {"id": request_id, "object": "text_completion", "model": self.model,
+                            "created": int(time.time()), "choices": choices, "usage": usage}
+                    if kind == "truncated_usage":
+                        del data["usage"]
+                    return web.json_response(data)
+                finally:
+                    self.stats["running"] -= 1
+        finally:
+            if self.max_total_tokens:
+                self._release_kv(kv_tokens)
+
+    def _abort(self, request):
+        """Drop the connection without a proper end of response (the client may already be gone)"""
+        if request.transport is not None:
+            request.transport.abort()
+        self.stats["aborted"] += 1
+
+    async def _stream(self, request, body, request_id, max_tokens, usage, multiplier=1.0, fault=None):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        kind = fault["kind"] if fault else None
+        i = -1
+        try:
+            await response.prepare(request)
+            for i in range(max_tokens):
+                if i:
+                    await asyncio.sleep(self.token_delay(multiplier))
+                if kind in ("reset", "stall") and i == fault["at_token"]:
+                    if kind == "stall":
+                        await asyncio.sleep(self.faults.stall_ms / 1000)
+                    self._abort(request)
+                    return response
+                finish = "length" if i == max_tokens - 1 else None
+                event = self.chunk(body, request_id, " tok", finish)
+                await response.write(b"data: " + json.dumps(event).encode() + b"\n\n")
+                self.stats["generated_tokens"] += 1
+            if (body.get("stream_options") or {}).get("include_usage") and kind != "truncated_usage":
+                event = {"id": request_id, "object": "text_completion", "model": self.model,
+                         "choices": [], "usage": usage}
+                await response.write(b"data: " + json.dumps(event).encode() + b"\n\n")
+            await response.write(b"data: [DONE]\n\n")
+        except ConnectionResetError:
+            self.stats["aborted"] += 1
+            if self.ignore_disconnect:
+                # Keep decoding the rest of the sequence for a client that is gone
+                for _ in range(i + 1, max_tokens):
+                    await asyncio.sleep(self.token_delay(multiplier))
+                    self.stats["generated_tokens"] += 1
+            # Otherwise stop generating like a real server would
+            return response
+        self.stats["completed"] += 1
+        return response
+
+
+async def start_mock_servers(count: int, base_port: int = 9100, **kwargs) -> List[MockOpenAIServer]:
+    """Start ``count`` mock servers on consecutive ports in this event loop (seeds offset per replica)"""
+    seed = kwargs.pop("seed", 0)
+    faults = kwargs.pop("faults", None)
+    servers = []
+    for i in range(count):
+        replica_faults = FaultSchedule(**{**faults.to_dict(), "seed": faults.seed + i}) if faults else None
+        servers.append(MockOpenAIServer(port=base_port + i, seed=seed + i, faults=replica_faults, **kwargs))
+    for server in servers:
+        await server.start()
+    return servers
+
+
+async def stop_mock_servers(servers: List[MockOpenAIServer]):
+    for server in servers:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible server")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind host")
+    parser.add_argument("--port", type=int, default=8000, help="First port")
+    parser.add_argument("--replicas", type=int, default=1, help="Servers on consecutive ports")
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name to report")
+    parser.add_argument("--ttft-ms", type=float, default=50.0)
+    parser.add_argument("--itl-ms", type=float, default=10.0)
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.05)
+    parser.add_argument("--max-running", type=int, default=8, help="Concurrent batch slots")
+    parser.add_argument("--batch-penalty", type=float, default=0.05, help="ITL stretch per extra running request")
+    parser.add_argument("--prefill-interference", type=float, default=0.0,
+                        help="ITL stretch per request in prefill (0 = prefills do not slow decodes)")
+    parser.add_argument("--ignore-disconnect", action="store_true",
+                        help="Keep generating for clients that closed their stream")
+    parser.add_argument("--prefix-cache-blocks", type=int, default=0, help="Simulated radix cache size (0 = off)")
+    parser.add_argument("--max-total-tokens", type=int, default=0, help="Simulated KV pool in tokens (0 = off)")
+    parser.add_argument("--straggler-rate", type=float, default=0.0, help="Fraction of slowed-down requests")
+    parser.add_argument("--straggler-multiplier", type=float, default=10.0, help="Slowdown of a straggler")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for injected faults")
+    parser.add_argument("--faults", default="", help=f"Fault rates, e.g. 'error_5xx=0.02,reset=0.01' ({', '.join(FAULT_KINDS)})")
+    parser.add_argument("--stall-ms", type=float, default=30000.0, help="How long a stalled stream hangs")
+    parser.add_argument("--first-byte-delay-ms", type=float, default=2000.0, help="Delay of slow_first_byte faults")
+    args = parser.parse_args()
+
+    faults = None
+    if args.faults:
+        # Merge the straggler shorthand before construction so the rates are validated together
+        rates = FaultSchedule.parse_rates(args.faults)
+        if args.straggler_rate:
+            rates["slow"] = args.straggler_rate
+        faults = FaultSchedule(rates, seed=args.seed, stall_ms=args.stall_ms,
+                               first_byte_delay_ms=args.first_byte_delay_ms,
+                               latency_multiplier=args.straggler_multiplier)
+
+    async def serve():
+        servers = await start_mock_servers(
+            args.replicas, args.port, host=args.host, model=args.model, ttft_ms=args.ttft_ms,
+            itl_ms=args.itl_ms, prefill_ms_per_token=args.prefill_ms_per_token,
+            max_running=args.max_running, batch_penalty=args.batch_penalty,
+            prefix_cache_blocks=args.prefix_cache_blocks, max_total_tokens=args.max_total_tokens,
+            prefill_interference=args.prefill_interference, ignore_disconnect=args.ignore_disconnect,
+            straggler_rate=args.straggler_rate, straggler_multiplier=args.straggler_multiplier, seed=args.seed,
+            faults=faults)
+        for server in servers:
+            print(f"🧪 {server.name} listening on {server.base_url}")
+        if faults:
+            print(f"💥 Fault rates {faults.rates} (seed {faults.seed})")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await stop_mock_servers(servers)
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
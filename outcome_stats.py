@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Outcome Statistics - error taxonomy and censoring-aware latency percentiles
+Every attempt gets an outcome class; timeouts stay in the latency
+distribution as right-censored samples (Kaplan-Meier) instead of silently
+dropping out and flattering the tail
+"""
+
+import statistics
+from typing import List, Dict, Any, Tuple, Iterable
+
+# "no_backend": a router had nowhere to send the request, so nothing reached a server
+OUTCOMES = ("ok", "timeout", "http_4xx", "http_5xx", "reset", "parse_error", "no_backend")
+DEFAULT_PERCENTILES = (50, 90, 95, 99)
+
+
+def classify_status(status: int) -> str:
+    if 200 <= status < 300:
+        return "ok"
+    return "http_4xx" if status < 500 else "http_5xx"
+
+
+def classify_exception(exc: BaseException) -> str:
+    """Map exceptions from asyncio, aiohttp or requests onto an outcome class.
+
+    Matched by class name so callers need not import every HTTP library.
+    """
+    names = [cls.__name__ for cls in type(exc).__mro__]
+    if any("Timeout" in name for name in names):
+        return "timeout"
+    if any(name in ("ValueError", "JSONDecodeError", "ContentTypeError", "UnicodeDecodeError") for name in names):
+        return "parse_error"
+    return "reset"
+
+
+def outcome_counts(records: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+    """Counts per outcome class (records without an outcome count by their success flag)"""
+    counts = {outcome: 0 for outcome in OUTCOMES}
+    for record in records:
+        outcome = record.get("outcome") or ("ok" if record.get("success") else "reset")
+        counts[outcome] = counts.get(outcome, 0) + 1
+    return counts
+
+
+def format_outcomes(counts: Dict[str, int]) -> str:
+    """'ok 18 | timeout 2' style summary, omitting empty classes"""
+    parts = [f"{name} {count}" for name, count in counts.items() if count]
+    return " | ".join(parts) if parts else "no requests"
+
+
+def kaplan_meier_percentiles(samples: List[Tuple[float, bool]],
+                             percentiles: Iterable[int] = DEFAULT_PERCENTILES) -> Dict[str, Any]:
+    """Latency percentiles from (value_ms, observed) pairs; observed=False marks a censored sample.
+
+    A censored sample (e.g. a timeout at 10s) says only that the latency was
+    larger than the value.  The product-limit estimator keeps such samples
+    in the risk set up to their censoring time.  When censoring leaves a
+    percentile unreached it is reported as None with ``censored_above_ms``
+    as its lower bound.
+    """
+    ordered = sorted(samples, key=lambda s: (s[0], not s[1]))
+    at_risk = len(ordered)
+    survival = 1.0
+    curve: List[Tuple[float, float]] = []
+    i = 0
+    while i < len(ordered):
+        value = ordered[i][0]
+        events = censored = 0
+        while i < len(ordered) and ordered[i][0] == value:
+            if ordered[i][1]:
+                events += 1
+            else:
+                censored += 1
+            i += 1
+        if events and at_risk:
+            survival *= 1 - events / at_risk
+            curve.append((value, 1 - survival))
+        at_risk -= events + censored
+
+    result: Dict[str, Any] = {}
+    for p in percentiles:
+        target = p / 100
+        result[f"p{p}_ms"] = next((value for value, cdf in curve if cdf >= target - 1e-12), None)
+    censored_values = [value for value, observed in samples if not observed]
+    result["censored"] = len(censored_values)
+    result["censored_above_ms"] = max(censored_values) if censored_values else None
+    return result
+
+
+def censored_samples(records: List[Dict[str, Any]], key: str = "total_ms",
+                     censor_key: str = "total_ms") -> List[Tuple[float, bool]]:
+    """Observed values of ``key`` for ok records plus timeouts censored at their elapsed time.
+
+    The elapsed time is read from ``censor_key``.  For ``first_token_ms`` a
+    timeout after the first token still counts as an observed TTFT.  Other
+    failures are not latency samples; they belong in the outcome breakdown.
+    """
+    samples = []
+    for record in records:
+        outcome = record.get("outcome") or ("ok" if record.get("success") else None)
+        value = record.get(key)
+        if outcome == "ok" and value is not None:
+            samples.append((value, True))
+        elif outcome == "timeout":
+            if value is not None and key != censor_key:
+                samples.append((value, True))
+            elif record.get(censor_key) is not None:
+                samples.append((record[censor_key], False))
+    return samples
+
+
+def naive_percentiles(values: List[float], percentiles: Iterable[int] = DEFAULT_PERCENTILES) -> Dict[str, Any]:
+    """The old way: percentiles over successful samples only"""
+    result = {}
+    for p in percentiles:
+        if len(values) >= 2:
+            result[f"p{p}_ms"] = statistics.quantiles(values, n=100, method="inclusive")[p - 1]
+        else:
+            result[f"p{p}_ms"] = values[0] if values else None
+    return result
+
+
+def summarize_outcomes(records: List[Dict[str, Any]], key: str = "total_ms", censor_key: str = "total_ms",
+                       percentiles: Iterable[int] = DEFAULT_PERCENTILES) -> Dict[str, Any]:
+    """Outcome breakdown plus censored and naive percentiles of ``key``"""
+    percentiles = tuple(percentiles)
+    counts = outcome_counts(records)
+    total = sum(counts.values())
+    observed = [r[key] for r in records if (r.get("outcome") or ("ok" if r.get("success") else None)) == "ok"
+                and r.get(key) is not None]
+    return {
+        "requests": total,
+        "outcomes": counts,
+        "error_rate": (total - counts["ok"]) / total if total else 0.0,
+        "latency_key": key,
+        "censored_percentiles": kaplan_meier_percentiles(censored_samples(records, key, censor_key),
+                                                          percentiles),
+        "naive_percentiles": naive_percentiles(observed, percentiles),
+    }
+
+
+def format_percentile(summary: Dict[str, Any], p: int) -> str:
+    """Censored percentile for printing, '>10000' when only a lower bound is known"""
+    censored = summary["censored_percentiles"]
+    value = censored.get(f"p{p}_ms")
+    if value is not None:
+        return f"{value:.0f}"
+    if censored.get("censored_above_ms") is not None:
+        return f">{censored['censored_above_ms']:.0f}"
+    return "n/a"
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Prefill Interference Benchmark - what a burst of long prompts does to running streams
+Keeps a steady population of long streaming decodes, injects bursts of
+long-prompt requests and measures how far and for how long the decoders'
+inter-token latency spikes, so --chunked-prefill-size, mixed batching and
+--num-continuous-decode-steps can be chosen from data
+"""
+
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from datetime import datetime
+from typing import List, Dict, Any, Tuple
+
+from load_engine import LoadEngine
+from mock_openai_server import MockOpenAIServer
+from decode_position_profiler import parse_target
+from outcome_stats import outcome_counts, format_outcomes
+
+DECODE_PROMPT = "Write a long, detailed history of the printing press:"
+BURST_SENTENCE = "The quarterly report covers revenue, churn, hiring, infrastructure costs and roadmap risks. "
+
+
+class DecoderPopulation:
+    """``count`` long streams kept alive for the whole run; every token's wall time and ITL is recorded"""
+
+    def __init__(self, engine: LoadEngine, count: int, max_tokens: int, max_failures: int = 5):
+        self.engine = engine
+        self.count = count
+        self.max_tokens = max_tokens
+        # A decoder gives up after this many failed streams in a row
+        self.max_failures = max_failures
+        self.stopped = 0
+        self.itl_events: List[Tuple[float, float]] = []
+        self.records: List[Dict[str, Any]] = []
+        self._tasks: List[asyncio.Task] = []
+
+    async def _decoder(self, worker: int):
+        failures = 0
+        while True:
+            last = {}
+
+            def on_token(record, now_ms):
+                now = time.perf_counter()
+                if "t" in last:
+                    self.itl_events.append((now, (now - last["t"]) * 1000))
+                last["t"] = now
+
+            payload = self.engine.build_payload(f"{DECODE_PROMPT} (stream {worker})", self.max_tokens,
+                                                ignore_eos=True, min_tokens=self.max_tokens)
+            record = await self.engine.send(payload, on_token=on_token)
+            self.records.append(record)
+            if record["success"]:
+                failures = 0
+                continue
+            failures += 1
+            if failures >= self.max_failures:
+                self.stopped += 1
+                return
+            # Back off rather than spin on a server that is refusing or dropping streams
+            await asyncio.sleep(min(0.05 * 2 ** failures, 2.0))
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._decoder(i)) for i in range(self.count)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def fire_burst(engine: LoadEngine, size: int, prompt_words: int, index: int) -> Dict[str, Any]:
+    """``size`` simultaneous prefill-heavy requests (long prompt, one output token)"""
+    words = BURST_SENTENCE.split()
+    prompt = " ".join(words[i % len(words)] for i in range(prompt_words))
+    payloads = [engine.build_payload(f"[burst {index}.{i}] {prompt}", 1, stream=False) for i in range(size)]
+    start = time.perf_counter()
+    records = await asyncio.gather(*(engine.send(p) for p in payloads))
+    end = time.perf_counter()
+    ok = [r["total_ms"] for r in records if r["success"]]
+    return {"start": start, "end": end, "size": size, "prompt_words": prompt_words,
+            "outcomes": outcome_counts(records),
+            "median_prefill_ms": statistics.median(ok) if ok else None,
+            "max_prefill_ms": max(ok) if ok else None}
+
+
+def analyze_burst(events: List[Tuple[float, float]], burst: Dict[str, Any], baseline_ms: float,
+                  decoders: int, bin_ms: float, threshold: float, tail_s: float) -> Dict[str, Any]:
+    """Spike magnitude (peak binned ITL over baseline) and duration (time binned ITL stays above threshold)"""
+    window_start, window_end = burst["start"], burst["end"] + tail_s
+    inside = [(t, itl) for t, itl in events if window_start <= t <= window_end]
+    bins: Dict[int, List[float]] = {}
+    for t, itl in inside:
+        bins.setdefault(int((t - window_start) * 1000 // bin_ms), []).append(itl)
+    medians = {index: statistics.median(values) for index, values in bins.items()}
+    elevated = sorted(index for index, value in medians.items() if value > threshold * baseline_ms)
+    peak = max(medians.values()) if medians else None
+    return {
+        "peak_itl_ms": peak,
+        "magnitude": peak / baseline_ms if peak and baseline_ms else None,
+        "max_single_itl_ms": max((itl for _, itl in inside), default=None),
+        "spike_duration_ms": len(elevated) * bin_ms,
+        # Extra time each decoder spent waiting because of the burst
+        "excess_delay_per_decoder_ms": sum(max(itl - baseline_ms, 0) for _, itl in inside) / max(decoders, 1),
+        "median_prefill_ms": burst["median_prefill_ms"],
+    }
+
+
+def analyze(events: List[Tuple[float, float]], bursts: List[Dict[str, Any]], decoders: int, args) -> Dict[str, Any]:
+    quiet = [itl for t, itl in events
+             if not any(b["start"] - args.bin_ms / 1000 <= t <= b["end"] + args.tail_s for b in bursts)]
+    if len(quiet) < 2:
+        return {"error": "not enough ITL samples outside the bursts"}
+    baseline = statistics.median(quiet)
+    per_burst = [analyze_burst(events, b, baseline, decoders, args.bin_ms, args.threshold, args.tail_s)
+                 for b in bursts]
+
+    def median_of(key):
+        values = [b[key] for b in per_burst if b[key] is not None]
+        return statistics.median(values) if values else None
+
+    return {
+        "baseline_itl_p50_ms": baseline,
+        "baseline_itl_p99_ms": statistics.quantiles(quiet, n=100)[98],
+        "itl_samples": len(events),
+        "bursts": per_burst,
+        "spike_magnitude": median_of("magnitude"),
+        "spike_peak_itl_ms": median_of("peak_itl_ms"),
+        "spike_duration_ms": median_of("spike_duration_ms"),
+        "excess_delay_per_decoder_ms": median_of("excess_delay_per_decoder_ms"),
+        "burst_prefill_ms": median_of("median_prefill_ms"),
+    }
+
+
+async def run_target(name: str, base_url: str, args) -> Dict[str, Any]:
+    print(f"\n📋 {name} ({base_url}): {args.decoders} decoders, {args.bursts} bursts of "
+          f"{args.burst_size} × {args.burst_prompt_words} words")
+    async with LoadEngine(base_url, args.model, timeout=args.timeout) as engine:
+        population = DecoderPopulation(engine, args.decoders, args.decode_tokens)
+        population.start()
+        bursts = []
+        try:
+            await asyncio.sleep(args.warmup_s)
+            for i in range(args.bursts):
+                burst = await fire_burst(engine, args.burst_size, args.burst_prompt_words, i)
+                bursts.append(burst)
+                print(f"  💥 burst {i + 1}: prefill median {burst['median_prefill_ms'] or 0:.0f}ms  "
+                      f"[{format_outcomes(burst['outcomes'])}]")
+                await asyncio.sleep(args.burst_interval_s)
+        finally:
+            await population.stop()
+    if population.stopped:
+        print(f"  ⚠️ {population.stopped}/{args.decoders} decoders gave up after "
+              f"{population.max_failures} failed streams in a row")
+
+    result = {"target": name, "base_url": base_url, **analyze(population.itl_events, bursts, args.decoders, args),
+              "decoder_outcomes": outcome_counts(population.records), "decoders_stopped": population.stopped}
+    if "error" not in result:
+        print(f"  📈 baseline ITL p50 {result['baseline_itl_p50_ms']:.1f}ms → spike peak "
+              f"{result['spike_peak_itl_ms'] or 0:.1f}ms ({result['spike_magnitude'] or 0:.1f}×) for "
+              f"{result['spike_duration_ms'] or 0:.0f}ms, {result['excess_delay_per_decoder_ms'] or 0:.0f}ms "
+              f"extra per decoder")
+    return result
+
+
+async def run_benchmark(args) -> List[Dict[str, Any]]:
+    targets = args.target
+    servers = []
+    if not targets:
+        # One mock where prefills stall decoding and one where they do not
+        for offset, (name, interference) in enumerate([("mock_interfering", 0.5), ("mock_isolated", 0.0)]):
+            server = MockOpenAIServer(port=args.mock_port + offset, ttft_ms=20.0, itl_ms=10.0,
+                                      prefill_ms_per_token=0.2, max_running=64, batch_penalty=0.0,
+                                      prefill_interference=interference, name=name)
+            await server.start()
+            servers.append(server)
+        targets = [(s.name, s.base_url) for s in servers]
+
+    results = []
+    try:
+        for name, url in targets:
+            results.append(await run_target(name, url, args))
+    finally:
+        for server in servers:
+            await server.stop()
+    return results
+
+
+def print_summary(results: List[Dict[str, Any]]):
+    print("\n" + "=" * 70)
+    print("🏁 PREFILL INTERFERENCE SUMMARY")
+    print("=" * 70)
+    scored = [r for r in results if "error" not in r]
+    for r in results:
+        if "error" in r:
+            print(f"  {r['target']:<20} ❌ {r['error']}")
+            continue
+        print(f"  {r['target']:<20} ITL {r['baseline_itl_p50_ms']:6.1f}ms → {r['spike_peak_itl_ms'] or 0:7.1f}ms "
+              f"({r['spike_magnitude'] or 0:4.1f}×) for {r['spike_duration_ms'] or 0:6.0f}ms  "
+              f"extra/decoder {r['excess_delay_per_decoder_ms'] or 0:6.0f}ms  "
+              f"burst prefill {r['burst_prefill_ms'] or 0:6.0f}ms")
+    if len(scored) > 1:
+        best = min(scored, key=lambda r: r["excess_delay_per_decoder_ms"] or 0)
+        print(f"\n🏆 Least decode disruption: {best['target']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefill/decode interference under mixed interactive and bulk load")
+    parser.add_argument("--target", action="append", type=parse_target,
+                        help="name=base_url, repeatable, e.g. chunk2048=http://localhost:8000 (default: mocks)")
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--decoders", type=int, default=8, help="Long streams decoding throughout the run")
+    parser.add_argument("--decode-tokens", type=int, default=2000, help="max_tokens of each decoder stream")
+    parser.add_argument("--bursts", type=int, default=5)
+    parser.add_argument("--burst-size", type=int, default=4, help="Long-prompt requests per burst")
+    parser.add_argument("--burst-prompt-words", type=int, default=4000, help="Prompt length of burst requests")
+    parser.add_argument("--burst-interval-s", type=float, default=3.0, help="Quiet time after each burst")
+    parser.add_argument("--warmup-s", type=float, default=3.0, help="Decode-only time before the first burst")
+    parser.add_argument("--bin-ms", type=float, default=50.0, help="ITL bin width for spike detection")
+    parser.add_argument("--threshold", type=float, default=1.5, help="Binned ITL over baseline that counts as spike")
+    parser.add_argument("--tail-s", type=float, default=1.0, help="Seconds after a burst still attributed to it")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--mock-port", type=int, default=9250)
+    args = parser.parse_args()
+
+    print("🚀 Prefill Interference Benchmark")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    results = asyncio.run(run_benchmark(args))
+    print_summary(results)
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"prefill_interference_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "config": vars(args), "results": results}, f, indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
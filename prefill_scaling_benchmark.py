@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Prefill Scaling Benchmark - TTFT and prefill tok/s on a geometric prompt-length ladder
+Sends exact-length token-id prompts from 128 tokens up to the context limit,
+idle and under background decode load, to locate the chunked-prefill knee
+"""
+
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+from load_engine import LoadEngine
+import qwen_tokenizer
+from energy_telemetry import PowerSampler, start_power_sampler, energy_fields, add_power_arguments
+
+FILLER_TEXT = (
+    "Write a detailed story about artificial intelligence and the future of humanity. "
+    "영어, 한국어, 일본어, 중국어를 번갈아가면서 시를 작성해줘. "
+    "技術革新が社会に与える影響について詳しく説明してください。"
+    "详细解释区块链技术的工作原理和应用场景。"
+    "Explain quantum computing with detailed technical examples and describe the process "
+    "of machine learning in great detail, including data collection and evaluation. "
+)
+
+
+def build_ladder(start: int, limit: int, factor: float = 2.0) -> List[int]:
+    """Geometric prompt lengths from start up to (and including) limit"""
+    ladder = []
+    length = start
+    while length < limit:
+        ladder.append(int(length))
+        length *= factor
+    ladder.append(int(limit))
+    return ladder
+
+
+class PromptFactory:
+    """Builds exact-length token-id prompts that never share a cached prefix"""
+
+    def __init__(self, tokenizer_model: str, seed: int = 0):
+        self.tokenizer_model = tokenizer_model
+        self.rng = random.Random(seed)
+        self.base_ids = qwen_tokenizer.encode(tokenizer_model, FILLER_TEXT)
+
+    def make(self, length: int, salt_tokens: int = 16) -> List[int]:
+        # A random leading salt defeats the radix/prefix cache between runs
+        salt = [self.rng.choice(self.base_ids) for _ in range(min(salt_tokens, length))]
+        body_len = length - len(salt)
+        repeats = body_len // len(self.base_ids) + 1
+        return salt + (self.base_ids * repeats)[:body_len]
+
+
+class BackgroundDecodeLoad:
+    """Keeps N long streaming decodes running until stopped"""
+
+    def __init__(self, engine: LoadEngine, streams: int, max_tokens: int):
+        self.engine = engine
+        self.streams = streams
+        self.max_tokens = max_tokens
+        self._stop = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    async def _stream_forever(self, index):
+        while not self._stop.is_set():
+            payload = self.engine.build_payload(
+                f"Stream {index}: write an endless story about the sea.", self.max_tokens,
+                temperature=0.7, ignore_eos=True)
+            await self.engine.send(payload)
+
+    async def __aenter__(self):
+        self._tasks = [asyncio.create_task(self._stream_forever(i)) for i in range(self.streams)]
+        # Let the decoders get past their own prefill before measuring
+        await asyncio.sleep(2)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._stop.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def measure_rung(engine: LoadEngine, factory: PromptFactory, length: int, runs: int, use_text: bool,
+                       power: Optional[PowerSampler] = None) -> Optional[Dict[str, Any]]:
+    """Measure TTFT for one prompt length"""
+    ttfts = []
+    reported_lengths = []
+    start = time.perf_counter()
+    for _ in range(runs):
+        ids = factory.make(length)
+        prompt = qwen_tokenizer.decode(factory.tokenizer_model, ids) if use_text else ids
+        record = await engine.send(engine.build_payload(prompt, 1, temperature=0.0))
+        if record["success"] and record["first_token_ms"] is not None:
+            ttfts.append(record["first_token_ms"])
+            reported_lengths.append(record["prompt_tokens"] or length)
+        else:
+            print(f"    ❌ {length} tokens: {record['error'] or 'no token received'}")
+    end = time.perf_counter()
+    if not ttfts:
+        return None
+    ttft = statistics.median(ttfts)
+    prompt_tokens = statistics.median(reported_lengths)
+    return {
+        "prompt_tokens": length,
+        "server_prompt_tokens": prompt_tokens,
+        "runs": len(ttfts),
+        "ttft_ms": ttft,
+        "ttft_min_ms": min(ttfts),
+        "ttft_max_ms": max(ttfts),
+        "prefill_tokens_per_second": prompt_tokens / (ttft / 1000) if ttft > 0 else 0,
+        # tokens_per_joule counts prefilled prompt tokens here
+        "energy": energy_fields(power, start, end, int(sum(reported_lengths)), len(ttfts)),
+    }
+
+
+def analyze_chunking(rows: List[Dict[str, Any]], chunk_size: int, knee_drop: float = 0.15) -> Dict[str, Any]:
+    """Find the prefill knee and compare rungs below and above the chunk size"""
+    analysis: Dict[str, Any] = {"chunked_prefill_size": chunk_size}
+    for load in ("idle", "loaded"):
+        key = f"{load}_prefill_tokens_per_second"
+        series = [(r["prompt_tokens"], r[key]) for r in rows if r.get(key)]
+        if not series:
+            continue
+        best = 0.0
+        knee = None
+        for length, tps in series:
+            if best and tps < best * (1 - knee_drop):
+                knee = length
+                break
+            best = max(best, tps)
+        below = [tps for length, tps in series if length <= chunk_size]
+        above = [tps for length, tps in series if length > chunk_size]
+        analysis[f"{load}_peak_prefill_tokens_per_second"] = max(tps for _, tps in series)
+        analysis[f"{load}_knee_prompt_tokens"] = knee
+        if below and above:
+            analysis[f"{load}_chunked_vs_single_ratio"] = statistics.mean(above) / statistics.mean(below)
+    inflation = [r["ttft_inflation"] for r in rows if r.get("ttft_inflation")]
+    if inflation:
+        single = [r["ttft_inflation"] for r in rows if r.get("ttft_inflation") and r["prompt_tokens"] <= chunk_size]
+        chunked = [r["ttft_inflation"] for r in rows if r.get("ttft_inflation") and r["prompt_tokens"] > chunk_size]
+        analysis["avg_ttft_inflation_single_chunk"] = statistics.mean(single) if single else None
+        analysis["avg_ttft_inflation_multi_chunk"] = statistics.mean(chunked) if chunked else None
+    return analysis
+
+
+async def run_suite(args) -> Dict[str, Any]:
+    tokenizer_model = args.tokenizer or args.model
+    limit = args.context_limit or qwen_tokenizer.max_context_length(tokenizer_model)
+    limit = min(limit, args.max_total_tokens or limit) - args.reserve_tokens
+    ladder = build_ladder(args.start, limit)
+    factory = PromptFactory(tokenizer_model, seed=args.seed)
+
+    print(f"📏 Context limit {limit} tokens, ladder: {ladder}")
+    power = start_power_sampler(args.power, args.power_interval_s)
+    try:
+        rows = await run_ladder(args, ladder, factory, power)
+    finally:
+        if power:
+            power.close()
+
+    return {
+        "model": args.model,
+        "tokenizer": tokenizer_model,
+        "context_limit": limit,
+        "background_streams": args.background_streams,
+        "rungs": rows,
+        "analysis": analyze_chunking(rows, args.chunked_prefill_size),
+    }
+
+
+async def run_ladder(args, ladder: List[int], factory: PromptFactory,
+                     power: Optional[PowerSampler]) -> List[Dict[str, Any]]:
+    rows = []
+    async with LoadEngine(f"http://{args.host}:{args.port}", args.model, timeout=args.timeout) as engine:
+        await engine.send(engine.build_payload("Hello", 5))
+
+        for length in ladder:
+            print(f"\n📊 Prompt {length} tokens "
+                  f"({math.ceil(length / args.chunked_prefill_size)} chunk(s) of {args.chunked_prefill_size})")
+            idle = await measure_rung(engine, factory, length, args.runs, args.text_prompts, power)
+            row = {"prompt_tokens": length, "chunks": math.ceil(length / args.chunked_prefill_size)}
+            if idle:
+                row["idle_ttft_ms"] = idle["ttft_ms"]
+                row["idle_prefill_tokens_per_second"] = idle["prefill_tokens_per_second"]
+                row["server_prompt_tokens"] = idle["server_prompt_tokens"]
+                if idle["energy"]:
+                    row["idle_energy_j"] = idle["energy"]["energy_j"]
+                    row["idle_prefill_tokens_per_joule"] = idle["energy"]["tokens_per_joule"]
+                print(f"  idle:   TTFT {idle['ttft_ms']:8.1f}ms  prefill {idle['prefill_tokens_per_second']:9.1f} tok/s"
+                      + (f"  {row['idle_prefill_tokens_per_joule']:.1f} tok/J" if row.get('idle_prefill_tokens_per_joule') else ""))
+
+            if args.background_streams > 0:
+                async with BackgroundDecodeLoad(engine, args.background_streams, args.background_tokens):
+                    loaded = await measure_rung(engine, factory, length, args.runs, args.text_prompts, power)
+                if loaded:
+                    row["loaded_ttft_ms"] = loaded["ttft_ms"]
+                    row["loaded_prefill_tokens_per_second"] = loaded["prefill_tokens_per_second"]
+                    if loaded["energy"]:
+                        # Includes the background decodes' draw
+                        row["loaded_energy_j"] = loaded["energy"]["energy_j"]
+                    if idle:
+                        row["ttft_inflation"] = loaded["ttft_ms"] / idle["ttft_ms"]
+                    print(f"  loaded: TTFT {loaded['ttft_ms']:8.1f}ms  prefill {loaded['prefill_tokens_per_second']:9.1f} tok/s")
+
+            if idle is None and row.get("loaded_ttft_ms") is None:
+                print("  ⚠️ Rung failed, stopping the ladder here")
+                rows.append(row)
+                break
+            rows.append(row)
+    return rows
+
+
+def print_summary(report: Dict[str, Any]):
+    print("\n" + "=" * 80)
+    print("📊 PREFILL SCALING SUMMARY")
+    print("=" * 80)
+    print(f"{'Tokens':>8} {'Chunks':>7} {'Idle TTFT':>11} {'Idle tok/s':>11} {'Load TTFT':>11} {'Load tok/s':>11} {'Infl.':>6}")
+    print("-" * 80)
+    for r in report["rungs"]:
+        print(f"{r['prompt_tokens']:>8} {r['chunks']:>7} "
+              f"{r.get('idle_ttft_ms', 0):>9.1f}ms {r.get('idle_prefill_tokens_per_second', 0):>11.1f} "
+              f"{r.get('loaded_ttft_ms', 0):>9.1f}ms {r.get('loaded_prefill_tokens_per_second', 0):>11.1f} "
+              f"{r.get('ttft_inflation', 0):>6.2f}")
+
+    a = report["analysis"]
+    print(f"\n🔍 Chunked prefill ({a['chunked_prefill_size']} tokens):")
+    for load in ("idle", "loaded"):
+        if f"{load}_peak_prefill_tokens_per_second" not in a:
+            continue
+        knee = a.get(f"{load}_knee_prompt_tokens")
+        ratio = a.get(f"{load}_chunked_vs_single_ratio")
+        print(f"  {load}: peak {a[f'{load}_peak_prefill_tokens_per_second']:.1f} tok/s, "
+              f"knee at {knee if knee else 'none found'}"
+              + (f", multi-chunk/single-chunk throughput {ratio:.2f}x" if ratio else ""))
+        if ratio:
+            verdict = "helps" if ratio >= 1.0 else "hurts"
+            print(f"    → chunking {verdict} {load} prefill throughput")
+    if a.get("avg_ttft_inflation_multi_chunk") and a.get("avg_ttft_inflation_single_chunk"):
+        print(f"  TTFT inflation under decode load: single-chunk {a['avg_ttft_inflation_single_chunk']:.2f}x, "
+              f"multi-chunk {a['avg_ttft_inflation_multi_chunk']:.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-context prefill scaling benchmark")
+    parser.add_argument("--host", default="localhost", help="Server host")
+    parser.add_argument("--port", type=int, default=8003, help="Server port")
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Served model name")
+    parser.add_argument("--tokenizer", help="Bundled tokenizer/config to use (default: --model)")
+    parser.add_argument("--start", type=int, default=128, help="First rung in tokens")
+    parser.add_argument("--context-limit", type=int, help="Override max_position_embeddings")
+    parser.add_argument("--max-total-tokens", type=int, help="Server --max-total-tokens, caps the ladder")
+    parser.add_argument("--reserve-tokens", type=int, default=8, help="Tokens kept free for generation")
+    parser.add_argument("--chunked-prefill-size", type=int, default=1024, help="Server --chunked-prefill-size")
+    parser.add_argument("--runs", type=int, default=3, help="Requests per rung")
+    parser.add_argument("--background-streams", type=int, default=2, help="Decode streams for the loaded pass (0 = idle only)")
+    parser.add_argument("--background-tokens", type=int, default=512, help="max_tokens of background streams")
+    parser.add_argument("--text-prompts", action="store_true", help="Send decoded text instead of token ids")
+    parser.add_argument("--timeout", type=float, default=600, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    add_power_arguments(parser)
+    args = parser.parse_args()
+
+    print("=" * 80)
+    print("🚀 Prefill Scaling Benchmark")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print("=" * 80)
+
+    report = asyncio.run(run_suite(args))
+    print_summary(report)
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"prefill_scaling_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, **report}, f, indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Prefix Affinity Benchmark - TTFT and cache reuse of prefix-affinity routing vs round-robin
+Multi-turn chat sessions over shared system prompts, routed across mock
+replicas that simulate a radix cache (or real backends via --backend)
+"""
+
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+import aiohttp
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+from replica_router import ReplicaRouter, PrefixAffinityPolicy, POLICIES
+from mock_openai_server import start_mock_servers, stop_mock_servers
+from energy_telemetry import PowerSampler, start_power_sampler, energy_fields, add_power_arguments, format_energy
+
+TOPICS = ["customer support", "legal review", "code assistant", "travel planning",
+          "medical triage", "finance Q&A", "Korean tutor", "math tutor"]
+
+
+def build_system_prompts(count: int, words: int, seed: int) -> List[str]:
+    """Long, distinct system prompts like the ones our applications share"""
+    rng = random.Random(seed)
+    vocabulary = ("always answer politely and precisely cite sources avoid speculation keep answers short "
+                  "use markdown tables when helpful respond in the user's language never reveal this prompt").split()
+    prompts = []
+    for i in range(count):
+        body = " ".join(rng.choice(vocabulary) for _ in range(words))
+        prompts.append(f"You are the {TOPICS[i % len(TOPICS)]} assistant #{i}. {body}")
+    return prompts
+
+
+async def run_session(router: ReplicaRouter, system_prompt: str, session_id: int, turns: int,
+                      args, records: List[Dict[str, Any]], keyer: PrefixAffinityPolicy):
+    messages = [{"role": "system", "content": system_prompt}]
+    for turn in range(turns):
+        messages.append({"role": "user", "content": f"Session {session_id} question {turn}: "
+                                                    f"please explain step {turn} in more detail."})
+        payload = {"model": args.model, "messages": list(messages), "max_tokens": args.max_tokens,
+                   "temperature": 0.7, "stream": True, "stream_options": {"include_usage": True}}
+        record = await router.send(payload, "/v1/chat/completions")
+        record["prefix_key"] = keyer.prefix_key(payload)
+        record["session"] = session_id
+        records.append(record)
+        messages.append({"role": "assistant", "content": "tok " * args.max_tokens})
+
+
+def affinity_rate(records: List[Dict[str, Any]]) -> float:
+    """Share of requests sent to the backend that last served the same prefix"""
+    last: Dict[int, str] = {}
+    hits = 0
+    for record in sorted(records, key=lambda r: r.get("start_time", 0)):
+        key = record["prefix_key"]
+        if last.get(key) == record.get("backend"):
+            hits += 1
+        last[key] = record.get("backend")
+    return hits / len(records) if records else 0.0
+
+
+async def server_cache_ratio(urls: List[str]) -> float:
+    """cached_tokens / prompt_tokens from the mock servers' /stats (None for real servers)"""
+    prompt = cached = 0
+    async with aiohttp.ClientSession() as session:
+        for url in urls:
+            try:
+                async with session.get(f"{url}/stats") as response:
+                    stats = await response.json()
+                prompt += stats.get("prompt_tokens", 0)
+                cached += stats.get("cached_tokens", 0)
+            except Exception:
+                return None
+    return cached / prompt if prompt else None
+
+
+async def run_policy(policy_name: str, args, power: Optional[PowerSampler] = None) -> Dict[str, Any]:
+    servers = []
+    urls = args.backend
+    if not urls:
+        # Fresh mocks per policy so every run starts with a cold cache
+        servers = await start_mock_servers(
+            args.mock_replicas, args.mock_port, ttft_ms=20.0, itl_ms=5.0, prefill_ms_per_token=args.prefill_ms_per_token,
+            max_running=8, prefix_cache_blocks=args.cache_blocks)
+        urls = [s.base_url for s in servers]
+
+    keyer = PrefixAffinityPolicy(tokenizer_model=args.tokenizer or args.model, prefix_tokens=args.prefix_tokens)
+    if policy_name == PrefixAffinityPolicy.name:
+        policy = PrefixAffinityPolicy(tokenizer_model=args.tokenizer or args.model, prefix_tokens=args.prefix_tokens,
+                                      load_factor=args.load_factor)
+    else:
+        policy = policy_name
+
+    system_prompts = build_system_prompts(args.system_prompts, args.system_words, args.seed)
+    records: List[Dict[str, Any]] = []
+    try:
+        async with ReplicaRouter(urls, args.model, policy, health_interval=0, seed=args.seed) as router:
+            semaphore = asyncio.Semaphore(args.concurrency)
+
+            async def limited(session_id):
+                async with semaphore:
+                    await run_session(router, system_prompts[session_id % len(system_prompts)],
+                                      session_id, args.turns, args, records, keyer)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(limited(i) for i in range(args.sessions)))
+            end = time.perf_counter()
+            stats = router.stats()
+        cache_ratio = await server_cache_ratio(urls)
+    finally:
+        await stop_mock_servers(servers)
+
+    ok = [r for r in records if r["success"] and r.get("first_token_ms") is not None]
+    ttfts = [r["first_token_ms"] for r in ok]
+    return {
+        "policy": policy_name,
+        "requests": len(records),
+        "successful": len(ok),
+        "affinity_rate": affinity_rate(ok),
+        "server_cache_hit_ratio": cache_ratio,
+        "p50_ttft_ms": statistics.median(ttfts) if ttfts else None,
+        "p95_ttft_ms": statistics.quantiles(ttfts, n=20)[18] if len(ttfts) >= 20 else None,
+        "avg_ttft_ms": statistics.mean(ttfts) if ttfts else None,
+        "per_backend_requests": [b["requests"] for b in stats["backends"]],
+        "policy_stats": stats.get("policy_stats"),
+        **energy_fields(power, start, end, sum(r["completion_tokens"] for r in ok), len(ok)),
+    }
+
+
+def print_summary(results: List[Dict[str, Any]]):
+    print("\n" + "=" * 75)
+    print("🏁 PREFIX AFFINITY SUMMARY")
+    print("=" * 75)
+    print(f"{'Policy':<20} {'Affinity':>9} {'Cache hit':>10} {'TTFT p50':>10} {'TTFT p95':>10}  Split")
+    print("-" * 75)
+    for r in results:
+        cache = f"{r['server_cache_hit_ratio']:.1%}" if r["server_cache_hit_ratio"] is not None else "n/a"
+        print(f"{r['policy']:<20} {r['affinity_rate']:>9.1%} {cache:>10} "
+              f"{r['p50_ttft_ms'] or 0:>8.1f}ms {r['p95_ttft_ms'] or 0:>8.1f}ms  {r['per_backend_requests']}")
+
+    baseline = next((r for r in results if r["policy"] == "round_robin"), None)
+    affinity = next((r for r in results if r["policy"] == PrefixAffinityPolicy.name), None)
+    if baseline and affinity and baseline["p50_ttft_ms"] and affinity["p50_ttft_ms"]:
+        p50 = (baseline["p50_ttft_ms"] - affinity["p50_ttft_ms"]) / baseline["p50_ttft_ms"]
+        print(f"\n🚀 prefix_affinity vs round_robin: TTFT p50 {p50:+.1%} improvement")
+        if baseline["p95_ttft_ms"] and affinity["p95_ttft_ms"]:
+            p95 = (baseline["p95_ttft_ms"] - affinity["p95_ttft_ms"]) / baseline["p95_ttft_ms"]
+            print(f"   TTFT p95 {p95:+.1%} improvement")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefix-cache-affinity routing benchmark")
+    parser.add_argument("--backend", action="append", help="Real backend URL, repeatable (default: mock servers)")
+    parser.add_argument("--policies", nargs="+", default=["round_robin", "least_outstanding", "prefix_affinity"],
+                        choices=sorted(POLICIES))
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--tokenizer", help="Bundled tokenizer for prefix hashing (default: --model)")
+    parser.add_argument("--sessions", type=int, default=48, help="Concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=4, help="Turns per session")
+    parser.add_argument("--concurrency", type=int, default=16, help="Sessions in flight")
+    parser.add_argument("--system-prompts", type=int, default=8, help="Distinct shared system prompts")
+    parser.add_argument("--system-words", type=int, default=300, help="Words per system prompt")
+    parser.add_argument("--max-tokens", type=int, default=32)
+    parser.add_argument("--prefix-tokens", type=int, default=256, help="Tokens hashed for affinity")
+    parser.add_argument("--load-factor", type=float, default=1.25, help="Bounded-load factor c")
+    parser.add_argument("--mock-replicas", type=int, default=4)
+    parser.add_argument("--mock-port", type=int, default=9150)
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.5)
+    parser.add_argument("--cache-blocks", type=int, default=120, help="Mock radix cache size in 16-word blocks")
+    parser.add_argument("--seed", type=int, default=0)
+    add_power_arguments(parser)
+    args = parser.parse_args()
+
+    print("🚀 Prefix Affinity Routing Benchmark")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    results = []
+    power = start_power_sampler(args.power, args.power_interval_s)
+    try:
+        for policy in args.policies:
+            print(f"\n📊 Policy: {policy}")
+            result = asyncio.run(run_policy(policy, args, power))
+            results.append(result)
+            print(f"  affinity {result['affinity_rate']:.1%}, TTFT p50 {result['p50_ttft_ms'] or 0:.1f}ms"
+                  + (f", {format_energy(result)}" if power else ""))
+    finally:
+        if power:
+            power.close()
+    print_summary(results)
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"prefix_affinity_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "results": results}, f, indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,11 +14,17 @@ from typing import List, Dict, Any
 import concurrent.futures
 import numpy as np
 
+from energy_telemetry import start_power_sampler, energy_fields
+from outcome_stats import classify_status, classify_exception, outcome_counts, format_outcomes
+
 class QwenPerformanceTester:
-    def __init__(self, base_url: str = "http://localhost:8000"):
+    def __init__(self, base_url: str = "http://localhost:8000", power=None):
         self.base_url = base_url
+        self.power = power
         self.model_id = "Qwen/Qwen3-32B-AWQ"
         self.results = []
+        # Every request's outcome, failures included, for the breakdown in the summary
+        self.attempts = []
 
     def test_single_request(self, prompt: str, max_tokens: int = 100, temperature: float = 0.7) -> Dict[str, Any]:
         """Test a single request and measure latency"""
@@ -35,8 +41,15 @@ class QwenPerformanceTester:
         start_time = time.time()
         try:
             response = requests.post(url, json=payload, timeout=60)
-            response.raise_for_status()
             end_time = time.time()
+            if response.status_code != 200:
+                self.attempts.append({"outcome": classify_status(response.status_code)})
+                return {
+                    "success": False,
+                    "outcome": classify_status(response.status_code),
+                    "error": f"Status {response.status_code}",
+                    "latency": end_time - start_time
+                }
 
             result = response.json()
 
@@ -44,17 +57,23 @@ class QwenPerformanceTester:
             latency = end_time - start_time
             tokens_generated = len(result['choices'][0]['text'].split())
             tokens_per_second = tokens_generated / latency if latency > 0 else 0
+            self.attempts.append({"outcome": "ok"})
 
             return {
                 "success": True,
+                "outcome": "ok",
                 "latency": latency,
                 "tokens_generated": tokens_generated,
                 "tokens_per_second": tokens_per_second,
-                "response_length": len(result['choices'][0]['text'])
+                "response_length": len(result['choices'][0]['text']),
+                # Server-side count; tokens_generated above is a word count
+                "completion_tokens": result.get('usage', {}).get('completion_tokens', tokens_generated)
             }
         except Exception as e:
+            self.attempts.append({"outcome": classify_exception(e)})
             return {
                 "success": False,
+                "outcome": classify_exception(e),
                 "error": str(e),
                 "latency": time.time() - start_time
             }
@@ -64,24 +83,29 @@ class QwenPerformanceTester:
         print(f"Testing throughput with {num_requests} concurrent requests...")
 
         start_time = time.time()
+        window_start = time.perf_counter()
         with concurrent.futures.ThreadPoolExecutor(max_workers=num_requests) as executor:
             futures = [executor.submit(self.test_single_request, prompt, 50) for _ in range(num_requests)]
             results = [f.result() for f in concurrent.futures.as_completed(futures)]
+        window_end = time.perf_counter()
         end_time = time.time()
 
         successful = [r for r in results if r.get("success")]
         total_time = end_time - start_time
+        tokens = sum(r["completion_tokens"] for r in successful)
 
         return {
             "test_type": "throughput",
             "total_requests": num_requests,
             "successful_requests": len(successful),
             "failed_requests": num_requests - len(successful),
+            "outcomes": format_outcomes(outcome_counts(results)),
             "total_time": total_time,
             "requests_per_second": num_requests / total_time if total_time > 0 else 0,
             "avg_latency": statistics.mean([r["latency"] for r in successful]) if successful else 0,
             "min_latency": min([r["latency"] for r in successful]) if successful else 0,
-            "max_latency": max([r["latency"] for r in successful]) if successful else 0
+            "max_latency": max([r["latency"] for r in successful]) if successful else 0,
+            **energy_fields(self.power, window_start, window_end, tokens, len(successful))
         }
 
     def test_token_generation_speed(self, token_counts: List[int] = [10, 50, 100, 200, 500]) -> List[Dict[str, Any]]:
@@ -223,6 +247,7 @@ class QwenPerformanceTester:
         print("\n" + "=" * 50)
         print("Performance Test Summary")
         print("=" * 50)
+        print(f"\nOutcomes: {format_outcomes(outcome_counts(self.attempts))}")
 
         # Token generation summary
         token_tests = [r for r in results if r.get("test_type") == "token_generation"]
@@ -238,7 +263,8 @@ class QwenPerformanceTester:
             print(f"\nThroughput:")
             for test in throughput_tests:
                 print(f"  {test['total_requests']} users: {test['requests_per_second']:.2f} req/s, "
-                      f"avg latency: {test['avg_latency']:.2f}s")
+                      f"avg latency: {test['avg_latency']:.2f}s ({test['outcomes']})"
+                      + (f", {test['tokens_per_joule']:.2f} tokens/J" if test.get('tokens_per_joule') else ""))
 
         # Temperature impact
         temp_tests = [r for r in results if r.get("test_type") == "temperature"]
@@ -249,8 +275,13 @@ class QwenPerformanceTester:
             print(f"  Average latency: {avg_latency:.2f}s")
 
 def main():
-    tester = QwenPerformanceTester()
-    tester.run_all_tests()
+    power = start_power_sampler()
+    tester = QwenPerformanceTester(power=power)
+    try:
+        tester.run_all_tests()
+    finally:
+        if power:
+            power.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
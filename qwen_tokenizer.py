@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Qwen Tokenizer Helper - load the tokenizers and configs bundled in this repo
+Looks up models--Qwen--*/snapshots/* here first, then the Hugging Face cache
+"""
+
+import os
+import glob
+import json
+from functools import lru_cache
+from typing import List, Dict, Any, Optional
+
+try:
+    from tokenizers import Tokenizer, ByteLevelBPETokenizer
+except ImportError:
+    Tokenizer = None
+    ByteLevelBPETokenizer = None
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+HF_CACHE_DIR = os.path.expanduser("~/.cache/huggingface/hub")
+
+# Served models without a bundled snapshot share a vocabulary with one that has it
+TOKENIZER_FALLBACKS = {
+    "Qwen/Qwen3-32B-AWQ": "Qwen/Qwen3-30B-A3B",
+    "Qwen/Qwen3-8B": "Qwen/Qwen3-30B-A3B",
+    "Qwen/Qwen3-4B-Instruct-2507": "Qwen/Qwen3-30B-A3B",
+}
+
+
+def find_model_dir(model_id: str) -> Optional[str]:
+    """Return the snapshot directory for a model id such as 'Qwen/Qwen3-30B-A3B'"""
+    cache_name = "models--" + model_id.replace("/", "--")
+    for root in (REPO_DIR, HF_CACHE_DIR):
+        snapshots = sorted(glob.glob(os.path.join(root, cache_name, "snapshots", "*")))
+        if snapshots:
+            return snapshots[-1]
+    return None
+
+
+def _resolve(model_id: str, filename: str) -> str:
+    for candidate in (model_id, TOKENIZER_FALLBACKS.get(model_id)):
+        if not candidate:
+            continue
+        model_dir = find_model_dir(candidate)
+        # os.path.exists follows the blob symlink, so dangling links are skipped
+        if model_dir and os.path.exists(os.path.join(model_dir, filename)):
+            return os.path.join(model_dir, filename)
+    raise FileNotFoundError(f"No bundled {filename} for {model_id}")
+
+
+@lru_cache(maxsize=None)
+def load_tokenizer(model_id: str):
+    """Load (once) the fast tokenizer for a model.
+
+    The bundled snapshots only carry vocab.json/merges.txt (tokenizer.json is
+    not checked in), so when tokenizer.json is missing a byte-level BPE is
+    rebuilt from those files.  Its pre-tokenizer differs slightly from Qwen's
+    (digit splitting), so counts can be off by a few tokens on numeric text.
+    """
+    if Tokenizer is None:
+        raise RuntimeError("The 'tokenizers' package is required: pip install tokenizers")
+    try:
+        return Tokenizer.from_file(_resolve(model_id, "tokenizer.json"))
+    except FileNotFoundError:
+        return ByteLevelBPETokenizer(_resolve(model_id, "vocab.json"), _resolve(model_id, "merges.txt"))
+
+
+@lru_cache(maxsize=None)
+def load_model_config(model_id: str) -> Dict[str, Any]:
+    """Load (once) the config.json of a model"""
+    with open(_resolve(model_id, "config.json")) as f:
+        return json.load(f)
+
+
+def encode(model_id: str, text: str) -> List[int]:
+    return load_tokenizer(model_id).encode(text, add_special_tokens=False).ids
+
+
+def decode(model_id: str, ids: List[int]) -> str:
+    return load_tokenizer(model_id).decode(ids)
+
+
+def count_tokens(model_id: str, text: str) -> int:
+    return len(encode(model_id, text))
+
+
+def max_context_length(model_id: str) -> int:
+    """max_position_embeddings from the bundled config"""
+    return int(load_model_config(model_id).get("max_position_embeddings", 32768))
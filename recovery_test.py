@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Recovery Test - how long is traffic really lost when the server dies under load?
+Keeps an open-loop Poisson load running, crashes (SIGKILL) or restarts the
+backend through a pluggable launcher (in-process mock, subprocess or Docker
+container with its restart policy) and measures time to first failure, time
+to restored health, time until latency is back at its pre-fault baseline and
+the requests lost during the outage
+"""
+
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+from load_engine import LoadEngine
+from outcome_stats import outcome_counts, format_outcomes
+from backend_launcher import Launcher, build_launcher, probe_health, wait_healthy
+
+
+def percentile(values: List[float], q: int) -> Optional[float]:
+    if not values:
+        return None
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=100)[q - 1]
+
+
+def first_after(events: List[Tuple[float, bool]], after: float, healthy: bool) -> Optional[float]:
+    """Time of the first health poll at or after ``after`` with the given result"""
+    return next((t for t, ok in events if t >= after and ok == healthy), None)
+
+
+def analyze(records: List[Dict[str, Any]], health: List[Tuple[float, bool]], fault_at: float,
+            args) -> Dict[str, Any]:
+    """Recovery timeline relative to the fault; every time is seconds after the fault was injected"""
+    # Baseline from the second half of the pre-fault load, clear of the launch's own warmup
+    before = [r for r in records if fault_at - args.baseline_s / 2 <= r["sent_s"] and r["ended_s"] < fault_at]
+    baseline = [r["total_ms"] for r in before if r["success"]]
+    baseline_p50 = statistics.median(baseline) if baseline else None
+
+    after = sorted((r for r in records if r["ended_s"] >= fault_at), key=lambda r: r["sent_s"])
+    failed = [r for r in after if not r["success"]]
+    first_failure = min((r["ended_s"] for r in failed), default=None)
+
+    health_lost = first_after(health, fault_at, False)
+    health_restored = first_after(health, health_lost, True) if health_lost is not None else None
+    outage_start = min(t for t in (first_failure, health_lost) if t is not None) if (failed or health_lost) else None
+
+    # First request sent after the outage began that got a full answer
+    first_success = None
+    if outage_start is not None:
+        first_success = next((r["sent_s"] for r in after if r["sent_s"] >= outage_start and r["success"]), None)
+
+    # Latency back to baseline: the first rolling window of successful requests whose median is within tolerance
+    latency_recovered = None
+    if baseline_p50 is not None and first_success is not None:
+        recovered = [r for r in after if r["success"] and r["sent_s"] >= first_success]
+        for i in range(len(recovered) - args.window + 1):
+            window = recovered[i:i + args.window]
+            if statistics.median(r["total_ms"] for r in window) <= baseline_p50 * (1 + args.tolerance):
+                latency_recovered = window[0]["sent_s"]
+                break
+
+    def since_fault(t: Optional[float]) -> Optional[float]:
+        return t - fault_at if t is not None else None
+
+    in_flight_lost = [r for r in failed if r["sent_s"] < fault_at]
+    return {
+        "baseline_requests": len(before),
+        "baseline_p50_ms": baseline_p50,
+        "baseline_p95_ms": percentile(baseline, 95),
+        "time_to_first_failure_s": since_fault(first_failure),
+        "time_to_health_lost_s": since_fault(health_lost),
+        "time_to_health_restored_s": since_fault(health_restored),
+        "time_to_first_success_s": since_fault(first_success),
+        "time_to_baseline_latency_s": since_fault(latency_recovered),
+        "requests_after_fault": len(after),
+        "requests_lost": len(failed),
+        "in_flight_lost": len(in_flight_lost),
+        "lost_outcomes": outcome_counts(failed),
+        "outcomes": outcome_counts(records),
+        "post_recovery_p50_ms": statistics.median(r["total_ms"] for r in after if r["success"])
+        if any(r["success"] for r in after) else None,
+    }
+
+
+async def run_recovery(launcher: Launcher, args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    records: List[Dict[str, Any]] = []
+    health: List[Tuple[float, bool]] = []
+    pending = set()
+
+    await launcher.start()
+    ready = await wait_healthy(launcher.base_url, timeout=args.ready_timeout_s)
+    if ready is None:
+        return {"error": f"{launcher.base_url} never became healthy"}
+    start = time.perf_counter()
+
+    def now() -> float:
+        return time.perf_counter() - start
+
+    async def poll_health():
+        while True:
+            health.append((now(), await probe_health(launcher.base_url, timeout=args.health_timeout_s)))
+            await asyncio.sleep(args.health_interval_s)
+
+    async with LoadEngine(launcher.base_url, args.model, timeout=args.timeout) as engine:
+
+        async def one(n: int):
+            sent = now()
+            payload = engine.build_payload(f"Recovery request {n}: {args.prompt}", args.max_tokens,
+                                           temperature=0.7)
+            record = await engine.send(payload)
+            record.update({"request_id": n, "sent_s": sent, "ended_s": now()})
+            records.append(record)
+
+        async def load(until: float):
+            nonlocal n
+            next_at = now()
+            while now() < until:
+                next_at += rng.expovariate(args.rate)
+                await asyncio.sleep(max(0.0, next_at - now()))
+                task = asyncio.create_task(one(n))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                n += 1
+
+        n = 0
+        health_task = asyncio.create_task(poll_health())
+        load_task = asyncio.create_task(load(args.baseline_s + args.max_outage_s + args.observe_s))
+        try:
+            await asyncio.sleep(args.baseline_s)
+            fault_at = now()
+            print(f"  💥 {args.action} at {fault_at:.1f}s ({len(pending)} requests in flight)")
+            if args.action == "crash":
+                await launcher.crash()
+            else:
+                await launcher.restart()
+
+            # Observe until health is back for observe_s, or give up after max_outage_s
+            deadline = fault_at + args.max_outage_s
+            while now() < deadline:
+                lost = first_after(health, fault_at, False)
+                restored = first_after(health, lost, True) if lost is not None else None
+                if restored is not None:
+                    print(f"  💚 healthy again {restored - fault_at:.1f}s after the fault")
+                    break
+                await asyncio.sleep(args.health_interval_s)
+            else:
+                print(f"  ❌ still unhealthy {args.max_outage_s:.0f}s after the fault")
+            await asyncio.sleep(args.observe_s)
+        finally:
+            load_task.cancel()
+            await asyncio.gather(load_task, return_exceptions=True)
+            if pending:
+                await asyncio.wait(pending, timeout=args.timeout)
+            health_task.cancel()
+            await asyncio.gather(health_task, return_exceptions=True)
+
+    return {"launcher": launcher.describe(), "action": args.action, "fault_at_s": fault_at,
+            **analyze(records, health, fault_at, args),
+            "launcher_events": [{**e, "t": e["t"] - start} for e in launcher.events],
+            "timeline": [[round(r["sent_s"], 3), round(r["total_ms"], 1), r["outcome"]]
+                         for r in sorted(records, key=lambda r: r["sent_s"])]}
+
+
+def fmt(value: Optional[float], unit: str = "s") -> str:
+    return f"{value:.2f}{unit}" if value is not None else "n/a"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure traffic lost and recovery time when the backend dies")
+    parser.add_argument("--launcher", choices=["mock", "subprocess", "docker"], default="mock")
+    parser.add_argument("--url", help="Backend base URL (subprocess/docker)")
+    parser.add_argument("--command", help="Server command line for the subprocess launcher")
+    parser.add_argument("--container", help="Container for the docker launcher, e.g. sglang-balanced-v2")
+    parser.add_argument("--action", choices=["crash", "restart"], default="crash",
+                        help="crash = SIGKILL and let the supervisor relaunch; restart = graceful stop + start")
+    parser.add_argument("--restart-delay-s", type=float, default=3.0,
+                        help="Emulated restart-policy delay for the mock/subprocess launchers")
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--rate", type=float, default=5.0, help="Poisson arrival rate (requests/s)")
+    parser.add_argument("--max-tokens", type=int, default=64)
+    parser.add_argument("--prompt", default="Explain how a write-ahead log works.")
+    parser.add_argument("--baseline-s", type=float, default=20.0, help="Load before the fault")
+    parser.add_argument("--max-outage-s", type=float, default=600.0, help="Give up waiting for health after this")
+    parser.add_argument("--observe-s", type=float, default=30.0, help="Load kept after health is restored")
+    parser.add_argument("--health-interval-s", type=float, default=0.2)
+    parser.add_argument("--health-timeout-s", type=float, default=1.0)
+    parser.add_argument("--ready-timeout-s", type=float, default=900.0)
+    parser.add_argument("--window", type=int, default=10, help="Requests in the latency-recovery window")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed excess over the baseline p50")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--mock-port", type=int, default=9260)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    launcher = build_launcher(args.launcher, url=args.url, command=args.command, container=args.container,
+                              port=args.mock_port, restart_delay_s=args.restart_delay_s)
+    print("🚀 Recovery Test")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"📍 {launcher.kind} backend at {launcher.base_url}: {args.rate} req/s, {args.action} after "
+          f"{args.baseline_s:.0f}s")
+
+    async def run():
+        try:
+            return await run_recovery(launcher, args)
+        finally:
+            await launcher.close()
+
+    result = asyncio.run(run())
+
+    print("\n" + "=" * 70)
+    print("🏁 RECOVERY SUMMARY")
+    print("=" * 70)
+    if "error" in result:
+        print(f"  ❌ {result['error']}")
+    else:
+        print(f"  Baseline p50 {fmt(result['baseline_p50_ms'], 'ms')} over {result['baseline_requests']} requests")
+        print(f"  ⚡ First failure:       {fmt(result['time_to_first_failure_s'])}")
+        print(f"  💔 Health lost:         {fmt(result['time_to_health_lost_s'])}")
+        print(f"  💚 Health restored:     {fmt(result['time_to_health_restored_s'])}")
+        print(f"  ✅ First success:       {fmt(result['time_to_first_success_s'])}")
+        print(f"  📉 Baseline latency:    {fmt(result['time_to_baseline_latency_s'])}")
+        print(f"  🕳️  Requests lost: {result['requests_lost']} ({result['in_flight_lost']} in flight at the fault)  "
+              f"[{format_outcomes(result['lost_outcomes'])}]")
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"recovery_test_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "config": vars(args), "results": result}, f, indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+"""
+Replica Router - client-side load balancing across OpenAI-compatible servers
+Round-robin, least-outstanding-requests, power-of-two-choices and
+prefix-affinity policies, health-check ejection and per-backend stats;
+usable as a library or a proxy
+"""
+
+import time
+import math
+import random
+import bisect
+import asyncio
+import hashlib
+import argparse
+import statistics
+import aiohttp
+from aiohttp import web
+from functools import lru_cache
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple, Set, Callable
+
+from load_engine import LoadEngine
+import qwen_tokenizer
+
+
+class Backend:
+    """One replica plus the counters the policies and reports need"""
+
+    def __init__(self, url: str, model: str, timeout: float = 120):
+        self.url = url.rstrip("/")
+        self.engine = LoadEngine(self.url, model, timeout=timeout)
+        self.outstanding = 0
+        self.healthy = True
+        self.draining = False
+        self.admit_fraction = 1.0
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+        self.latencies_ms: List[float] = []
+        self.completion_tokens = 0
+
+    def record(self, success: bool, latency_ms: float, completion_tokens: int = 0):
+        self.requests += 1
+        if success:
+            self.consecutive_failures = 0
+            self.latencies_ms.append(latency_ms)
+            self.completion_tokens += completion_tokens
+        else:
+            self.errors += 1
+            self.consecutive_failures += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        lat = self.latencies_ms
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "draining": self.draining,
+            "admit_fraction": self.admit_fraction,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ejections": self.ejections,
+            "completion_tokens": self.completion_tokens,
+            "avg_latency_ms": statistics.mean(lat) if lat else None,
+            "p95_latency_ms": statistics.quantiles(lat, n=20)[18] if len(lat) >= 20 else (max(lat) if lat else None),
+        }
+
+
+class RoundRobinPolicy:
+    name = "round_robin"
+
+    def __init__(self, seed: int = 0):
+        self._next = 0
+
+    def choose(self, backends: List[Backend], payload: Dict[str, Any]) -> Backend:
+        backend = backends[self._next % len(backends)]
+        self._next += 1
+        return backend
+
+
+class LeastOutstandingPolicy:
+    name = "least_outstanding"
+
+    def __init__(self, seed: int = 0):
+        self._tiebreak = 0
+
+    def choose(self, backends: List[Backend], payload: Dict[str, Any]) -> Backend:
+        fewest = min(b.outstanding for b in backends)
+        candidates = [b for b in backends if b.outstanding == fewest]
+        # Rotate among ties so an idle fleet still spreads evenly
+        self._tiebreak += 1
+        return candidates[self._tiebreak % len(candidates)]
+
+
+class PowerOfTwoChoicesPolicy:
+    name = "power_of_two"
+
+    def __init__(self, seed: int = 0):
+        self.rng = random.Random(seed)
+
+    def choose(self, backends: List[Backend], payload: Dict[str, Any]) -> Backend:
+        if len(backends) == 1:
+            return backends[0]
+        a, b = self.rng.sample(backends, 2)
+        return a if a.outstanding <= b.outstanding else b
+
+
+def request_text(payload: Dict[str, Any]) -> str:
+    """Flatten a completion or chat payload into the text the server will prefill"""
+    if "messages" in payload:
+        # ChatML, as rendered by the Qwen chat template
+        return "".join(f"<|im_start|>{m.get('role', 'user')}\n{m.get('content', '')}<|im_end|>\n"
+                       for m in payload["messages"])
+    prompt = payload.get("prompt", "")
+    if isinstance(prompt, list):
+        return " ".join(str(p) for p in prompt)
+    return str(prompt)
+
+
+def _stable_hash(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+class PrefixAffinityPolicy:
+    """Consistent hashing on the token prefix with bounded load.
+
+    The first ``prefix_tokens`` tokens (rounded down to ``block_tokens``, the
+    granularity a radix cache reuses) are hashed onto a ring of virtual nodes.
+    Walking clockwise, the first backend whose outstanding count stays within
+    ``load_factor`` × the fleet average wins, so hot prefixes spill over
+    instead of overloading a single replica.
+    """
+
+    name = "prefix_affinity"
+
+    def __init__(self, seed: int = 0, tokenizer_model: str = "Qwen/Qwen3-32B-AWQ", prefix_tokens: int = 256,
+                 block_tokens: int = 64, load_factor: float = 1.25, virtual_nodes: int = 100,
+                 max_tracked_prefixes: int = 10000):
+        self.tokenizer_model = tokenizer_model
+        self.prefix_tokens = prefix_tokens
+        self.block_tokens = block_tokens
+        self.load_factor = load_factor
+        self.virtual_nodes = virtual_nodes
+        self.max_tracked_prefixes = max_tracked_prefixes
+        self._ring: List[Tuple[int, str]] = []
+        self._ring_urls = set()
+        self._last_backend: "OrderedDict[int, str]" = OrderedDict()
+        self.requests = 0
+        self.affinity_hits = 0
+        self.spills = 0
+        self._prefix_key = lru_cache(maxsize=4096)(self._compute_prefix_key)
+
+    def _compute_prefix_key(self, text: str) -> int:
+        ids = qwen_tokenizer.encode(self.tokenizer_model, text)
+        length = min(len(ids), self.prefix_tokens)
+        if length >= self.block_tokens:
+            length -= length % self.block_tokens
+        prefix = ids[:length]
+        return _stable_hash(b"".join(i.to_bytes(4, "little") for i in prefix))
+
+    def prefix_key(self, payload: Dict[str, Any]) -> int:
+        # Only the leading characters can matter: tokens average well under 8 characters, so this slice
+        # covers prefix_tokens without encoding (or caching) the whole conversation on every request
+        text = request_text(payload)[:self.prefix_tokens * 8]
+        return self._prefix_key(text)
+
+    def _add_to_ring(self, url: str):
+        for v in range(self.virtual_nodes):
+            bisect.insort(self._ring, (_stable_hash(f"{url}#{v}".encode()), url))
+        self._ring_urls.add(url)
+
+    def choose(self, backends: List[Backend], payload: Dict[str, Any]) -> Backend:
+        for backend in backends:
+            if backend.url not in self._ring_urls:
+                self._add_to_ring(backend.url)
+        by_url = {b.url: b for b in backends}
+        key = self.prefix_key(payload)
+
+        total = sum(b.outstanding for b in backends) + 1
+        capacity = math.ceil(self.load_factor * total / len(backends))
+        start = bisect.bisect(self._ring, (key, ""))
+        chosen = None
+        preferred = None
+        for offset in range(len(self._ring)):
+            url = self._ring[(start + offset) % len(self._ring)][1]
+            backend = by_url.get(url)
+            if backend is None:
+                continue
+            preferred = preferred or backend
+            if backend.outstanding + 1 <= capacity:
+                chosen = backend
+                break
+        chosen = chosen or preferred
+        if chosen is not preferred:
+            self.spills += 1
+
+        self.requests += 1
+        if self._last_backend.get(key) == chosen.url:
+            self.affinity_hits += 1
+        self._last_backend[key] = chosen.url
+        self._last_backend.move_to_end(key)
+        if len(self._last_backend) > self.max_tracked_prefixes:
+            self._last_backend.popitem(last=False)
+        return chosen
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hashed_requests": self.requests,
+            "affinity_rate": self.affinity_hits / self.requests if self.requests else 0.0,
+            "bounded_load_spills": self.spills,
+        }
+
+
+POLICIES = {
+    RoundRobinPolicy.name: RoundRobinPolicy,
+    LeastOutstandingPolicy.name: LeastOutstandingPolicy,
+    PowerOfTwoChoicesPolicy.name: PowerOfTwoChoicesPolicy,
+    PrefixAffinityPolicy.name: PrefixAffinityPolicy,
+}
+
+
+# Per-connection headers a proxy must not forward, plus the ones aiohttp recomputes for the re-encoded body
+_HOP_HEADERS = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailer",
+                "transfer-encoding", "upgrade", "host", "content-length", "content-type", "accept-encoding"}
+
+
+def forward_headers(request: web.Request) -> Dict[str, str]:
+    """Client request headers that are safe to pass upstream"""
+    return {k: v for k, v in request.headers.items() if k.lower() not in _HOP_HEADERS}
+
+
+async def _relay(response: web.StreamResponse, data: bytes) -> bool:
+    """Write to the client; False once it has gone away"""
+    try:
+        await response.write(data)
+    except ConnectionError:
+        return False
+    return True
+
+
+async def proxy_stream(request: web.Request, session: aiohttp.ClientSession, url: str, body: Dict[str, Any],
+                       response_headers: Optional[Dict[str, str]] = None,
+                       on_upstream: Optional[Callable[[aiohttp.ClientResponse], Any]] = None,
+                       on_line: Optional[Callable[[bytes], None]] = None) -> Tuple[web.StreamResponse, str]:
+    """POST ``body`` to ``url`` with the client's query string and headers and stream the answer back.
+
+    ``on_upstream`` may return a finished response instead of streaming
+    (the cache gateway's non-stream path); with ``on_line`` the body is
+    relayed line by line and every line is shown to it.  The outcome is
+    ``ok``, ``error_status`` (upstream 5xx), ``upstream_failed`` (connect or
+    read error) or ``client_gone``, which says nothing about the upstream.
+    Once headers are out an upstream failure aborts the connection, so the
+    client sees a truncated stream rather than a 502 written into it.
+    """
+    response = None
+    try:
+        async with session.post(f"{url}{request.path_qs}", json=body, headers=forward_headers(request)) as upstream:
+            outcome = "ok" if upstream.status < 500 else "error_status"
+            if on_upstream is not None:
+                finished = await on_upstream(upstream)
+                if finished is not None:
+                    return finished, outcome
+            response = web.StreamResponse(status=upstream.status, headers=response_headers)
+            response.content_type = upstream.content_type
+            try:
+                await response.prepare(request)
+            except ConnectionError:
+                return response, "client_gone"
+            async for data in (upstream.content if on_line else upstream.content.iter_any()):
+                if on_line:
+                    on_line(data)
+                if not await _relay(response, data):
+                    return response, "client_gone"
+            try:
+                await response.write_eof()
+            except ConnectionError:
+                return response, "client_gone"
+            return response, outcome
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        if response is not None and response.prepared:
+            if request.transport is not None:
+                request.transport.abort()
+            return response, "upstream_failed"
+        return web.json_response({"error": f"Upstream {url} failed: {e}"}, status=502), "upstream_failed"
+
+
+class ReplicaRouter:
+    """Routes requests over N backends and ejects the ones that stop answering.
+
+    A backend is ejected after ``eject_after`` consecutive failures (passive,
+    from real traffic) or failed /health probes (active), and re-admitted as
+    soon as a probe succeeds again.
+
+    ``drain`` stops new admissions to a backend independently of its health
+    (in-flight requests finish), and ``undrain`` brings it back, optionally
+    at a reduced ``admit_fraction`` so traffic can be shifted onto it in
+    steps.
+    """
+
+    def __init__(self, urls: List[str], model: str = "Qwen/Qwen3-32B-AWQ", policy: Any = "least_outstanding",
+                 health_interval: float = 2.0, eject_after: int = 3, timeout: float = 120, seed: int = 0):
+        if isinstance(policy, str):
+            if policy not in POLICIES:
+                raise ValueError(f"Unknown policy {policy!r}, choose from {sorted(POLICIES)}")
+            policy = POLICIES[policy](seed=seed)
+        self.model = model
+        self.backends = [Backend(url, model, timeout) for url in urls]
+        self.policy = policy
+        self.health_interval = health_interval
+        self.eject_after = eject_after
+        self.timeout = timeout
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self._admit_rng = random.Random(seed)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def start(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        if self.health_interval and self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        for backend in self.backends:
+            await backend.engine.close()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def healthy_backends(self) -> List[Backend]:
+        return [b for b in self.backends if b.healthy]
+
+    def backend(self, url: str) -> Backend:
+        url = url.rstrip("/")
+        for backend in self.backends:
+            if backend.url == url:
+                return backend
+        raise ValueError(f"Unknown backend {url}")
+
+    def drain(self, url: str) -> Backend:
+        """Stop admitting new requests to ``url``; requests already there run to completion"""
+        backend = self.backend(url)
+        backend.draining = True
+        return backend
+
+    def undrain(self, url: str, admit_fraction: float = 1.0) -> Backend:
+        """Admit requests to ``url`` again, to ``admit_fraction`` of the picks that would choose it"""
+        backend = self.backend(url)
+        backend.draining = False
+        backend.admit_fraction = admit_fraction
+        return backend
+
+    async def wait_drained(self, url: str, timeout: float = 300.0, interval: float = 0.05) -> Optional[float]:
+        """Seconds until ``url`` has no requests in flight, or None on timeout"""
+        backend = self.backend(url)
+        start = time.perf_counter()
+        while backend.outstanding > 0:
+            if time.perf_counter() - start >= timeout:
+                return None
+            await asyncio.sleep(interval)
+        return time.perf_counter() - start
+
+    def admitting_backends(self) -> List[Backend]:
+        """Healthy, not draining, and - for backends being ramped up - admitted by a coin flip"""
+        candidates = [b for b in self.healthy_backends() if not b.draining]
+        admitted = [b for b in candidates if b.admit_fraction >= 1.0 or self._admit_rng.random() < b.admit_fraction]
+        return admitted or candidates
+
+    def pick(self, payload: Dict[str, Any], exclude: Optional[Set[str]] = None) -> Backend:
+        """Choose a healthy backend, avoiding the URLs in ``exclude`` unless nothing else is left"""
+        candidates = self.admitting_backends()
+        if not candidates:
+            raise RuntimeError("No healthy backends")
+        if exclude:
+            candidates = [b for b in candidates if b.url not in exclude] or candidates
+        return self.policy.choose(candidates, payload)
+
+    def _eject(self, backend: Backend):
+        if backend.healthy:
+            backend.healthy = False
+            backend.ejections += 1
+
+    def _observe(self, backend: Backend, success: bool, latency_ms: float, completion_tokens: int = 0):
+        backend.record(success, latency_ms, completion_tokens)
+        if not success and backend.consecutive_failures >= self.eject_after:
+            self._eject(backend)
+
+    async def check_health(self, backend: Backend) -> bool:
+        try:
+            async with self.session.get(f"{backend.url}/health",
+                                        timeout=aiohttp.ClientTimeout(total=2)) as response:
+                ok = response.status == 200
+        except Exception:
+            ok = False
+        if ok:
+            backend.healthy = True
+            backend.consecutive_failures = 0
+        else:
+            backend.consecutive_failures += 1
+            if backend.consecutive_failures >= self.eject_after:
+                self._eject(backend)
+        return ok
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.gather(*(self.check_health(b) for b in self.backends))
+            await asyncio.sleep(self.health_interval)
+
+    async def send(self, payload: Dict[str, Any], endpoint: str = "/v1/completions") -> Dict[str, Any]:
+        """Route one request through the load engine of the chosen backend"""
+        await self.start()
+        try:
+            backend = self.pick(payload)
+        except RuntimeError as e:
+            # Never sent, so no latency sample: a 0ms "reset" would drag the percentiles down
+            return {"success": False, "outcome": "no_backend", "status": None, "error": str(e), "backend": None,
+                    "total_ms": None, "first_token_ms": None, "completion_tokens": 0, "token_times_ms": []}
+        return await self.send_to(backend, payload, endpoint)
+
+    async def send_to(self, backend: Backend, payload: Dict[str, Any], endpoint: str = "/v1/completions",
+                      on_token: Optional[Callable[[Dict[str, Any], float], None]] = None,
+                      headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Send to a backend already chosen with ``pick``, keeping its counters and health up to date"""
+        await self.start()
+        backend.outstanding += 1
+        try:
+            record = await backend.engine.send(payload, endpoint, on_token=on_token, headers=headers)
+        finally:
+            backend.outstanding -= 1
+        # 4xx is the caller's fault, only transport errors and 5xx count against the replica
+        failed = not record["success"] and (record["status"] is None or record["status"] >= 500)
+        self._observe(backend, not failed, record["total_ms"], record["completion_tokens"])
+        record["backend"] = backend.url
+        return record
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            "policy": self.policy.name,
+            "healthy": len(self.healthy_backends()),
+            "backends": [b.snapshot() for b in self.backends],
+        }
+        if hasattr(self.policy, "stats"):
+            stats["policy_stats"] = self.policy.stats()
+        return stats
+
+    # --- proxy mode -------------------------------------------------------
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/health", self.handle_health)
+        app.router.add_get("/router/stats", self.handle_stats)
+        app.router.add_post("/router/drain", self.handle_drain)
+        app.router.add_post("/router/undrain", self.handle_undrain)
+        app.router.add_post("/v1/{tail:.*}", self.handle_proxy)
+        app.on_startup.append(lambda app: self.start())
+        app.on_cleanup.append(lambda app: self.close())
+        return app
+
+    async def handle_health(self, request):
+        if self.healthy_backends():
+            return web.Response(text="OK")
+        return web.Response(status=503, text="No healthy backends")
+
+    async def handle_stats(self, request):
+        return web.json_response(self.stats())
+
+    async def handle_drain(self, request):
+        """POST /router/drain?backend=<url>"""
+        try:
+            backend = self.drain(request.query.get("backend", ""))
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=404)
+        return web.json_response(backend.snapshot())
+
+    async def handle_undrain(self, request):
+        """POST /router/undrain?backend=<url>[&admit_fraction=0.5]"""
+        try:
+            backend = self.undrain(request.query.get("backend", ""),
+                                   float(request.query.get("admit_fraction", 1.0)))
+        except ValueError as e:
+            return web.json_response({"error": str(e)}, status=404)
+        return web.json_response(backend.snapshot())
+
+    async def handle_proxy(self, request):
+        body = await request.json()
+        try:
+            backend = self.pick(body)
+        except RuntimeError as e:
+            return web.json_response({"error": str(e)}, status=503)
+        backend.outstanding += 1
+        start = time.perf_counter()
+        outcome = "upstream_failed"
+        try:
+            response, outcome = await proxy_stream(request, self.session, backend.url, body)
+            return response
+        finally:
+            backend.outstanding -= 1
+            # An abandoned stream is the client's doing, not the replica's
+            if outcome != "client_gone":
+                self._observe(backend, outcome == "ok", (time.perf_counter() - start) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Client-side multi-replica routing proxy")
+    parser.add_argument("--backend", action="append", required=True,
+                        help="Backend base URL, repeatable (e.g. http://localhost:8000)")
+    parser.add_argument("--policy", default="least_outstanding", choices=sorted(POLICIES))
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--host", default="0.0.0.0", help="Proxy bind host")
+    parser.add_argument("--port", type=int, default=8080, help="Proxy port")
+    parser.add_argument("--health-interval", type=float, default=2.0)
+    parser.add_argument("--eject-after", type=int, default=3)
+    parser.add_argument("--tokenizer", help="Bundled tokenizer for prefix_affinity (default: --model)")
+    args = parser.parse_args()
+
+    policy = args.policy
+    if policy == PrefixAffinityPolicy.name:
+        policy = PrefixAffinityPolicy(tokenizer_model=args.tokenizer or args.model)
+    router = ReplicaRouter(args.backend, args.model, policy,
+                           health_interval=args.health_interval, eject_after=args.eject_after)
+    print(f"🔀 Routing {len(args.backend)} backends with {args.policy} on port {args.port}")
+    web.run_app(router.build_app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
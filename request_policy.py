@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+"""
+Request Policy - retries, hedging and retry budgets on top of ReplicaRouter
+Retries with jittered exponential backoff (only when the caller has not
+already seen output, unless the request is deterministic), hedges a second
+replica after a p95-based delay and cancels the loser, and caps the extra
+load with a token-bucket budget; the benchmark injects stragglers into mocks
+"""
+
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import statistics
+from collections import deque
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Callable
+
+from replica_router import ReplicaRouter, POLICIES
+from outcome_stats import summarize_outcomes, format_outcomes, format_percentile
+from response_cache_gateway import is_cacheable
+from mock_openai_server import start_mock_servers, stop_mock_servers
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class RetryBudget:
+    """Token bucket for extra attempts (retries and hedges).
+
+    Every original request deposits ``ratio`` tokens and the bucket also
+    refills at ``min_per_s``, so extra load stays near ``ratio`` of the
+    traffic while a trickle of retries is always possible at low rates.
+    """
+
+    def __init__(self, ratio: float = 0.1, min_per_s: float = 1.0, capacity: float = 20.0):
+        self.ratio = ratio
+        self.min_per_s = min_per_s
+        self.capacity = capacity
+        self.balance = capacity
+        self.spent = 0
+        self.denied = 0
+        self._last = time.perf_counter()
+
+    def _refill(self):
+        now = time.perf_counter()
+        self.balance = min(self.capacity, self.balance + (now - self._last) * self.min_per_s)
+        self._last = now
+
+    def deposit(self):
+        self._refill()
+        self.balance = min(self.capacity, self.balance + self.ratio)
+
+    def try_spend(self) -> bool:
+        self._refill()
+        if self.balance >= 1.0:
+            self.balance -= 1.0
+            self.spent += 1
+            return True
+        self.denied += 1
+        return False
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies for percentile-based hedge delays"""
+
+    def __init__(self, window: int = 500, min_samples: int = 20):
+        self.samples: deque = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def add(self, value_ms: float):
+        self.samples.append(value_ms)
+
+    def percentile(self, q: int) -> Optional[float]:
+        if len(self.samples) < self.min_samples:
+            return None
+        return statistics.quantiles(self.samples, n=100)[q - 1]
+
+
+class RetryPolicy:
+    """When and how long to wait before trying again.
+
+    A failure is retried when it is a timeout, transport error or
+    retryable status, and either no token has reached the caller yet or the
+    request is idempotent (greedy/seeded, so a restart reproduces the same
+    output).  ``attempt_timeout_ms`` bounds the wait for the first token
+    (streams) or the whole response (non-streamed) of one attempt.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay_ms: float = 25.0, max_delay_ms: float = 1000.0,
+                 attempt_timeout_ms: Optional[float] = None):
+        self.max_attempts = max_attempts
+        self.base_delay_ms = base_delay_ms
+        self.max_delay_ms = max_delay_ms
+        self.attempt_timeout_ms = attempt_timeout_ms
+
+    def backoff_ms(self, attempt: int, rng: random.Random) -> float:
+        """Full jitter: uniform in [0, min(max, base * 2^attempt)]"""
+        return rng.uniform(0, min(self.max_delay_ms, self.base_delay_ms * 2 ** attempt))
+
+    @staticmethod
+    def should_retry(record: Dict[str, Any], delivered_tokens: int, idempotent: bool) -> bool:
+        if record["success"]:
+            return False
+        status = record.get("status")
+        # A 200 that broke off mid-stream is a transport error, not a refusal
+        if status is not None and status >= 300 and status not in RETRYABLE_STATUS:
+            return False
+        return delivered_tokens == 0 or idempotent
+
+
+class HedgePolicy:
+    """Send a duplicate to another replica if nothing arrived after the p``quantile`` latency"""
+
+    def __init__(self, quantile: int = 95, fixed_delay_ms: Optional[float] = None, min_delay_ms: float = 5.0,
+                 max_hedges: int = 1):
+        self.quantile = quantile
+        self.fixed_delay_ms = fixed_delay_ms
+        self.min_delay_ms = min_delay_ms
+        self.max_hedges = max_hedges
+
+    def delay_ms(self, tracker: LatencyTracker) -> Optional[float]:
+        if self.fixed_delay_ms is not None:
+            return self.fixed_delay_ms
+        value = tracker.percentile(self.quantile)
+        return max(value, self.min_delay_ms) if value is not None else None
+
+
+class PolicyClient:
+    """Sends through a ReplicaRouter applying retry, hedge and budget policies.
+
+    For streams an attempt "commits" when its first token arrives: every
+    other attempt is cancelled (closing its connection, so the server stops
+    generating) and only the winner's tokens are passed to ``on_token``.
+    A retry after partial output (idempotent requests only, so the stream
+    repeats) skips the tokens the caller has already seen.
+    Non-streamed attempts commit on the first successful response.
+    """
+
+    def __init__(self, router: ReplicaRouter, retry: Optional[RetryPolicy] = None,
+                 hedge: Optional[HedgePolicy] = None, budget: Optional[RetryBudget] = None, seed: int = 0):
+        self.router = router
+        self.retry = retry or RetryPolicy(max_attempts=1)
+        self.hedge = hedge
+        self.budget = budget
+        self.rng = random.Random(seed)
+        self.trackers = {True: LatencyTracker(), False: LatencyTracker()}
+        self.stats = {"requests": 0, "sends": 0, "hedges": 0, "hedge_wins": 0, "retries": 0,
+                      "budget_denied": 0, "attempt_timeouts": 0, "failures": 0}
+
+    def _spend(self) -> bool:
+        if self.budget is None or self.budget.try_spend():
+            return True
+        self.stats["budget_denied"] += 1
+        return False
+
+    async def send(self, payload: Dict[str, Any], endpoint: str = "/v1/completions",
+                   idempotent: Optional[bool] = None,
+                   on_token: Optional[Callable[[Dict[str, Any], float], None]] = None) -> Dict[str, Any]:
+        """One logical request; the record has end-to-end ``e2e_*`` timings and attempt counters"""
+        if idempotent is None:
+            idempotent = is_cacheable(payload)
+        self.stats["requests"] += 1
+        if self.budget is not None:
+            self.budget.deposit()
+        key = uuid.uuid4().hex
+        start = time.perf_counter()
+        tried: set = set()
+        delivered = [0]
+        sends = hedges = retries = 0
+        record: Dict[str, Any] = {}
+
+        for attempt in range(self.retry.max_attempts):
+            if attempt:
+                if not self._spend():
+                    break
+                self.stats["retries"] += 1
+                retries += 1
+                await asyncio.sleep(self.retry.backoff_ms(attempt - 1, self.rng) / 1000)
+            record, launched_at, used, hedged = await self._hedged_attempt(payload, endpoint, key, tried,
+                                                                         delivered, on_token)
+            sends += used
+            hedges += hedged
+            if not self.retry.should_retry(record, delivered[0], idempotent):
+                break
+
+        end = time.perf_counter()
+        record = dict(record)
+        record["attempts"] = sends
+        record["hedges"] = hedges
+        record["retries"] = retries
+        record["idempotency_key"] = key
+        record["e2e_total_ms"] = (end - start) * 1000
+        record["e2e_first_token_ms"] = None
+        if record.get("success") and record.get("first_token_ms") is not None:
+            record["e2e_first_token_ms"] = (launched_at - start) * 1000 + record["first_token_ms"]
+        if record.get("success"):
+            self.trackers[bool(payload.get("stream"))].add(
+                record["first_token_ms"] if record.get("first_token_ms") is not None else record["total_ms"])
+        else:
+            self.stats["failures"] += 1
+        return record
+
+    async def _hedged_attempt(self, payload, endpoint, key, tried, delivered, on_token):
+        """Primary send plus up to max_hedges duplicates; returns (record, launch time, sends, hedges)"""
+        stream = bool(payload.get("stream"))
+        tasks: List[asyncio.Task] = []
+        launched: List[float] = []
+        winner: List[Optional[int]] = [None]
+        received = [0]
+        progress = asyncio.Event()
+
+        def launch() -> bool:
+            try:
+                backend = self.router.pick(payload, exclude=tried)
+            except RuntimeError:
+                return False
+            tried.add(backend.url)
+            index = len(tasks)
+
+            def token_callback(record, now_ms):
+                if winner[0] is None:
+                    winner[0] = index
+                    for i, other in enumerate(tasks):
+                        if i != index:
+                            other.cancel()
+                    progress.set()
+                if winner[0] == index:
+                    received[0] += 1
+                    # The stream restarts on a retry; the first ``delivered`` tokens were already passed on
+                    if received[0] > delivered[0]:
+                        delivered[0] = received[0]
+                        if on_token is not None:
+                            on_token(record, now_ms)
+
+            task = asyncio.create_task(self.router.send_to(backend, payload, endpoint, on_token=token_callback,
+                                                           headers={"Idempotency-Key": key}))
+            task.add_done_callback(lambda _: progress.set())
+            tasks.append(task)
+            launched.append(time.perf_counter())
+            self.stats["sends"] += 1
+            return True
+
+        if not launch():
+            return ({"success": False, "outcome": "no_backend", "status": None, "error": "No healthy backends",
+                     "total_ms": None, "first_token_ms": None, "completion_tokens": 0, "token_times_ms": []},
+                    time.perf_counter(), 0, 0)
+
+        hedges = 0
+        start = time.perf_counter()
+        hedge_delay = self.hedge.delay_ms(self.trackers[stream]) if self.hedge else None
+        timeout_ms = self.retry.attempt_timeout_ms
+        try:
+            while True:
+                progress.clear()
+                if winner[0] is not None:
+                    index = winner[0]
+                    return await tasks[index], launched[index], len(tasks), hedges
+                for index, task in enumerate(tasks):
+                    if task.done() and not task.cancelled() and task.result()["success"]:
+                        # Non-streamed (or token-less) success commits directly
+                        self._cancel_others(tasks, index)
+                        return task.result(), launched[index], len(tasks), hedges
+                if all(task.done() for task in tasks):
+                    index = len(tasks) - 1
+                    return tasks[index].result(), launched[index], len(tasks), hedges
+
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                waits = []
+                can_hedge = hedge_delay is not None and hedges < self.hedge.max_hedges
+                if can_hedge:
+                    waits.append(hedge_delay * (hedges + 1) - elapsed_ms)
+                if timeout_ms is not None:
+                    waits.append(timeout_ms - elapsed_ms)
+                wait_s = max(min(waits), 0) / 1000 if waits else None
+                try:
+                    await asyncio.wait_for(progress.wait(), wait_s)
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                if timeout_ms is not None and elapsed_ms >= timeout_ms:
+                    self.stats["attempt_timeouts"] += 1
+                    self._cancel_others(tasks, None)
+                    return ({"success": False, "outcome": "timeout", "status": None, "error": "Timeout",
+                             "total_ms": elapsed_ms, "first_token_ms": None, "completion_tokens": 0, "token_times_ms": [],
+                             "stream": stream}, launched[0], len(tasks), hedges)
+                if can_hedge and elapsed_ms >= hedge_delay * (hedges + 1):
+                    if self._spend() and launch():
+                        hedges += 1
+                        self.stats["hedges"] += 1
+                    else:
+                        hedge_delay = None
+        finally:
+            if winner[0] is not None and winner[0] > 0:
+                self.stats["hedge_wins"] += 1
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    def _cancel_others(tasks: List[asyncio.Task], keep: Optional[int]):
+        for i, task in enumerate(tasks):
+            if i != keep and not task.done():
+                task.cancel()
+
+
+def percentile(values: List[float], q: int) -> Optional[float]:
+    if len(values) < 2:
+        return values[0] if values else None
+    return statistics.quantiles(values, n=100)[q - 1]
+
+
+def build_client(name: str, router: ReplicaRouter, args) -> PolicyClient:
+    budget = RetryBudget(ratio=args.budget_ratio)
+    retry = RetryPolicy(max_attempts=3, attempt_timeout_ms=args.attempt_timeout_ms)
+    hedge = HedgePolicy(quantile=args.hedge_quantile)
+    configs = {
+        "none": (None, None, None),
+        "retry": (retry, None, budget),
+        "hedge": (None, hedge, budget),
+        "hedge_retry": (retry, hedge, budget),
+    }
+    retry, hedge, budget = configs[name]
+    return PolicyClient(router, retry, hedge, budget, seed=args.seed)
+
+
+async def run_config(name: str, urls: List[str], args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    async with ReplicaRouter(urls, args.model, args.routing, health_interval=0, seed=args.seed) as router:
+        client = build_client(name, router, args)
+        records = []
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        at = 0.0
+
+        async def fire(i, when):
+            await asyncio.sleep(max(when - (loop.time() - start), 0))
+            payload = {"model": args.model, "prompt": f"Interactive request {i}: say hello", "stream": True,
+                       "max_tokens": args.max_tokens, "temperature": 0.7, "stream_options": {"include_usage": True}}
+            records.append(await client.send(payload))
+
+        jobs = []
+        for i in range(args.requests):
+            at += rng.expovariate(args.rate)
+            jobs.append(fire(i, at))
+        await asyncio.gather(*jobs)
+
+    ok = [r for r in records if r["success"]]
+    ttfts = [r["e2e_first_token_ms"] for r in ok if r.get("e2e_first_token_ms") is not None]
+    totals = [r["e2e_total_ms"] for r in ok]
+    stats = client.stats
+    ttft_outcomes = summarize_outcomes(records, key="e2e_first_token_ms", censor_key="e2e_total_ms")
+    return {
+        "policy": name,
+        "requests": len(records),
+        "successful": len(ok),
+        "outcomes": ttft_outcomes["outcomes"],
+        "censored_percentiles": ttft_outcomes["censored_percentiles"],
+        "extra_load": (stats["sends"] - stats["requests"]) / stats["requests"] if stats["requests"] else 0.0,
+        "p50_ttft_ms": percentile(ttfts, 50),
+        "p95_ttft_ms": percentile(ttfts, 95),
+        "p99_ttft_ms": percentile(ttfts, 99),
+        "p50_total_ms": percentile(totals, 50),
+        "p99_total_ms": percentile(totals, 99),
+        "stats": stats,
+    }
+
+
+async def run_benchmark(args) -> List[Dict[str, Any]]:
+    servers = []
+    urls = args.backend
+    if not urls:
+        servers = await start_mock_servers(args.mock_replicas, args.mock_port, ttft_ms=30.0, itl_ms=5.0,
+                                           max_running=32, straggler_rate=args.straggler_rate,
+                                           straggler_multiplier=args.straggler_multiplier, seed=args.seed)
+        urls = [s.base_url for s in servers]
+
+    results = []
+    try:
+        for name in args.policies:
+            result = await run_config(name, urls, args)
+            results.append(result)
+            print(f"  {name:<12} TTFT p50 {result['p50_ttft_ms'] or 0:6.0f}ms  p95 {result['p95_ttft_ms'] or 0:6.0f}ms  "
+                  f"p99 {result['p99_ttft_ms'] or 0:6.0f}ms (censored {format_percentile(result, 99)}ms)  "
+                  f"total p99 {result['p99_total_ms'] or 0:6.0f}ms  "
+                  f"extra load {result['extra_load']:.1%}  [{format_outcomes(result['outcomes'])}]")
+    finally:
+        await stop_mock_servers(servers)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retry/hedging policy benchmark against straggling replicas")
+    parser.add_argument("--backend", action="append", help="Real backend URL, repeatable (default: mock servers)")
+    parser.add_argument("--policies", nargs="+", default=["none", "retry", "hedge", "hedge_retry"],
+                        choices=["none", "retry", "hedge", "hedge_retry"])
+    parser.add_argument("--routing", default="least_outstanding", choices=sorted(POLICIES))
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=50.0, help="Poisson arrival rate (requests/s)")
+    parser.add_argument("--max-tokens", type=int, default=32)
+    parser.add_argument("--hedge-quantile", type=int, default=95)
+    parser.add_argument("--attempt-timeout-ms", type=float, default=250.0,
+                        help="Per-attempt time-to-first-token limit before retrying")
+    parser.add_argument("--budget-ratio", type=float, default=0.1, help="Extra attempts per request allowed")
+    parser.add_argument("--mock-replicas", type=int, default=4)
+    parser.add_argument("--mock-port", type=int, default=9210)
+    parser.add_argument("--straggler-rate", type=float, default=0.05)
+    parser.add_argument("--straggler-multiplier", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print("🚀 Request Policy Benchmark")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    results = asyncio.run(run_benchmark(args))
+
+    baseline = next((r for r in results if r["policy"] == "none"), None)
+    if baseline and baseline["p99_ttft_ms"]:
+        for r in results:
+            if r is not baseline and r["p99_ttft_ms"]:
+                print(f"🎯 {r['policy']}: TTFT p99 {(baseline['p99_ttft_ms'] - r['p99_ttft_ms']) / baseline['p99_ttft_ms']:+.1%} "
+                      f"reduction for {r['extra_load']:.1%} extra requests")
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"request_policy_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "config": vars(args), "results": results}, f, indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
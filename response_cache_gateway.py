@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Response Cache Gateway - exact-match cache in front of an OpenAI-compatible server
+Caches greedy or seeded requests in an LRU+TTL memory tier (plus an optional
+SQLite disk tier) and replays hits as SSE streams with the original chunking
+"""
+
+import time
+import json
+import sqlite3
+import asyncio
+import threading
+import hashlib
+import argparse
+import aiohttp
+from aiohttp import web
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+from replica_router import proxy_stream
+
+# Fields that change the generated tokens; everything else (stream, user, ...) is ignored
+KEY_FIELDS = [
+    "model", "prompt", "messages", "suffix", "max_tokens", "max_completion_tokens", "temperature", "top_p",
+    "top_k", "min_p", "n", "best_of", "stop", "stop_token_ids", "presence_penalty", "frequency_penalty",
+    "repetition_penalty", "logit_bias", "logprobs", "top_logprobs", "echo", "seed", "ignore_eos",
+    "min_tokens", "response_format", "tools", "tool_choice", "regex", "json_schema",
+]
+
+
+def is_cacheable(body: Dict[str, Any], greedy_temperature: float = 0.0) -> bool:
+    """Only deterministic requests: greedy sampling or an explicit seed.
+
+    ``temperature`` defaults to 1.0 on SGLang/vLLM when omitted.  Raising
+    ``greedy_temperature`` (e.g. to 0.1 for our benchmark probes) accepts
+    near-greedy requests whose replays may differ slightly from a fresh run.
+    """
+    if body.get("seed") is not None:
+        return True
+    if body.get("top_k") == 1:
+        return True
+    temperature = body.get("temperature", 1.0)
+    return temperature is not None and temperature <= greedy_temperature
+
+
+def normalize_request(path: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    normalized = {"path": path}
+    for field in KEY_FIELDS:
+        if body.get(field) is not None:
+            normalized[field] = body[field]
+    if isinstance(normalized.get("stop"), str):
+        normalized["stop"] = [normalized["stop"]]
+    if normalized.get("n") == 1:
+        del normalized["n"]
+    return normalized
+
+
+def cache_key(path: str, body: Dict[str, Any]) -> str:
+    canonical = json.dumps(normalize_request(path, body), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResponseCache:
+    """LRU+TTL memory tier with an optional SQLite disk tier behind it"""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 3600, disk_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._db = None
+        self._db_lock = threading.Lock()
+        if disk_path:
+            # Disk reads and writes run in worker threads, serialized by _db_lock
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, created REAL, entry TEXT)")
+            self._db.commit()
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return self.ttl_seconds > 0 and time.time() - entry["created"] > self.ttl_seconds
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._db_lock:
+            row = self._db.execute("SELECT entry FROM responses WHERE key = ?", (key,)).fetchone()
+            if not row:
+                return None
+            entry = json.loads(row[0])
+            if self._expired(entry):
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            return entry
+
+    def _disk_put(self, key: str, entry: Dict[str, Any]):
+        with self._db_lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                             (key, entry["created"], json.dumps(entry, ensure_ascii=False)))
+            self._db.commit()
+
+    async def get(self, key: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """Return (entry, tier) where tier is 'memory' or 'disk', or (None, None)"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            if not self._expired(entry):
+                self._memory.move_to_end(key)
+                return entry, "memory"
+            del self._memory[key]
+        if self._db is not None:
+            # SQLite blocks; keep it off the event loop so a slow disk doesn't stall every stream
+            entry = await asyncio.to_thread(self._disk_get, key)
+            if entry is not None:
+                self._remember(key, entry)
+                return entry, "disk"
+        return None, None
+
+    async def put(self, key: str, entry: Dict[str, Any]):
+        self._remember(key, entry)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_put, key, entry)
+
+    def __len__(self):
+        return len(self._memory)
+
+
+def events_from_response(response: Dict[str, Any], chat: bool, itl_ms: float) -> List[List[Any]]:
+    """Re-chunk a non-streamed response into per-word SSE events"""
+    events = []
+    offset = 0.0
+    for choice in response.get("choices", []):
+        text = (choice.get("message") or {}).get("content") if chat else choice.get("text")
+        pieces = [piece if i == 0 else " " + piece for i, piece in enumerate((text or "").split(" "))]
+        pieces = [piece for piece in pieces if piece] or [""]
+        for i, piece in enumerate(pieces):
+            # The choice's last event carries its real finish_reason, as a live stream would
+            finish_reason = choice.get("finish_reason") if i == len(pieces) - 1 else None
+            if chat:
+                delta = {"index": choice.get("index", 0), "delta": {"content": piece}, "finish_reason": finish_reason}
+            else:
+                delta = {"index": choice.get("index", 0), "text": piece, "finish_reason": finish_reason}
+            event = {"id": response.get("id"), "object": "chat.completion.chunk" if chat else "text_completion",
+                     "model": response.get("model"), "choices": [delta]}
+            events.append([offset, json.dumps(event, ensure_ascii=False)])
+            offset += itl_ms
+    if response.get("usage"):
+        events.append([offset, json.dumps({"id": response.get("id"), "model": response.get("model"),
+                                           "choices": [], "usage": response["usage"]})])
+    return events
+
+
+def response_from_events(events: List[List[Any]], chat: bool) -> Dict[str, Any]:
+    """Fold streamed events back into a non-streamed response body"""
+    texts: Dict[int, str] = {}
+    finish: Dict[int, Optional[str]] = {}
+    usage = None
+    first = {}
+    for _, data in events:
+        event = json.loads(data)
+        first = first or event
+        usage = event.get("usage") or usage
+        for choice in event.get("choices") or []:
+            index = choice.get("index", 0)
+            piece = (choice.get("delta") or {}).get("content") if chat else choice.get("text")
+            texts[index] = texts.get(index, "") + (piece or "")
+            finish[index] = choice.get("finish_reason") or finish.get(index)
+    choices = []
+    for index in sorted(texts):
+        if chat:
+            choices.append({"index": index, "message": {"role": "assistant", "content": texts[index]},
+                            "finish_reason": finish.get(index)})
+        else:
+            choices.append({"index": index, "text": texts[index], "finish_reason": finish.get(index)})
+    return {"id": first.get("id"), "object": "chat.completion" if chat else "text_completion",
+            "model": first.get("model"), "choices": choices, "usage": usage}
+
+
+class CacheGateway:
+    """aiohttp proxy that answers repeated deterministic requests from the cache"""
+
+    def __init__(self, upstream: str, cache: ResponseCache, greedy_temperature: float = 0.0,
+                 replay_pacing: float = 0.0, timeout: float = 300):
+        self.upstream = upstream.rstrip("/")
+        self.cache = cache
+        self.greedy_temperature = greedy_temperature
+        self.replay_pacing = replay_pacing
+        self.timeout = timeout
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.stats = {"requests": 0, "uncacheable": 0, "misses": 0, "memory_hits": 0, "disk_hits": 0,
+                      "latency_saved_ms": 0.0, "upstream_errors": 0}
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/health", self.handle_health)
+        app.router.add_get("/cache/stats", self.handle_stats)
+        app.router.add_post("/v1/completions", self.handle_completion)
+        app.router.add_post("/v1/chat/completions", self.handle_completion)
+        app.on_startup.append(self._start)
+        app.on_cleanup.append(self._close)
+        return app
+
+    async def _start(self, app):
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+
+    async def _close(self, app):
+        await self.session.close()
+
+    async def handle_health(self, request):
+        async with self.session.get(f"{self.upstream}/health") as upstream:
+            return web.Response(status=upstream.status, text=await upstream.text())
+
+    def stats_snapshot(self) -> Dict[str, Any]:
+        s = dict(self.stats)
+        hits = s["memory_hits"] + s["disk_hits"]
+        cacheable = hits + s["misses"]
+        s["hit_rate"] = hits / cacheable if cacheable else 0.0
+        s["hit_rate_all_requests"] = hits / s["requests"] if s["requests"] else 0.0
+        s["avg_latency_saved_ms"] = s["latency_saved_ms"] / hits if hits else 0.0
+        s["entries"] = len(self.cache)
+        return s
+
+    async def handle_stats(self, request):
+        return web.json_response(self.stats_snapshot())
+
+    async def handle_completion(self, request):
+        body = await request.json()
+        chat = request.path.endswith("/chat/completions")
+        self.stats["requests"] += 1
+        start = time.perf_counter()
+
+        if not is_cacheable(body, self.greedy_temperature):
+            self.stats["uncacheable"] += 1
+            return await self._forward(request, body, chat, None, start)
+
+        key = cache_key(request.path, body)
+        entry, tier = await self.cache.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return await self._forward(request, body, chat, key, start)
+
+        self.stats[f"{tier}_hits"] += 1
+        if body.get("stream"):
+            response = await self._replay_stream(request, entry, body)
+        else:
+            response = web.json_response(entry["response"], headers={"X-Cache": "HIT"})
+        served_ms = (time.perf_counter() - start) * 1000
+        self.stats["latency_saved_ms"] += max(entry["latency_ms"] - served_ms, 0.0)
+        return response
+
+    async def _replay_stream(self, request, entry, body):
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache",
+                                               "X-Cache": "HIT"})
+        await response.prepare(request)
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+        previous = 0.0
+        for offset, data in entry["events"]:
+            if self.replay_pacing > 0 and offset > previous:
+                await asyncio.sleep((offset - previous) * self.replay_pacing / 1000)
+            previous = offset
+            if not include_usage and not json.loads(data).get("choices"):
+                continue
+            await response.write(b"data: " + data.encode() + b"\n\n")
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    async def _forward(self, request, body, chat, key, start):
+        """Proxy to upstream; on a cacheable miss also build the cache entry"""
+        events = []
+        completed = False
+
+        async def read_whole(upstream):
+            # Non-stream requests and errors are read in full so a 200 can be cached as one body
+            if upstream.status == 200 and body.get("stream"):
+                return None
+            payload = await upstream.read()
+            if upstream.status == 200 and key:
+                data = json.loads(payload)
+                latency_ms = (time.perf_counter() - start) * 1000
+                tokens = (data.get("usage") or {}).get("completion_tokens") or 1
+                await self.cache.put(key, {"created": time.time(), "latency_ms": latency_ms, "response": data,
+                                           "events": events_from_response(data, chat, latency_ms / tokens)})
+            return web.Response(status=upstream.status, body=payload, content_type=upstream.content_type,
+                                headers={"X-Cache": "MISS"})
+
+        def collect(raw_line):
+            nonlocal completed
+            line = raw_line.strip()
+            if not line.startswith(b"data: "):
+                return
+            data = line[6:].decode()
+            if data == "[DONE]":
+                completed = True
+                return
+            events.append([(time.perf_counter() - start) * 1000, data])
+
+        response, outcome = await proxy_stream(request, self.session, self.upstream, body,
+                                               response_headers={"Cache-Control": "no-cache", "X-Cache": "MISS"},
+                                               on_upstream=read_whole, on_line=collect)
+        if outcome == "upstream_failed":
+            self.stats["upstream_errors"] += 1
+        elif outcome == "ok" and key and completed:
+            # Only streams that reached [DONE]; a truncated or abandoned one is never cached
+            base = events[0][0] if events else 0.0
+            await self.cache.put(key, {"created": time.time(), "latency_ms": (time.perf_counter() - start) * 1000,
+                                       "response": response_from_events(events, chat),
+                                       "events": [[offset - base, data] for offset, data in events]})
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exact-match response cache gateway")
+    parser.add_argument("--upstream", default="http://localhost:8003", help="OpenAI-compatible server URL")
+    parser.add_argument("--host", default="0.0.0.0", help="Gateway bind host")
+    parser.add_argument("--port", type=int, default=8090, help="Gateway port")
+    parser.add_argument("--max-entries", type=int, default=10000, help="Memory tier size")
+    parser.add_argument("--ttl", type=float, default=3600, help="Entry lifetime in seconds (0 = forever)")
+    parser.add_argument("--disk-cache", help="SQLite file for the disk tier")
+    parser.add_argument("--greedy-temperature", type=float, default=0.0,
+                        help="Treat temperature <= this as deterministic (e.g. 0.1 for benchmark probes)")
+    parser.add_argument("--replay-pacing", type=float, default=0.0,
+                        help="Replay hits with this fraction of the original inter-chunk timing (0 = no delay)")
+    args = parser.parse_args()
+
+    cache = ResponseCache(args.max_entries, args.ttl, args.disk_cache)
+    gateway = CacheGateway(args.upstream, cache, args.greedy_temperature, args.replay_pacing)
+    print(f"🗄️ Caching {args.upstream} on port {args.port} "
+          f"(memory {args.max_entries}, disk {args.disk_cache or 'off'}, TTL {args.ttl}s)")
+    web.run_app(gateway.build_app(), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Rolling Restart - swap replicas one at a time behind the client router without dropping traffic
+For each replica: drain it in the ReplicaRouter (no new admissions), wait
+for its in-flight streams, relaunch it through a backend launcher (e.g. a
+deploy script with the new flag set), wait for /health and for warm
+latency, then shift traffic back in steps. Open-loop load runs throughout
+and the latency and error impact of every phase is compared with the
+pre-swap baseline
+"""
+
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from datetime import datetime
+from urllib.parse import urlparse
+from typing import List, Dict, Any, Optional, Tuple
+
+from replica_router import ReplicaRouter
+from outcome_stats import outcome_counts, format_outcomes
+from backend_launcher import Launcher, MockLauncher, SubprocessLauncher, DockerLauncher, wait_healthy
+from warmup_detector import completion_probe, warmup_until_steady
+
+
+def percentile(values: List[float], q: int) -> Optional[float]:
+    if not values:
+        return None
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=100)[q - 1]
+
+
+def phase_stats(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ok = [r for r in records if r["success"]]
+    totals = [r["total_ms"] for r in ok]
+    ttfts = [r["first_token_ms"] for r in ok if r.get("first_token_ms") is not None]
+    backends: Dict[str, int] = {}
+    for r in records:
+        if r.get("backend"):
+            backends[r["backend"]] = backends.get(r["backend"], 0) + 1
+    return {
+        "requests": len(records),
+        "errors": len(records) - len(ok),
+        "error_rate": (len(records) - len(ok)) / len(records) if records else 0.0,
+        "outcomes": outcome_counts(records),
+        "p50_total_ms": percentile(totals, 50),
+        "p99_total_ms": percentile(totals, 99),
+        "p50_ttft_ms": percentile(ttfts, 50),
+        "p99_ttft_ms": percentile(ttfts, 99),
+        "per_backend": backends,
+    }
+
+
+class PhaseClock:
+    """Current phase label and when each phase started; records are tagged at send time"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.current = "baseline"
+        self.phases: List[Tuple[str, float]] = [("baseline", 0.0)]
+
+    def now(self) -> float:
+        return time.perf_counter() - self.start
+
+    def enter(self, phase: str):
+        self.current = phase
+        self.phases.append((phase, self.now()))
+        print(f"  ⏩ {self.now():6.1f}s  {phase}")
+
+
+async def warm_replica(url: str, args) -> Dict[str, Any]:
+    """Warm readiness: /health answers long before compiled kernels and graphs are ready"""
+    probe = completion_probe(url, args.model, max_tokens=args.warmup_tokens, timeout=args.timeout)
+    return await asyncio.to_thread(warmup_until_steady, probe, args.warmup_batch_sizes,
+                                   max_rounds=args.warmup_max_rounds, log=lambda msg: print(f"  {msg}"))
+
+
+async def swap_replica(router: ReplicaRouter, launcher: Launcher, clock: PhaseClock, args) -> Dict[str, Any]:
+    """Drain, relaunch, wait for warm readiness and shift traffic back onto one replica"""
+    url = launcher.base_url
+    name = urlparse(url).netloc
+    timings: Dict[str, Any] = {"replica": url}
+
+    if args.no_drain:
+        clock.enter(f"relaunch:{name}")
+    else:
+        clock.enter(f"drain:{name}")
+        router.drain(url)
+        drained = await router.wait_drained(url, timeout=args.drain_timeout_s)
+        timings["drain_s"] = drained
+        timings["cut_off_streams"] = router.backend(url).outstanding if drained is None else 0
+        if drained is None:
+            print(f"    ⚠️ {timings['cut_off_streams']} streams still running after {args.drain_timeout_s:.0f}s")
+        clock.enter(f"relaunch:{name}")
+
+    started = time.perf_counter()
+    await launcher.restart()
+    timings["relaunch_s"] = time.perf_counter() - started
+    timings["health_s"] = await wait_healthy(url, timeout=args.ready_timeout_s, interval=0.2)
+    if timings["health_s"] is None:
+        raise RuntimeError(f"{url} did not come back within {args.ready_timeout_s:.0f}s")
+
+    if not args.no_drain:
+        clock.enter(f"warmup:{name}")
+        warmup = await warm_replica(url, args)
+        timings["warmup_s"] = warmup["warmup_s"]
+        timings["warmup_converged"] = warmup["converged"]
+
+        clock.enter(f"shift:{name}")
+        for fraction in args.shift_steps:
+            router.undrain(url, fraction)
+            await asyncio.sleep(args.shift_step_s)
+    timings["total_s"] = time.perf_counter() - started + (timings.get("drain_s") or 0.0)
+    return timings
+
+
+async def run_rolling_restart(launchers: List[Launcher], args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    for launcher in launchers:
+        await launcher.start()
+    for launcher in launchers:
+        if await wait_healthy(launcher.base_url, timeout=args.ready_timeout_s) is None:
+            return {"error": f"{launcher.base_url} never became healthy"}
+    # The baseline must be measured on warm replicas, the same state a swap waits for
+    initial_warmup = {}
+    for launcher in launchers:
+        print(f"  🔥 warming {launcher.base_url}")
+        warmup = await warm_replica(launcher.base_url, args)
+        initial_warmup[launcher.base_url] = {"warmup_s": warmup["warmup_s"], "converged": warmup["converged"]}
+
+    records: List[Dict[str, Any]] = []
+    pending = set()
+    swaps = []
+    router = ReplicaRouter([l.base_url for l in launchers], args.model, args.policy,
+                           health_interval=args.health_interval_s, eject_after=args.eject_after,
+                           timeout=args.timeout, seed=args.seed)
+    clock = PhaseClock()
+
+    async with router:
+
+        async def one(n: int):
+            phase, sent = clock.current, clock.now()
+            payload = {"model": args.model, "prompt": f"Rolling restart request {n}: {args.prompt}",
+                       "max_tokens": args.max_tokens, "temperature": 0.7, "stream": True,
+                       "stream_options": {"include_usage": True}}
+            record = await router.send(payload)
+            record.update({"phase": phase, "sent_s": sent})
+            records.append(record)
+
+        async def load():
+            n = 0
+            next_at = clock.now()
+            while True:
+                next_at += rng.expovariate(args.rate)
+                await asyncio.sleep(max(0.0, next_at - clock.now()))
+                task = asyncio.create_task(one(n))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+                n += 1
+
+        load_task = asyncio.create_task(load())
+        try:
+            await asyncio.sleep(args.baseline_s)
+            for launcher in launchers:
+                swaps.append(await swap_replica(router, launcher, clock, args))
+                clock.enter(f"settle:{urlparse(launcher.base_url).netloc}")
+                await asyncio.sleep(args.settle_s)
+            clock.enter("after")
+            await asyncio.sleep(args.baseline_s)
+        finally:
+            load_task.cancel()
+            await asyncio.gather(load_task, return_exceptions=True)
+            if pending:
+                await asyncio.wait(pending, timeout=args.timeout)
+        router_stats = router.stats()
+
+    phases = {}
+    for phase, _ in clock.phases:
+        if phase not in phases:
+            phases[phase] = phase_stats([r for r in records if r["phase"] == phase])
+    swap_records = [r for r in records if r["phase"] not in ("baseline", "after")]
+    baseline = phases["baseline"]
+    impact = phase_stats(swap_records)
+    return {
+        "mode": "restart without draining" if args.no_drain else "drain + warm + shift",
+        "launchers": [l.describe() for l in launchers],
+        "initial_warmup": initial_warmup,
+        "swaps": swaps,
+        "phases": phases,
+        "phase_starts_s": clock.phases,
+        "during_swaps": impact,
+        "p99_increase": (impact["p99_total_ms"] / baseline["p99_total_ms"] - 1)
+        if impact["p99_total_ms"] and baseline["p99_total_ms"] else None,
+        "zero_downtime": impact["errors"] == 0,
+        "outcomes": outcome_counts(records),
+        "router": router_stats,
+    }
+
+
+def build_launchers(args) -> List[Launcher]:
+    if args.launcher == "mock":
+        return [MockLauncher(port=args.mock_port + i, restart_delay_s=args.mock_restart_delay_s, cold_s=args.mock_cold_s,
+                             cold_ttft_ms=args.mock_cold_ttft_ms, name=f"replica-{i}") for i in range(2)]
+    launchers = []
+    for spec in args.replica:
+        name, _, url = spec.partition("=")
+        if not url:
+            raise ValueError(f"--replica expects name=url, got {spec!r}")
+        if args.launcher == "docker":
+            deploy = args.deploy_command.format(name=name) if args.deploy_command else None
+            launchers.append(DockerLauncher(name, url, deploy))
+        else:
+            if not args.command:
+                raise ValueError("--command is required for the subprocess launcher")
+            port = urlparse(url).port
+            launchers.append(SubprocessLauncher(args.command.format(name=name, port=port), url, supervised=False))
+    return launchers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Zero-downtime rolling restart across replicas via the router")
+    parser.add_argument("--launcher", choices=["mock", "subprocess", "docker"], default="mock")
+    parser.add_argument("--replica", action="append", default=[],
+                        help="name=url, repeatable; the name is the container for the docker launcher")
+    parser.add_argument("--command", help="Subprocess command template, e.g. 'python server.py --port {port}'")
+    parser.add_argument("--deploy-command",
+                        help="Docker relaunch command template, e.g. './deploy-{name}.sh' (default: docker start)")
+    parser.add_argument("--no-drain", action="store_true", help="Restart in place without draining, for comparison")
+    parser.add_argument("--policy", default="least_outstanding")
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--rate", type=float, default=4.0, help="Poisson arrival rate (requests/s)")
+    parser.add_argument("--max-tokens", type=int, default=128)
+    parser.add_argument("--prompt", default="Describe how a rolling deployment works.")
+    parser.add_argument("--baseline-s", type=float, default=20.0, help="Load before the first and after the last swap")
+    parser.add_argument("--settle-s", type=float, default=10.0, help="Load between swaps")
+    parser.add_argument("--drain-timeout-s", type=float, default=300.0)
+    parser.add_argument("--ready-timeout-s", type=float, default=900.0)
+    parser.add_argument("--warmup-batch-sizes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--warmup-max-rounds", type=int, default=60)
+    parser.add_argument("--warmup-tokens", type=int, default=16)
+    parser.add_argument("--shift-steps", type=float, nargs="+", default=[0.25, 0.5, 1.0],
+                        help="Admit fractions applied in turn when traffic moves back")
+    parser.add_argument("--shift-step-s", type=float, default=5.0)
+    parser.add_argument("--health-interval-s", type=float, default=1.0)
+    parser.add_argument("--eject-after", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--mock-port", type=int, default=9270)
+    parser.add_argument("--mock-cold-s", type=float, default=3.0)
+    parser.add_argument("--mock-restart-delay-s", type=float, default=3.0,
+                        help="Downtime of a mock restart, standing in for model load")
+    parser.add_argument("--mock-cold-ttft-ms", type=float, default=400.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.launcher != "mock" and len(args.replica) < 2:
+        parser.error("a rolling restart needs at least two --replica")
+
+    launchers = build_launchers(args)
+    print("🚀 Rolling Restart")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"📍 {len(launchers)} {args.launcher} replicas at {args.rate} req/s, "
+          f"{'no draining' if args.no_drain else 'drain → relaunch → warm → shift'}")
+
+    async def run():
+        try:
+            return await run_rolling_restart(launchers, args)
+        finally:
+            # Containers outlive the run; mocks and subprocesses were started by it
+            if args.launcher != "docker":
+                for launcher in launchers:
+                    await launcher.close()
+
+    result = asyncio.run(run())
+
+    print("\n" + "=" * 70)
+    print("🏁 ROLLING RESTART SUMMARY")
+    print("=" * 70)
+    if "error" in result:
+        print(f"  ❌ {result['error']}")
+    else:
+        for phase, stats in result["phases"].items():
+            print(f"  {phase:<28} {stats['requests']:4d} req  err {stats['errors']:3d}  "
+                  f"p50 {stats['p50_total_ms'] or 0:7.0f}ms  p99 {stats['p99_total_ms'] or 0:7.0f}ms  "
+                  f"TTFT p99 {stats['p99_ttft_ms'] or 0:6.0f}ms")
+        for swap in result["swaps"]:
+            print(f"  🔁 {swap['replica']}: drain {swap.get('drain_s') or 0:.1f}s, relaunch {swap['relaunch_s']:.1f}s, "
+                  f"health {swap['health_s']:.1f}s, warmup {swap.get('warmup_s') or 0:.1f}s")
+        impact = result["during_swaps"]
+        verdict = "✅ zero downtime" if result["zero_downtime"] else f"❌ {impact['errors']} failed requests"
+        increase = f"{result['p99_increase']:+.0%}" if result["p99_increase"] is not None else "n/a"
+        print(f"\n  {verdict} during the swaps, p99 latency {increase} vs baseline  "
+              f"[{format_outcomes(impact['outcomes'])}]")
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"rolling_restart_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "config": vars(args), "results": result}, f, indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Roofline Estimator - analytical decode ceiling per model, quantization and batch size
+Reads config.json and counts the bytes one decode step must stream from
+HBM: attention (full and Gated DeltaNet linear layers), the experts the
+batch activates (8/128 for Qwen3-30B-A3B, 10/512 plus a shared expert for
+Qwen3-Next-80B-A3B), the KV cache at a given context, recurrent state and
+the LM head. Memory bandwidth turns that into an upper-bound tok/s for
+each batch size, and measured throughput is reported as a share of it
+"""
+
+import os
+import glob
+import json
+import argparse
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+# Bytes per weight of the quantized linear layers; AWQ is 4-bit with an fp16
+# scale and a 4-bit zero point per group of 128
+QUANT_BYTES = {"fp16": 2.0, "fp8": 1.0, "awq": 0.5 + 2.5 / 128}
+KV_BYTES = {"fp16": 2.0, "fp8": 1.0}
+
+# RTX 5090 (GDDR7, 512-bit at 28 Gbps)
+DEFAULT_BANDWIDTH_GBS = 1792.0
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def resolve_config(spec: str) -> str:
+    """config.json from a path, a models--Org--Name cache dir or an 'Org/Name' id"""
+    if os.path.isfile(spec):
+        return spec
+    cache_name = f"models--{spec.replace('/', '--')}"
+    candidates = [spec, cache_name, os.path.join(REPO_DIR, cache_name)]
+    for directory in candidates:
+        if os.path.isfile(os.path.join(directory, "config.json")):
+            return os.path.join(directory, "config.json")
+        snapshots = sorted(glob.glob(os.path.join(directory, "snapshots", "*", "config.json")))
+        if snapshots:
+            return snapshots[-1]
+    raise FileNotFoundError(f"No config.json for {spec!r}")
+
+
+def default_models() -> List[str]:
+    """Every bundled models-- snapshot next to this script, wherever it is run from"""
+    return sorted(d for d in glob.glob(os.path.join(REPO_DIR, "models--*"))
+                  if glob.glob(os.path.join(d, "snapshots", "*", "config.json")))
+
+
+def model_name(spec: str) -> str:
+    base = os.path.basename(os.path.normpath(spec))
+    return base[len("models--"):].replace("--", "/") if base.startswith("models--") else spec
+
+
+def layer_types(cfg: Dict[str, Any]) -> List[str]:
+    """'full' or 'linear' attention per layer; Qwen3-Next has a full layer every ``full_attention_interval``"""
+    layers = cfg["num_hidden_layers"]
+    if "layer_types" in cfg:
+        return ["full" if t == "full_attention" else "linear" for t in cfg["layer_types"]]
+    interval = cfg.get("full_attention_interval")
+    if interval:
+        return ["full" if (i + 1) % interval == 0 else "linear" for i in range(layers)]
+    return ["full"] * layers
+
+
+def is_moe_layer(cfg: Dict[str, Any], index: int) -> bool:
+    if not cfg.get("num_experts"):
+        return False
+    step = cfg.get("decoder_sparse_step", 1) or 1
+    return index not in cfg.get("mlp_only_layers", []) and (index + 1) % step == 0
+
+
+def model_shape(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """Parameter counts per component (whole model) and per-sequence cache sizes in elements"""
+    hidden = cfg["hidden_size"]
+    heads = cfg["num_attention_heads"]
+    kv_heads = cfg.get("num_key_value_heads", heads)
+    head_dim = cfg.get("head_dim", hidden // heads)
+    types = layer_types(cfg)
+    full_layers = types.count("full")
+    linear_layers = types.count("linear")
+
+    # Qwen3-Next's gated attention projects a per-head output gate alongside the query
+    q_out = heads * head_dim * (2 if cfg.get("model_type") == "qwen3_next" else 1)
+    attention = full_layers * (hidden * q_out + 2 * hidden * kv_heads * head_dim + heads * head_dim * hidden)
+
+    linear_attention, state_per_seq = 0, 0
+    if linear_layers:
+        key_dim = cfg["linear_num_key_heads"] * cfg["linear_key_head_dim"]
+        value_heads = cfg["linear_num_value_heads"]
+        value_dim = value_heads * cfg["linear_value_head_dim"]
+        conv_dim = 2 * key_dim + value_dim
+        kernel = cfg.get("linear_conv_kernel_dim", 4)
+        linear_attention = linear_layers * (hidden * (2 * key_dim + 2 * value_dim) + hidden * 2 * value_heads
+                                            + conv_dim * kernel + value_dim * hidden)
+        # Recurrent state (one dk x dv matrix per value head) plus the conv window, per sequence
+        state_per_seq = linear_layers * (value_heads * cfg["linear_key_head_dim"] * cfg["linear_value_head_dim"]
+                                         + conv_dim * (kernel - 1))
+
+    moe_layers = sum(1 for i in range(cfg["num_hidden_layers"]) if is_moe_layer(cfg, i))
+    dense_layers = cfg["num_hidden_layers"] - moe_layers
+    expert = 3 * hidden * cfg.get("moe_intermediate_size", 0)
+    shared_size = cfg.get("shared_expert_intermediate_size", 0)
+    return {
+        "layers": cfg["num_hidden_layers"],
+        "full_attention_layers": full_layers,
+        "linear_attention_layers": linear_layers,
+        "moe_layers": moe_layers,
+        "num_experts": cfg.get("num_experts", 0),
+        "experts_per_token": cfg.get("num_experts_per_tok", 0),
+        "attention_params": attention,
+        "linear_attention_params": linear_attention,
+        "dense_mlp_params": dense_layers * 3 * hidden * cfg["intermediate_size"],
+        "expert_params": expert,
+        "shared_expert_params": moe_layers * ((3 * hidden * shared_size + hidden) if shared_size else 0),
+        "router_params": moe_layers * hidden * cfg.get("num_experts", 0),
+        "embedding_params": cfg["vocab_size"] * hidden,
+        "lm_head_params": 0 if cfg.get("tie_word_embeddings") else cfg["vocab_size"] * hidden,
+        "kv_per_token": full_layers * 2 * kv_heads * head_dim,
+        "state_per_seq": state_per_seq,
+        "hidden_size": hidden,
+    }
+
+
+def expected_active_experts(num_experts: int, top_k: int, batch: int) -> float:
+    """Distinct experts a batch touches per layer, assuming uniform independent routing"""
+    if not num_experts:
+        return 0.0
+    return num_experts * (1 - (1 - top_k / num_experts) ** batch)
+
+
+def active_params(shape: Dict[str, Any]) -> int:
+    """Parameters one token uses (the usual 'A3B' figure, LM head included)"""
+    return (shape["attention_params"] + shape["linear_attention_params"] + shape["dense_mlp_params"]
+            + shape["moe_layers"] * shape["experts_per_token"] * shape["expert_params"]
+            + shape["shared_expert_params"] + shape["router_params"]
+            + (shape["lm_head_params"] or shape["embedding_params"]) + shape["hidden_size"])
+
+
+def step_bytes(shape: Dict[str, Any], quant: str, batch: int, context: int, kv_dtype: str = "fp16",
+               state_bytes: float = 4.0) -> Dict[str, float]:
+    """Bytes read from memory by one decode step of ``batch`` sequences at ``context`` tokens each.
+
+    Weights are read once per step whatever the batch; quantization covers
+    the decoder's linear layers, while router, embedding and LM head stay
+    fp16 as in the AWQ/FP8 checkpoints. KV is read per sequence; the
+    linear-attention state is read and written back.
+    """
+    weight = QUANT_BYTES[quant]
+    experts = expected_active_experts(shape["num_experts"], shape["experts_per_token"], batch)
+    lm_head = shape["lm_head_params"] or shape["embedding_params"]
+    breakdown = {
+        "attention": shape["attention_params"] * weight,
+        "linear_attention": shape["linear_attention_params"] * weight,
+        "dense_mlp": shape["dense_mlp_params"] * weight,
+        "experts": shape["moe_layers"] * experts * shape["expert_params"] * weight,
+        "shared_expert": shape["shared_expert_params"] * weight,
+        "router": shape["router_params"] * 2.0,
+        "embedding_lm_head": lm_head * 2.0 + batch * shape["hidden_size"] * 2.0,
+        "kv_cache": batch * context * shape["kv_per_token"] * KV_BYTES[kv_dtype],
+        "linear_state": batch * shape["state_per_seq"] * state_bytes * 2,
+    }
+    breakdown["total"] = sum(breakdown.values())
+    return breakdown
+
+
+def roofline(shape: Dict[str, Any], quant: str, batch: int, context: int, bandwidth_gbs: float,
+             kv_dtype: str = "fp16", state_bytes: float = 4.0,
+             peak_tflops: Optional[float] = None) -> Dict[str, Any]:
+    """Upper-bound aggregate tok/s for one batch size; compute-bound too when ``peak_tflops`` is given"""
+    breakdown = step_bytes(shape, quant, batch, context, kv_dtype, state_bytes)
+    step_s = breakdown["total"] / (bandwidth_gbs * 1e9)
+    bound = "memory"
+    if peak_tflops:
+        # 2 FLOPs per active weight plus QK^T and PV over the context, per sequence
+        flops = batch * (2 * active_params(shape) + 2 * context * shape["kv_per_token"])
+        compute_s = flops / (peak_tflops * 1e12)
+        if compute_s > step_s:
+            step_s, bound = compute_s, "compute"
+    return {
+        "batch": batch,
+        "bytes_per_step": breakdown["total"],
+        "breakdown": breakdown,
+        "step_ms": step_s * 1000,
+        "tok_s": batch / step_s,
+        "per_stream_tok_s": 1 / step_s,
+        "bound": bound,
+    }
+
+
+def parse_measured(value: str) -> Tuple[int, float]:
+    """'8=520' -> (8, 520.0): aggregate tok/s measured at batch 8"""
+    batch, tok_s = value.split("=", 1)
+    return int(batch), float(tok_s)
+
+
+def estimate(spec: str, args) -> Dict[str, Any]:
+    config_path = resolve_config(spec)
+    with open(config_path) as f:
+        cfg = json.load(f)
+    shape = model_shape(cfg)
+    measured = dict(args.measured or [])
+    quants = []
+    for quant in args.quant:
+        points = [roofline(shape, quant, batch, args.context, args.bandwidth_gbs, args.kv_dtype,
+                           args.state_bytes, args.peak_tflops) for batch in args.batch_sizes]
+        for point in points:
+            if point["batch"] in measured:
+                point["measured_tok_s"] = measured[point["batch"]]
+                point["percent_of_roofline"] = 100 * measured[point["batch"]] / point["tok_s"]
+        quants.append({"quant": quant, "points": points})
+    return {"model": model_name(spec), "config": config_path, "architecture": cfg.get("architectures", ["?"])[0],
+            "shape": shape, "active_params": active_params(shape), "quants": quants}
+
+
+def print_estimate(result: Dict[str, Any], args):
+    shape = result["shape"]
+    print(f"\n{'=' * 70}")
+    print(f"🧮 {result['model']} ({result['architecture']})")
+    print(f"{'=' * 70}")
+    layers = f"{shape['layers']} layers"
+    if shape["linear_attention_layers"]:
+        layers += f" ({shape['full_attention_layers']} full + {shape['linear_attention_layers']} linear attention)"
+    experts = (f", {shape['experts_per_token']}/{shape['num_experts']} experts"
+               f"{' + shared' if shape['shared_expert_params'] else ''}" if shape["num_experts"] else "")
+    print(f"  {layers}{experts}, {result['active_params'] / 1e9:.2f}B active params/token")
+    print(f"  KV {shape['kv_per_token'] * KV_BYTES[args.kv_dtype] / 1024:.0f} KiB/token ({args.kv_dtype})"
+          + (f", linear state {shape['state_per_seq'] * args.state_bytes / 2 ** 20:.0f} MiB/seq"
+             if shape["state_per_seq"] else ""))
+
+    for entry in result["quants"]:
+        first = entry["points"][0]
+        parts = [f"{key.replace('_', ' ')} {value / 2 ** 20:.0f}" for key, value in first["breakdown"].items()
+                 if key != "total" and value >= 2 ** 20]
+        print(f"\n  📦 {entry['quant'].upper()} at batch {first['batch']}, context {args.context}: "
+              f"{first['bytes_per_step'] / 2 ** 30:.2f} GiB/step (MiB: {', '.join(parts)})")
+        for point in entry["points"]:
+            line = (f"    batch {point['batch']:4d}: ≤ {point['tok_s']:9.1f} tok/s "
+                    f"({point['per_stream_tok_s']:7.1f}/stream, {point['step_ms']:6.2f}ms/step, {point['bound']})")
+            if "measured_tok_s" in point:
+                line += f"  measured {point['measured_tok_s']:.1f} = {point['percent_of_roofline']:.1f}% of roofline"
+                if point["percent_of_roofline"] > 100:
+                    line += "  ⚠️ above the ceiling: check bandwidth, quantization and context"
+            print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analytical decode roofline per model, quantization and batch")
+    parser.add_argument("--model", action="append",
+                        help="config.json, models--Org--Name dir or Org/Name, repeatable (default: every models-- dir)")
+    parser.add_argument("--quant", type=lambda s: s.split(","), default=["awq", "fp8", "fp16"],
+                        help=f"Comma-separated weight formats from {', '.join(QUANT_BYTES)}")
+    parser.add_argument("--batch-sizes", type=lambda s: [int(x) for x in s.split(",")],
+                        default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--context", type=int, default=2048, help="Tokens in each sequence's KV cache")
+    parser.add_argument("--kv-dtype", choices=list(KV_BYTES), default="fp16")
+    parser.add_argument("--state-bytes", type=float, default=4.0,
+                        help="Bytes per linear-attention state element (fp32 = 4)")
+    parser.add_argument("--bandwidth-gbs", type=float, default=DEFAULT_BANDWIDTH_GBS,
+                        help="Memory bandwidth in GB/s (default: RTX 5090)")
+    parser.add_argument("--peak-tflops", type=float, help="Dense tensor TFLOPS, adds the compute roof")
+    parser.add_argument("--measured", action="append", type=parse_measured,
+                        help="BATCH=TOK_S aggregate throughput measured at that batch size, repeatable")
+    args = parser.parse_args()
+    unknown = [q for q in args.quant if q not in QUANT_BYTES]
+    if unknown:
+        parser.error(f"unknown --quant {', '.join(unknown)}; choose from {', '.join(QUANT_BYTES)}")
+
+    print("🚀 Decode Roofline Estimator")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"📍 {args.bandwidth_gbs:.0f} GB/s"
+          + (f", {args.peak_tflops:.0f} TFLOPS" if args.peak_tflops else "") + f", context {args.context}")
+    specs = args.model or default_models()
+    if not specs:
+        parser.error(f"no models--*/snapshots/*/config.json under {REPO_DIR}; pass --model")
+    results = []
+    for spec in specs:
+        result = estimate(spec, args)
+        print_estimate(result, args)
+        results.append(result)
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"roofline_estimate_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "config": vars(args), "results": results}, f, indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
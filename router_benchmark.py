@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Router Benchmark - aggregate throughput across replicas per routing policy
+Runs against local mock servers by default, or real backends via --backend
+"""
+
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+from replica_router import ReplicaRouter, POLICIES
+from outcome_stats import summarize_outcomes, format_outcomes
+from mock_openai_server import start_mock_servers, stop_mock_servers
+from energy_telemetry import PowerSampler, start_power_sampler, energy_fields, add_power_arguments, format_energy
+
+
+async def run_policy(urls: List[str], policy: str, args, power: Optional[PowerSampler] = None) -> Dict[str, Any]:
+    """Closed-loop run of args.requests requests through one router configuration"""
+    async with ReplicaRouter(urls, args.model, policy, health_interval=1.0, seed=args.seed) as router:
+        payloads = [
+            {"model": args.model, "prompt": f"Request {i}: explain quantum computing in simple terms:",
+             "max_tokens": args.max_tokens, "temperature": 0.7, "stream": True,
+             "stream_options": {"include_usage": True}}
+            for i in range(args.requests)
+        ]
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def worker(payload):
+            async with semaphore:
+                return await router.send(payload)
+
+        start = time.perf_counter()
+        records = await asyncio.gather(*(worker(p) for p in payloads))
+        end = time.perf_counter()
+        elapsed = end - start
+        stats = router.stats()
+
+    ok = [r for r in records if r["success"]]
+    latencies = [r["total_ms"] for r in ok]
+    ttfts = [r["first_token_ms"] for r in ok if r.get("first_token_ms") is not None]
+    tokens = sum(r["completion_tokens"] for r in ok)
+    outcomes = summarize_outcomes(records)
+    return {
+        "policy": policy,
+        "replicas": len(urls),
+        "requests": len(records),
+        "successful": len(ok),
+        "outcomes": outcomes["outcomes"],
+        "censored_latency_percentiles": outcomes["censored_percentiles"],
+        "elapsed_s": elapsed,
+        "throughput_tps": tokens / elapsed if elapsed > 0 else 0,
+        "requests_per_second": len(ok) / elapsed if elapsed > 0 else 0,
+        "p50_latency_ms": statistics.median(latencies) if latencies else None,
+        "p95_latency_ms": statistics.quantiles(latencies, n=20)[18] if len(latencies) >= 20 else None,
+        "p50_ttft_ms": statistics.median(ttfts) if ttfts else None,
+        "per_backend_requests": [b["requests"] for b in stats["backends"]],
+        **energy_fields(power, start, end, tokens, len(ok)),
+    }
+
+
+async def run_benchmark(args) -> List[Dict[str, Any]]:
+    power = start_power_sampler(args.power, args.power_interval_s)
+    servers = []
+    urls = args.backend
+    if not urls:
+        servers = await start_mock_servers(
+            args.mock_replicas, args.mock_port, ttft_ms=args.mock_ttft_ms, itl_ms=args.mock_itl_ms,
+            max_running=args.mock_max_running)
+        # One slower replica makes the policies distinguishable
+        if args.slow_factor > 1 and servers:
+            servers[-1].itl_ms *= args.slow_factor
+        urls = [s.base_url for s in servers]
+
+    results = []
+    try:
+        for replicas in sorted({1, *range(2, len(urls) + 1, max(1, len(urls) // 4)), len(urls)}):
+            for policy in args.policies:
+                result = await run_policy(urls[:replicas], policy, args, power)
+                results.append(result)
+                print(f"  {replicas} replica(s) {policy:<18} {result['throughput_tps']:9.1f} tok/s  "
+                      f"p50 {result['p50_latency_ms'] or 0:7.0f}ms  split {result['per_backend_requests']}"
+                      + (f"  {format_energy(result)}" if power else ""))
+    finally:
+        await stop_mock_servers(servers)
+        if power:
+            power.close()
+    return results
+
+
+def print_summary(results: List[Dict[str, Any]]):
+    print("\n" + "=" * 70)
+    print("🏁 ROUTER SCALING SUMMARY")
+    print("=" * 70)
+    single = {r["policy"]: r["throughput_tps"] for r in results if r["replicas"] == 1}
+    for r in results:
+        base = single.get(r["policy"])
+        scale = r["throughput_tps"] / base if base else 0
+        print(f"  {r['replicas']} × {r['policy']:<18} {r['throughput_tps']:9.1f} tok/s "
+              f"({scale:.2f}x of 1 replica), p95 {r['p95_latency_ms'] or 0:.0f}ms, "
+              f"{format_outcomes(r['outcomes'])}")
+    best = max(results, key=lambda r: r["throughput_tps"])
+    print(f"\n🏆 Best: {best['replicas']} replicas with {best['policy']} ({best['throughput_tps']:.1f} tok/s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-replica router benchmark")
+    parser.add_argument("--backend", action="append", help="Real backend URL, repeatable (default: mock servers)")
+    parser.add_argument("--policies", nargs="+", default=sorted(POLICIES), choices=sorted(POLICIES))
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per run")
+    parser.add_argument("--concurrency", type=int, default=32, help="In-flight requests")
+    parser.add_argument("--max-tokens", type=int, default=50)
+    parser.add_argument("--mock-replicas", type=int, default=4)
+    parser.add_argument("--mock-port", type=int, default=9100)
+    parser.add_argument("--mock-ttft-ms", type=float, default=50.0)
+    parser.add_argument("--mock-itl-ms", type=float, default=5.0)
+    parser.add_argument("--mock-max-running", type=int, default=4)
+    parser.add_argument("--slow-factor", type=float, default=2.0, help="ITL multiplier of the last mock replica")
+    parser.add_argument("--seed", type=int, default=0)
+    add_power_arguments(parser)
+    args = parser.parse_args()
+
+    print("🚀 Router Benchmark")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    results = asyncio.run(run_benchmark(args))
+    print_summary(results)
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"router_benchmark_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "results": results}, f, indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+SGLang Log Monitor - scheduler time series from the server's own log lines
+Tails `docker logs` or a log file, parses the per-iteration "Prefill batch" /
+"Decode batch" lines into running/queued requests, KV token usage and gen
+throughput, and lines them up with client-side request timelines so batch
+dynamics are visible without touching the server
+"""
+
+import re
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, AsyncIterator
+
+from load_engine import LoadEngine
+
+# [2025-09-16 15:30:00 TP0] Decode batch. #running-req: 12, #token: 5120, token usage: 0.08, gen throughput (token/s): 812.34, #queue-req: 0
+BATCH_LINE = re.compile(r"(?P<kind>Prefill|Decode) batch\b[^#]*(?P<fields>#.*)$")
+SERVER_TIME = re.compile(r"\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})(?:[.,]\d+)?(?: [^\]]*)?\]")
+# Prefix added by `docker logs -t`: 2025-09-16T15:30:00.123456789Z
+DOCKER_TIME = re.compile(r"^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(\.\d+)?Z\s")
+FIELD = re.compile(r"(#?[A-Za-z][\w\- ()/]*?):\s*([-\d.]+|True|False)")
+
+FIELD_NAMES = {
+    "#running-req": "running_req",
+    "#queue-req": "queue_req",
+    "token usage": "token_usage",
+    "gen throughput (token/s)": "gen_throughput",
+    "#new-seq": "new_seq",
+    "#new-token": "new_token",
+    "#cached-token": "cached_token",
+    "#token": "num_token",
+    "accept len": "accept_len",
+}
+SERIES_FIELDS = ["running_req", "queue_req", "token_usage", "num_token", "gen_throughput", "new_token"]
+
+
+def parse_timestamp(line: str) -> Optional[float]:
+    """Epoch seconds from a `docker logs -t` prefix (UTC, sub-second) or SGLang's own stamp (local, seconds)"""
+    match = DOCKER_TIME.match(line)
+    if match:
+        stamp = datetime.strptime(match.group(1), "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc)
+        return stamp.timestamp() + float(match.group(2) or 0)
+    match = SERVER_TIME.search(line)
+    if match:
+        return time.mktime(time.strptime(match.group(1), "%Y-%m-%d %H:%M:%S"))
+    return None
+
+
+def parse_line(line: str, arrival: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """One scheduler sample from a log line, or None for any other line.
+
+    ``t`` is the docker timestamp when present, otherwise ``arrival`` (the
+    moment a tailed line was read, better than SGLang's whole-second stamp),
+    otherwise the stamp in the line.
+    """
+    match = BATCH_LINE.search(line)
+    if not match:
+        return None
+    sample: Dict[str, Any] = {"kind": match.group("kind").lower()}
+    for key, value in FIELD.findall(match.group("fields")):
+        name = FIELD_NAMES.get(key.strip())
+        if name is not None and value not in ("True", "False"):
+            sample[name] = float(value) if "." in value else int(value)
+    docker_time = parse_timestamp(line) if DOCKER_TIME.match(line) else None
+    sample["t"] = docker_time or arrival or parse_timestamp(line)
+    return sample
+
+
+class SchedulerLogIngester:
+    """Collects scheduler samples from a file or a container while other work runs"""
+
+    def __init__(self, clock_offset_s: float = 0.0):
+        self.clock_offset_s = clock_offset_s
+        self.samples: List[Dict[str, Any]] = []
+        self.lines = 0
+
+    def feed(self, line: str, arrival: Optional[float] = None):
+        self.lines += 1
+        sample = parse_line(line, arrival)
+        if sample is not None:
+            if sample["t"] is not None:
+                sample["t"] += self.clock_offset_s
+            self.samples.append(sample)
+
+    async def tail_file(self, path: str, follow: bool = False, poll_s: float = 0.2) -> AsyncIterator[str]:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            if follow:
+                f.seek(0, 2)
+            while True:
+                line = f.readline()
+                if line:
+                    yield line
+                elif follow:
+                    await asyncio.sleep(poll_s)
+                else:
+                    return
+
+    async def tail_docker(self, container: str, since: Optional[str] = None) -> AsyncIterator[str]:
+        """``docker logs -f -t`` of the container (SGLang logs to stderr, so both streams are read)"""
+        command = ["docker", "logs", "-f", "-t"] + (["--since", since] if since else []) + [container]
+        process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.STDOUT)
+        try:
+            async for raw in process.stdout:
+                yield raw.decode("utf-8", errors="replace")
+        finally:
+            if process.returncode is None:
+                process.terminate()
+                await process.wait()
+
+    async def ingest(self, lines: AsyncIterator[str], live: bool):
+        async for line in lines:
+            self.feed(line, time.time() if live else None)
+
+    def series(self, kind: Optional[str] = "decode") -> Dict[str, List[Any]]:
+        """Columnar time series (one list per field) of ``kind`` samples, or of all samples with None"""
+        selected = [s for s in self.samples if kind is None or s["kind"] == kind]
+        columns = {"t": [s["t"] for s in selected]}
+        for field in SERIES_FIELDS:
+            if any(field in s for s in selected):
+                columns[field] = [s.get(field) for s in selected]
+        return columns
+
+
+def summarize_samples(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    decode = [s for s in samples if s["kind"] == "decode"]
+    prefill = [s for s in samples if s["kind"] == "prefill"]
+
+    def stats(field, rows=decode):
+        values = [s[field] for s in rows if field in s]
+        if not values:
+            return None
+        return {"mean": statistics.mean(values), "max": max(values), "min": min(values)}
+
+    return {
+        "decode_samples": len(decode),
+        "prefill_samples": len(prefill),
+        "running_req": stats("running_req"),
+        "queue_req": stats("queue_req", samples),
+        "token_usage": stats("token_usage", samples),
+        "gen_throughput": stats("gen_throughput"),
+        "prefill_new_tokens": sum(s.get("new_token", 0) for s in prefill),
+        "prefill_cached_tokens": sum(s.get("cached_token", 0) for s in prefill),
+    }
+
+
+def align(samples: List[Dict[str, Any]], records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Join scheduler samples and client records on wall-clock time.
+
+    Each record gets the scheduler state seen while it was in flight and
+    each sample gets the number of client requests in flight at that
+    moment, so the server's batch size can be compared with what the
+    client thinks it is sending.
+    """
+    timed = sorted((s for s in samples if s.get("t") is not None), key=lambda s: s["t"])
+    per_request = []
+    for record in records:
+        if record.get("start_time") is None or record.get("total_ms") is None:
+            continue
+        start, end = record["start_time"], record["start_time"] + record["total_ms"] / 1000
+        during = [s for s in timed if start <= s["t"] <= end]
+        running = [s["running_req"] for s in during if "running_req" in s]
+        queued = [s["queue_req"] for s in during if "queue_req" in s]
+        per_request.append({
+            "request_id": record.get("request_id"),
+            "start_time": start,
+            "end_time": end,
+            "outcome": record.get("outcome"),
+            "first_token_ms": record.get("first_token_ms"),
+            "total_ms": record["total_ms"],
+            "scheduler_samples": len(during),
+            "mean_running_req": statistics.mean(running) if running else None,
+            "max_queue_req": max(queued) if queued else None,
+        })
+
+    intervals = [(r["start_time"], r["end_time"]) for r in per_request]
+    timeline = []
+    for s in timed:
+        in_flight = sum(1 for start, end in intervals if start <= s["t"] <= end)
+        timeline.append({"t": s["t"], "kind": s["kind"], "client_in_flight": in_flight,
+                         "running_req": s.get("running_req"), "queue_req": s.get("queue_req"),
+                         "token_usage": s.get("token_usage"), "gen_throughput": s.get("gen_throughput")})
+
+    gaps = [t["client_in_flight"] - (t["running_req"] or 0) - (t["queue_req"] or 0)
+            for t in timeline if t["kind"] == "decode" and t["client_in_flight"]]
+    return {
+        "requests": per_request,
+        "timeline": timeline,
+        # Positive: requests the client has sent but the scheduler does not hold yet (or other tenants' load if negative)
+        "mean_in_flight_gap": statistics.mean(gaps) if gaps else None,
+    }
+
+
+async def run_monitor(args) -> Dict[str, Any]:
+    ingester = SchedulerLogIngester(args.clock_offset_s)
+    live = bool(args.container) or args.follow
+    if args.container:
+        source = ingester.tail_docker(args.container, args.since)
+    else:
+        source = ingester.tail_file(args.file, follow=args.follow)
+    task = asyncio.create_task(ingester.ingest(source, live))
+
+    records: List[Dict[str, Any]] = []
+    try:
+        if args.backend:
+            # Let the tail catch up before the load starts
+            await asyncio.sleep(1.0)
+            async with LoadEngine(args.backend, args.model, timeout=args.timeout) as engine:
+                payloads = [engine.build_payload(f"Log monitor request {i}: write a short story", args.max_tokens)
+                            for i in range(args.requests)]
+                print(f"⚡ Sending {args.requests} requests at concurrency {args.concurrency}...")
+                records = await engine.run_closed_loop(payloads, args.concurrency)
+            await asyncio.sleep(args.settle_s)
+        elif live:
+            await asyncio.sleep(args.duration)
+        else:
+            await task
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    result = {
+        "lines": ingester.lines,
+        "summary": summarize_samples(ingester.samples),
+        "series": ingester.series(None),
+    }
+    if records:
+        result["alignment"] = align(ingester.samples, records)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse SGLang scheduler log lines into a time series")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="Log file, e.g. deploy-patched.log or saved `docker logs -t` output")
+    source.add_argument("--container", help="Container to follow with `docker logs -f -t`")
+    parser.add_argument("--follow", action="store_true", help="Keep tailing --file for new lines")
+    parser.add_argument("--since", help="Passed to `docker logs --since` (e.g. 5m)")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds to tail when no --backend load runs")
+    parser.add_argument("--clock-offset-s", type=float, default=0.0, help="Added to server timestamps (clock skew)")
+    parser.add_argument("--backend", help="Also run a closed-loop load against this URL and align its timelines")
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--settle-s", type=float, default=2.0, help="Seconds to keep tailing after the load ends")
+    args = parser.parse_args()
+
+    print("🚀 SGLang Log Monitor")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"📜 Source: {args.container and f'docker logs {args.container}' or args.file}")
+    try:
+        result = asyncio.run(run_monitor(args))
+    except KeyboardInterrupt:
+        print("\n⏹️ Interrupted")
+        return
+
+    summary = result["summary"]
+    print(f"\n📊 {result['lines']} lines, {summary['decode_samples']} decode / {summary['prefill_samples']} prefill samples")
+    for field, label in (("running_req", "running requests"), ("queue_req", "queued requests"),
+                         ("token_usage", "KV token usage"), ("gen_throughput", "gen throughput tok/s")):
+        if summary[field]:
+            print(f"  {label:<22} mean {summary[field]['mean']:9.2f}  max {summary[field]['max']:9.2f}")
+    alignment = result.get("alignment")
+    if alignment and alignment["mean_in_flight_gap"] is not None:
+        print(f"  🔗 client in flight minus scheduler running+queued: {alignment['mean_in_flight_gap']:+.2f} on average")
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"sglang_log_monitor_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "config": vars(args), **result}, f, indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,12 +14,18 @@ from typing import List, Dict, Any
 import concurrent.futures
 import numpy as np
 
+from energy_telemetry import start_power_sampler, energy_fields
+from outcome_stats import classify_status, classify_exception, outcome_counts, format_outcomes
+
 class SGLangPerformanceTester:
-    def __init__(self, base_url: str, config_name: str):
+    def __init__(self, base_url: str, config_name: str, power=None):
         self.base_url = base_url
         self.config_name = config_name
+        self.power = power
         self.model_id = "Qwen/Qwen3-32B-AWQ"
         self.results = []
+        # Every measured request's outcome, failures included
+        self.attempts = []
 
     def test_single_request(self, prompt: str, max_tokens: int = 100, temperature: float = 0.7) -> Dict[str, Any]:
         """Test a single request and measure latency"""
@@ -36,8 +42,15 @@ class SGLangPerformanceTester:
         start_time = time.time()
         try:
             response = requests.post(url, json=payload, timeout=60)
-            response.raise_for_status()
             end_time = time.time()
+            if response.status_code != 200:
+                self.attempts.append({"outcome": classify_status(response.status_code)})
+                return {
+                    "success": False,
+                    "outcome": classify_status(response.status_code),
+                    "error": f"Status {response.status_code}",
+                    "latency": end_time - start_time
+                }
 
             result = response.json()
 
@@ -45,17 +58,21 @@ class SGLangPerformanceTester:
             latency = end_time - start_time
             tokens_generated = result.get('usage', {}).get('completion_tokens', 0)
             tokens_per_second = tokens_generated / latency if latency > 0 else 0
+            self.attempts.append({"outcome": "ok"})
 
             return {
                 "success": True,
+                "outcome": "ok",
                 "latency": latency,
                 "tokens_generated": tokens_generated,
                 "tokens_per_second": tokens_per_second,
                 "response_length": len(result['choices'][0]['text'])
             }
         except Exception as e:
+            self.attempts.append({"outcome": classify_exception(e)})
             return {
                 "success": False,
+                "outcome": classify_exception(e),
                 "error": str(e),
                 "latency": time.time() - start_time
             }
@@ -65,24 +82,30 @@ class SGLangPerformanceTester:
         print(f"  동시 사용자 {num_requests}명 테스트...")
 
         start_time = time.time()
+        window_start = time.perf_counter()
         with concurrent.futures.ThreadPoolExecutor(max_workers=num_requests) as executor:
             futures = [executor.submit(self.test_single_request, prompt, 50) for _ in range(num_requests)]
             results = [f.result() for f in concurrent.futures.as_completed(futures)]
+        window_end = time.perf_counter()
         end_time = time.time()
 
         successful = [r for r in results if r.get("success")]
         total_time = end_time - start_time
+        tokens = sum(r["tokens_generated"] for r in successful)
 
         return {
             "test_type": "throughput",
             "total_requests": num_requests,
             "successful_requests": len(successful),
             "failed_requests": num_requests - len(successful),
+            "outcomes": outcome_counts(results),
             "total_time": total_time,
             "requests_per_second": num_requests / total_time if total_time > 0 else 0,
             "avg_latency": statistics.mean([r["latency"] for r in successful]) if successful else 0,
             "min_latency": min([r["latency"] for r in successful]) if successful else 0,
-            "max_latency": max([r["latency"] for r in successful]) if successful else 0
+            "max_latency": max([r["latency"] for r in successful]) if successful else 0,
+            "total_tokens": tokens,
+            **energy_fields(self.power, window_start, window_end, tokens, len(successful))
         }
 
     def test_token_generation_speed(self, token_counts: List[int] = [10, 50, 100, 200, 500]) -> List[Dict[str, Any]]:
@@ -154,6 +177,7 @@ class SGLangPerformanceTester:
         for _ in range(3):
             self.test_single_request("Hello", max_tokens=5)
             time.sleep(0.5)
+        self.attempts = []
 
         all_results = {
             "configuration": self.config_name,
@@ -179,6 +203,7 @@ class SGLangPerformanceTester:
             result = self.test_throughput(num_users)
             throughput_results.append(result)
         all_results["throughput"] = throughput_results
+        all_results["outcomes"] = outcome_counts(self.attempts)
 
         return all_results
 
@@ -243,7 +268,7 @@ def save_results_to_csv(results: List[Dict], filename: str):
                     f"{test['total_requests']}명 처리량",
                     round(test["requests_per_second"], 2),
                     "req/sec",
-                    f"{test['total_requests']}명 동시"
+                    f"{test['total_requests']}명 동시 ({format_outcomes(test['outcomes'])})"
                 ])
                 rows.append([
                     config_name,
@@ -253,6 +278,15 @@ def save_results_to_csv(results: List[Dict], filename: str):
                     "seconds",
                     f"{test['total_requests']}명 동시"
                 ])
+                if test.get("tokens_per_joule") is not None:
+                    rows.append([
+                        config_name,
+                        "동시 사용자 처리",
+                        f"{test['total_requests']}명 에너지 효율",
+                        round(test["tokens_per_joule"], 3),
+                        "tokens/J",
+                        f"{test['mean_power_w']:.0f} W"
+                    ])
 
     # Write CSV
     with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
@@ -275,18 +309,23 @@ def main():
     ]
 
     all_results = []
+    power = start_power_sampler()
+    if power:
+        print(f"🔋 GPU 전력 측정: {power.provider.name}")
 
     for config in configs:
         # Check if accessible
         try:
             response = requests.get(f"http://localhost:{config['port']}/health", timeout=2)
             if response.status_code == 200:
-                tester = SGLangPerformanceTester(f"http://localhost:{config['port']}", config['name'])
+                tester = SGLangPerformanceTester(f"http://localhost:{config['port']}", config['name'], power)
                 result = tester.run_comprehensive_test()
                 all_results.append(result)
                 print(f"  ✅ {config['name']} 테스트 완료")
         except Exception as e:
             print(f"  ❌ {config['name']} 접속 불가: {e}")
+    if power:
+        power.close()
 
     # Save results
     if all_results:
@@ -306,13 +345,16 @@ def main():
             if "token_generation" in result:
                 avg_tps = statistics.mean([t["tokens_per_second"] for t in result["token_generation"]])
                 print(f"\n{config}:")
-                print(f"  평균 토큰 생성 속도: {avg_tps:.2f} tokens/sec")
+                print(f"  평균 토큰 생성 속도: {avg_tps:.2f} tokens/sec ({format_outcomes(result['outcomes'])})")
 
             if "throughput" in result:
                 for t in result["throughput"]:
                     if t["total_requests"] == 10:
-                        print(f"  10명 동시 처리량: {t['requests_per_second']:.2f} req/sec")
+                        print(f"  10명 동시 처리량: {t['requests_per_second']:.2f} req/sec "
+                              f"({format_outcomes(t['outcomes'])})")
                         print(f"  10명 평균 지연시간: {t['avg_latency']:.2f} seconds")
+                        if t.get("tokens_per_joule") is not None:
+                            print(f"  10명 에너지 효율: {t['tokens_per_joule']:.2f} tokens/J")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
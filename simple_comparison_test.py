@@ -10,28 +10,30 @@ import csv
 import statistics
 from datetime import datetime
 
-def quick_test(port, name, runs=10):
+from warmup_detector import completion_probe, warmup_until_steady, trim_to_steady_state
+from energy_telemetry import start_power_sampler, energy_fields, format_energy
+from outcome_stats import classify_status, classify_exception, outcome_counts, format_outcomes
+
+def quick_test(port, name, runs=10, power=None):
     """Quick performance test"""
     base_url = f"http://localhost:{port}"
 
     print(f"\n🎯 Testing {name} (Port {port})")
     print("-" * 40)
 
-    # Warmup
-    for _ in range(2):
-        try:
-            requests.post(f"{base_url}/v1/completions",
-                         json={"model": "Qwen/Qwen3-32B-AWQ", "prompt": "Hi", "max_tokens": 5},
-                         timeout=10)
-        except:
-            pass
+    # Warmup until latency is stationary rather than a fixed number of calls
+    probe = completion_probe(base_url, "Qwen/Qwen3-32B-AWQ", prompt="Hi", max_tokens=5, timeout=10)
+    warmup = warmup_until_steady(probe, [1])
+    print(f"🔥 Warmup took {warmup['warmup_s']:.1f}s ({warmup['requests']} requests)")
 
     results = {
         'name': name,
         'port': port,
         'latencies': [],
         'throughputs': [],
-        'ttfts': []
+        'ttfts': [],
+        'attempts': [],
+        'warmup': warmup
     }
 
     # Test 1: Short latency
@@ -47,18 +49,33 @@ def quick_test(port, name, runs=10):
             if resp.status_code == 200:
                 latency = (time.perf_counter() - start) * 1000
                 results['latencies'].append(latency)
+                results['attempts'].append({'outcome': 'ok'})
                 print(f"  {i+1:2d}: {latency:6.0f}ms", end="")
                 if (i+1) % 5 == 0:
                     print()
-        except:
+            else:
+                results['attempts'].append({'outcome': classify_status(resp.status_code)})
+                print(f"  {i+1:2d}: HTTP {resp.status_code}")
+        except Exception as e:
+            results['attempts'].append({'outcome': classify_exception(e)})
             print(f"  {i+1:2d}: ERROR")
 
+    # Only trim when the warmup gave up before converging
+    dropped = 0
+    if not warmup['converged']:
+        results['latencies'], dropped = trim_to_steady_state(results['latencies'])
+    if dropped:
+        print(f"\n  Excluded {dropped} pre-convergence samples")
+
     if results['latencies']:
         avg = statistics.mean(results['latencies'])
         print(f"\n  Average: {avg:.0f}ms")
 
     # Test 2: Throughput
     print("\n📊 Throughput (50 tokens):")
+    window_start = time.perf_counter()
+    generated = 0
+    throughput_attempts = []
     for i in range(5):
         start = time.perf_counter()
         try:
@@ -72,13 +89,24 @@ def quick_test(port, name, runs=10):
                 tokens = resp.json().get('usage', {}).get('completion_tokens', 50)
                 throughput = tokens / elapsed
                 results['throughputs'].append(throughput)
+                generated += tokens
+                throughput_attempts.append({'outcome': 'ok'})
                 print(f"  {i+1}: {throughput:.2f} tok/s")
-        except:
+            else:
+                throughput_attempts.append({'outcome': classify_status(resp.status_code)})
+                print(f"  {i+1}: HTTP {resp.status_code}")
+        except Exception as e:
+            throughput_attempts.append({'outcome': classify_exception(e)})
             print(f"  {i+1}: ERROR")
+    results['attempts'].extend(throughput_attempts)
 
     if results['throughputs']:
         avg = statistics.mean(results['throughputs'])
-        print(f"  Average: {avg:.2f} tok/s")
+        print(f"  Average: {avg:.2f} tok/s ({format_outcomes(outcome_counts(throughput_attempts))})")
+    results['energy'] = energy_fields(power, window_start, time.perf_counter(), generated,
+                                      len(results['throughputs']))
+    if results['energy']:
+        print(f"  Energy: {format_energy(results['energy'])}")
 
     # Test 3: TTFT
     print("\n📊 Time to First Token:")
@@ -90,19 +118,30 @@ def quick_test(port, name, runs=10):
                                       "prompt": "Once upon a time",
                                       "max_tokens": 10, "stream": True},
                                 stream=True, timeout=10)
+            if resp.status_code != 200:
+                results['attempts'].append({'outcome': classify_status(resp.status_code)})
+                print(f"  {i+1}: HTTP {resp.status_code}")
+                continue
             for line in resp.iter_lines():
                 if line:
                     ttft = (time.perf_counter() - start) * 1000
                     results['ttfts'].append(ttft)
+                    results['attempts'].append({'outcome': 'ok'})
                     print(f"  {i+1}: {ttft:.0f}ms")
                     break
-        except:
+            else:
+                results['attempts'].append({'outcome': 'reset'})
+                print(f"  {i+1}: ERROR")
+        except Exception as e:
+            results['attempts'].append({'outcome': classify_exception(e)})
             print(f"  {i+1}: ERROR")
 
     if results['ttfts']:
         avg = statistics.mean(results['ttfts'])
         print(f"  Average: {avg:.0f}ms")
 
+    results['outcomes'] = outcome_counts(results['attempts'])
+    print(f"\n🧾 Outcomes: {format_outcomes(results['outcomes'])}")
     return results
 
 def main():
@@ -112,7 +151,12 @@ def main():
     print("="*60)
 
     # Test balanced-v2 only (baseline OOM)
-    results = quick_test(8003, "Balanced-v2-LOF")
+    power = start_power_sampler()
+    try:
+        results = quick_test(8003, "Balanced-v2-LOF", power=power)
+    finally:
+        if power:
+            power.close()
 
     # Save CSV
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -125,7 +169,10 @@ def main():
         'Max_Latency_ms': round(max(results['latencies']), 1) if results['latencies'] else 0,
         'Avg_Throughput_tps': round(statistics.mean(results['throughputs']), 2) if results['throughputs'] else 0,
         'Avg_TTFT_ms': round(statistics.mean(results['ttfts']), 1) if results['ttfts'] else 0,
-        'Samples': len(results['latencies'])
+        'Samples': len(results['latencies']),
+        'Warmup_s': round(results['warmup']['warmup_s'], 1),
+        'Tokens_Per_Joule': results['energy'].get('tokens_per_joule', ''),
+        'Outcomes': format_outcomes(results['outcomes'])
     }]
 
     # Add baseline data from previous test
@@ -136,7 +183,10 @@ def main():
         'Max_Latency_ms': 1059.0,
         'Avg_Throughput_tps': 10.16,
         'Avg_TTFT_ms': 269.0,
-        'Samples': 20
+        'Samples': 20,
+        'Warmup_s': '',
+        'Tokens_Per_Joule': '',
+        'Outcomes': ''
     }
     csv_data.insert(0, baseline_data)
 
@@ -162,7 +212,8 @@ def main():
     ttft_imp = (b['Avg_TTFT_ms'] - o['Avg_TTFT_ms']) / b['Avg_TTFT_ms'] * 100
 
     print(f"{'Latency (ms)':<20} {b['Avg_Latency_ms']:<15.1f} {o['Avg_Latency_ms']:<15.1f} {lat_imp:+.1f}%")
-    print(f"{'Throughput (tok/s)':<20} {b['Avg_Throughput_tps']:<15.2f} {o['Avg_Throughput_tps']:<15.2f} {tps_imp:+.1f}%")
+    print(f"{'Throughput (tok/s)':<20} {b['Avg_Throughput_tps']:<15.2f} {o['Avg_Throughput_tps']:<15.2f} {tps_imp:+.1f}%"
+          f"  ({o['Outcomes']})")
     print(f"{'TTFT (ms)':<20} {b['Avg_TTFT_ms']:<15.1f} {o['Avg_TTFT_ms']:<15.1f} {ttft_imp:+.1f}%")
 
     print("\n" + "="*60)
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Slow Consumer Test - do slow SSE readers hurt everyone else?
+Runs full-speed streaming clients alone, next to extra full-speed clients
+(the control for the added load) and next to the same number of clients
+reading their socket at N bytes/s, and compares the fast readers' TTFT/ITL
+between the last two; when they slowed down, server running counts, the
+client's own event-loop lag and the slow readers' timings point at the
+cause (server buffering, event-loop stalls or head-of-line blocking in the
+HTTP layer)
+"""
+
+import json
+import time
+import socket
+import asyncio
+import argparse
+import statistics
+import aiohttp
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+from load_engine import LoadEngine
+from mock_openai_server import MockOpenAIServer
+from decode_position_profiler import parse_target
+from disconnect_benchmark import ServerCounters
+from outcome_stats import outcome_counts, format_outcomes
+
+
+def percentile(values: List[float], q: int) -> Optional[float]:
+    if len(values) < 2:
+        return values[0] if values else None
+    return statistics.quantiles(values, n=100)[q - 1]
+
+
+def small_buffer_socket_factory(receive_buffer: int):
+    """Sockets with a small kernel receive buffer, so a slow reader pushes back on the server quickly"""
+
+    def factory(addr_info):
+        family, type_, proto, _, _ = addr_info
+        sock = socket.socket(family=family, type=type_, proto=proto)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+        return sock
+
+    return factory
+
+
+async def slow_stream(session: aiohttp.ClientSession, url: str, payload: Dict[str, Any],
+                      bytes_per_s: Optional[float], read_size: int) -> Dict[str, Any]:
+    """Read one SSE response at ``bytes_per_s`` (None: full speed); the unread rest waits in socket and server buffers"""
+    start = time.perf_counter()
+    record = {"success": False, "outcome": None, "bytes": 0, "first_byte_ms": None, "total_ms": None}
+    try:
+        async with session.post(url, json=payload) as response:
+            if response.status != 200:
+                record["outcome"] = "http_5xx" if response.status >= 500 else "http_4xx"
+            else:
+                while True:
+                    data = await response.content.read(read_size)
+                    if not data:
+                        break
+                    if record["first_byte_ms"] is None:
+                        record["first_byte_ms"] = (time.perf_counter() - start) * 1000
+                    record["bytes"] += len(data)
+                    if bytes_per_s:
+                        await asyncio.sleep(len(data) / bytes_per_s)
+                record["success"] = True
+                record["outcome"] = "ok"
+    except asyncio.TimeoutError:
+        record["outcome"] = "timeout"
+    except aiohttp.ClientError:
+        record["outcome"] = "reset"
+    record["total_ms"] = (time.perf_counter() - start) * 1000
+    return record
+
+
+async def loop_lag(samples: List[float], interval_s: float = 0.01):
+    """How late the client's event loop wakes up from a short sleep (ms)"""
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval_s)
+        samples.append((time.perf_counter() - start - interval_s) * 1000)
+
+
+async def run_phase(base_url: str, counters: ServerCounters, slow_clients: int, bytes_per_s: Optional[float],
+                    args) -> Dict[str, Any]:
+    deadline = time.perf_counter() + args.duration
+    fast_records: List[Dict[str, Any]] = []
+    slow_records: List[Dict[str, Any]] = []
+    lags: List[float] = []
+    server_samples: List[Dict[str, Any]] = []
+    slow_in_flight = [0]
+    fast_in_flight = [0]
+
+    connector = aiohttp.TCPConnector(limit=0, socket_factory=small_buffer_socket_factory(args.receive_buffer))
+    async with LoadEngine(base_url, args.model, timeout=args.timeout) as engine, \
+            aiohttp.ClientSession(connector=connector,
+                                  timeout=aiohttp.ClientTimeout(total=args.slow_timeout)) as slow_session:
+
+        async def fast_client(worker: int):
+            n = 0
+            while time.perf_counter() < deadline:
+                payload = engine.build_payload(f"Fast reader {worker}.{n}: describe the sea", args.max_tokens)
+                fast_in_flight[0] += 1
+                try:
+                    fast_records.append(await engine.send(payload))
+                finally:
+                    fast_in_flight[0] -= 1
+                n += 1
+
+        async def slow_client(worker: int):
+            n = 0
+            while time.perf_counter() < deadline:
+                payload = engine.build_payload(f"Slow reader {worker}.{n}: describe the mountains",
+                                               args.slow_max_tokens)
+                slow_in_flight[0] += 1
+                try:
+                    slow_records.append(await slow_stream(slow_session, f"{base_url}/v1/completions", payload,
+                                                          bytes_per_s, args.read_size))
+                finally:
+                    slow_in_flight[0] -= 1
+                n += 1
+
+        async def sample_server():
+            while True:
+                reading = await counters.read()
+                server_samples.append({"running": reading["running"], "slow_in_flight": slow_in_flight[0],
+                                       "fast_in_flight": fast_in_flight[0]})
+                await asyncio.sleep(args.poll_s)
+
+        background = [asyncio.create_task(loop_lag(lags)), asyncio.create_task(sample_server())]
+        try:
+            await asyncio.gather(*(fast_client(i) for i in range(args.fast_clients)),
+                                 *(slow_client(i) for i in range(slow_clients)))
+        finally:
+            for task in background:
+                task.cancel()
+            await asyncio.gather(*background, return_exceptions=True)
+
+    ok = [r for r in fast_records if r["success"]]
+    ttfts = [r["first_token_ms"] for r in ok if r["first_token_ms"] is not None]
+    itls = [b - a for r in ok for a, b in zip(r["token_times_ms"], r["token_times_ms"][1:])]
+    counted = [s for s in server_samples if s["running"] is not None]
+    # Slow streams the client is still reading that the server no longer runs: their rest sits in buffers
+    buffered = [max(s["slow_in_flight"] - max(s["running"] - s["fast_in_flight"], 0), 0) for s in counted]
+    slow_ok = [r for r in slow_records if r["success"]]
+    return {
+        "slow_clients": slow_clients,
+        "slow_bytes_per_s": bytes_per_s,
+        "fast_requests": len(fast_records),
+        "fast_outcomes": outcome_counts(fast_records),
+        "fast_ttft_p50_ms": percentile(ttfts, 50),
+        "fast_ttft_p99_ms": percentile(ttfts, 99),
+        "fast_itl_p50_ms": percentile(itls, 50),
+        "fast_itl_p99_ms": percentile(itls, 99),
+        "fast_tokens_per_s": sum(r["completion_tokens"] for r in ok) / args.duration,
+        "slow_requests": len(slow_records),
+        "slow_outcomes": outcome_counts(slow_records),
+        "slow_median_total_ms": statistics.median([r["total_ms"] for r in slow_ok]) if slow_ok else None,
+        "slow_median_bytes": statistics.median([r["bytes"] for r in slow_ok]) if slow_ok else None,
+        "server_running_mean": statistics.mean(s["running"] for s in counted) if counted else None,
+        "slow_in_flight_mean": statistics.mean(s["slow_in_flight"] for s in counted) if counted else None,
+        "slow_buffered_mean": statistics.mean(buffered) if buffered else None,
+        "client_loop_lag_p99_ms": percentile(lags, 99),
+    }
+
+
+def diagnose(control: Dict[str, Any], mixed: Dict[str, Any], args) -> Dict[str, Any]:
+    """Compare slow extra readers with full-speed extra readers and name the likely mechanism"""
+
+    def ratio(key):
+        before, after = control.get(key), mixed.get(key)
+        return after / before if before and after else None
+
+    inflation = {key: ratio(key) for key in ("fast_ttft_p50_ms", "fast_ttft_p99_ms", "fast_itl_p50_ms",
+                                             "fast_itl_p99_ms")}
+    worst = max((v for v in inflation.values() if v is not None), default=None)
+    affected = worst is not None and worst > args.max_inflation
+    observations = []
+    stalled = (mixed["client_loop_lag_p99_ms"] or 0) > args.max_loop_lag_ms
+    if stalled:
+        observations.append(f"client event-loop stalls (lag p99 {mixed['client_loop_lag_p99_ms']:.1f}ms)")
+    if mixed["slow_buffered_mean"] is not None and mixed["slow_in_flight_mean"]:
+        share = mixed["slow_buffered_mean"] / mixed["slow_in_flight_mean"]
+        if share > 0.5:
+            observations.append(f"server-side buffering ({share:.0%} of slow streams finished on the server "
+                                f"while still draining to the reader)")
+        else:
+            observations.append("backpressure reaches the server (slow streams keep their running slots)")
+    # Only a slowdown needs a cause; otherwise the same facts are just how the server handled slow readers
+    causes = list(observations) if affected else []
+    if affected and not stalled:
+        causes.append("head-of-line blocking in the server's HTTP layer")
+    return {"inflation": inflation, "fast_readers_affected": affected, "likely_causes": causes,
+            "observations": observations}
+
+
+async def run_target(name: str, base_url: str, args) -> Dict[str, Any]:
+    counters = ServerCounters(base_url, args.container)
+    await counters.start()
+    print(f"\n📋 {name} ({base_url}), server counters from {counters.source}")
+    try:
+        phases = {}
+        for label, extra, rate in (("fast_only", 0, None), ("control", args.slow_clients, None),
+                                   ("mixed", args.slow_clients, args.bytes_per_s)):
+            phase = await run_phase(base_url, counters, extra, rate, args)
+            phases[label] = phase
+            print(f"  {label:<9} fast TTFT p99 {phase['fast_ttft_p99_ms'] or 0:7.1f}ms  "
+                  f"ITL p99 {phase['fast_itl_p99_ms'] or 0:6.1f}ms  {phase['fast_tokens_per_s']:8.1f} tok/s  "
+                  f"loop lag p99 {phase['client_loop_lag_p99_ms'] or 0:5.1f}ms  "
+                  f"[{format_outcomes(phase['fast_outcomes'])}]")
+    finally:
+        await counters.stop()
+    diagnosis = diagnose(phases["control"], phases["mixed"], args)
+    mixed = phases["mixed"]
+    if mixed["slow_median_total_ms"] is not None:
+        print(f"  🐢 slow readers: {mixed['slow_median_bytes']:.0f} bytes in "
+              f"{mixed['slow_median_total_ms'] / 1000:.1f}s [{format_outcomes(mixed['slow_outcomes'])}]")
+    flag = "⚠️ fast readers slowed" if diagnosis["fast_readers_affected"] else "✅ fast readers unaffected"
+    if diagnosis["fast_readers_affected"]:
+        print(f"  {flag}; likely {'; '.join(diagnosis['likely_causes'])}")
+    else:
+        print(f"  {flag}; observed {'; '.join(diagnosis['observations']) or 'nothing (no server counters)'}")
+    return {"target": name, "base_url": base_url, "counter_source": counters.source, **phases,
+            "diagnosis": diagnosis}
+
+
+async def run_benchmark(args) -> List[Dict[str, Any]]:
+    targets = args.target
+    servers = []
+    if not targets:
+        server = MockOpenAIServer(port=args.mock_port, ttft_ms=30.0, itl_ms=10.0,
+                                  max_running=args.fast_clients + args.slow_clients, batch_penalty=0.02)
+        await server.start()
+        servers.append(server)
+        targets = [("mock", server.base_url)]
+
+    results = []
+    try:
+        for name, url in targets:
+            results.append(await run_target(name, url, args))
+    finally:
+        for server in servers:
+            await server.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Slow SSE consumer backpressure test")
+    parser.add_argument("--target", action="append", type=parse_target,
+                        help="name=base_url, repeatable, e.g. sglang=http://localhost:8000 (default: mock)")
+    parser.add_argument("--container", help="Read running requests from this container's log without /metrics")
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--fast-clients", type=int, default=8)
+    parser.add_argument("--slow-clients", type=int, default=8)
+    parser.add_argument("--bytes-per-s", type=float, default=2000.0, help="Read rate of a slow client")
+    parser.add_argument("--read-size", type=int, default=256, help="Bytes per read of a slow client")
+    parser.add_argument("--receive-buffer", type=int, default=4096, help="SO_RCVBUF of slow client sockets")
+    parser.add_argument("--max-tokens", type=int, default=128, help="max_tokens of fast readers")
+    parser.add_argument("--slow-max-tokens", type=int, default=256, help="max_tokens of slow readers")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per phase")
+    parser.add_argument("--poll-s", type=float, default=0.1)
+    parser.add_argument("--max-inflation", type=float, default=1.2,
+                        help="Fast-reader latency ratio (slow extra readers / full-speed extra readers) "
+                             "that counts as affected")
+    parser.add_argument("--max-loop-lag-ms", type=float, default=5.0, help="Client loop lag that counts as stall")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--slow-timeout", type=float, default=600.0)
+    parser.add_argument("--mock-port", type=int, default=9270)
+    args = parser.parse_args()
+
+    print("🚀 Slow Consumer Test")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"🐢 {args.slow_clients} readers at {args.bytes_per_s:.0f} B/s next to {args.fast_clients} full-speed readers")
+    results = asyncio.run(run_benchmark(args))
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    report_file = f"slow_consumer_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "config": vars(args), "results": results}, f, indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Soak Test - hold a target load for hours and watch for drift and leaks
+Open-loop Poisson load with a cap on in-flight requests; every finished
+request is folded into fixed-size log-bucket histograms and dropped, so
+client memory stays bounded however long it runs. Each interval snapshots
+latency histograms, throughput, error rate, energy per token, GPU memory
+and server RSS, and trend fits over the snapshots raise alerts on
+throughput degradation, latency drift and monotonic memory growth
+(fragmentation under PYTORCH_CUDA_ALLOC_CONF=expandable_segments)
+"""
+
+import re
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from collections import Counter, deque
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+from load_engine import LoadEngine
+from outcome_stats import format_outcomes
+from energy_telemetry import PowerSampler, build_power_provider
+
+MEMORY_UNITS = {"b": 1 / 2 ** 20, "kib": 1 / 1024, "kb": 1 / 1024, "mib": 1.0, "mb": 1.0,
+                "gib": 1024.0, "gb": 1024.0, "tib": 1024.0 ** 2}
+MEMORY_VALUE = re.compile(r"([\d.]+)\s*([A-Za-z]+)")
+
+
+class LatencyHistogram:
+    """Log-spaced latency buckets (``growth`` apart) from ``min_ms`` to ``max_ms``; memory is fixed"""
+
+    def __init__(self, min_ms: float = 1.0, max_ms: float = 600_000.0, growth: float = 1.05):
+        self.min_ms = min_ms
+        self.growth = growth
+        self.counts = [0] * (int(math.log(max_ms / min_ms, growth)) + 2)
+        self.total = 0
+
+    def _bucket(self, value_ms: float) -> int:
+        if value_ms <= self.min_ms:
+            return 0
+        return min(int(math.log(value_ms / self.min_ms, self.growth)) + 1, len(self.counts) - 1)
+
+    def upper_bound(self, bucket: int) -> float:
+        return self.min_ms * self.growth ** bucket
+
+    def add(self, value_ms: float):
+        self.counts[self._bucket(value_ms)] += 1
+        self.total += 1
+
+    def merge(self, other: "LatencyHistogram"):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.total += other.total
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Upper edge of the bucket holding the p-th percentile (within ``growth`` of the true value)"""
+        if not self.total:
+            return None
+        rank = math.ceil(p / 100 * self.total)
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.upper_bound(i)
+        return self.upper_bound(len(self.counts) - 1)
+
+    def to_dict(self) -> Dict[str, int]:
+        """Sparse upper-edge -> count, for the report"""
+        return {f"{self.upper_bound(i):.1f}": count for i, count in enumerate(self.counts) if count}
+
+
+class Interval:
+    """Everything one snapshot needs, accumulated without keeping records"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token = LatencyHistogram()
+        self.total = LatencyHistogram()
+        self.outcomes: Counter = Counter()
+        self.tokens = 0
+        self.shed = 0
+
+    def add(self, record: Dict[str, Any]):
+        self.outcomes[record["outcome"] or "reset"] += 1
+        if record["success"]:
+            self.tokens += record["completion_tokens"]
+            self.total.add(record["total_ms"])
+            if record.get("first_token_ms") is not None:
+                self.first_token.add(record["first_token_ms"])
+
+
+def parse_memory_mb(text: str) -> Optional[float]:
+    """'1.5GiB' / '812MiB' / '2.1GB' -> MiB"""
+    match = MEMORY_VALUE.search(text)
+    if not match:
+        return None
+    factor = MEMORY_UNITS.get(match.group(2).lower())
+    return float(match.group(1)) * factor if factor else None
+
+
+async def _run(*command: str) -> Optional[str]:
+    try:
+        process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE,
+                                                       stderr=asyncio.subprocess.DEVNULL)
+        stdout, _ = await asyncio.wait_for(process.communicate(), timeout=10)
+    except (OSError, asyncio.TimeoutError):
+        return None
+    return stdout.decode() if process.returncode == 0 else None
+
+
+async def gpu_memory_mb() -> Optional[float]:
+    """Used GPU memory summed over all GPUs (None without nvidia-smi)"""
+    output = await _run("nvidia-smi", "--query-gpu=memory.used", "--format=csv,noheader,nounits")
+    if not output:
+        return None
+    values = [float(line) for line in output.split() if line.strip()]
+    return sum(values) if values else None
+
+
+async def server_rss_mb(container: Optional[str], pid: Optional[int]) -> Optional[float]:
+    """Resident memory of the server: the container's usage via docker stats, or VmRSS of a local pid"""
+    if container:
+        output = await _run("docker", "stats", "--no-stream", "--format", "{{.MemUsage}}", container)
+        return parse_memory_mb(output.split("/")[0]) if output else None
+    if pid:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            return None
+    return None
+
+
+def mann_kendall(values: List[float]) -> Tuple[int, float]:
+    """Mann-Kendall S statistic and its z-score (positive = increasing trend)"""
+    n = len(values)
+    s = sum((values[j] > values[i]) - (values[j] < values[i]) for i in range(n - 1) for j in range(i + 1, n))
+    ties = Counter(values).values()
+    variance = (n * (n - 1) * (2 * n + 5) - sum(t * (t - 1) * (2 * t + 5) for t in ties)) / 18
+    if variance <= 0:
+        return s, 0.0
+    return s, (s - (s > 0) + (s < 0)) / math.sqrt(variance)
+
+
+def fit_trend(times_s: List[float], values: List[Optional[float]]) -> Optional[Dict[str, Any]]:
+    """Least-squares slope (per hour), fitted change over the span and Mann-Kendall z"""
+    points = [(t, v) for t, v in zip(times_s, values) if v is not None]
+    if len(points) < 3 or len({t for t, _ in points}) < 2:
+        return None
+    ts, vs = [t for t, _ in points], [v for _, v in points]
+    slope, intercept = statistics.linear_regression(ts, vs)
+    start = intercept + slope * ts[0]
+    change = slope * (ts[-1] - ts[0])
+    _, z = mann_kendall(vs)
+    return {
+        "slope_per_hour": slope * 3600,
+        "fitted_start": start,
+        "fitted_change": change,
+        "relative_change": change / start if start else None,
+        "mann_kendall_z": z,
+        "points": len(points),
+    }
+
+
+def evaluate_alerts(snapshots: List[Dict[str, Any]], args) -> Tuple[Dict[str, Any], List[str]]:
+    """Trend fits over the settled snapshots and the alerts they trigger"""
+    settled = [s for s in snapshots if s["elapsed_s"] >= args.settle_s]
+    if len(settled) < args.min_snapshots:
+        return {}, []
+    times = [s["elapsed_s"] for s in settled]
+    trends = {key: fit_trend(times, [s[key] for s in settled])
+              for key in ("throughput_tps", "total_p99_ms", "first_token_p99_ms", "tokens_per_joule",
+                          "gpu_memory_mb", "server_rss_mb")}
+    alerts = []
+
+    throughput = trends["throughput_tps"]
+    if (throughput and throughput["relative_change"] is not None
+            and throughput["relative_change"] < -args.throughput_drop and throughput["mann_kendall_z"] < -args.z):
+        alerts.append(f"throughput degrading: {throughput['relative_change']:+.0%} over the run "
+                      f"({throughput['slope_per_hour']:+.1f} tok/s per hour)")
+    for key, label in (("total_p99_ms", "p99 latency"), ("first_token_p99_ms", "p99 TTFT")):
+        trend = trends[key]
+        if (trend and trend["relative_change"] is not None
+                and trend["relative_change"] > args.latency_growth and trend["mann_kendall_z"] > args.z):
+            alerts.append(f"{label} drifting up: {trend['relative_change']:+.0%} over the run")
+    for key, label in (("gpu_memory_mb", "GPU memory"), ("server_rss_mb", "server RSS")):
+        trend = trends[key]
+        if trend and trend["mann_kendall_z"] > args.z and trend["fitted_change"] > args.min_growth_mb:
+            alerts.append(f"{label} growing monotonically: {trend['fitted_change']:+.0f} MiB "
+                          f"({trend['slope_per_hour']:+.0f} MiB/h, Mann-Kendall z={trend['mann_kendall_z']:.1f})")
+    recent = settled[-args.min_snapshots:]
+    requests = sum(s["requests"] for s in recent)
+    errors = sum(s["requests"] * s["error_rate"] for s in recent)
+    if requests and errors / requests > args.max_error_rate:
+        alerts.append(f"error rate {errors / requests:.1%} over the last {len(recent)} snapshots")
+    return trends, alerts
+
+
+def snapshot(interval: Interval, elapsed_s: float, in_flight: int, gpu_mb: Optional[float],
+             rss_mb: Optional[float], power: Optional[PowerSampler] = None) -> Dict[str, Any]:
+    now = time.perf_counter()
+    duration = now - interval.started
+    requests = sum(interval.outcomes.values())
+    energy = power.energy_report(interval.started, now, interval.tokens, interval.outcomes["ok"]) if power else {}
+    return {
+        "elapsed_s": elapsed_s,
+        "duration_s": duration,
+        "requests": requests,
+        "shed": interval.shed,
+        "in_flight": in_flight,
+        "outcomes": dict(interval.outcomes),
+        "error_rate": (requests - interval.outcomes["ok"]) / requests if requests else 0.0,
+        "throughput_tps": interval.tokens / duration if duration > 0 else 0.0,
+        "first_token_p50_ms": interval.first_token.percentile(50),
+        "first_token_p99_ms": interval.first_token.percentile(99),
+        "total_p50_ms": interval.total.percentile(50),
+        "total_p99_ms": interval.total.percentile(99),
+        "total_histogram": interval.total.to_dict(),
+        "energy_j": energy.get("energy_j"),
+        "mean_power_w": energy.get("mean_power_w"),
+        "tokens_per_joule": energy.get("tokens_per_joule"),
+        "joules_per_request": energy.get("joules_per_request"),
+        "gpu_memory_mb": gpu_mb,
+        "server_rss_mb": rss_mb,
+    }
+
+
+async def run_soak(args, snapshot_file: str) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    snapshots: deque = deque(maxlen=args.max_snapshots)
+    overall_total, overall_first_token = LatencyHistogram(), LatencyHistogram()
+    overall_outcomes: Counter = Counter()
+    raised: Dict[str, str] = {}
+    shed = 0
+    pending = set()
+    interval = Interval()
+    start = time.perf_counter()
+    deadline = start + args.hours * 3600
+    provider = build_power_provider(args.power)
+    # Only the current interval is ever integrated, so a couple of intervals of samples is enough
+    power = PowerSampler(provider, args.power_interval_s,
+                         max_samples=int(2 * args.interval_s / args.power_interval_s) + 10) if provider else None
+    energy_j, energy_tokens, energy_requests = 0.0, 0, 0
+
+    async with LoadEngine(args.url, args.model, timeout=args.timeout, max_connections=args.max_in_flight) as engine:
+
+        async def one(n: int):
+            payload = engine.build_payload(f"Soak request {n}: {args.prompt}", args.max_tokens, temperature=0.7)
+            record = await engine.send(payload)
+            interval.add(record)
+
+        def take_snapshot(out, gpu_mb: Optional[float], rss_mb: Optional[float]) -> Dict[str, Any]:
+            nonlocal interval, shed, energy_j, energy_tokens, energy_requests
+            finished, interval = interval, Interval()
+            snap = snapshot(finished, time.perf_counter() - start, len(pending), gpu_mb, rss_mb, power)
+            if snap["energy_j"] is not None:
+                energy_j += snap["energy_j"]
+                energy_tokens += finished.tokens
+                energy_requests += finished.outcomes["ok"]
+            overall_total.merge(finished.total)
+            overall_first_token.merge(finished.first_token)
+            overall_outcomes.update(finished.outcomes)
+            shed += finished.shed
+            snapshots.append(snap)
+            out.write(json.dumps(snap) + "\n")
+            out.flush()
+            return snap
+
+        async def reporter(out):
+            while True:
+                await asyncio.sleep(args.interval_s)
+                gpu_mb, rss_mb = await asyncio.gather(gpu_memory_mb(), server_rss_mb(args.container, args.pid))
+                snap = take_snapshot(out, gpu_mb, rss_mb)
+                memory = " ".join(f"{label} {value:.0f}MiB" for label, value in
+                                  (("GPU", gpu_mb), ("RSS", rss_mb)) if value is not None)
+                if snap["tokens_per_joule"] is not None:
+                    memory += f"  {snap['tokens_per_joule']:.2f} tok/J @ {snap['mean_power_w']:.0f}W"
+                print(f"  📸 {snap['elapsed_s'] / 60:7.1f}min  {snap['throughput_tps']:7.1f} tok/s  "
+                      f"p99 {snap['total_p99_ms'] or 0:7.0f}ms  err {snap['error_rate']:.1%}  "
+                      f"in-flight {snap['in_flight']:3d}  {memory}  [{format_outcomes(snap['outcomes'])}]")
+                _, alerts = evaluate_alerts(list(snapshots), args)
+                for alert in alerts:
+                    kind = alert.split(":")[0]
+                    if raised.get(kind) is None:
+                        print(f"  🚨 {alert}")
+                    raised[kind] = alert
+
+        if power:
+            power.start()
+        with open(snapshot_file, "a") as out:
+            report_task = asyncio.create_task(reporter(out))
+            n = 0
+            next_at = time.perf_counter()
+            try:
+                while time.perf_counter() < deadline:
+                    next_at += rng.expovariate(args.rate)
+                    await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+                    if len(pending) >= args.max_in_flight:
+                        # Client-side shedding keeps memory bounded when the server falls behind
+                        interval.shed += 1
+                        continue
+                    task = asyncio.create_task(one(n))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+                    n += 1
+                if pending:
+                    await asyncio.wait(pending, timeout=args.timeout)
+            finally:
+                report_task.cancel()
+                await asyncio.gather(report_task, return_exceptions=True)
+                # Requests still running after the drain timeout are given up on and counted as timeouts
+                abandoned = list(pending)
+                for task in abandoned:
+                    task.cancel()
+                await asyncio.gather(*abandoned, return_exceptions=True)
+                interval.outcomes["timeout"] += len(abandoned)
+            # The drain after the deadline is not steady load: count it, but keep it out of the trends
+            tail = take_snapshot(out, None, None)
+            snapshots.pop()
+        if power:
+            power.stop()
+            provider.close()
+
+    trends, alerts = evaluate_alerts(list(snapshots), args)
+    return {
+        "elapsed_s": time.perf_counter() - start,
+        "requests_sent": n,
+        "shed": shed,
+        "drain_requests": tail["requests"],
+        "drain_abandoned": len(abandoned),
+        "outcomes": dict(overall_outcomes),
+        "first_token_p50_ms": overall_first_token.percentile(50),
+        "first_token_p99_ms": overall_first_token.percentile(99),
+        "total_p50_ms": overall_total.percentile(50),
+        "total_p99_ms": overall_total.percentile(99),
+        "power_provider": provider.name if provider else None,
+        "energy_j": energy_j if power else None,
+        "tokens_per_joule": energy_tokens / energy_j if energy_j > 0 else None,
+        "joules_per_request": energy_j / energy_requests if energy_requests else None,
+        "trends": trends,
+        "alerts": alerts,
+        "alerts_seen": sorted(raised.values()),
+        "snapshots": list(snapshots),
+        "snapshot_file": snapshot_file,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hours-long soak test with drift and leak detection")
+    parser.add_argument("--url", default="http://localhost:8000", help="Server base URL")
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--hours", type=float, default=4.0, help="How long to hold the load")
+    parser.add_argument("--rate", type=float, default=2.0, help="Poisson arrival rate (requests/s)")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="Arrivals beyond this are shed client-side")
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--prompt", default="Summarize the history of the printing press.")
+    parser.add_argument("--interval-s", type=float, default=60.0, help="Snapshot interval")
+    parser.add_argument("--max-snapshots", type=int, default=1440, help="Snapshots kept in memory for trend fits")
+    parser.add_argument("--settle-s", type=float, default=600.0, help="Ignore snapshots before this for trends")
+    parser.add_argument("--min-snapshots", type=int, default=6, help="Snapshots needed before alerting")
+    parser.add_argument("--container", help="Docker container whose memory to track (docker stats)")
+    parser.add_argument("--pid", type=int, help="Local server PID whose RSS to track")
+    parser.add_argument("--power", choices=["auto", "nvml", "nvidia-smi", "none"], default="auto",
+                        help="GPU power source for energy per snapshot (auto skips it when there is no GPU)")
+    parser.add_argument("--power-interval-s", type=float, default=0.5, help="Power sampling interval")
+    parser.add_argument("--throughput-drop", type=float, default=0.1, help="Fitted relative drop that alerts")
+    parser.add_argument("--latency-growth", type=float, default=0.25, help="Fitted relative p99 growth that alerts")
+    parser.add_argument("--min-growth-mb", type=float, default=256.0, help="Memory growth below this never alerts")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--z", type=float, default=2.33, help="Mann-Kendall z for a significant trend")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    snapshot_file = f"soak_snapshots_{timestamp}.jsonl"
+    print("🚀 Soak Test")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"📍 {args.url}: {args.rate} req/s for {args.hours}h, snapshots every {args.interval_s:.0f}s → "
+          f"{snapshot_file}")
+    result = asyncio.run(run_soak(args, snapshot_file))
+
+    print("\n" + "=" * 70)
+    print("🏁 SOAK SUMMARY")
+    print("=" * 70)
+    print(f"  {result['requests_sent']} requests in {result['elapsed_s'] / 3600:.2f}h, {result['shed']} shed "
+          f"client-side  [{format_outcomes(result['outcomes'])}]")
+    print(f"  latency p50/p99 {result['total_p50_ms'] or 0:.0f}/{result['total_p99_ms'] or 0:.0f}ms, "
+          f"TTFT p50/p99 {result['first_token_p50_ms'] or 0:.0f}/{result['first_token_p99_ms'] or 0:.0f}ms")
+    if result["energy_j"] is not None:
+        print(f"  ⚡ {result['energy_j'] / 3.6e6:.3f} kWh, {result['tokens_per_joule'] or 0:.2f} tok/J, "
+              f"{result['joules_per_request'] or 0:.1f} J/req ({result['power_provider']})")
+    for key, trend in result["trends"].items():
+        if trend:
+            print(f"  📈 {key:<20} {trend['slope_per_hour']:+10.2f}/h  z={trend['mann_kendall_z']:+.1f}")
+    if result["alerts"]:
+        for alert in result["alerts"]:
+            print(f"  🚨 {alert}")
+    else:
+        print("  ✅ No drift or leak detected")
+
+    report_file = f"soak_test_{timestamp}.json"
+    with open(report_file, 'w') as f:
+        json.dump({"timestamp": timestamp, "config": vars(args), "results": result}, f, indent=2)
+    print(f"\n💾 Report saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Steady State - throughput over the window where the server is actually loaded
+``total_tokens / overall_time`` charges the prefill ramp-up and the tail where
+the last request decodes alone to the throughput. This module lines up the
+per-token timestamps of every streamed request, finds the longest stretch
+where the number of decoding requests stays at its plateau and reports the
+token rate over that window plus a binned throughput series for the whole run,
+all as vectorized NumPy operations on the per-request arrays
+"""
+
+import math
+from typing import List, Dict, Any, Optional, Tuple
+
+import numpy as np
+
+
+def request_arrays(records: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    """Per-request and per-token arrays in seconds from the first request's start.
+
+    Uses ``start_time`` (wall clock at issue) and ``token_times_ms`` as
+    recorded by ``LoadEngine.send``. Each chunk is weighted by
+    ``completion_tokens / chunks`` so multi-token chunks count fully.
+    """
+    streamed = [r for r in records if r.get("success") and r.get("token_times_ms")]
+    if not streamed:
+        empty = np.empty(0)
+        return {"first_token": empty, "end": empty, "token_times": empty, "token_weights": empty}
+    starts = np.array([r["start_time"] for r in streamed], dtype=float)
+    origin = starts.min()
+    starts -= origin
+    chunks = np.array([len(r["token_times_ms"]) for r in streamed])
+    tokens = np.array([r.get("completion_tokens") or len(r["token_times_ms"]) for r in streamed], dtype=float)
+    offsets = np.concatenate([np.asarray(r["token_times_ms"], dtype=float) for r in streamed]) / 1000
+    return {
+        "first_token": starts + np.array([r["token_times_ms"][0] for r in streamed]) / 1000,
+        "end": starts + np.array([r["total_ms"] for r in streamed]) / 1000,
+        "token_times": np.repeat(starts, chunks) + offsets,
+        "token_weights": np.repeat(tokens / chunks, chunks),
+    }
+
+
+def decoding_counts(first_token: np.ndarray, end: np.ndarray, at: np.ndarray) -> np.ndarray:
+    """Number of requests between their first token and their end at each time in ``at``"""
+    return (np.searchsorted(np.sort(first_token), at, side="right")
+            - np.searchsorted(np.sort(end), at, side="right"))
+
+
+def throughput_series(token_times: np.ndarray, token_weights: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Tokens per second in each bin between consecutive ``edges``"""
+    tokens, _ = np.histogram(token_times, bins=edges, weights=token_weights)
+    return tokens / np.diff(edges)
+
+
+def find_steady_window(first_token: np.ndarray, end: np.ndarray, plateau: float = 0.9,
+                       min_duration_s: float = 0.5) -> Optional[Tuple[float, float, int]]:
+    """Longest interval where at least ``plateau`` of the peak number of requests are decoding.
+
+    Exact on the request events (first token +1, end -1) rather than on
+    bins; returns (start, end, peak) or None when the interval is shorter
+    than ``min_duration_s``.
+    """
+    if not len(first_token):
+        return None
+    times = np.concatenate((first_token, end))
+    deltas = np.concatenate((np.ones(len(first_token), dtype=int), -np.ones(len(end), dtype=int)))
+    # Ends sort before starts at the same instant so the count never overshoots
+    order = np.lexsort((deltas, times))
+    times, counts = times[order], np.cumsum(deltas[order])
+    peak = int(counts.max())
+    loaded = counts[:-1] >= max(1, math.ceil(plateau * peak))
+    # Run boundaries over the inter-event intervals: +1 where a loaded run starts, -1 one past its end
+    padded = np.diff(np.concatenate(([0], loaded.astype(int), [0])))
+    run_starts, run_ends = np.flatnonzero(padded == 1), np.flatnonzero(padded == -1)
+    if not len(run_starts):
+        return None
+    durations = times[run_ends] - times[run_starts]
+    longest = int(np.argmax(durations))
+    if durations[longest] < min_duration_s:
+        return None
+    return float(times[run_starts[longest]]), float(times[run_ends[longest]]), peak
+
+
+def analyze_throughput(records: List[Dict[str, Any]], bin_s: float = 0.25, plateau: float = 0.9,
+                       min_duration_s: float = 0.5) -> Dict[str, Any]:
+    """Steady-state token rate, the window it was measured over and the binned series"""
+    arrays = request_arrays(records)
+    times, weights = arrays["token_times"], arrays["token_weights"]
+    if not len(times):
+        return {"steady_throughput": None, "error": "no streamed tokens to analyze"}
+
+    duration = float(arrays["end"].max())
+    edges = np.arange(0.0, duration + bin_s, bin_s)
+    series = throughput_series(times, weights, edges)
+    counts = decoding_counts(arrays["first_token"], arrays["end"], (edges[:-1] + edges[1:]) / 2)
+    window = find_steady_window(arrays["first_token"], arrays["end"], plateau, min_duration_s)
+
+    result = {
+        "bin_s": bin_s,
+        "throughput_series": np.round(series, 2).tolist(),
+        "decoding_series": counts.tolist(),
+        "peak_decoding": None,
+        "steady_window_s": None,
+        "steady_throughput": None,
+        "steady_cv": None,
+        "steady_fraction": 0.0,
+    }
+    if window is None:
+        result["error"] = f"no decoding plateau of at least {min_duration_s}s"
+        return result
+
+    start, end, peak = window
+    inside = (times >= start) & (times < end)
+    # Only bins lying entirely inside the window say anything about its stability
+    full_bins = series[(edges[:-1] >= start) & (edges[1:] <= end)]
+    result.update({
+        "peak_decoding": peak,
+        "steady_window_s": [start, end],
+        "steady_throughput": float(weights[inside].sum() / (end - start)),
+        "steady_cv": float(full_bins.std() / full_bins.mean()) if len(full_bins) > 1 and full_bins.mean() > 0
+        else None,
+        "steady_fraction": (end - start) / duration if duration > 0 else 0.0,
+    })
+    return result
@@ -16,37 +16,34 @@ import sys
 from typing import List, Dict, Any
 import argparse
 
+from warmup_detector import completion_probe, warmup_until_steady
+from energy_telemetry import start_power_sampler, add_power_arguments, energy_fields, format_energy
+from outcome_stats import classify_status, classify_exception, outcome_counts, format_outcomes
+
 class TokenSpeedBenchmark:
-    def __init__(self, host="localhost", port=8000, model="Qwen/Qwen3-8B"):
+    def __init__(self, host="localhost", port=8000, model="Qwen/Qwen3-8B", power=None):
         self.base_url = f"http://{host}:{port}"
         self.model = model
         self.results = []
+        self.warmup_report = None
+        # Running PowerSampler (or None); every test integrates energy over its own window
+        self.power = power
 
     def print_progress(self, msg):
         """Print progress message with timestamp"""
         timestamp = datetime.now().strftime("%H:%M:%S")
         print(f"[{timestamp}] {msg}")
 
-    def warmup(self, runs=3):
-        """Warm up the model"""
-        self.print_progress("🔥 Warming up model...")
-        for i in range(runs):
-            try:
-                response = requests.post(
-                    f"{self.base_url}/v1/completions",
-                    json={
-                        "model": self.model,
-                        "prompt": "Hello, this is a warmup request.",
-                        "max_tokens": 10,
-                        "temperature": 0.1
-                    },
-                    timeout=30
-                )
-                if response.status_code == 200:
-                    self.print_progress(f"  Warmup {i+1}/{runs} ✓")
-                time.sleep(1)
-            except Exception as e:
-                self.print_progress(f"  Warmup {i+1}/{runs} failed: {e}")
+    def warmup(self, batch_sizes=(1, 2, 5, 10), max_rounds=60, max_seconds=300.0):
+        """Warm up until latency at every batch size is stationary"""
+        self.print_progress("🔥 Warming up model until latency settles...")
+        probe = completion_probe(self.base_url, self.model, max_tokens=10, timeout=30)
+        report = warmup_until_steady(probe, list(batch_sizes), max_rounds=max_rounds, max_seconds=max_seconds,
+                                     log=self.print_progress)
+        status = "steady" if report["converged"] else "NOT steady, results may include warmup effects"
+        self.print_progress(f"  Warmup took {report['warmup_s']:.1f}s over {report['requests']} requests ({status})")
+        self.warmup_report = report
+        return report
 
     def measure_single_request(self, prompt: str, max_tokens: int, runs: int = 5) -> Dict:
         """Measure token speed for single requests"""
@@ -55,6 +52,9 @@ class TokenSpeedBenchmark:
         latencies = []
         tokens_per_second = []
         ttft_times = []
+        attempts = []
+        generated = 0
+        window_start = time.perf_counter()
 
         for i in range(runs):
             try:
@@ -78,6 +78,7 @@ class TokenSpeedBenchmark:
 
                 if response.status_code == 200:
                     data = response.json()
+                    attempts.append({"outcome": "ok"})
 
                     # Calculate metrics
                     total_time = end_time - start_time
@@ -88,6 +89,7 @@ class TokenSpeedBenchmark:
                     prompt_tokens = usage.get("prompt_tokens", 0)
                     completion_tokens = usage.get("completion_tokens", 0)
                     total_tokens = usage.get("total_tokens", 0)
+                    generated += completion_tokens
 
                     # Calculate tokens per second (generation only)
                     if total_time > 0 and completion_tokens > 0:
@@ -99,9 +101,15 @@ class TokenSpeedBenchmark:
                     ttft_times.append(ttft_estimate)
 
                     self.print_progress(f"  Run {i+1}/{runs}: {completion_tokens} tokens in {total_time:.2f}s = {tps:.2f} tok/s")
+                else:
+                    attempts.append({"outcome": classify_status(response.status_code)})
+                    self.print_progress(f"  Run {i+1}/{runs} failed: Status {response.status_code}")
 
             except Exception as e:
+                attempts.append({"outcome": classify_exception(e)})
                 self.print_progress(f"  Run {i+1}/{runs} failed: {e}")
+        window_end = time.perf_counter()
+        outcomes = format_outcomes(outcome_counts(attempts))
 
         if tokens_per_second:
             return {
@@ -116,8 +124,11 @@ class TokenSpeedBenchmark:
                 "avg_latency_ms": statistics.mean(latencies),
                 "p50_latency_ms": statistics.median(latencies),
                 "p95_latency_ms": statistics.quantiles(latencies, n=20)[18] if len(latencies) >= 5 else max(latencies),
-                "avg_ttft_ms": statistics.mean(ttft_times)
+                "avg_ttft_ms": statistics.mean(ttft_times),
+                "outcomes": outcomes,
+                **energy_fields(self.power, window_start, window_end, generated, len(tokens_per_second))
             }
+        self.print_progress(f"  ❌ No successful runs ({outcomes})")
         return None
 
     async def measure_concurrent_requests(self, prompt: str, max_tokens: int, concurrent: int = 5) -> Dict:
@@ -150,22 +161,29 @@ class TokenSpeedBenchmark:
 
                         return {
                             "request_id": request_id,
+                            "success": True,
+                            "outcome": "ok",
                             "total_time": total_time,
                             "completion_tokens": completion_tokens,
                             "tokens_per_second": tps,
                             "latency_ms": total_time * 1000
                         }
+                    self.print_progress(f"  Request {request_id} failed: Status {response.status}")
+                    return {"request_id": request_id, "success": False, "outcome": classify_status(response.status)}
             except Exception as e:
                 self.print_progress(f"  Request {request_id} failed: {e}")
-                return None
+                return {"request_id": request_id, "success": False, "outcome": classify_exception(e)}
 
         # Run concurrent requests
         async with aiohttp.ClientSession() as session:
             tasks = [make_request(session, i) for i in range(concurrent)]
+            window_start = time.perf_counter()
             results = await asyncio.gather(*tasks)
+            window_end = time.perf_counter()
 
-        # Filter successful results
-        successful_results = [r for r in results if r is not None]
+        # Filter successful results; failures still count in the outcome breakdown
+        successful_results = [r for r in results if r["success"]]
+        outcomes = format_outcomes(outcome_counts(results))
 
         if successful_results:
             all_tps = [r["tokens_per_second"] for r in successful_results]
@@ -179,12 +197,15 @@ class TokenSpeedBenchmark:
                 "prompt_words": len(prompt.split()),
                 "max_tokens": max_tokens,
                 "successful_requests": len(successful_results),
+                "outcomes": outcomes,
                 "avg_tokens_per_second_per_request": statistics.mean(all_tps),
                 "total_tokens_per_second": total_tokens / total_time if total_time > 0 else 0,
                 "avg_latency_ms": statistics.mean(all_latencies),
                 "p50_latency_ms": statistics.median(all_latencies),
-                "p95_latency_ms": statistics.quantiles(all_latencies, n=20)[18] if len(all_latencies) >= 5 else max(all_latencies)
+                "p95_latency_ms": statistics.quantiles(all_latencies, n=20)[18] if len(all_latencies) >= 5 else max(all_latencies),
+                **energy_fields(self.power, window_start, window_end, total_tokens, len(successful_results))
             }
+        self.print_progress(f"  ❌ No successful requests ({outcomes})")
         return None
 
     def measure_streaming(self, prompt: str, max_tokens: int) -> Dict:
@@ -208,13 +229,20 @@ class TokenSpeedBenchmark:
                 stream=True,
                 timeout=120
             )
+            if response.status_code != 200:
+                self.print_progress(f"  Streaming test failed: Status {response.status_code} "
+                                    f"({classify_status(response.status_code)})")
+                return None
 
+            completed = False
             for line in response.iter_lines():
                 if line:
                     if first_token_time is None:
                         first_token_time = time.perf_counter()
 
-                    if line.startswith(b"data: "):
+                    if line == b"data: [DONE]":
+                        completed = True
+                    elif line.startswith(b"data: "):
                         try:
                             data = json.loads(line[6:])
                             if "choices" in data and data["choices"]:
@@ -234,22 +262,25 @@ class TokenSpeedBenchmark:
                 "tokens_received": tokens_received,
                 "total_time_seconds": total_time,
                 "tokens_per_second": tokens_received / total_time if total_time > 0 else 0,
-                "time_to_first_token_ms": ttft
+                "time_to_first_token_ms": ttft,
+                # A stream cut before [DONE] still has a speed, but it is not a clean run
+                "outcomes": format_outcomes(outcome_counts([{"outcome": "ok" if completed else "reset"}])),
+                **energy_fields(self.power, start_time, end_time, tokens_received, 1)
             }
 
         except Exception as e:
-            self.print_progress(f"  Streaming test failed: {e}")
+            self.print_progress(f"  Streaming test failed: {e} ({classify_exception(e)})")
             return None
 
-    def run_comprehensive_benchmark(self):
+    def run_comprehensive_benchmark(self, warmup_batch_sizes=(1, 2, 5, 10), warmup_max_rounds=60):
         """Run comprehensive benchmark suite"""
         self.print_progress("🚀 Starting Comprehensive Token Speed Benchmark")
         self.print_progress(f"📍 Server: {self.base_url}")
         self.print_progress(f"🤖 Model: {self.model}")
         print("=" * 60)
 
-        # Warmup
-        self.warmup()
+        # Warmup - every concurrency used below is its own batch-size bucket
+        warmup = self.warmup(warmup_batch_sizes, warmup_max_rounds)
         print()
 
         # Test configurations
@@ -273,7 +304,7 @@ class TokenSpeedBenchmark:
             if result:
                 result["description"] = desc
                 all_results.append(result)
-                print(f"✅ {desc}: {result['avg_tokens_per_second']:.2f} tok/s")
+                print(f"✅ {desc}: {result['avg_tokens_per_second']:.2f} tok/s ({result['outcomes']})")
             time.sleep(2)  # Pause between tests
 
         # Concurrent request tests
@@ -294,7 +325,8 @@ class TokenSpeedBenchmark:
             if result:
                 result["description"] = f"concurrent_{concurrent_users}_users"
                 all_results.append(result)
-                print(f"✅ {concurrent_users} users: {result['total_tokens_per_second']:.2f} total tok/s")
+                print(f"✅ {concurrent_users} users: {result['total_tokens_per_second']:.2f} total tok/s "
+                      f"({result['outcomes']})")
             time.sleep(3)
 
         # Streaming test
@@ -305,8 +337,18 @@ class TokenSpeedBenchmark:
         if result:
             result["description"] = "streaming_test"
             all_results.append(result)
-            print(f"✅ Streaming: {result['tokens_per_second']:.2f} tok/s, TTFT: {result['time_to_first_token_ms']:.2f}ms")
-
+            print(f"✅ Streaming: {result['tokens_per_second']:.2f} tok/s, TTFT: {result['time_to_first_token_ms']:.2f}ms "
+                  f"({result['outcomes']})")
+
+        # Warmup requests never enter the measurements; keep how long they took
+        all_results.append({
+            "test_type": "warmup",
+            "description": "adaptive_warmup",
+            "warmup_seconds": warmup["warmup_s"],
+            "warmup_requests": warmup["requests"],
+            "warmup_converged": warmup["converged"],
+            "warmup_rounds": " ".join(f"b{b['batch_size']}:{b['rounds']}" for b in warmup["buckets"]),
+        })
         return all_results
 
     def save_results(self, results: List[Dict], filename: str = None):
@@ -343,23 +385,30 @@ class TokenSpeedBenchmark:
             print(f"  Average Speed: {avg_speed:.2f} tokens/second")
 
             for r in single_results:
-                print(f"  {r['description']}: {r['avg_tokens_per_second']:.2f} tok/s")
+                print(f"  {r['description']}: {r['avg_tokens_per_second']:.2f} tok/s ({r['outcomes']})")
 
         # Concurrent request summary
         concurrent_results = [r for r in results if r.get("test_type") == "concurrent_requests"]
         if concurrent_results:
             print(f"\n📌 Concurrent Request Performance:")
             for r in concurrent_results:
-                print(f"  {r['concurrent_users']} users: {r['total_tokens_per_second']:.2f} total tok/s")
+                print(f"  {r['concurrent_users']} users: {r['total_tokens_per_second']:.2f} total tok/s ({r['outcomes']})")
 
         # Streaming summary
         streaming_results = [r for r in results if r.get("test_type") == "streaming"]
         if streaming_results:
             print(f"\n📌 Streaming Performance:")
             for r in streaming_results:
-                print(f"  Speed: {r['tokens_per_second']:.2f} tok/s")
+                print(f"  Speed: {r['tokens_per_second']:.2f} tok/s ({r['outcomes']})")
                 print(f"  TTFT: {r['time_to_first_token_ms']:.2f}ms")
 
+        # Energy summary, when a power source was available
+        measured = [r for r in results if r.get("tokens_per_joule") is not None]
+        if measured:
+            print(f"\n📌 Energy Efficiency:")
+            for r in measured:
+                print(f"  {r['description']}: {format_energy(r)}")
+
         print("=" * 60)
 
 def main():
@@ -368,6 +417,10 @@ def main():
     parser.add_argument("--port", type=int, default=8000, help="Server port")
     parser.add_argument("--model", default="Qwen/Qwen3-8B", help="Model name")
     parser.add_argument("--output", help="Output CSV filename")
+    parser.add_argument("--warmup-batch-sizes", type=int, nargs="+", default=[1, 2, 5, 10],
+                        help="Batch sizes warmed until their latency is stationary")
+    parser.add_argument("--warmup-max-rounds", type=int, default=60, help="Warmup round budget per batch size")
+    add_power_arguments(parser)
 
     args = parser.parse_args()
 
@@ -385,7 +438,12 @@ def main():
         sys.exit(1)
 
     # Run comprehensive benchmark
-    results = benchmark.run_comprehensive_benchmark()
+    benchmark.power = start_power_sampler(args.power, args.power_interval_s)
+    try:
+        results = benchmark.run_comprehensive_benchmark(args.warmup_batch_sizes, args.warmup_max_rounds)
+    finally:
+        if benchmark.power:
+            benchmark.power.close()
 
     # Save and display results
     if results:
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Warmup Detector - warm up until latency is stationary instead of for a fixed count
+With --enable-torch-compile and CUDA graph capture the first requests at every
+batch size are slow. Warmup runs rounds of ``batch_size`` simultaneous requests
+per bucket until a two-window Mann-Whitney test (plus a relative tolerance on
+the means) finds the recent rolling latency stationary, and reports how many
+rounds and how long that took
+"""
+
+import math
+import time
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Callable, Tuple
+
+import requests
+
+
+def mann_whitney_p(a: List[float], b: List[float]) -> float:
+    """Two-sided Mann-Whitney U p-value (normal approximation with tie correction)"""
+    n1, n2 = len(a), len(b)
+    if not n1 or not n2:
+        return 1.0
+    pooled = sorted([(v, 0) for v in a] + [(v, 1) for v in b])
+    ranks = [0.0] * len(pooled)
+    tie_term = 0.0
+    i = 0
+    while i < len(pooled):
+        j = i
+        while j + 1 < len(pooled) and pooled[j + 1][0] == pooled[i][0]:
+            j += 1
+        for k in range(i, j + 1):
+            ranks[k] = (i + j) / 2 + 1
+        tied = j - i + 1
+        tie_term += tied ** 3 - tied
+        i = j + 1
+    rank_sum = sum(rank for rank, (_, group) in zip(ranks, pooled) if group == 0)
+    u = rank_sum - n1 * (n1 + 1) / 2
+    n = n1 + n2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (abs(u - n1 * n2 / 2) - 0.5) / math.sqrt(variance)
+    return min(1.0, math.erfc(max(z, 0.0) / math.sqrt(2)))
+
+
+def is_stationary(values: List[float], window: int = 5, alpha: float = 0.05, tolerance: float = 0.1) -> bool:
+    """Whether the last ``window`` values look like the ``window`` before them.
+
+    Both conditions must hold: the Mann-Whitney test cannot tell the two
+    windows apart at ``alpha``, and their means differ by at most
+    ``tolerance`` (relative). The rank test alone lets a slow drift or a
+    couple of leftover slow samples through when the windows are small;
+    the means do not.
+    """
+    if len(values) < 2 * window:
+        return False
+    older, recent = values[-2 * window:-window], values[-window:]
+    older_mean, recent_mean = statistics.mean(older), statistics.mean(recent)
+    if recent_mean > 0 and abs(older_mean - recent_mean) / recent_mean > tolerance:
+        return False
+    return mann_whitney_p(older, recent) > alpha
+
+
+def steady_state_start(values: List[float], window: int = 5, alpha: float = 0.05,
+                       tolerance: float = 0.1) -> Optional[int]:
+    """Index of the first sample of the earliest stationary stretch (None if it never settles)"""
+    for start in range(0, len(values) - 2 * window + 1):
+        if is_stationary(values[start:start + 2 * window], window, alpha, tolerance):
+            return start
+    return None
+
+
+def trim_to_steady_state(values: List[float], window: int = 5, alpha: float = 0.05,
+                         tolerance: float = 0.1) -> Tuple[List[float], int]:
+    """``values`` without their pre-convergence head, and how many samples were dropped.
+
+    Series too short to test are returned untouched.
+    """
+    if len(values) < 2 * window:
+        return values, 0
+    start = steady_state_start(values, window, alpha, tolerance)
+    if start is None:
+        return values, 0
+    return values[start:], start
+
+
+def completion_probe(base_url: str, model: str = "Qwen/Qwen3-32B-AWQ", prompt: str = "Hello, this is a warmup request.",
+                     max_tokens: int = 10, timeout: float = 60.0) -> Callable[[], Optional[float]]:
+    """Blocking /v1/completions call returning its latency in ms, or None if it failed"""
+    def probe() -> Optional[float]:
+        start = time.perf_counter()
+        try:
+            response = requests.post(f"{base_url}/v1/completions",
+                                     json={"model": model, "prompt": prompt, "max_tokens": max_tokens,
+                                           "temperature": 0.1},
+                                     timeout=timeout)
+        except Exception:
+            return None
+        if response.status_code != 200:
+            return None
+        return (time.perf_counter() - start) * 1000
+    return probe
+
+
+def warmup_bucket(probe: Callable[[], Optional[float]], batch_size: int, window: int = 5, alpha: float = 0.05,
+                  tolerance: float = 0.1, max_rounds: int = 60, max_seconds: float = 300.0,
+                  log: Callable[[str], None] = print, max_failed_rounds: int = 5,
+                  failure_backoff_s: float = 1.0) -> Dict[str, Any]:
+    """Rounds of ``batch_size`` simultaneous probes until the per-round median latency is stationary
+
+    A round where every probe fails backs off (doubling from ``failure_backoff_s``) instead of
+    hammering a server that is down; ``max_failed_rounds`` in a row give up unconverged.
+    """
+    round_medians: List[float] = []
+    failures = 0
+    failed_rounds = 0
+    converged = False
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=batch_size) as pool:
+        while len(round_medians) < max_rounds and time.perf_counter() - start < max_seconds:
+            latencies = list(pool.map(lambda _: probe(), range(batch_size)))
+            ok = [latency for latency in latencies if latency is not None]
+            failures += len(latencies) - len(ok)
+            if not ok:
+                failed_rounds += 1
+                if failed_rounds >= max_failed_rounds:
+                    log(f"  Warmup batch={batch_size}: ❌ {failed_rounds} rounds in a row failed, giving up")
+                    break
+                time.sleep(min(failure_backoff_s * 2 ** (failed_rounds - 1), 30.0))
+                continue
+            failed_rounds = 0
+            round_medians.append(statistics.median(ok))
+            if is_stationary(round_medians, window, alpha, tolerance):
+                converged = True
+                break
+    elapsed = time.perf_counter() - start
+
+    rounds = len(round_medians)
+    # Everything before the two stationary windows is the warmup transient
+    discarded = rounds - 2 * window if converged else rounds
+    result = {
+        "batch_size": batch_size,
+        "converged": converged,
+        "rounds": rounds,
+        "requests": rounds * batch_size + failures,
+        "failures": failures,
+        "gave_up": failed_rounds >= max_failed_rounds,
+        "warmup_s": elapsed,
+        "transient_rounds": discarded,
+        "first_round_ms": round_medians[0] if round_medians else None,
+        "steady_median_ms": statistics.median(round_medians[-window:]) if round_medians else None,
+    }
+    if converged:
+        log(f"  Warmup batch={batch_size}: steady after {rounds} rounds in {elapsed:.1f}s "
+            f"({result['first_round_ms']:.0f}ms → {result['steady_median_ms']:.0f}ms) ✓")
+    else:
+        log(f"  Warmup batch={batch_size}: ⚠️ not stationary after {rounds} rounds in {elapsed:.1f}s "
+            f"({failures} failures)")
+    return result
+
+
+def warmup_until_steady(probe: Callable[[], Optional[float]], batch_sizes: List[int] = (1,), window: int = 5,
+                        alpha: float = 0.05, tolerance: float = 0.1, max_rounds: int = 60,
+                        max_seconds: float = 300.0, log: Callable[[str], None] = print,
+                        max_failed_rounds: int = 5) -> Dict[str, Any]:
+    """Warm every batch-size bucket; the report says how long it took and whether each bucket settled"""
+    start = time.perf_counter()
+    buckets = [warmup_bucket(probe, size, window, alpha, tolerance, max_rounds, max_seconds, log,
+                             max_failed_rounds=max_failed_rounds)
+               for size in batch_sizes]
+    return {
+        "warmup_s": time.perf_counter() - start,
+        "requests": sum(b["requests"] for b in buckets),
+        "converged": all(b["converged"] for b in buckets),
+        "window": window,
+        "alpha": alpha,
+        "tolerance": tolerance,
+        "buckets": buckets,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm a server until latency per batch size is stationary")
+    parser.add_argument("--url", default="http://localhost:8000", help="Server base URL")
+    parser.add_argument("--model", default="Qwen/Qwen3-32B-AWQ", help="Model name")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 5, 10])
+    parser.add_argument("--max-tokens", type=int, default=10)
+    parser.add_argument("--window", type=int, default=5, help="Rounds per comparison window")
+    parser.add_argument("--alpha", type=float, default=0.05, help="Significance level of the stationarity test")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Allowed relative change of the window means")
+    parser.add_argument("--max-rounds", type=int, default=60, help="Round budget per batch size")
+    parser.add_argument("--max-seconds", type=float, default=300.0, help="Time budget per batch size")
+    parser.add_argument("--max-failed-rounds", type=int, default=5,
+                        help="Consecutive all-failed rounds before a batch size is given up")
+    args = parser.parse_args()
+
+    print("🔥 Adaptive Warmup")
+    print(f"📅 {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    probe = completion_probe(args.url, args.model, max_tokens=args.max_tokens)
+    report = warmup_until_steady(probe, args.batch_sizes, args.window, args.alpha, args.tolerance,
+                                 args.max_rounds, args.max_seconds, max_failed_rounds=args.max_failed_rounds)
+    status = "✅ steady" if report["converged"] else "⚠️ not steady"
+    print(f"\n{status}: {report['requests']} warmup requests in {report['warmup_s']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()